@@ -2,3 +2,16 @@
 
 __version__ = "0.1.0"
 
+__all__ = ["__version__", "compress_bytes", "compress_stream"]
+
+# The library API lives in mpress.api and is imported on first access, so
+# 'import mpress' (e.g. for __version__) does not load Pillow
+_API = ("compress_bytes", "compress_stream")
+
+
+def __getattr__(name):
+    if name in _API:
+        from mpress import api
+
+        return getattr(api, name)
+    raise AttributeError(f"module 'mpress' has no attribute {name!r}")
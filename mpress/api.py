@@ -0,0 +1,172 @@
+"""In-memory compression API for library callers."""
+
+import io
+from typing import IO, Optional, Union
+
+from mpress.image_compressor import ImageCompressionError, encode_image
+from mpress.options import CompressionOptions
+from mpress.video_compressor import VideoCompressionError, compress_video_stream
+
+# Anything exposing the buffer protocol as bytes
+Buffer = Union[bytes, bytearray, memoryview]
+
+# Accepted values of the format argument, with the canonical name of each
+FORMATS = {
+    "png": "png",
+    "jpg": "jpeg",
+    "jpeg": "jpeg",
+    "mov": "mov",
+    "mp4": "mp4",
+    "webm": "webm",
+}
+
+# Bytes needed by detect_format()
+_SNIFF_SIZE = 16
+
+
+def detect_format(head: bytes) -> Optional[str]:
+    """
+    Identify a media format from the first bytes of a file.
+
+    Args:
+        head: At least the first 12 bytes of the file
+
+    Returns:
+        'png', 'jpeg', 'mov', 'mp4' or 'webm', or None if not recognized
+    """
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "png"
+    if head.startswith(b"\xff\xd8\xff"):
+        return "jpeg"
+    if head.startswith(b"\x1a\x45\xdf\xa3"):
+        # EBML header: Matroska, which mpress only handles as WebM
+        return "webm"
+    if head[4:8] == b"ftyp":
+        return "mov" if head[8:12] == b"qt  " else "mp4"
+    if head[4:8] in (b"moov", b"mdat", b"wide", b"free"):
+        # Old QuickTime files start without an ftyp box
+        return "mov"
+    return None
+
+
+def _resolve_format(source: IO[bytes], format: Optional[str]) -> str:
+    """Validate the format argument, or sniff it without consuming the stream."""
+    if format is not None:
+        if format.lower() not in FORMATS:
+            raise ValueError(f"Unsupported format: {format}. Available: {', '.join(FORMATS)}")
+        return FORMATS[format.lower()]
+
+    if source.seekable():
+        position = source.tell()
+        head = source.read(_SNIFF_SIZE)
+        source.seek(position)
+    elif hasattr(source, "peek"):
+        head = source.peek(_SNIFF_SIZE)[:_SNIFF_SIZE]
+    else:
+        raise ValueError("format is required for streams that can neither seek nor peek")
+
+    detected = detect_format(head)
+    if detected is None:
+        raise ValueError("Could not detect the media format; pass format explicitly")
+    return detected
+
+
+def compress_stream(
+    source: IO[bytes],
+    output: Optional[IO[bytes]] = None,
+    format: Optional[str] = None,
+    options: CompressionOptions = CompressionOptions(),
+) -> IO[bytes]:
+    """
+    Compress media read from a binary stream.
+
+    Images are decoded and encoded entirely in memory. Videos are piped
+    through FFmpeg where the container allows it (see compress_video_stream).
+    The result is always written: unlike the file-based functions, there is
+    no result cache and nothing is kept because it would not be smaller.
+
+    Args:
+        source: Binary stream positioned at the start of the media
+        output: Binary stream to write to (defaults to a new BytesIO)
+        format: Input format, a key of FORMATS; detected from the first bytes
+            when None (the stream must then be seekable or support peek())
+        options: Compression settings; image_format converts images, while
+            video_format and video_segments need files and are not supported
+
+    Returns:
+        output; a BytesIO created here is rewound to the start
+
+    Raises:
+        ValueError: If the format is unknown or cannot be detected
+        ImageCompressionError: If image compression fails
+        VideoCompressionError: If video compression fails
+        FFmpegNotFoundError: If a video is given and FFmpeg is not installed
+    """
+    media_format = _resolve_format(source, format)
+    result = io.BytesIO() if output is None else output
+
+    if media_format in ("png", "jpeg"):
+        try:
+            encode_image(
+                source,
+                result,
+                options.image_format or media_format,
+                options.png_quantizer,
+                options.png_compress_level,
+                options.png_strategy,
+                max_dimension=options.max_dimension,
+                scale=options.scale,
+                target_ssim=options.target_ssim,
+                jpeg_keep=options.jpeg_keep,
+                jpeg_progressive=options.jpeg_progressive,
+                jpeg_lossless_min_gain=options.jpeg_lossless_min_gain,
+            )
+        except ImageCompressionError:
+            raise
+        except Exception as e:
+            raise ImageCompressionError(f"Failed to compress {media_format} stream: {e}") from e
+    else:
+        if options.video_format is not None:
+            raise VideoCompressionError(
+                "Converting video formats needs files; use compress_video instead"
+            )
+        compress_video_stream(
+            source,
+            result,
+            media_format,
+            options.video_profile,
+            max_dimension=options.max_dimension,
+            scale=options.scale,
+        )
+
+    if output is None:
+        result.seek(0)
+    return result
+
+
+def compress_bytes(
+    data: Buffer,
+    format: Optional[str] = None,
+    options: CompressionOptions = CompressionOptions(),
+) -> bytes:
+    """
+    Compress media held in memory.
+
+    Args:
+        data: The file contents (bytes, bytearray or memoryview)
+        format: Input format, a key of FORMATS; detected when None
+        options: Compression settings, as for compress_stream()
+
+    Returns:
+        The compressed file contents
+
+    Raises:
+        ValueError: If the format is unknown or cannot be detected
+        ImageCompressionError: If image compression fails
+        VideoCompressionError: If video compression fails
+        FFmpegNotFoundError: If a video is given and FFmpeg is not installed
+    """
+    # BytesIO shares a bytes object's buffer until written to; other
+    # buffers are copied once
+    source = io.BytesIO(data)
+    return compress_stream(source, io.BytesIO(), format, options).getvalue()
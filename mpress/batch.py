@@ -0,0 +1,278 @@
+"""Parallel batch scheduling for mpress."""
+
+import heapq
+import itertools
+import os
+import time
+from collections import deque
+from typing import (
+    TYPE_CHECKING,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+)
+
+from mpress.file_handler import get_file_type
+from mpress.timing import FileDetails, StageTimings
+
+if TYPE_CHECKING:
+    from concurrent.futures import Future
+
+
+# Default number of concurrent FFmpeg processes. Encoders such as libx264 are
+# already multithreaded, so running many of them at once mostly adds contention.
+DEFAULT_VIDEO_JOBS = 1
+
+# How many submitted-but-unreported tasks we allow per worker. Results are
+# reported in input order, so this bounds how far the pools can run ahead of
+# a slow file at the head of the queue (and the memory held by pending results).
+_PENDING_PER_WORKER = 8
+
+
+class FileResult(NamedTuple):
+    """Outcome of processing one file."""
+
+    file_path: str
+    success: bool
+    message: str
+    bytes_before: int = 0
+    bytes_after: int = 0
+    # 'compressed', 'cached', 'no-gain', 'aborted', 'deferred', or 'failed'
+    outcome: str = "failed"
+    # (stage, seconds) pairs, only recorded when a report was asked for
+    stages: StageTimings = ()
+    # Noted facts such as the JPEG quality chosen for --target-ssim
+    details: FileDetails = ()
+    # Where the output was written, if it was (a new name when converting)
+    output_path: Optional[str] = None
+    # CPU seconds spent on the file, including FFmpeg's (see timing.cpu_time)
+    cpu_seconds: float = 0.0
+
+
+def default_jobs() -> int:
+    """
+    Get the default number of image worker processes.
+
+    Returns:
+        Number of CPUs available to this process (at least 1)
+    """
+    if hasattr(os, "sched_getaffinity"):
+        return max(1, len(os.sched_getaffinity(0)))
+    return max(1, os.cpu_count() or 1)
+
+
+def classify_path(file_path: str) -> Optional[str]:
+    """
+    Guess the file type from the extension, without touching the filesystem.
+
+    This is only used to route work to the right pool; full validation still
+    happens inside the worker.
+
+    Args:
+        file_path: Path to the file
+
+    Returns:
+        'image', 'video', or None if the extension is not supported
+    """
+    return get_file_type(os.path.splitext(file_path)[1].lower())
+
+
+def run_batch(
+    files: Iterable[Tuple[str, Optional[str]]],
+    process: Callable[..., FileResult],
+    jobs: Optional[int] = None,
+    video_jobs: int = DEFAULT_VIDEO_JOBS,
+    track_progress: Optional[Callable[[str], Callable]] = None,
+    memory_budget: Optional[int] = None,
+    estimate_memory: Optional[Callable[[str], int]] = None,
+    deadline: Optional[float] = None,
+    estimate_seconds: Optional[Callable[[str], float]] = None,
+) -> Iterator[FileResult]:
+    """
+    Process files concurrently and yield results in input order.
+
+    Images are CPU-bound Pillow work that holds the GIL, so they run in a
+    process pool. Videos spend their time in FFmpeg subprocesses, so a small
+    thread pool is enough to drive them. Everything else (unsupported or
+    missing files) goes to the image pool, where validation reports the error.
+
+    Args:
+        files: (file_path, file_type) pairs to process, consumed lazily so
+            files can be fed in as they are discovered. file_type is None for
+            paths that have not been validated yet.
+        process: Function called as process(file_path, file_type) that returns
+            a FileResult. It must be picklable (a module-level function or a
+            functools.partial of one) when more than one image job is used.
+        jobs: Number of image worker processes (defaults to the CPU count)
+        video_jobs: Number of concurrent video compressions
+        track_progress: Called with a video's path when it is submitted; the
+            returned callback is passed to process() as on_progress. Video
+            work runs on threads in this process, so the callback need not
+            be picklable.
+        memory_budget: Bytes that running image tasks may use together. An
+            image is only started once the estimates of the images already
+            running plus its own fit in the budget; an image larger than the
+            whole budget runs on its own. None means no limit.
+        estimate_memory: Called with an image's path to estimate its peak
+            memory use in bytes; required for memory_budget to take effect
+        deadline: time.monotonic() value by which all work should be done.
+            A file is only started if its pool has a worker predicted to be
+            free early enough for it to finish in time; otherwise its result
+            is a 'deferred' one and it is not processed.
+        estimate_seconds: Called with a file's path to estimate how long it
+            occupies a worker; required for deadline to take effect
+
+    Yields:
+        FileResult for each file, in the same order as files
+    """
+    if jobs is None:
+        jobs = default_jobs()
+    jobs = max(1, jobs)
+    video_jobs = max(1, video_jobs)
+
+    timed = deadline is not None and estimate_seconds is not None
+
+    # Look ahead one file: a single file gains nothing from the pools
+    files = iter(files)
+    head = list(itertools.islice(files, 2))
+    files = itertools.chain(head, files)
+
+    # Sequential fast path: no pools, same behaviour as processing in a loop
+    if len(head) < 2 or (jobs == 1 and video_jobs == 1):
+        free_at = [0.0]
+        for file_path, file_type in files:
+            if timed and not _reserve(free_at, estimate_seconds(file_path), deadline):
+                yield _deferred(file_path)
+            elif track_progress is not None and _is_video(file_path, file_type):
+                yield process(file_path, file_type, on_progress=track_progress(file_path))
+            else:
+                yield process(file_path, file_type)
+        return
+
+    # Imported here: single-file and single-job runs take the path above and
+    # never need the pools (ProcessPoolExecutor also loads multiprocessing)
+    from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+
+    if jobs > 1:
+        image_pool = ProcessPoolExecutor(max_workers=jobs)
+    else:
+        image_pool = ThreadPoolExecutor(max_workers=1)
+    video_pool = ThreadPoolExecutor(max_workers=video_jobs)
+
+    max_pending = (jobs + video_jobs) * _PENDING_PER_WORKER
+    pending: "deque[Tuple[str, Future]]" = deque()
+    # Running image tasks and their estimated memory use
+    admitted: "Dict[Future, int]" = {}
+    budgeted = memory_budget is not None and estimate_memory is not None
+    # Predicted times at which each image and video worker is next free
+    image_free_at = [0.0] * jobs
+    video_free_at = [0.0] * video_jobs
+
+    try:
+        for file_path, file_type in files:
+            video = _is_video(file_path, file_type)
+            free_at = video_free_at if video else image_free_at
+            if timed and not _reserve(free_at, estimate_seconds(file_path), deadline):
+                future = Future()
+                future.set_result(_deferred(file_path))
+            elif not video:
+                if budgeted:
+                    need = estimate_memory(file_path)
+                    _wait_for_memory(admitted, need, memory_budget)
+                future = image_pool.submit(process, file_path, file_type)
+                if budgeted:
+                    admitted[future] = need
+            elif track_progress is not None:
+                on_progress = track_progress(file_path)
+                future = video_pool.submit(process, file_path, file_type, on_progress=on_progress)
+            else:
+                future = video_pool.submit(process, file_path, file_type)
+            pending.append((file_path, future))
+
+            while len(pending) >= max_pending:
+                yield _collect(*pending.popleft())
+
+        while pending:
+            yield _collect(*pending.popleft())
+
+    finally:
+        # On early exit (e.g. KeyboardInterrupt) drop work that has not started
+        for _, future in pending:
+            future.cancel()
+        image_pool.shutdown(wait=True)
+        video_pool.shutdown(wait=True)
+
+
+def _wait_for_memory(admitted: "Dict[Future, int]", need: int, budget: int) -> None:
+    """
+    Block until a task needing `need` bytes fits in the memory budget.
+
+    Finished tasks are removed from admitted. Results are still collected in
+    input order by the caller; this only waits for tasks to complete.
+
+    Args:
+        admitted: Running tasks and their estimated memory use
+        need: Estimated memory use of the task about to start
+        budget: Total bytes running tasks may use
+    """
+    from concurrent.futures import FIRST_COMPLETED, wait
+
+    while admitted:
+        for future in [future for future in admitted if future.done()]:
+            del admitted[future]
+        if not admitted or sum(admitted.values()) + need <= budget:
+            return
+        wait(admitted, return_when=FIRST_COMPLETED)
+
+
+def _reserve(free_at: List[float], seconds: float, deadline: float) -> bool:
+    """
+    Book the worker predicted to be free first for a task, if it can finish in time.
+
+    Args:
+        free_at: Heap of the times the pool's workers are predicted to be free
+        seconds: Predicted duration of the task
+        deadline: time.monotonic() value the task must finish by
+
+    Returns:
+        True if the task was booked and should be started
+    """
+    start = max(time.monotonic(), free_at[0])
+    if start + seconds > deadline:
+        return False
+    heapq.heapreplace(free_at, start + seconds)
+    return True
+
+
+def _deferred(file_path: str) -> FileResult:
+    """Result of a file left for a later run by run_batch's deadline."""
+    return FileResult(file_path, True, f"Deferred (time budget): {file_path}", outcome="deferred")
+
+
+def _is_video(file_path: str, file_type: Optional[str]) -> bool:
+    """Check whether a file should go to the video pool."""
+    return (file_type or classify_path(file_path)) == "video"
+
+
+def _collect(file_path: str, future: "Future") -> FileResult:
+    """
+    Wait for a submitted task and convert worker crashes into error results.
+
+    Args:
+        file_path: Path the task was submitted for
+        future: Future returned by the pool
+
+    Returns:
+        FileResult of the task
+    """
+    try:
+        return future.result()
+    except Exception as e:
+        # process() catches its own errors; this covers pool failures such as
+        # a worker process being killed by the OOM killer.
+        return FileResult(file_path, False, f"Unexpected error processing {file_path}: {e}")
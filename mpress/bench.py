@@ -0,0 +1,269 @@
+"""Benchmarks for choosing compression settings."""
+
+import io
+import random
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+
+from PIL import Image, ImageDraw
+
+from mpress.image_compressor import encode_png, has_libimagequant
+from mpress.video_compressor import (
+    VIDEO_PROFILES,
+    EncodeProgress,
+    compress_mov_mp4,
+    compress_webm,
+    get_ffmpeg_path,
+)
+
+
+# Codecs benchmarked by bench-video, with the compressor and container for each
+VIDEO_CODECS = {
+    "h264": (compress_mov_mp4, ".mp4"),
+    "vp9": (compress_webm, ".webm"),
+}
+
+
+# zlib (level, strategy) pairs benchmarked by bench-png
+PNG_ENCODINGS: List[Tuple[int, str]] = [
+    (9, "default"),
+    (6, "default"),
+    (6, "filtered"),
+    (6, "rle"),
+    (1, "huffman"),
+]
+
+
+class VideoBenchResult(NamedTuple):
+    """Result of encoding the sample clip with one profile and codec."""
+
+    profile: str
+    codec: str
+    wall_time: float
+    fps: float
+    output_size: int
+
+
+class PngBenchResult(NamedTuple):
+    """Result of encoding the PNG corpus with one quantizer and zlib setting."""
+
+    quantizer: str
+    compress_level: int
+    strategy: str
+    wall_time: float
+    input_size: int
+    output_size: int
+
+
+def generate_sample_clip(
+    output_path: Path,
+    seconds: int = 10,
+    size: str = "1280x720",
+    rate: int = 30,
+) -> Path:
+    """
+    Generate a synthetic test clip with FFmpeg.
+
+    Uses the testsrc2 pattern (moving shapes, gradients and a counter) with an
+    audio tone, stored at high quality so it is worth compressing.
+
+    Args:
+        output_path: Where to write the clip (.mov or .mp4)
+        seconds: Clip duration
+        size: Frame size as WIDTHxHEIGHT
+        rate: Frame rate
+
+    Returns:
+        Path to the generated clip
+
+    Raises:
+        subprocess.CalledProcessError: If FFmpeg fails
+    """
+    cmd = [
+        get_ffmpeg_path(),
+        "-v",
+        "error",
+        "-f",
+        "lavfi",
+        "-i",
+        f"testsrc2=duration={seconds}:size={size}:rate={rate}",
+        "-f",
+        "lavfi",
+        "-i",
+        f"sine=frequency=440:duration={seconds}",
+        "-c:v",
+        "mpeg4",
+        "-q:v",
+        "2",
+        "-c:a",
+        "aac",
+        "-y",
+        str(output_path),
+    ]
+    subprocess.run(cmd, check=True, stdin=subprocess.DEVNULL)
+    return output_path
+
+
+def run_video_benchmark(
+    sample: Path,
+    profiles: Optional[Sequence[str]] = None,
+    codecs: Optional[Sequence[str]] = None,
+) -> List[VideoBenchResult]:
+    """
+    Encode a sample clip under each speed profile and codec.
+
+    Outputs are written to a temporary directory and deleted afterwards; the
+    sample itself is never modified.
+
+    Args:
+        sample: Path to the input clip
+        profiles: Profile names to test (defaults to all of VIDEO_PROFILES)
+        codecs: Codecs to test (defaults to all of VIDEO_CODECS)
+
+    Returns:
+        One VideoBenchResult per (profile, codec) pair
+    """
+    results = []
+    with tempfile.TemporaryDirectory(prefix="mpress-bench-") as tmpdir:
+        for codec in codecs or VIDEO_CODECS:
+            compress, suffix = VIDEO_CODECS[codec]
+            for profile in profiles or VIDEO_PROFILES:
+                output_path = Path(tmpdir) / f"{profile}-{codec}{suffix}"
+                last: List[EncodeProgress] = []
+
+                start = time.perf_counter()
+                compress(sample, output_path, last.append, profile)
+                wall_time = time.perf_counter() - start
+
+                frames = last[-1].frame if last else 0
+                results.append(
+                    VideoBenchResult(
+                        profile=profile,
+                        codec=codec,
+                        wall_time=wall_time,
+                        fps=frames / wall_time if wall_time > 0 else 0.0,
+                        output_size=output_path.stat().st_size,
+                    )
+                )
+                output_path.unlink()
+    return results
+
+
+def generate_sample_screenshots(directory: Path, count: int = 4, seed: int = 0) -> List[Path]:
+    """
+    Generate synthetic screenshots for benchmarking PNG compression.
+
+    Each image mimics an application window: flat panels, rows of small
+    "text" blocks and a gradient title bar, so some images fit in a 256-color
+    palette and some do not. Odd-numbered images have an alpha channel.
+
+    Args:
+        directory: Directory to write the PNG files to
+        count: Number of images
+        seed: Random seed, so the corpus is the same on every run
+
+    Returns:
+        Paths of the generated images
+    """
+    rng = random.Random(seed)
+    paths = []
+    for index in range(count):
+        width, height = 1280, 800
+        mode = "RGBA" if index % 2 else "RGB"
+        img = Image.new(mode, (width, height), (246, 246, 246, 255))
+        draw = ImageDraw.Draw(img)
+
+        # Gradient title bar on every other pair of images adds many colors
+        if index % 4 >= 2:
+            for x in range(width):
+                shade = 40 + 160 * x // width
+                draw.line([(x, 0), (x, 40)], fill=(shade, 90, 255 - shade, 255))
+        else:
+            draw.rectangle([0, 0, width, 40], fill=(52, 58, 64, 255))
+
+        # Sidebar and content panels
+        draw.rectangle([0, 40, 240, height], fill=(230, 232, 236, 255))
+        for _ in range(6):
+            x0 = rng.randrange(260, width - 300)
+            y0 = rng.randrange(60, height - 200)
+            color = (rng.randrange(200, 256), rng.randrange(200, 256), rng.randrange(200, 256), 255)
+            x1 = x0 + rng.randrange(150, 300)
+            y1 = y0 + rng.randrange(80, 200)
+            draw.rectangle([x0, y0, x1, y1], fill=color)
+
+        # Lines of "text": short dark runs of varying width
+        for y in range(70, height - 20, 18):
+            x = rng.choice((20, 270))
+            while x < width - 60 and rng.random() > 0.05:
+                word = rng.randrange(12, 60)
+                draw.rectangle([x, y, x + word, y + 9], fill=(33, 37, 41, 255))
+                x += word + 6
+
+        if mode == "RGBA":
+            # Transparent margin, like a window captured with its shadow
+            draw.rectangle([0, height - 16, width, height], fill=(0, 0, 0, 0))
+
+        path = directory / f"screenshot-{index}.png"
+        img.save(path, "PNG")
+        paths.append(path)
+    return paths
+
+
+def run_png_benchmark(
+    images: Sequence[Path],
+    quantizers: Optional[Sequence[str]] = None,
+    encodings: Optional[Sequence[Tuple[int, str]]] = None,
+) -> List[PngBenchResult]:
+    """
+    Encode a set of images with each PNG quantizer and zlib setting.
+
+    Images are decoded once up front and encoded to memory, so the timings
+    cover only quantization and PNG encoding.
+
+    Args:
+        images: Paths of the images to encode
+        quantizers: Quantizers to test (defaults to 'auto', 'fastoctree' and,
+            when available, 'libimagequant')
+        encodings: (compress_level, strategy) pairs (defaults to PNG_ENCODINGS)
+
+    Returns:
+        One PngBenchResult per (quantizer, encoding) pair, with sizes summed
+        over all images
+    """
+    if quantizers is None:
+        quantizers = ["auto", "fastoctree"]
+        if has_libimagequant():
+            quantizers.append("libimagequant")
+
+    decoded = []
+    input_size = 0
+    for path in images:
+        with Image.open(path) as img:
+            img.load()
+            decoded.append(img.copy())
+        input_size += path.stat().st_size
+
+    results = []
+    for quantizer in quantizers:
+        for compress_level, strategy in encodings or PNG_ENCODINGS:
+            output_size = 0
+            start = time.perf_counter()
+            for img in decoded:
+                buffer = io.BytesIO()
+                encode_png(img, buffer, quantizer, compress_level, strategy)
+                output_size += buffer.tell()
+            wall_time = time.perf_counter() - start
+            results.append(
+                PngBenchResult(
+                    quantizer=quantizer,
+                    compress_level=compress_level,
+                    strategy=strategy,
+                    wall_time=wall_time,
+                    input_size=input_size,
+                    output_size=output_size,
+                )
+            )
+    return results
@@ -0,0 +1,352 @@
+"""Throughput benchmark suite over a deterministic synthetic corpus."""
+
+import json
+import multiprocessing
+import platform
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence
+
+from PIL import Image, ImageDraw, ImageFilter
+
+import mpress
+from mpress.bench import generate_sample_clip, generate_sample_screenshots
+from mpress.image_compressor import compress_jpeg, compress_png
+from mpress.video_compressor import compress_mov_mp4, compress_webm
+
+
+# Version of the JSON report layout, bumped when fields change meaning
+REPORT_VERSION = 1
+
+# Corpus subdirectory for each kind of input
+CORPUS_KINDS = ("screenshots", "alpha", "photos", "clips")
+
+# Codec paths measured by the suite: corpus kind, compressor and output suffix
+CODEC_PATHS: Dict[str, Any] = {
+    "png-screenshot": ("screenshots", compress_png, ".png"),
+    "png-alpha": ("alpha", compress_png, ".png"),
+    "jpeg-photo": ("photos", compress_jpeg, ".jpg"),
+    "h264": ("clips", compress_mov_mp4, ".mp4"),
+    "vp9": ("clips", compress_webm, ".webm"),
+}
+VIDEO_PATHS = ("h264", "vp9")
+
+
+class CodecBenchResult(NamedTuple):
+    """Throughput of one codec path over its part of the corpus."""
+
+    codec: str
+    files: int
+    input_bytes: int
+    output_bytes: int
+    wall_time: float
+    # Peak resident set size of the benchmark process and its FFmpeg
+    # children, in bytes (None where the platform cannot report it)
+    peak_rss: Optional[int]
+
+    @property
+    def mb_per_s(self) -> float:
+        """Input megabytes (10^6 bytes) processed per second."""
+        return self.input_bytes / 1e6 / self.wall_time if self.wall_time > 0 else 0.0
+
+    @property
+    def files_per_s(self) -> float:
+        """Files processed per second."""
+        return self.files / self.wall_time if self.wall_time > 0 else 0.0
+
+    @property
+    def ratio(self) -> float:
+        """Output size as a fraction of input size."""
+        return self.output_bytes / self.input_bytes if self.input_bytes else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Convert to the JSON report representation.
+
+        Returns:
+            Raw measurements plus the derived rates
+        """
+        return {
+            **self._asdict(),
+            "mb_per_s": self.mb_per_s,
+            "files_per_s": self.files_per_s,
+            "ratio": self.ratio,
+        }
+
+
+def _generate_photos(directory: Path, count: int, rng: random.Random) -> List[Path]:
+    """Generate photo-like JPEGs: smooth lighting, soft shapes and sensor grain."""
+    paths = []
+    for index in range(count):
+        width, height = 1600, 1200
+        base = Image.merge(
+            "RGB",
+            (
+                Image.linear_gradient("L").resize((width, height)),
+                Image.radial_gradient("L").resize((width, height)),
+                Image.linear_gradient("L").rotate(90).resize((width, height)),
+            ),
+        )
+        draw = ImageDraw.Draw(base)
+        for _ in range(12):
+            x, y = rng.randrange(width), rng.randrange(height)
+            radius = rng.randrange(40, 300)
+            color = (rng.randrange(256), rng.randrange(256), rng.randrange(256))
+            draw.ellipse([x - radius, y - radius, x + radius, y + radius], fill=color)
+        base = base.filter(ImageFilter.GaussianBlur(12))
+
+        # Upscaled random noise gives texture at several frequencies
+        noise_size = (width // 4, height // 4)
+        noise = Image.frombytes("RGB", noise_size, rng.randbytes(noise_size[0] * noise_size[1] * 3))
+        noise = noise.resize((width, height), Image.Resampling.BICUBIC)
+        photo = Image.blend(base, noise, 0.15)
+
+        path = directory / f"photo-{index}.jpg"
+        photo.save(path, "JPEG", quality=95)
+        paths.append(path)
+    return paths
+
+
+def _generate_alpha(directory: Path, count: int, rng: random.Random) -> List[Path]:
+    """Generate icon-like RGBA PNGs with soft edges and gradients."""
+    paths = []
+    for index in range(count):
+        size = 512
+        color = Image.merge(
+            "RGB",
+            (
+                Image.linear_gradient("L").resize((size, size)),
+                Image.new("L", (size, size), rng.randrange(256)),
+                Image.radial_gradient("L").resize((size, size)),
+            ),
+        )
+        # Anti-aliased rounded shape: blurred mask gives many alpha levels
+        mask = Image.new("L", (size, size), 0)
+        margin = rng.randrange(16, 96)
+        ImageDraw.Draw(mask).rounded_rectangle(
+            [margin, margin, size - margin, size - margin], radius=rng.randrange(20, 120), fill=255
+        )
+        mask = mask.filter(ImageFilter.GaussianBlur(6))
+        color.putalpha(mask)
+
+        path = directory / f"icon-{index}.png"
+        color.save(path, "PNG")
+        paths.append(path)
+    return paths
+
+
+def generate_corpus(
+    directory: Path,
+    count: int = 4,
+    video: bool = True,
+    video_seconds: int = 3,
+    seed: int = 0,
+) -> Dict[str, List[Path]]:
+    """
+    Generate the benchmark corpus.
+
+    The same arguments always produce the same images (for a given Pillow
+    version), so results from different mpress versions are comparable.
+
+    Args:
+        directory: Directory to create the corpus in; one subdirectory per
+            kind (see CORPUS_KINDS)
+        count: Number of files of each image kind
+        video: Whether to generate clips (needs FFmpeg)
+        video_seconds: Duration of each clip
+        seed: Random seed
+
+    Returns:
+        Mapping of corpus kind to file paths
+
+    Raises:
+        FFmpegNotFoundError: If video is set and FFmpeg is not installed
+        subprocess.CalledProcessError: If FFmpeg fails
+    """
+    rng = random.Random(seed)
+    for kind in CORPUS_KINDS:
+        (directory / kind).mkdir(parents=True, exist_ok=True)
+
+    corpus = {
+        "screenshots": generate_sample_screenshots(directory / "screenshots", count, seed),
+        "alpha": _generate_alpha(directory / "alpha", count, rng),
+        "photos": _generate_photos(directory / "photos", count, rng),
+        "clips": [],
+    }
+    if video:
+        # Two clips: a 720p screen-like one and a small one
+        for index, size in enumerate(("1280x720", "640x360")):
+            clip = directory / "clips" / f"clip-{index}.mp4"
+            corpus["clips"].append(generate_sample_clip(clip, video_seconds, size))
+    return corpus
+
+
+def load_corpus(directory: Path) -> Dict[str, List[Path]]:
+    """
+    Load a corpus created earlier by generate_corpus().
+
+    Args:
+        directory: Corpus directory
+
+    Returns:
+        Mapping of corpus kind to file paths (empty lists for missing kinds)
+    """
+    return {
+        kind: sorted(p for p in (directory / kind).glob("*") if p.is_file())
+        if (directory / kind).is_dir()
+        else []
+        for kind in CORPUS_KINDS
+    }
+
+
+def _peak_rss() -> Optional[int]:
+    """Peak RSS of this process and its waited-for children, in bytes."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    # ru_maxrss is in bytes on macOS and kilobytes on Linux
+    scale = 1 if sys.platform == "darwin" else 1024
+    usage = max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    )
+    return usage * scale
+
+
+def _measure(codec: str, files: List[Path], output_dir: Path, repeat: int) -> CodecBenchResult:
+    """Run one codec path over its files; executed in a fresh process."""
+    _, compress, suffix = CODEC_PATHS[codec]
+
+    best = None
+    output_bytes = 0
+    for _ in range(repeat):
+        output_bytes = 0
+        start = time.perf_counter()
+        for index, path in enumerate(files):
+            output_path = output_dir / f"{codec}-{index}{suffix}"
+            compress(path, output_path)
+            output_bytes += output_path.stat().st_size
+            output_path.unlink()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    return CodecBenchResult(
+        codec=codec,
+        files=len(files),
+        input_bytes=sum(path.stat().st_size for path in files),
+        output_bytes=output_bytes,
+        wall_time=best or 0.0,
+        peak_rss=_peak_rss(),
+    )
+
+
+def run_suite(
+    corpus: Dict[str, List[Path]],
+    output_dir: Path,
+    codecs: Optional[Sequence[str]] = None,
+    repeat: int = 1,
+) -> List[CodecBenchResult]:
+    """
+    Measure every codec path over the corpus.
+
+    Each codec path runs in its own fresh process, so peak RSS is
+    measured per path rather than accumulated over the whole run. Codec paths
+    whose part of the corpus is empty are skipped.
+
+    Args:
+        corpus: Mapping of corpus kind to file paths
+        output_dir: Scratch directory for compressed outputs
+        codecs: Codec paths to run (defaults to all of CODEC_PATHS)
+        repeat: Runs per codec path; the fastest is reported
+
+    Returns:
+        One CodecBenchResult per codec path that was run
+    """
+    # Linux carries a process's peak RSS across exec, so a spawned child
+    # would start with the parent's peak; forkserver children start small
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+    results = []
+    for codec in codecs or CODEC_PATHS:
+        files = corpus.get(CODEC_PATHS[codec][0], [])
+        if not files:
+            continue
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            results.append(pool.submit(_measure, codec, files, output_dir, repeat).result())
+    return results
+
+
+def build_report(results: Sequence[CodecBenchResult]) -> Dict[str, Any]:
+    """
+    Build the machine-readable report for a suite run.
+
+    Args:
+        results: Results from run_suite()
+
+    Returns:
+        JSON-serializable report with environment details and per-codec results
+    """
+    return {
+        "report_version": REPORT_VERSION,
+        "mpress_version": mpress.__version__,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "pillow": Image.__version__,
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "results": {result.codec: result.to_dict() for result in results},
+    }
+
+
+def load_report(path: Path) -> Dict[str, Any]:
+    """
+    Read a report written by an earlier run.
+
+    Args:
+        path: Path to the JSON report
+
+    Returns:
+        Parsed report
+
+    Raises:
+        ValueError: If the file is not a suite report
+    """
+    with open(path, encoding="utf-8") as f:
+        report = json.load(f)
+    if not isinstance(report, dict) or report.get("report_version") != REPORT_VERSION:
+        raise ValueError(f"{path} is not a version {REPORT_VERSION} benchmark report")
+    return report
+
+
+def compare_reports(
+    baseline: Dict[str, Any], current: Dict[str, Any]
+) -> Dict[str, Dict[str, Optional[float]]]:
+    """
+    Compare two reports codec by codec.
+
+    Args:
+        baseline: Earlier report
+        current: New report
+
+    Returns:
+        For each codec present in both, the relative change of mb_per_s,
+        files_per_s, ratio and peak_rss (e.g. 0.1 = 10% higher); None where
+        a value is missing or the baseline is zero
+    """
+    changes = {}
+    for codec, new in current["results"].items():
+        old = baseline["results"].get(codec)
+        if old is None:
+            continue
+        changes[codec] = {}
+        for metric in ("mb_per_s", "files_per_s", "ratio", "peak_rss"):
+            before, after = old.get(metric), new.get(metric)
+            if before and after is not None:
+                changes[codec][metric] = (after - before) / before
+            else:
+                changes[codec][metric] = None
+    return changes
@@ -0,0 +1,319 @@
+"""Persistent cache of files that mpress has already compressed."""
+
+import hashlib
+import math
+import os
+import sqlite3
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+
+# Bump when the compressors change in a way that makes old outputs worth
+# recompressing; every cached result then becomes a miss.
+SETTINGS_VERSION = 1
+
+# Maximum number of rows kept per table before least-recently-used eviction
+DEFAULT_MAX_ENTRIES = 200_000
+
+# Maximum bytes of database pages in use before least-recently-used eviction.
+# The cache stores no outputs, only these rows, so this bounds its disk use
+# (plus the WAL, which SQLite checkpoints back into the freed pages).
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+# Fraction of rows that each pass of byte-bounded eviction drops at least.
+# Deleting rows leaves B-tree pages partly empty rather than freeing them,
+# so eviction measures again and repeats until the database fits.
+_EVICT_MIN_FRACTION = 0.1
+
+# Eviction needs a COUNT(*) scan, so only check every this many inserts
+_EVICT_INTERVAL = 256
+
+_HASH_CHUNK_SIZE = 1024 * 1024
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outputs (
+    digest TEXT NOT NULL,
+    settings TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    last_used REAL NOT NULL,
+    PRIMARY KEY (digest, settings)
+);
+CREATE INDEX IF NOT EXISTS outputs_last_used ON outputs (last_used);
+CREATE TABLE IF NOT EXISTS paths (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    inode INTEGER NOT NULL,
+    digest TEXT NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS paths_last_used ON paths (last_used);
+"""
+
+
+def default_cache_dir() -> Path:
+    """
+    Get the directory used for the result cache.
+
+    Honours MPRESS_CACHE_DIR, then the platform's user cache directory.
+
+    Returns:
+        Path to the cache directory (may not exist yet)
+    """
+    override = os.environ.get("MPRESS_CACHE_DIR")
+    if override:
+        return Path(override).expanduser()
+    if sys.platform == "darwin":
+        return Path.home() / "Library" / "Caches" / "mpress"
+    xdg_cache = os.environ.get("XDG_CACHE_HOME")
+    if xdg_cache:
+        return Path(xdg_cache) / "mpress"
+    return Path.home() / ".cache" / "mpress"
+
+
+def settings_key(file_path: Path, **options) -> str:
+    """
+    Build the cache key describing how a file would be compressed.
+
+    Args:
+        file_path: Path to the media file (only the extension is used)
+        **options: Compression options that affect the output
+
+    Returns:
+        Stable string identifying the compression settings
+    """
+    parts = [file_path.suffix.lower(), f"v{SETTINGS_VERSION}"]
+    for name in sorted(options):
+        parts.append(f"{name}={options[name]}")
+    return ";".join(parts)
+
+
+def hash_file(file_path: Path) -> str:
+    """
+    Compute the content hash of a file.
+
+    Args:
+        file_path: Path to the file
+
+    Returns:
+        Hex digest of the file contents
+    """
+    digest = hashlib.blake2b(digest_size=20)
+    with open(file_path, "rb") as f:
+        while True:
+            chunk = f.read(_HASH_CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    On-disk record of the files mpress has produced.
+
+    Outputs are keyed by content hash plus compression settings, so a file is
+    recognised wherever it lives. A second table remembers the stat signature
+    (size, mtime, inode) of each path, which lets unchanged files be skipped
+    without reading them at all.
+
+    Cache failures never fail a compression: a broken or locked database just
+    behaves like an empty cache.
+
+    The cache is safe to share between threads and can be pickled to worker
+    processes; each thread opens its own SQLite connection on first use.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+    ):
+        """
+        Args:
+            path: Path to the SQLite database file
+            max_entries: Maximum rows per table before LRU eviction
+            max_bytes: Maximum bytes of database pages in use before LRU
+                eviction
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+
+    def __getstate__(self):
+        return {"path": self.path, "max_entries": self.max_entries, "max_bytes": self.max_bytes}
+
+    def __setstate__(self, state):
+        self.__init__(state["path"], state["max_entries"], state["max_bytes"])
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), timeout=30)
+            # WAL lets concurrent worker processes read while one writes
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._local.conn = conn
+            self._local.inserts = 0
+        return conn
+
+    def lookup(self, file_path: Path, settings: str) -> bool:
+        """
+        Check whether a file is an mpress output for the given settings.
+
+        If the path's size, mtime and inode match what was recorded, the file
+        is not opened. Otherwise its contents are hashed and looked up.
+
+        Args:
+            file_path: Path to the file
+            settings: Key from settings_key()
+
+        Returns:
+            True if the file was produced by mpress with these settings
+        """
+        try:
+            stat = file_path.stat()
+            conn = self._connect()
+            row = conn.execute(
+                "SELECT size, mtime_ns, inode, digest FROM paths WHERE path = ?",
+                (str(file_path),),
+            ).fetchone()
+            if row is not None and tuple(row[:3]) == (
+                stat.st_size,
+                stat.st_mtime_ns,
+                stat.st_ino,
+            ):
+                digest = row[3]
+            else:
+                digest = hash_file(file_path)
+
+            now = time.time()
+            with conn:
+                hit = conn.execute(
+                    "UPDATE outputs SET last_used = ? WHERE digest = ? AND settings = ?",
+                    (now, digest, settings),
+                ).rowcount
+                if hit:
+                    self._remember_path(conn, file_path, stat, digest, now)
+            return bool(hit)
+
+        except (OSError, sqlite3.Error):
+            return False
+
+    def record(self, file_path: Path, settings: str) -> None:
+        """
+        Record a freshly compressed file as an mpress output.
+
+        Args:
+            file_path: Path to the compressed file (after replacement)
+            settings: Key from settings_key()
+        """
+        try:
+            stat = file_path.stat()
+            digest = hash_file(file_path)
+            conn = self._connect()
+            now = time.time()
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO outputs (digest, settings, size, last_used) "
+                    "VALUES (?, ?, ?, ?)",
+                    (digest, settings, stat.st_size, now),
+                )
+                self._remember_path(conn, file_path, stat, digest, now)
+
+            self._local.inserts += 1
+            if self._local.inserts % _EVICT_INTERVAL == 0:
+                self.evict()
+
+        except (OSError, sqlite3.Error):
+            pass
+
+    def evict(self) -> None:
+        """
+        Drop least-recently-used rows beyond max_entries per table, then
+        until the database uses no more than max_bytes.
+
+        Both tables lose the same share of their rows to the byte bound.
+        """
+        conn = self._connect()
+        with conn:
+            for table in ("outputs", "paths"):
+                (count,) = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()
+                self._drop_oldest(conn, table, count - self.max_entries)
+
+            while True:
+                used = self.used_bytes()
+                counts = {
+                    table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                    for table in ("outputs", "paths")
+                }
+                if used <= self.max_bytes or not any(counts.values()):
+                    break
+                fraction = max(1 - self.max_bytes / used, _EVICT_MIN_FRACTION)
+                for table, count in counts.items():
+                    self._drop_oldest(conn, table, max(1, math.ceil(count * fraction)))
+
+    def used_bytes(self) -> int:
+        """
+        Measure the database pages in use, excluding free pages.
+
+        Returns:
+            Size in bytes
+        """
+        conn = self._connect()
+        (page_size,) = conn.execute("PRAGMA page_size").fetchone()
+        (page_count,) = conn.execute("PRAGMA page_count").fetchone()
+        (free_count,) = conn.execute("PRAGMA freelist_count").fetchone()
+        return (page_count - free_count) * page_size
+
+    @staticmethod
+    def _drop_oldest(conn: sqlite3.Connection, table: str, count: int) -> None:
+        if count > 0:
+            conn.execute(
+                f"DELETE FROM {table} WHERE rowid IN "
+                f"(SELECT rowid FROM {table} ORDER BY last_used LIMIT ?)",
+                (count,),
+            )
+
+    def close(self) -> None:
+        """Close this thread's database connection, if open."""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    @staticmethod
+    def _remember_path(
+        conn: sqlite3.Connection,
+        file_path: Path,
+        stat: os.stat_result,
+        digest: str,
+        now: float,
+    ) -> None:
+        conn.execute(
+            "INSERT OR REPLACE INTO paths (path, size, mtime_ns, inode, digest, last_used) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (str(file_path), stat.st_size, stat.st_mtime_ns, stat.st_ino, digest, now),
+        )
+
+
+def open_default_cache() -> Optional[ResultCache]:
+    """
+    Open the result cache in the default location.
+
+    Returns:
+        ResultCache instance, or None if the cache directory cannot be created
+    """
+    cache_dir = default_cache_dir()
+    try:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+    except OSError:
+        return None
+    return ResultCache(cache_dir / "results.sqlite3")
@@ -1,68 +1,1469 @@
 """Command-line interface for mpress."""
 
 import argparse
+import functools
+import json
+import os
+import signal
 import sys
+import threading
+import time
+from collections import Counter
 from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 
-from mpress.file_handler import FileValidationError, validate_file
-from mpress.image_compressor import ImageCompressionError, compress_image
-from mpress.video_compressor import (
-    FFmpegNotFoundError,
-    VideoCompressionError,
-    compress_video,
+# Only modules needed to parse arguments and schedule work are imported up
+# front. Pillow, the FFmpeg helpers and the subcommands' modules are imported
+# where they are first used, so --help, argument errors and single-file runs
+# start quickly (see tests/test_startup.py).
+from mpress.batch import DEFAULT_VIDEO_JOBS, FileResult, run_batch
+from mpress.cache import ResultCache, open_default_cache, settings_key
+from mpress.dedup import DedupSummary, group_duplicates, share_results
+from mpress.file_handler import FileValidationError, iter_media_files, validate_file
+from mpress.journal import (
+    BatchJournal,
+    JournalError,
+    default_journal_dir,
+    is_unchanged,
+    prune_journals,
+    run_key,
+    sweep_temp_files,
 )
+from mpress.options import (
+    DEFAULT_JPEG_LOSSLESS_MIN_GAIN,
+    DEFAULT_PNG_COMPRESS_LEVEL,
+    DEFAULT_PNG_QUANTIZER,
+    DEFAULT_PNG_STRATEGY,
+    DEFAULT_PROFILE,
+    IMAGE_FORMATS,
+    JPEG_METADATA,
+    PNG_QUANTIZERS,
+    PNG_STRATEGIES,
+    VIDEO_FORMATS,
+    VIDEO_PROFILES,
+    CompressionOptions,
+)
+from mpress.progress import ProgressDashboard
+from mpress.report import BatchReport
+from mpress.timing import cpu_time, record_stages, stage
+from mpress.utils import (
+    DirectorySync,
+    format_duration,
+    format_size,
+    get_file_size,
+    parse_duration,
+    parse_size,
+)
+
+if TYPE_CHECKING:
+    from mpress.video_compressor import ProgressCallback
 
 
-def process_file(file_path: str) -> tuple[bool, str]:
+def process_file(
+    file_path: str,
+    file_type: Optional[str] = None,
+    options: CompressionOptions = CompressionOptions(),
+    cache: Optional[ResultCache] = None,
+    on_progress: "Optional[ProgressCallback]" = None,
+    timed: bool = False,
+) -> FileResult:
     """
     Process a single file: validate, compress, and replace.
 
     Args:
         file_path: Path to the file to process
+        file_type: 'image' or 'video' if the file was already validated
+            (e.g. by the directory walker); None to validate it here
+        options: Compression settings
+        cache: Result cache used to skip files mpress already compressed
+        on_progress: Progress callback for video encodes
+        timed: Record how long each stage took in the result's stages
 
     Returns:
-        Tuple of (success: bool, message: str)
+        FileResult with the success flag, message, sizes before/after and
+        CPU time
     """
+    start = cpu_time()
+    if not timed and options.target_ssim is None and options.video_min_ssim is None:
+        result = _process_file(file_path, file_type, options, cache, on_progress)
+        return result._replace(cpu_seconds=cpu_time() - start)
+    with record_stages() as timer:
+        result = _process_file(file_path, file_type, options, cache, on_progress)
+    result = result._replace(cpu_seconds=cpu_time() - start)
+    quality = timer.details.get("jpeg_quality")
+    crf = timer.details.get("video_crf")
+    if quality is not None and result.success:
+        saved = timer.details["jpeg_bytes_saved_vs_q85"]
+        comparison = "smaller" if saved >= 0 else "larger"
+        result = result._replace(
+            message=(
+                f"{result.message} (quality {quality}, "
+                f"{format_size(abs(saved))} {comparison} than quality 85)"
+            )
+        )
+    elif crf is not None and result.success:
+        result = result._replace(message=f"{result.message} (CRF {crf})")
+    return result._replace(stages=timer.items() if timed else (), details=timer.detail_items())
+
+
+def _process_file(
+    file_path: str,
+    file_type: Optional[str],
+    options: CompressionOptions,
+    cache: Optional[ResultCache],
+    on_progress: "Optional[ProgressCallback]",
+) -> FileResult:
+    """Validate, compress and replace a file; see process_file()."""
     try:
         # Validate file
-        path, file_type = validate_file(file_path)
+        with stage("validate"):
+            if file_type is None:
+                path, file_type = validate_file(file_path)
+            else:
+                path = Path(file_path)
+            bytes_before = get_file_size(path)
+
+        # Skip outputs of earlier runs (recompressing would only lose quality)
+        settings = settings_key(path, **options.cache_options(file_type))
+        with stage("cache"):
+            cached = cache is not None and cache.lookup(path, settings)
+        if cached:
+            return FileResult(
+                file_path,
+                True,
+                f"Skipped (already compressed): {file_path}",
+                bytes_before,
+                bytes_before,
+                "cached",
+            )
 
-        # Compress based on file type
+        # Compress based on file type. The compressors are imported on first
+        # use: Pillow is slow to import, and video-only runs never need it.
+        message = None
         if file_type == "image":
-            compress_image(path)
-            return True, f"Compressed: {file_path}"
+            from mpress.image_compressor import ImageCompressionError, compress_image
+
+            try:
+                output_path = compress_image(
+                    path,
+                    png_quantizer=options.png_quantizer,
+                    png_compress_level=options.png_compress_level,
+                    png_strategy=options.png_strategy,
+                    max_dimension=options.max_dimension,
+                    scale=options.scale,
+                    image_format=options.image_format,
+                    keep_original=options.keep_original,
+                    durable=options.durable,
+                    target_ssim=options.target_ssim,
+                    jpeg_keep=options.jpeg_keep,
+                    jpeg_progressive=options.jpeg_progressive,
+                    jpeg_lossless_min_gain=options.jpeg_lossless_min_gain,
+                )
+            except ImageCompressionError as e:
+                return FileResult(file_path, False, f"Compression error: {e}")
+            outcome = "compressed"
         elif file_type == "video":
-            compress_video(path)
-            return True, f"Compressed: {file_path}"
+            from mpress.video_compressor import (
+                KEPT_ABORTED,
+                KEPT_EFFICIENT,
+                KEPT_NO_GAIN,
+                REPLACED,
+                VideoCompressionError,
+                compress_video,
+                video_target_path,
+            )
+
+            try:
+                result = compress_video(
+                    path,
+                    on_progress,
+                    profile=options.video_profile,
+                    segments=options.video_segments,
+                    max_dimension=options.max_dimension,
+                    scale=options.scale,
+                    video_format=options.video_format,
+                    keep_original=options.keep_original,
+                    durable=options.durable,
+                    min_ssim=options.video_min_ssim,
+                )
+            except VideoCompressionError as e:
+                # Includes FFmpegNotFoundError
+                return FileResult(file_path, False, f"Compression error: {e}")
+            outcome = "compressed" if result == REPLACED else result
+            # Kept originals stay where they are
+            output_path = path
+            if result == REPLACED:
+                output_path = video_target_path(path, options.video_format)
+            elif result == KEPT_EFFICIENT:
+                message = f"Kept original (already efficiently encoded): {file_path}"
+            elif result == KEPT_NO_GAIN:
+                message = f"Kept original (compressed file was not smaller): {file_path}"
+            elif result == KEPT_ABORTED:
+                message = f"Kept original (stopped early, would not be smaller): {file_path}"
         else:
-            return False, f"Unknown file type: {file_path}"
+            return FileResult(file_path, False, f"Unknown file type: {file_path}")
+
+        # Kept originals are recorded too, so the next run doesn't retry them
+        # (a converted original is only still there with keep_original)
+        if cache is not None and path.exists():
+            with stage("cache"):
+                cache.record(path, settings)
+        bytes_after = get_file_size(output_path)
+
+        if message is None and output_path != path:
+            message = f"Converted: {file_path} -> {output_path}"
+        elif message is None:
+            message = f"Compressed: {file_path}"
+        return FileResult(
+            file_path,
+            True,
+            message,
+            bytes_before,
+            bytes_after,
+            outcome,
+            output_path=str(output_path),
+        )
 
     except FileValidationError as e:
-        return False, f"Error: {e}"
-    except ImageCompressionError as e:
-        return False, f"Compression error: {e}"
-    except VideoCompressionError as e:
-        return False, f"Compression error: {e}"
-    except FFmpegNotFoundError as e:
-        return False, f"Error: {e}"
+        return FileResult(file_path, False, f"Error: {e}")
     except Exception as e:
-        return False, f"Unexpected error processing {file_path}: {e}"
+        return FileResult(file_path, False, f"Unexpected error processing {file_path}: {e}")
+
+
+def _estimate_memory(file_path: str) -> int:
+    """Estimate an image's decode memory for run_batch's memory budget."""
+    from mpress.image_compressor import estimate_decode_memory
+
+    return estimate_decode_memory(Path(file_path))
+
+
+def iter_inputs(
+    paths: List[str],
+    recursive: bool,
+    include: List[str],
+    exclude: List[str],
+    on_error: Callable[[FileValidationError], None],
+) -> Iterator[Tuple[str, Optional[str]]]:
+    """
+    Expand command-line arguments into (file_path, file_type) pairs.
+
+    With recursive set, directory arguments are walked lazily so files reach
+    the compressors as they are discovered. Explicit file arguments are always
+    passed through (unvalidated) regardless of include/exclude patterns.
+
+    Args:
+        paths: Command-line path arguments
+        recursive: Whether to descend into directory arguments
+        include: Glob patterns a walked file must match
+        exclude: Glob patterns for walked files and directories to skip
+        on_error: Callback for directories that cannot be read
+
+    Yields:
+        Tuples of (file_path, file_type), where file_type is None if the path
+        still needs validation
+    """
+    for path in paths:
+        if recursive and os.path.isdir(path):
+            yield from iter_media_files([path], include, exclude, on_error)
+        else:
+            yield path, None
+
+
+def open_journal(
+    arguments: Dict[str, Any], resume: bool
+) -> Tuple[Optional[BatchJournal], Dict[str, Optional[Tuple[int, int]]]]:
+    """
+    Open the journal of a batch and clean up after an interrupted earlier run.
+
+    Temporary files left by files the earlier run never finished are removed
+    either way; with resume, the files it finished are returned so they can
+    be skipped, otherwise its journal is reset.
+
+    Args:
+        arguments: Description of the batch (see run_key)
+        resume: Whether to continue the earlier run
+
+    Returns:
+        Tuple of (journal, or None if journaling is unavailable; mapping of
+        finished paths to their signatures, empty unless resuming)
+    """
+    directory = default_journal_dir()
+    prune_journals(directory)
+    try:
+        journal = BatchJournal(directory / f"{run_key(arguments)}.sqlite3")
+    except JournalError as e:
+        if resume:
+            print(f"Error: cannot resume: {e}", file=sys.stderr)
+            sys.exit(1)
+        print(f"Warning: {e}; this run will not be resumable", file=sys.stderr)
+        return None, {}
+
+    interrupted = journal.interrupted()
+    removed = sweep_temp_files(interrupted)
+    if removed:
+        print(
+            f"Removed {len(removed)} temporary files left by an interrupted run",
+            file=sys.stderr,
+        )
+    if resume:
+        return journal, journal.completed()
+    if interrupted or journal.completed():
+        print(
+            "Note: an interrupted run with the same arguments was found; "
+            "use --resume to skip the files it finished",
+            file=sys.stderr,
+        )
+    journal.reset(arguments)
+    return journal, {}
+
+
+def journaled_inputs(
+    inputs: Iterable[Tuple[str, Optional[str]]],
+    journal: Optional[BatchJournal],
+    completed: Dict[str, Optional[Tuple[int, int]]],
+    skipped: Counter,
+) -> Iterator[Tuple[str, Optional[str]]]:
+    """
+    Skip files a resumed run already finished and journal the rest.
+
+    Args:
+        inputs: (file_path, file_type) pairs from iter_inputs()
+        journal: Journal to record submissions in, or None
+        completed: Finished paths and signatures from open_journal()
+        skipped: Counter whose 'resumed' entry counts skipped files
+
+    Yields:
+        The (file_path, file_type) pairs that still need compressing
+    """
+    for file_path, file_type in inputs:
+        if file_path in completed and is_unchanged(file_path, completed[file_path]):
+            skipped["resumed"] += 1
+            continue
+        if journal is not None:
+            journal.submitted(file_path)
+        yield file_path, file_type
+
+
+def make_video_tracker(dashboard: ProgressDashboard) -> "Callable[[str], ProgressCallback]":
+    """
+    Build the track_progress hook for run_batch.
+
+    When the dashboard is shown, each video is probed as it is queued so its
+    duration and predicted saving feed the batch-wide ETA. Probe results are
+    cached, so the worker does not probe the file again.
+
+    Args:
+        dashboard: Dashboard to report to
+
+    Returns:
+        Function mapping a video's path to its progress callback
+    """
+    # ffprobe is looked up when the first video is queued, so runs without
+    # videos never load the FFmpeg helpers
+    probing: Optional[bool] = None
+
+    def track(file_path: str) -> "ProgressCallback":
+        nonlocal probing
+        from mpress.probe import (
+            ACTION_SKIP,
+            check_ffprobe_available,
+            estimate_output_size,
+            plan_video,
+            probe_video,
+        )
+        from mpress.video_compressor import VideoCompressionError
+
+        if probing is None:
+            probing = dashboard.enabled and check_ffprobe_available()
+        if probing:
+            try:
+                path = Path(file_path)
+                extension = path.suffix.lower()
+                probe = probe_video(path)
+                action, _ = plan_video(probe, extension)
+                duration = 0.0 if action == ACTION_SKIP else probe.duration or 0.0
+                saving = probe.size - estimate_output_size(probe, extension, action)
+                dashboard.expect(file_path, duration, saving)
+            except (OSError, VideoCompressionError):
+                # The worker reports the problem when it processes the file
+                pass
+        return dashboard.track(file_path)
+
+    return track
+
+
+def format_summary(
+    success_count: int,
+    error_count: int,
+    outcomes: Counter,
+    dashboard: ProgressDashboard,
+    dedup: Optional[DedupSummary] = None,
+) -> str:
+    """
+    Build the end-of-batch summary line.
+
+    Args:
+        success_count: Number of files processed successfully
+        error_count: Number of files that failed
+        outcomes: Count of FileResult outcomes
+        dashboard: Dashboard holding the byte totals
+        dedup: What --dedup saved, if it was used
+
+    Returns:
+        Summary line
+    """
+    from mpress.video_compressor import KEPT_ABORTED, KEPT_EFFICIENT, KEPT_NO_GAIN
+
+    summary = f"Done: {success_count} succeeded, {error_count} failed"
+    if dashboard.bytes_before:
+        ratio = dashboard.bytes_saved / dashboard.bytes_before
+        summary += f", saved {format_size(dashboard.bytes_saved)} ({ratio:.1%})"
+    kept = outcomes[KEPT_NO_GAIN] + outcomes[KEPT_ABORTED] + outcomes[KEPT_EFFICIENT]
+    if kept:
+        summary += (
+            f"; kept {kept} originals ({outcomes[KEPT_EFFICIENT]} already efficient, "
+            f"{outcomes[KEPT_NO_GAIN]} not smaller, {outcomes[KEPT_ABORTED]} stopped early)"
+        )
+    if outcomes["deferred"]:
+        summary += f"; deferred {outcomes['deferred']} files to stay within the time budget"
+    if dedup is not None and dedup.files:
+        summary += (
+            f"; {dedup.files} duplicates reused an output, saving "
+            f"{dedup.cpu_seconds:.1f} CPU-seconds and {format_size(dedup.bytes_saved)}"
+        )
+    return summary
+
+
+def check_target_formats(
+    parser: argparse.ArgumentParser, target_formats: List[str]
+) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Validate --target-format values against the installed encoders.
+
+    Exits through parser.error if a format is given twice for the same kind
+    of file or the local Pillow/FFmpeg build cannot write it.
+
+    Args:
+        parser: Parser used to report errors
+        target_formats: Values of --target-format
+
+    Returns:
+        Tuple of (image format, video format); None where not requested
+    """
+    image_formats = [name for name in target_formats if name in IMAGE_FORMATS]
+    video_formats = [name for name in target_formats if name in VIDEO_FORMATS]
+    if len(image_formats) > 1 or len(video_formats) > 1:
+        parser.error("--target-format takes at most one image and one video format")
+
+    image_format = image_formats[0] if image_formats else None
+    video_format = video_formats[0] if video_formats else None
+    if image_format is not None:
+        from mpress.image_compressor import available_image_formats
+
+        if image_format not in available_image_formats():
+            parser.error(f"--target-format {image_format}: this Pillow build cannot write it")
+    if video_format is not None:
+        from mpress.video_compressor import available_video_formats
+
+        if video_format not in available_video_formats():
+            parser.error(
+                f"--target-format {video_format}: FFmpeg is missing or has no "
+                f"{video_format} encoder"
+            )
+    return image_format, video_format
+
+
+def add_compression_arguments(parser: argparse.ArgumentParser) -> None:
+    """
+    Add the flags that choose how files are compressed.
+
+    Shared by the main command and 'mpress watch'; read them back with
+    compression_options().
+
+    Args:
+        parser: Parser to add the flags to
+    """
+    parser.add_argument(
+        "--profile",
+        choices=list(VIDEO_PROFILES),
+        default=DEFAULT_PROFILE,
+        help=f"Video encoding speed profile (default: {DEFAULT_PROFILE})",
+    )
+    parser.add_argument(
+        "--segments",
+        type=int,
+        default=1,
+        metavar="N",
+        help=(
+            "Split long MOV/MP4 videos into up to N segments encoded in parallel "
+            "(default: 1, no splitting)"
+        ),
+    )
+    parser.add_argument(
+        "--max-dimension",
+        type=int,
+        default=None,
+        metavar="PIXELS",
+        help="Downscale images and videos so the longer side is at most PIXELS",
+    )
+    parser.add_argument(
+        "--scale",
+        type=float,
+        default=None,
+        metavar="FACTOR",
+        help="Downscale images and videos by FACTOR (between 0 and 1, e.g. 0.5)",
+    )
+    parser.add_argument(
+        "--target-format",
+        action="append",
+        default=[],
+        choices=[*IMAGE_FORMATS, *VIDEO_FORMATS],
+        help=(
+            "Convert images to webp or avif, and/or videos to hevc or av1 "
+            "(repeatable: one image and one video format)"
+        ),
+    )
+    parser.add_argument(
+        "--keep-original",
+        action="store_true",
+        help="With --target-format, keep originals next to files written with a new extension",
+    )
+    parser.add_argument(
+        "--durable",
+        action="store_true",
+        help=(
+            "Flush each compressed file to disk before it replaces the original, and "
+            "flush its directory afterwards (safe against power loss, slightly slower)"
+        ),
+    )
+    parser.add_argument(
+        "--target-ssim",
+        type=float,
+        default=None,
+        metavar="SSIM",
+        help=(
+            "Encode each JPEG at the lowest quality whose SSIM reaches this value "
+            "(e.g. 0.95) instead of quality 85; requires NumPy"
+        ),
+    )
+    parser.add_argument(
+        "--video-min-ssim",
+        type=float,
+        default=None,
+        metavar="SSIM",
+        help=(
+            "Encode each video at the highest CRF whose SSIM on short samples stays at "
+            "or above this value (e.g. 0.97) instead of a fixed CRF; requires ffprobe"
+        ),
+    )
+    parser.add_argument(
+        "--lossless-min-gain",
+        type=float,
+        default=DEFAULT_JPEG_LOSSLESS_MIN_GAIN * 100,
+        metavar="PERCENT",
+        help=(
+            "Keep the lossless JPEG optimization (metadata stripped, Huffman tables "
+            "re-optimized) when it saves at least PERCENT, otherwise re-encode "
+            f"(default: {DEFAULT_JPEG_LOSSLESS_MIN_GAIN * 100:g}; 100 always re-encodes)"
+        ),
+    )
+    parser.add_argument(
+        "--jpeg-keep",
+        action="append",
+        default=[],
+        choices=JPEG_METADATA,
+        help="Metadata to keep in compressed JPEGs (repeatable; default: strip all)",
+    )
+    parser.add_argument(
+        "--progressive",
+        action="store_true",
+        help="Write progressive JPEGs",
+    )
+    parser.add_argument(
+        "--png-quantizer",
+        choices=PNG_QUANTIZERS,
+        default=DEFAULT_PNG_QUANTIZER,
+        help=(
+            "PNG palette quantizer; 'auto' keeps images with up to 256 colors "
+            f"lossless and prefers libimagequant (default: {DEFAULT_PNG_QUANTIZER})"
+        ),
+    )
+    parser.add_argument(
+        "--png-level",
+        type=int,
+        choices=range(10),
+        default=DEFAULT_PNG_COMPRESS_LEVEL,
+        metavar="0-9",
+        help=f"PNG zlib compression level (default: {DEFAULT_PNG_COMPRESS_LEVEL})",
+    )
+    parser.add_argument(
+        "--png-strategy",
+        choices=list(PNG_STRATEGIES),
+        default=DEFAULT_PNG_STRATEGY,
+        help=f"PNG zlib strategy (default: {DEFAULT_PNG_STRATEGY})",
+    )
+
+
+def compression_options(
+    parser: argparse.ArgumentParser, args: argparse.Namespace
+) -> CompressionOptions:
+    """
+    Validate the flags added by add_compression_arguments().
+
+    Args:
+        parser: Parser used for error messages (exits on invalid values)
+        args: Parsed arguments
+
+    Returns:
+        CompressionOptions for process_file()
+    """
+    if args.segments < 1:
+        parser.error("--segments must be at least 1")
+    if args.max_dimension is not None and args.max_dimension < 2:
+        parser.error("--max-dimension must be at least 2")
+    if args.scale is not None and not 0 < args.scale <= 1:
+        parser.error("--scale must be greater than 0 and at most 1")
+    if args.target_ssim is not None:
+        if not 0 < args.target_ssim < 1:
+            parser.error("--target-ssim must be between 0 and 1")
+        from mpress.image_compressor import has_ssim_support
+
+        if not has_ssim_support():
+            parser.error("--target-ssim requires NumPy (pip install numpy)")
+    if args.video_min_ssim is not None:
+        if not 0 < args.video_min_ssim < 1:
+            parser.error("--video-min-ssim must be between 0 and 1")
+        from mpress.probe import check_ffprobe_available
+
+        if not check_ffprobe_available():
+            parser.error("--video-min-ssim requires ffprobe (part of FFmpeg)")
+    if not 0 <= args.lossless_min_gain <= 100:
+        parser.error("--lossless-min-gain must be between 0 and 100")
+    image_format, video_format = check_target_formats(parser, args.target_format)
 
+    return CompressionOptions(
+        video_profile=args.profile,
+        video_segments=args.segments,
+        png_quantizer=args.png_quantizer,
+        png_compress_level=args.png_level,
+        png_strategy=args.png_strategy,
+        max_dimension=args.max_dimension,
+        scale=args.scale,
+        image_format=image_format,
+        video_format=video_format,
+        video_min_ssim=args.video_min_ssim,
+        target_ssim=args.target_ssim,
+        jpeg_keep=tuple(sorted(set(args.jpeg_keep))),
+        jpeg_progressive=args.progressive,
+        jpeg_lossless_min_gain=args.lossless_min_gain / 100,
+        keep_original=args.keep_original,
+        durable=args.durable,
+    )
+
+
+def bench_video_main(argv: List[str]) -> None:
+    """
+    Entry point for 'mpress bench-video'.
+
+    Args:
+        argv: Arguments after the subcommand name
+    """
+    import subprocess
+    import tempfile
+
+    from mpress.bench import VIDEO_CODECS, generate_sample_clip, run_video_benchmark
+    from mpress.video_compressor import VideoCompressionError
+
+    parser = argparse.ArgumentParser(
+        prog="mpress bench-video",
+        description="Encode a sample clip under each speed profile and report the results",
+    )
+    parser.add_argument(
+        "sample",
+        nargs="?",
+        help="Clip to encode (default: generate a 10 second synthetic 720p clip)",
+    )
+    parser.add_argument(
+        "--profile",
+        action="append",
+        choices=list(VIDEO_PROFILES),
+        help="Profile to test (repeatable; default: all profiles)",
+    )
+    parser.add_argument(
+        "--codec",
+        action="append",
+        choices=list(VIDEO_CODECS),
+        help="Codec to test (repeatable; default: all codecs)",
+    )
+    args = parser.parse_args(argv)
+
+    try:
+        with tempfile.TemporaryDirectory(prefix="mpress-bench-") as tmpdir:
+            if args.sample:
+                sample, _ = validate_file(args.sample)
+            else:
+                print("Generating sample clip...", file=sys.stderr)
+                sample = generate_sample_clip(Path(tmpdir) / "sample.mov")
+
+            results = run_video_benchmark(sample, args.profile, args.codec)
+
+    except (FileValidationError, VideoCompressionError, subprocess.CalledProcessError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    input_size = get_file_size(sample) if args.sample else None
+    print(f"{'profile':<10} {'codec':<6} {'fps':>8} {'wall time':>10} {'size':>10}")
+    for result in results:
+        line = (
+            f"{result.profile:<10} {result.codec:<6} {result.fps:>8.1f} "
+            f"{result.wall_time:>9.2f}s {format_size(result.output_size):>10}"
+        )
+        if input_size:
+            line += f"  ({result.output_size / input_size:.1%} of input)"
+        print(line)
+
+
+def bench_png_main(argv: List[str]) -> None:
+    """
+    Entry point for 'mpress bench-png'.
+
+    Args:
+        argv: Arguments after the subcommand name
+    """
+    import tempfile
+
+    from mpress.bench import generate_sample_screenshots, run_png_benchmark
+    from mpress.image_compressor import ImageCompressionError
+
+    parser = argparse.ArgumentParser(
+        prog="mpress bench-png",
+        description=(
+            "Encode a corpus of PNG screenshots with each quantizer and zlib "
+            "setting and report the time and size"
+        ),
+    )
+    parser.add_argument(
+        "images",
+        nargs="*",
+        help="PNG files to encode (default: generate synthetic screenshots)",
+    )
+    parser.add_argument(
+        "--quantizer",
+        action="append",
+        choices=PNG_QUANTIZERS,
+        help=(
+            "Quantizer to test (repeatable; default: auto, fastoctree and "
+            "libimagequant if available)"
+        ),
+    )
+    args = parser.parse_args(argv)
+
+    try:
+        with tempfile.TemporaryDirectory(prefix="mpress-bench-") as tmpdir:
+            if args.images:
+                images = [validate_file(image)[0] for image in args.images]
+            else:
+                print("Generating sample screenshots...", file=sys.stderr)
+                images = generate_sample_screenshots(Path(tmpdir))
+
+            results = run_png_benchmark(images, args.quantizer)
+
+    except (FileValidationError, ImageCompressionError, OSError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    print(f"{'quantizer':<14} {'level':>5} {'strategy':<9} {'wall time':>10} {'size':>10}")
+    for result in results:
+        print(
+            f"{result.quantizer:<14} {result.compress_level:>5} {result.strategy:<9} "
+            f"{result.wall_time:>9.2f}s {format_size(result.output_size):>10}"
+            f"  ({result.output_size / result.input_size:.1%} of input)"
+        )
+
+
+def bench_main(argv: List[str]) -> None:
+    """
+    Entry point for 'mpress bench'.
+
+    Args:
+        argv: Arguments after the subcommand name
+    """
+    import subprocess
+    import tempfile
+
+    from mpress.bench_suite import (
+        CODEC_PATHS,
+        VIDEO_PATHS,
+        build_report,
+        compare_reports,
+        generate_corpus,
+        load_corpus,
+        load_report,
+        run_suite,
+    )
+    from mpress.video_compressor import VideoCompressionError, check_ffmpeg_available
+
+    parser = argparse.ArgumentParser(
+        prog="mpress bench",
+        description=(
+            "Measure throughput (MB/s, files/s), peak memory and compression ratio "
+            "of each codec path on a deterministic synthetic corpus"
+        ),
+    )
+    parser.add_argument(
+        "--corpus",
+        metavar="DIR",
+        help="Corpus directory; generated there if empty (default: a temporary directory)",
+    )
+    parser.add_argument(
+        "--codec",
+        action="append",
+        choices=list(CODEC_PATHS),
+        help="Codec path to run (repeatable; default: all)",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=1,
+        metavar="N",
+        help="Run each codec path N times and report the fastest (default: 1)",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        metavar="FILE",
+        help="Write the results as JSON to FILE ('-' for standard output)",
+    )
+    parser.add_argument(
+        "--baseline",
+        metavar="FILE",
+        help="JSON results of an earlier run to compare against",
+    )
+    args = parser.parse_args(argv)
+    if args.repeat < 1:
+        parser.error("--repeat must be at least 1")
+
+    codecs = args.codec or list(CODEC_PATHS)
+    video = check_ffmpeg_available()
+    if not video and any(codec in VIDEO_PATHS for codec in codecs):
+        print("FFmpeg not found; skipping video codec paths", file=sys.stderr)
+        codecs = [codec for codec in codecs if codec not in VIDEO_PATHS]
+
+    try:
+        baseline = load_report(Path(args.baseline)) if args.baseline else None
+        with tempfile.TemporaryDirectory(prefix="mpress-bench-") as tmpdir:
+            corpus_dir = Path(args.corpus) if args.corpus else Path(tmpdir) / "corpus"
+            corpus = load_corpus(corpus_dir)
+            if not any(corpus.values()):
+                print(f"Generating corpus in {corpus_dir}...", file=sys.stderr)
+                corpus = generate_corpus(corpus_dir, video=video)
+
+            output_dir = Path(tmpdir) / "output"
+            output_dir.mkdir()
+            results = run_suite(corpus, output_dir, codecs, args.repeat)
+
+    except (OSError, ValueError, VideoCompressionError, subprocess.CalledProcessError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    report = build_report(results)
+    changes = compare_reports(baseline, report) if baseline else {}
+
+    # Keep standard output clean when it carries the JSON
+    table = sys.stderr if args.output == "-" else sys.stdout
+    print(
+        f"{'codec':<15} {'files':>5} {'MB/s':>8} {'files/s':>8} {'peak RSS':>10} {'ratio':>7}",
+        file=table,
+    )
+    for result in results:
+        rss = format_size(result.peak_rss) if result.peak_rss is not None else "n/a"
+        line = (
+            f"{result.codec:<15} {result.files:>5} {result.mb_per_s:>8.2f} "
+            f"{result.files_per_s:>8.2f} {rss:>10} {result.ratio:>7.1%}"
+        )
+        change = changes.get(result.codec)
+        if change:
+            line += "  vs baseline: " + ", ".join(
+                f"{metric} {value:+.1%}" for metric, value in change.items() if value is not None
+            )
+        print(line, file=table)
+
+    if args.output == "-":
+        print(json.dumps(report, indent=2))
+    elif args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+
+
+def watch_main(argv: List[str]) -> None:
+    """
+    Entry point for 'mpress watch': compress files as they arrive.
+
+    Args:
+        argv: Arguments after the subcommand name
+    """
+    from mpress.watcher import (
+        DEFAULT_POLL_INTERVAL,
+        DEFAULT_QUEUE_SIZE,
+        DEFAULT_SETTLE_SECONDS,
+        PollingWatcher,
+        WatchError,
+        watch,
+    )
+
+    parser = argparse.ArgumentParser(
+        prog="mpress watch",
+        description=(
+            "Watch directories (recursively) and compress media files once they "
+            "stop changing. Runs until interrupted."
+        ),
+    )
+    parser.add_argument("directories", nargs="+", metavar="DIR", help="Directories to watch")
+    parser.add_argument(
+        "--include",
+        action="append",
+        default=[],
+        metavar="GLOB",
+        help="Only compress files matching this pattern (repeatable)",
+    )
+    parser.add_argument(
+        "--exclude",
+        action="append",
+        default=[],
+        metavar="GLOB",
+        help="Skip files and directories matching this pattern (repeatable)",
+    )
+    parser.add_argument(
+        "--settle",
+        type=float,
+        default=DEFAULT_SETTLE_SECONDS,
+        metavar="SECONDS",
+        help=(
+            "Wait until a file's size and modification time have not changed for "
+            f"SECONDS before compressing it (default: {DEFAULT_SETTLE_SECONDS:g})"
+        ),
+    )
+    parser.add_argument(
+        "--poll",
+        action="store_true",
+        help="Scan for changes instead of using inotify (e.g. on network filesystems)",
+    )
+    parser.add_argument(
+        "--poll-interval",
+        type=float,
+        default=DEFAULT_POLL_INTERVAL,
+        metavar="SECONDS",
+        help=f"Seconds between scans when polling (default: {DEFAULT_POLL_INTERVAL:g})",
+    )
+    parser.add_argument(
+        "--queue-size",
+        type=int,
+        default=DEFAULT_QUEUE_SIZE,
+        metavar="N",
+        help=(
+            "Maximum number of stable files waiting for a worker before the "
+            f"watcher pauses (default: {DEFAULT_QUEUE_SIZE})"
+        ),
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=None,
+        metavar="N",
+        help="Number of image worker processes (default: number of CPUs)",
+    )
+    parser.add_argument(
+        "--video-jobs",
+        type=int,
+        default=DEFAULT_VIDEO_JOBS,
+        metavar="N",
+        help=f"Number of concurrent video compressions (default: {DEFAULT_VIDEO_JOBS})",
+    )
+    add_compression_arguments(parser)
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Recompress files even if mpress has already compressed them",
+    )
+    args = parser.parse_args(argv)
+
+    if args.jobs is not None and args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    if args.video_jobs < 1:
+        parser.error("--video-jobs must be at least 1")
+    if args.settle < 0:
+        parser.error("--settle must not be negative")
+    if args.poll_interval <= 0:
+        parser.error("--poll-interval must be greater than 0")
+    if args.queue_size < 1:
+        parser.error("--queue-size must be at least 1")
+    options = compression_options(parser, args)
+    for directory in args.directories:
+        if not os.path.isdir(directory):
+            parser.error(f"not a directory: {directory}")
+
+    cache = None if args.no_cache else open_default_cache()
+    stop = threading.Event()
+    # Let service managers stop the watcher cleanly; in-flight files finish
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+
+    def started(watcher) -> None:
+        method = "polling" if isinstance(watcher, PollingWatcher) else "inotify"
+        print(f"Watching {', '.join(args.directories)} ({method})", file=sys.stderr, flush=True)
+
+    # Files arrive one at a time, so each directory is flushed straight away
+    directory_sync = DirectorySync(max_pending=1) if options.durable else None
+
+    def report(result: FileResult) -> None:
+        if directory_sync is not None and result.outcome == "compressed":
+            directory_sync.add(result.file_path)
+        print(result.message, file=sys.stdout if result.success else sys.stderr, flush=True)
+
+    try:
+        watch(
+            args.directories,
+            functools.partial(process_file, options=options, cache=cache),
+            report,
+            jobs=args.jobs,
+            video_jobs=args.video_jobs,
+            include=args.include,
+            exclude=args.exclude,
+            settle_seconds=args.settle,
+            queue_size=args.queue_size,
+            poll=args.poll,
+            poll_interval=args.poll_interval,
+            stop=stop,
+            on_start=started,
+        )
+    except WatchError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+def serve_main(argv: List[str]) -> None:
+    """
+    Entry point for 'mpress serve': run the local compression service.
+
+    Args:
+        argv: Arguments after the subcommand name
+    """
+    from mpress.server import (
+        DEFAULT_HOST,
+        DEFAULT_MAX_PENDING,
+        DEFAULT_PORT,
+        CompressionService,
+        make_server,
+    )
+
+    parser = argparse.ArgumentParser(
+        prog="mpress serve",
+        description=(
+            "Serve compression over HTTP on localhost or a Unix socket. "
+            "POST a file to /compress/<ext> (png, jpg, jpeg, mov, mp4, webm) to get the "
+            "compressed file back; GET /metrics for Prometheus metrics."
+        ),
+    )
+    parser.add_argument(
+        "--host",
+        default=DEFAULT_HOST,
+        help=f"Address to listen on (default: {DEFAULT_HOST})",
+    )
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=DEFAULT_PORT,
+        help=f"TCP port to listen on (default: {DEFAULT_PORT})",
+    )
+    parser.add_argument(
+        "--socket",
+        default=None,
+        metavar="PATH",
+        help="Listen on a Unix domain socket instead of TCP",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=None,
+        metavar="N",
+        help="Number of image worker processes (default: number of CPUs)",
+    )
+    parser.add_argument(
+        "--video-jobs",
+        type=int,
+        default=DEFAULT_VIDEO_JOBS,
+        metavar="N",
+        help=f"Number of concurrent video compressions (default: {DEFAULT_VIDEO_JOBS})",
+    )
+    parser.add_argument(
+        "--max-pending",
+        type=int,
+        default=DEFAULT_MAX_PENDING,
+        metavar="N",
+        help=(
+            "Requests handled at once, including ones waiting for a worker; "
+            f"more are refused with 503 (default: {DEFAULT_MAX_PENDING})"
+        ),
+    )
+    parser.add_argument(
+        "--max-body-size",
+        default="4G",
+        metavar="SIZE",
+        help="Largest accepted upload, e.g. 500M (default: 4G)",
+    )
+    parser.add_argument(
+        "--spool-dir",
+        default=None,
+        metavar="DIR",
+        help="Directory for uploads being compressed (default: system temp directory)",
+    )
+    add_compression_arguments(parser)
+    parser.add_argument("--verbose", action="store_true", help="Log every request")
+    args = parser.parse_args(argv)
+
+    if args.jobs is not None and args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    if args.video_jobs < 1:
+        parser.error("--video-jobs must be at least 1")
+    if args.max_pending < 1:
+        parser.error("--max-pending must be at least 1")
+    if args.keep_original:
+        parser.error("--keep-original does not apply to serve")
+    try:
+        max_body_size = parse_size(args.max_body_size)
+    except ValueError as e:
+        parser.error(f"--max-body-size: {e}")
+    options = compression_options(parser, args)
+
+    service = CompressionService(
+        options,
+        jobs=args.jobs,
+        video_jobs=args.video_jobs,
+        max_pending=args.max_pending,
+        max_body_size=max_body_size,
+        spool_dir=args.spool_dir,
+    )
+    try:
+        # Start the image workers before any request threads exist
+        service.warm()
+        server = make_server(service, args.host, args.port, args.socket, args.verbose)
+    except OSError as e:
+        service.close()
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    # shutdown() waits for serve_forever to return, so call it from another thread
+    signal.signal(
+        signal.SIGTERM,
+        lambda signum, frame: threading.Thread(target=server.shutdown).start(),
+    )
+    where = args.socket or f"http://{args.host}:{server.server_address[1]}"
+    print(f"Serving on {where}", file=sys.stderr, flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+
+
+def bench_serve_main(argv: List[str]) -> None:
+    """
+    Entry point for 'mpress bench-serve': load-test the compression service.
+
+    Args:
+        argv: Arguments after the subcommand name
+    """
+    import tempfile
+
+    from mpress.bench import generate_sample_screenshots
+    from mpress.loadtest import fetch_metrics, run_load_test
+    from mpress.server import DEFAULT_PORT, CompressionService, make_server
+
+    parser = argparse.ArgumentParser(
+        prog="mpress bench-serve",
+        description=(
+            "Send concurrent compression requests to 'mpress serve' on localhost and "
+            "report throughput and latency"
+        ),
+    )
+    parser.add_argument(
+        "files",
+        nargs="*",
+        help="Media files to upload (default: generate synthetic screenshots)",
+    )
+    parser.add_argument(
+        "-n",
+        "--requests",
+        type=int,
+        default=200,
+        metavar="N",
+        help="Total number of requests (default: 200)",
+    )
+    parser.add_argument(
+        "-c",
+        "--concurrency",
+        type=int,
+        default=8,
+        metavar="N",
+        help="Number of concurrent clients (default: 8)",
+    )
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="Service TCP port")
+    parser.add_argument("--socket", default=None, metavar="PATH", help="Service Unix socket")
+    parser.add_argument(
+        "--start",
+        action="store_true",
+        help="Start a temporary service in this process instead of using a running one",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=None,
+        metavar="N",
+        help="With --start, number of image worker processes (default: number of CPUs)",
+    )
+    args = parser.parse_args(argv)
+    if args.requests < 1 or args.concurrency < 1:
+        parser.error("--requests and --concurrency must be at least 1")
+
+    with tempfile.TemporaryDirectory(prefix="mpress-bench-") as tmpdir:
+        try:
+            if args.files:
+                files = [validate_file(path)[0] for path in args.files]
+            else:
+                print("Generating sample screenshots...", file=sys.stderr)
+                files = generate_sample_screenshots(Path(tmpdir))
+        except (FileValidationError, OSError) as e:
+            print(f"Error: {e}", file=sys.stderr)
+            sys.exit(1)
+
+        server = service = None
+        port = args.port
+        if args.start:
+            service = CompressionService(jobs=args.jobs, spool_dir=tmpdir)
+            service.warm()
+            server = make_server(service, port=0)
+            port = server.server_address[1]
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        try:
+            result = run_load_test(
+                files, args.requests, args.concurrency, port=port, socket_path=args.socket
+            )
+            metrics = fetch_metrics(port=port, socket_path=args.socket)
+        except OSError as e:
+            print(f"Error: cannot reach the service: {e}", file=sys.stderr)
+            sys.exit(1)
+        finally:
+            if server is not None:
+                server.shutdown()
+                server.server_close()
+                service.close()
+
+    print(
+        f"{len(result.latencies)}/{result.requests} requests succeeded in "
+        f"{format_duration(result.wall_time)} ({result.errors} errors, "
+        f"{result.rejected} rejected)"
+    )
+    print(f"Throughput: {result.requests_per_s:.1f} req/s, {result.mb_per_s:.1f} MB/s uploaded")
+    print(
+        "Latency: "
+        + ", ".join(
+            f"p{round(fraction * 100)} {result.percentile(fraction) * 1000:.0f} ms"
+            for fraction in (0.5, 0.9, 0.99)
+        )
+    )
+    for line in metrics.splitlines():
+        if line.startswith("mpress_queue_depth_max"):
+            print(f"Server {line}")
+
+
+# Subcommands are dispatched on the first argument so that plain
+# 'mpress file1 file2' keeps working. Use './name' to compress a file that
+# happens to share a subcommand's name.
+SUBCOMMANDS = {
+    "bench": bench_main,
+    "bench-png": bench_png_main,
+    "bench-serve": bench_serve_main,
+    "bench-video": bench_video_main,
+    "serve": serve_main,
+    "watch": watch_main,
+}
+
+
+def main(argv: Optional[List[str]] = None):
+    """
+    Main entry point for the mpress command.
+
+    Args:
+        argv: Command-line arguments (defaults to sys.argv[1:])
+    """
+    if argv is None:
+        argv = sys.argv[1:]
+    if argv and argv[0] in SUBCOMMANDS:
+        SUBCOMMANDS[argv[0]](argv[1:])
+        return
 
-def main():
-    """Main entry point for the mpress command."""
     parser = argparse.ArgumentParser(
         prog="mpress",
         description="Compress media files (PNG, JPG, JPEG, MOV, MP4, WebM)",
-        epilog="Example: mpress image.png video.mp4",
+        epilog=(
+            "Example: mpress image.png video.mp4\n"
+            f"Subcommands: {', '.join(SUBCOMMANDS)} (run 'mpress <subcommand> --help')"
+        ),
+        formatter_class=argparse.RawDescriptionHelpFormatter,
     )
     parser.add_argument(
         "files",
         nargs="*",
-        help="Media files to compress",
+        help="Media files to compress (or directories, with --recursive)",
+    )
+    parser.add_argument(
+        "-r",
+        "--recursive",
+        action="store_true",
+        help=(
+            "Compress all supported media files under directory arguments. Symlinked "
+            "directories are not followed; symlinked files have their target compressed"
+        ),
+    )
+    parser.add_argument(
+        "--include",
+        action="append",
+        default=[],
+        metavar="GLOB",
+        help="With -r, only compress files matching this pattern (repeatable)",
+    )
+    parser.add_argument(
+        "--exclude",
+        action="append",
+        default=[],
+        metavar="GLOB",
+        help="With -r, skip files and directories matching this pattern (repeatable)",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=None,
+        metavar="N",
+        help="Number of image worker processes (default: number of CPUs)",
+    )
+    parser.add_argument(
+        "--video-jobs",
+        type=int,
+        default=DEFAULT_VIDEO_JOBS,
+        metavar="N",
+        help=f"Number of concurrent video compressions (default: {DEFAULT_VIDEO_JOBS})",
+    )
+    add_compression_arguments(parser)
+    parser.add_argument(
+        "--memory-budget",
+        default=None,
+        metavar="SIZE",
+        help=(
+            "Limit the memory used by concurrent image workers, e.g. 4G; large "
+            "images then run with fewer workers (default: no limit)"
+        ),
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Recompress files even if mpress has already compressed them",
+    )
+    parser.add_argument(
+        "--no-progress",
+        action="store_true",
+        help="Do not show the live progress display on the terminal",
+    )
+    parser.add_argument(
+        "--dedup",
+        action="store_true",
+        help=(
+            "Compress identical files once and copy the output to the others; "
+            "compression starts once all inputs are found"
+        ),
+    )
+    parser.add_argument(
+        "--hardlink-duplicates",
+        action="store_true",
+        help=(
+            "With --dedup, hard link identical files to one output instead of "
+            "copying it (they then share ownership and permissions)"
+        ),
+    )
+    parser.add_argument(
+        "--prioritize",
+        action="store_true",
+        help=(
+            "Compress the files expected to save the most bytes per CPU-second "
+            "first, estimated by compressing a small sample of each"
+        ),
+    )
+    parser.add_argument(
+        "--time-budget",
+        default=None,
+        metavar="DURATION",
+        help=(
+            "With --prioritize (implied), do not start files that would not finish "
+            "within this wall-clock time of starting mpress, e.g. 30m or 2h"
+        ),
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help=(
+            "Continue an interrupted run with the same arguments, skipping the files "
+            "it finished"
+        ),
     )
 
-    args = parser.parse_args()
+    parser.add_argument(
+        "--report",
+        default=None,
+        metavar="PATH",
+        help=(
+            "Write a JSON report with per-file and per-stage timings (p50/p95) and "
+            "total savings"
+        ),
+    )
+    parser.add_argument(
+        "--metrics-file",
+        default=None,
+        metavar="PATH",
+        help=(
+            "Write the report's summary as Prometheus metrics, for the node_exporter "
+            "textfile collector"
+        ),
+    )
+
+    args = parser.parse_args(argv)
+    # The time budget counts from here, so it covers estimating the files
+    started = time.monotonic()
+
+    if args.jobs is not None and args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    if args.video_jobs < 1:
+        parser.error("--video-jobs must be at least 1")
+    if args.hardlink_duplicates and not args.dedup:
+        parser.error("--hardlink-duplicates requires --dedup")
+    options = compression_options(parser, args)
+    deadline = None
+    if args.time_budget is not None:
+        try:
+            deadline = started + parse_duration(args.time_budget)
+        except ValueError as e:
+            parser.error(f"--time-budget: {e}")
+    memory_budget = None
+    if args.memory_budget is not None:
+        try:
+            memory_budget = parse_size(args.memory_budget)
+        except ValueError as e:
+            parser.error(f"--memory-budget: {e}")
 
     # Handle no arguments case
     if not args.files:
@@ -71,20 +1472,138 @@ def main():
         print("Usage: mpress <file1> [file2] [file3] ...")
         sys.exit(1)
 
-    # Process files sequentially
+    # Process files in parallel; results come back in argument order
     success_count = 0
     error_count = 0
     errors = []
+    outcomes: Counter = Counter()
 
-    for file_path in args.files:
-        success, message = process_file(file_path)
-        if success:
-            success_count += 1
-            print(message)
-        else:
+    cache = None if args.no_cache else open_default_cache()
+    dashboard = ProgressDashboard(
+        enabled=False if args.no_progress else None,
+        video_jobs=args.video_jobs,
+    )
+
+    def report_walk_error(error: FileValidationError) -> None:
+        nonlocal error_count
+        error_count += 1
+        message = f"Error: {error}"
+        errors.append(message)
+        dashboard.print(message, file=sys.stderr)
+
+    # Batches are journaled, so that a killed run can be resumed. A single
+    # file has nothing to resume (hooks run mpress on one file at a time),
+    # and its temporary output is overwritten by the next attempt; only
+    # segment working directories have unique names that need sweeping.
+    journal, completed = None, {}
+    if args.resume or args.recursive or len(args.files) > 1 or options.video_segments > 1:
+        journal, completed = open_journal(
+            {
+                "files": [os.path.abspath(path) for path in args.files],
+                "recursive": args.recursive,
+                "include": args.include,
+                "exclude": args.exclude,
+                "options": options._asdict(),
+            },
+            args.resume,
+        )
+    # Stage timings are only recorded when they will be reported
+    report = None
+    timed = args.report is not None or args.metrics_file is not None
+    if timed:
+        report = BatchReport()
+
+    # Renames are made durable with one fsync per directory, not per file
+    directory_sync = DirectorySync() if options.durable else None
+
+    skipped: Counter = Counter()
+    inputs = journaled_inputs(
+        iter_inputs(args.files, args.recursive, args.include, args.exclude, report_walk_error),
+        journal,
+        completed,
+        skipped,
+    )
+    dedup = None
+    if args.dedup:
+        # Identical files are grouped before any is compressed
+        inputs, duplicates = group_duplicates(inputs)
+        dedup = DedupSummary()
+    estimates = None
+    if args.prioritize or deadline is not None:
+        from mpress.schedule import estimate_batch, prioritize
+
+        inputs = list(inputs)
+        dashboard.print(f"Estimating {len(inputs)} files...")
+        estimates = dict(
+            zip(
+                (file_path for file_path, _ in inputs),
+                estimate_batch(inputs, options, cache, args.jobs, args.video_jobs),
+            )
+        )
+        weights = None
+        if args.dedup:
+            weights = {path: 1 + len(copies) for path, copies in duplicates.items()}
+        inputs = prioritize(inputs, [estimates[path] for path, _ in inputs], weights)
+    results = run_batch(
+        inputs,
+        functools.partial(process_file, options=options, cache=cache, timed=timed),
+        jobs=args.jobs,
+        video_jobs=args.video_jobs,
+        track_progress=make_video_tracker(dashboard),
+        memory_budget=memory_budget,
+        estimate_memory=_estimate_memory,
+        deadline=deadline,
+        estimate_seconds=None if estimates is None else (lambda path: estimates[path].wall_seconds),
+    )
+    if args.dedup:
+        results = share_results(results, duplicates, options, cache, args.hardlink_duplicates)
+    finished = False
+    try:
+        for result in results:
+            # Deferred files stay unfinished, so --resume compresses them
+            if journal is not None and result.outcome != "deferred":
+                journal.finished(result)
+            dashboard.finish(result.file_path, result.bytes_before, result.bytes_after)
+            if report is not None:
+                report.add(result)
+            if directory_sync is not None and result.outcome == "compressed":
+                directory_sync.add(result.file_path)
+            if dedup is not None:
+                dedup.add(result)
+            outcomes[result.outcome] += 1
+            if result.success:
+                success_count += 1
+                dashboard.print(result.message)
+            else:
+                error_count += 1
+                errors.append(result.message)
+                dashboard.print(result.message, file=sys.stderr)
+        finished = True
+    finally:
+        dashboard.close()
+        if directory_sync is not None:
+            directory_sync.flush()
+        if journal is not None:
+            # A completed run leaves nothing to resume, unless it deferred files
+            journal.close(delete=finished and not outcomes["deferred"])
+
+    if report is not None:
+        report.finish()
+        try:
+            if args.report is not None:
+                report.write_json(args.report)
+            if args.metrics_file is not None:
+                report.write_prometheus(args.metrics_file)
+        except OSError as e:
+            print(f"Error: cannot write report: {e}", file=sys.stderr)
             error_count += 1
-            errors.append(message)
-            print(message, file=sys.stderr)
+
+    if skipped["resumed"]:
+        print(f"Resumed: skipped {skipped['resumed']} files finished by the interrupted run")
+    if success_count + error_count > 1:
+        print(format_summary(success_count, error_count, outcomes, dashboard, dedup))
+    if outcomes["deferred"] and journal is not None:
+        print(f"Run again with --resume to compress the {outcomes['deferred']} deferred files")
 
     # Exit with appropriate code
     if error_count > 0:
@@ -94,5 +1613,9 @@ def main():
 
 
 if __name__ == "__main__":
+    import multiprocessing
+
+    # Needed for the process pool in frozen (PyInstaller) builds
+    multiprocessing.freeze_support()
     main()
 
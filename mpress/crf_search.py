@@ -0,0 +1,229 @@
+"""Choose a video's CRF by encoding and scoring short samples."""
+
+import re
+import subprocess
+import tempfile
+from pathlib import Path
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from mpress.options import DEFAULT_PROFILE
+from mpress.video_compressor import (
+    DEFAULT_CRF,
+    FFmpegNotFoundError,
+    VideoCompressionError,
+    get_codec_args,
+    get_ffmpeg_path,
+    get_scale_args,
+    run_ffmpeg,
+)
+
+# CRFs a search picks from, per codec (lower is better quality)
+CRF_SEARCH_RANGES = {"h264": (18, 36), "vp9": (20, 44)}
+
+# Samples are spread evenly over the video, each this many seconds long
+SAMPLE_COUNT = 3
+SAMPLE_SECONDS = 1.5
+
+# Most candidate CRFs encoded per video; 4 steps narrow either range down
+# to a few CRFs
+CRF_SEARCH_MAX_STEPS = 4
+
+# Share of the full encode's cost a search may add
+CRF_SEARCH_BUDGET = 0.10
+
+# Costs of a search, in multiples of encoding the samples once at the full
+# encode's settings. Extracting the reference is cheap; each candidate is one
+# encode (slower per second than a long encode, as FFmpeg and the encoder start
+# over) plus scoring, which decodes both clips.
+_REFERENCE_COST = 0.5
+_CANDIDATE_COST = 2.5
+
+_SSIM_RE = re.compile(r"SSIM Y:([\d.]+)")
+_PSNR_RE = re.compile(r"PSNR y:([\d.]+|inf)")
+
+# The codec, and the container get_codec_args knows it by
+_CONTAINERS = {"h264": "mp4", "vp9": "webm"}
+
+
+class CrfChoice(NamedTuple):
+    """Outcome of a CRF search."""
+
+    crf: int
+    # Luma SSIM and PSNR of the samples at the chosen CRF, or None if the
+    # search ran out of steps before scoring it
+    ssim: Optional[float]
+    psnr: Optional[float]
+    steps: int
+
+
+def plan_search_steps(duration: Optional[float], budget: float = CRF_SEARCH_BUDGET) -> int:
+    """
+    Get how many candidate CRFs a video's budget allows.
+
+    Args:
+        duration: Video duration in seconds, if known
+        budget: Share of the full encode's cost the search may add
+
+    Returns:
+        Number of candidates (at most CRF_SEARCH_MAX_STEPS), or 0 if the
+        video is too short to search at least 2
+    """
+    if not duration:
+        return 0
+    sampled = SAMPLE_COUNT * SAMPLE_SECONDS
+    steps = int((budget * duration / sampled - _REFERENCE_COST) / _CANDIDATE_COST)
+    return min(steps, CRF_SEARCH_MAX_STEPS) if steps >= 2 else 0
+
+
+def sample_starts(duration: float) -> Tuple[float, ...]:
+    """
+    Get where the samples start.
+
+    Args:
+        duration: Video duration in seconds
+
+    Returns:
+        SAMPLE_COUNT start times, centred in equal parts of the video
+    """
+    return tuple(
+        max(0.0, duration * (index + 0.5) / SAMPLE_COUNT - SAMPLE_SECONDS / 2)
+        for index in range(SAMPLE_COUNT)
+    )
+
+
+def _extract_reference(
+    ffmpeg_path: str,
+    input_path: Path,
+    duration: float,
+    reference: Path,
+    max_dimension: Optional[int],
+    scale: Optional[float],
+) -> None:
+    """Join the samples into one losslessly coded (FFV1) clip, downscaled like the output."""
+    cmd = [ffmpeg_path]
+    for start in sample_starts(duration):
+        cmd += ["-ss", f"{start:.3f}", "-t", f"{SAMPLE_SECONDS:g}", "-i", str(input_path)]
+    graph = "".join(f"[{index}:v:0]" for index in range(SAMPLE_COUNT))
+    graph += f"concat=n={SAMPLE_COUNT}:v=1:a=0"
+    scale_args = get_scale_args(max_dimension, scale)
+    if scale_args:
+        graph += "," + scale_args[1]
+    cmd += ["-filter_complex", graph, "-an", "-c:v", "ffv1", "-y", str(reference)]
+    run_ffmpeg(cmd, input_path)
+
+
+def _score(
+    ffmpeg_path: str, candidate: Path, reference: Path, input_path: Path
+) -> Tuple[float, float]:
+    """Compare an encoded candidate with the reference using FFmpeg's ssim and psnr filters."""
+    # ssim passes its first input through, so psnr can follow it
+    cmd = [
+        ffmpeg_path,
+        "-hide_banner",
+        "-nostats",
+        "-i",
+        str(candidate),
+        "-i",
+        str(reference),
+        "-lavfi",
+        "[1:v]split[ref1][ref2];[0:v][ref1]ssim[scored];[scored][ref2]psnr",
+        "-f",
+        "null",
+        "-",
+    ]
+    result = subprocess.run(
+        cmd, stdin=subprocess.DEVNULL, capture_output=True, text=True, errors="replace"
+    )
+    ssim = _SSIM_RE.search(result.stderr)
+    psnr = _PSNR_RE.search(result.stderr)
+    if result.returncode != 0 or ssim is None or psnr is None:
+        tail = "\n".join(result.stderr.splitlines()[-5:])
+        raise VideoCompressionError(f"Failed to score samples of {input_path}: {tail}")
+    return float(ssim.group(1)), float(psnr.group(1))
+
+
+def choose_crf(
+    input_path: Path,
+    codec: str,
+    duration: Optional[float],
+    min_ssim: float,
+    profile: str = DEFAULT_PROFILE,
+    max_dimension: Optional[int] = None,
+    scale: Optional[float] = None,
+    budget: float = CRF_SEARCH_BUDGET,
+) -> Optional[CrfChoice]:
+    """
+    Find the highest CRF whose samples keep a minimum SSIM.
+
+    SAMPLE_COUNT short samples are joined into a lossless reference clip,
+    which is encoded at candidate CRFs with the same settings as the full
+    encode and scored against itself. The binary search starts at the
+    codec's DEFAULT_CRF. When the steps run out, the highest CRF that met
+    the floor is used (or the lowest of the range if none did).
+
+    Args:
+        input_path: Video to sample
+        codec: 'h264' or 'vp9'
+        duration: Video duration in seconds (from ffprobe)
+        min_ssim: Luma SSIM the samples must keep, e.g. 0.98
+        profile: Speed profile of the full encode (see VIDEO_PROFILES)
+        max_dimension: Downscaling of the full encode, applied to the samples
+        scale: Downscaling of the full encode, applied to the samples
+        budget: Share of the full encode's cost the search may add
+
+    Returns:
+        The chosen CRF, or None if the video is too short to search within
+        the budget (use DEFAULT_CRF)
+
+    Raises:
+        VideoCompressionError: If sampling, encoding or scoring fails
+        FFmpegNotFoundError: If FFmpeg is not installed
+    """
+    max_steps = plan_search_steps(duration, budget)
+    if max_steps == 0:
+        return None
+    ffmpeg_path = get_ffmpeg_path()
+    container = _CONTAINERS[codec]
+
+    try:
+        with tempfile.TemporaryDirectory(
+            dir=input_path.parent, prefix=f".{input_path.name}.", suffix=".tmp"
+        ) as tmpdir:
+            reference = Path(tmpdir) / "reference.mkv"
+            _extract_reference(ffmpeg_path, input_path, duration, reference, max_dimension, scale)
+
+            scores: Dict[int, Tuple[float, float]] = {}
+            # The answer lies in low..high; low is taken to pass until scored
+            low, high = CRF_SEARCH_RANGES[codec]
+            crf = DEFAULT_CRF[codec]
+            steps = 0
+            while low < high and steps < max_steps:
+                steps += 1
+                candidate = Path(tmpdir) / f"crf{crf}.mkv"
+                cmd = [
+                    ffmpeg_path,
+                    "-i",
+                    str(reference),
+                    *get_codec_args(container, profile, crf=crf),
+                    "-an",
+                    "-y",
+                    str(candidate),
+                ]
+                run_ffmpeg(cmd, input_path)
+                scores[crf] = _score(ffmpeg_path, candidate, reference, input_path)
+                candidate.unlink()
+                if scores[crf][0] >= min_ssim:
+                    low = crf
+                else:
+                    high = crf - 1
+                crf = (low + high + 1) // 2
+
+    except FileNotFoundError:
+        raise FFmpegNotFoundError(
+            "FFmpeg executable not found. Please install FFmpeg: brew install ffmpeg"
+        )
+    except (OSError, subprocess.SubprocessError) as e:
+        raise VideoCompressionError(f"Failed to sample {input_path}: {e}") from e
+
+    ssim, psnr = scores.get(low, (None, None))
+    return CrfChoice(low, ssim, psnr, steps)
@@ -0,0 +1,249 @@
+"""Compress identical files of a batch once, and copy the result to the rest."""
+
+import errno
+import os
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from mpress.batch import FileResult, classify_path
+from mpress.cache import ResultCache, hash_file, settings_key
+from mpress.options import CompressionOptions
+from mpress.utils import atomic_replace, clone_file, copy_metadata, get_file_size
+
+# Duplicate paths of each file that is compressed, keyed by its path
+Duplicates = Dict[str, List[str]]
+
+# Errors for which a hard link falls back to a copy
+_LINK_UNSUPPORTED = (errno.EXDEV, errno.EPERM, errno.EMLINK, errno.EOPNOTSUPP)
+
+
+def group_duplicates(
+    inputs: Iterable[Tuple[str, Optional[str]]],
+) -> Tuple[List[Tuple[str, Optional[str]]], Duplicates]:
+    """
+    Find inputs with identical content.
+
+    Only files with the same extension and size are hashed, so a tree of
+    distinct files is read no further than a stat of each. The whole input
+    is collected before anything is returned.
+
+    Args:
+        inputs: (file_path, file_type) pairs, e.g. from iter_inputs()
+
+    Returns:
+        Tuple of (the inputs to compress, which is the first of each group of
+        identical files, in input order; the duplicates of each of them)
+    """
+    inputs = list(inputs)
+    by_size: Dict[Tuple[str, int], List[int]] = {}
+    for index, (file_path, _) in enumerate(inputs):
+        try:
+            size = os.path.getsize(file_path)
+        except OSError:
+            # Compressed on its own, so the worker reports the problem
+            continue
+        if size > 0:
+            extension = os.path.splitext(file_path)[1].lower()
+            by_size.setdefault((extension, size), []).append(index)
+
+    duplicate_of: Dict[int, int] = {}
+    for indices in by_size.values():
+        if len(indices) < 2:
+            continue
+        first_by_hash: Dict[str, int] = {}
+        for index in indices:
+            try:
+                digest = hash_file(Path(inputs[index][0]))
+            except OSError:
+                continue
+            first = first_by_hash.setdefault(digest, index)
+            if first != index:
+                duplicate_of[index] = first
+
+    unique = []
+    duplicates: Duplicates = {}
+    for index, (file_path, file_type) in enumerate(inputs):
+        if index in duplicate_of:
+            duplicates.setdefault(inputs[duplicate_of[index]][0], []).append(file_path)
+        else:
+            unique.append((file_path, file_type))
+    return unique, duplicates
+
+
+def link_output(source: Path, destination: Path, hardlink: bool = False) -> bool:
+    """
+    Make destination a new file with the content of source.
+
+    Args:
+        source: Finished output to share
+        destination: Path to create (it must not exist)
+        hardlink: Link destination to source instead of copying, where the
+            filesystem allows it
+
+    Returns:
+        True if a hard link was made, False for a copy (see clone_file)
+
+    Raises:
+        OSError: If the file cannot be created
+    """
+    if hardlink:
+        try:
+            os.link(source, destination)
+            return True
+        except OSError as e:
+            if e.errno not in _LINK_UNSUPPORTED:
+                raise
+    clone_file(source, destination)
+    return False
+
+
+def _share_output(
+    output_path: Path,
+    input_path: Path,
+    file_path: str,
+    options: CompressionOptions,
+    hardlink: bool,
+) -> Path:
+    """
+    Put a copy of a compressed output in place of a duplicate input.
+
+    The copy is written to a temporary sibling and moved into place with
+    atomic_replace, as the compressors do, so the duplicate is replaced
+    whole or not at all.
+
+    Returns:
+        Path the copy was written to
+    """
+    path = Path(file_path)
+    target = path
+    if output_path != input_path:
+        target = path.with_suffix(output_path.suffix)
+        if target.exists():
+            raise OSError(f"Output file already exists: {target}")
+    elif os.path.samefile(output_path, target):
+        # The same file was given twice, or hard linked
+        return target
+
+    temp_path = target.parent / f".{target.name}.tmp"
+    try:
+        linked = link_output(output_path, temp_path, hardlink)
+        if not linked:
+            copy_metadata(path, temp_path)
+    except BaseException:
+        temp_path.unlink(missing_ok=True)
+        raise
+    atomic_replace(temp_path, target, options.durable)
+    if target != path and not options.keep_original:
+        path.unlink()
+    return target
+
+
+def share_results(
+    results: Iterable[FileResult],
+    duplicates: Duplicates,
+    options: CompressionOptions = CompressionOptions(),
+    cache: Optional[ResultCache] = None,
+    hardlink: bool = False,
+) -> Iterator[FileResult]:
+    """
+    Pass results through, following each with the results of its duplicates.
+
+    When a file was compressed, its output is copied (or hard linked) over
+    each of its duplicates; when it was kept or skipped, so are they. A
+    duplicate's details name the file it duplicates and the CPU time its
+    compression took, which the duplicate saved.
+
+    Args:
+        results: Results of the inputs group_duplicates() returned
+        duplicates: Duplicates from group_duplicates()
+        options: Compression settings of the batch
+        cache: Result cache to record the copies in
+        hardlink: Hard link copies to the output instead of copying it
+
+    Yields:
+        Each result, then one for each of its duplicates
+    """
+    for result in results:
+        yield result
+        for file_path in duplicates.get(result.file_path, ()):
+            yield _share_result(result, file_path, options, cache, hardlink)
+
+
+def _share_result(
+    result: FileResult,
+    file_path: str,
+    options: CompressionOptions,
+    cache: Optional[ResultCache],
+    hardlink: bool,
+) -> FileResult:
+    """Give a duplicate the outcome of the file it duplicates; see share_results()."""
+    source = result.file_path
+    if not result.success:
+        return FileResult(file_path, False, f"Error: duplicate of {source}, which failed")
+    if result.outcome == "deferred":
+        return result._replace(
+            file_path=file_path, message=f"Deferred (duplicate of {source}): {file_path}"
+        )
+
+    details = (("duplicate_of", source), ("cpu_seconds_saved", result.cpu_seconds))
+    try:
+        bytes_before = get_file_size(Path(file_path))
+        if result.outcome != "compressed":
+            # Kept or already compressed: nothing to write
+            message = f"{result.message.split(':', 1)[0]} (duplicate of {source}): {file_path}"
+            return FileResult(
+                file_path,
+                True,
+                message,
+                bytes_before,
+                bytes_before,
+                result.outcome,
+                details=details,
+            )
+
+        output_path = Path(result.output_path)
+        target = _share_output(output_path, Path(source), file_path, options, hardlink)
+        if cache is not None and Path(file_path).exists():
+            settings = settings_key(
+                Path(file_path), **options.cache_options(classify_path(file_path))
+            )
+            cache.record(Path(file_path), settings)
+    except OSError as e:
+        return FileResult(file_path, False, f"Error: cannot copy {source}'s output: {e}")
+
+    if target != Path(file_path):
+        message = f"Converted (duplicate of {source}): {file_path} -> {target}"
+    else:
+        message = f"Compressed (duplicate of {source}): {file_path}"
+    return FileResult(
+        file_path,
+        True,
+        message,
+        bytes_before,
+        get_file_size(target),
+        "compressed",
+        details=details,
+        output_path=str(target),
+    )
+
+
+class DedupSummary:
+    """Totals of what deduplication saved in a batch."""
+
+    def __init__(self):
+        self.files = 0
+        self.cpu_seconds = 0.0
+        self.bytes_saved = 0
+
+    def add(self, result: FileResult) -> None:
+        """
+        Count a result if it came from share_results() for a duplicate.
+
+        Args:
+            result: Result of any file of the batch
+        """
+        details = dict(result.details)
+        if result.success and "duplicate_of" in details:
+            self.files += 1
+            self.cpu_seconds += details["cpu_seconds_saved"]
+            self.bytes_saved += result.bytes_before - result.bytes_after
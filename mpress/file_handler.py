@@ -1,8 +1,12 @@
 """File validation and path handling for mpress."""
 
+import fnmatch
 import os
+import stat
 from pathlib import Path
-from typing import List, Tuple
+from typing import Callable, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from mpress.utils import is_temp_output
 
 
 # Supported file formats
@@ -110,3 +114,214 @@ def validate_files(file_paths: List[str]) -> List[Tuple[Path, str, str]]:
 
     return validated_files
 
+
+def get_file_type(extension: str) -> Optional[str]:
+    """
+    Map a lower-case file extension to a file type.
+
+    Args:
+        extension: Extension including the leading dot (e.g. '.png')
+
+    Returns:
+        'image', 'video', or None if the extension is not supported
+    """
+    if extension in SUPPORTED_IMAGE_FORMATS:
+        return "image"
+    if extension in SUPPORTED_VIDEO_FORMATS:
+        return "video"
+    return None
+
+
+def _mode_allows_read_write(st: os.stat_result) -> bool:
+    """
+    Check read and write permission from stat mode bits.
+
+    This mirrors os.access(path, R_OK | W_OK) for the common case without an
+    extra system call per file. ACLs are not considered; anything this check
+    lets through is still caught when the file is opened.
+
+    Args:
+        st: Stat result of the file
+
+    Returns:
+        True if the current user can read and write the file
+    """
+    if not hasattr(os, "geteuid"):
+        # No POSIX ownership model (Windows): treat read-only files as unwritable
+        return bool(st.st_mode & stat.S_IWRITE)
+
+    uid = os.geteuid()
+    if uid == 0:
+        return True
+    if st.st_uid == uid:
+        wanted = stat.S_IRUSR | stat.S_IWUSR
+    elif st.st_gid == os.getegid() or st.st_gid in os.getgroups():
+        wanted = stat.S_IRGRP | stat.S_IWGRP
+    else:
+        wanted = stat.S_IROTH | stat.S_IWOTH
+    return st.st_mode & wanted == wanted
+
+
+def _matches_any(name: str, relative_path: str, patterns: Sequence[str]) -> bool:
+    """
+    Check whether a file matches any glob pattern.
+
+    Patterns are matched against both the file name and the path relative to
+    the directory being walked, so '*.png' and 'assets/*/icon.png' both work.
+    """
+    return any(
+        fnmatch.fnmatch(name, pattern) or fnmatch.fnmatch(relative_path, pattern)
+        for pattern in patterns
+    )
+
+
+def path_excluded(root: str, path: str, exclude: Sequence[str]) -> bool:
+    """
+    Check whether iter_media_files would skip a path because of exclude.
+
+    A path is excluded if its own name or any directory between root and it
+    matches one of the patterns.
+
+    Args:
+        root: Directory being walked
+        path: File or directory under root
+        exclude: Glob patterns, as for iter_media_files
+
+    Returns:
+        True if the path or one of its parent directories is excluded
+    """
+    if not exclude:
+        return False
+    parts = os.path.relpath(path, root).replace(os.sep, "/").split("/")
+    return any(
+        _matches_any(name, "/".join(parts[: depth + 1]), exclude)
+        for depth, name in enumerate(parts)
+    )
+
+
+def filter_media_path(
+    root: str,
+    file_path: str,
+    include: Sequence[str] = (),
+    exclude: Sequence[str] = (),
+) -> Optional[str]:
+    """
+    Apply iter_media_files' filters to a single file under root.
+
+    Used when files are discovered one at a time (e.g. by mpress watch)
+    rather than by walking. The file itself is not validated.
+
+    Args:
+        root: Directory being walked
+        file_path: File under root
+        include: Glob patterns a file must match, as for iter_media_files
+        exclude: Glob patterns to skip, as for iter_media_files
+
+    Returns:
+        'image' or 'video' if iter_media_files would yield the file, else None
+    """
+    relative_path = os.path.relpath(file_path, root).replace(os.sep, "/")
+    name = os.path.basename(file_path)
+    if relative_path.startswith("../") or path_excluded(root, file_path, exclude):
+        return None
+    file_type = get_file_type(os.path.splitext(name)[1].lower())
+    if file_type is None or is_temp_output(name):
+        return None
+    if include and not _matches_any(name, relative_path, include):
+        return None
+    return file_type
+
+
+def iter_media_files(
+    roots: Iterable[str],
+    include: Sequence[str] = (),
+    exclude: Sequence[str] = (),
+    on_error: Optional[Callable[[FileValidationError], None]] = None,
+) -> Iterator[Tuple[str, Optional[str]]]:
+    """
+    Walk directories and yield supported media files as they are found.
+
+    Directories are read with os.scandir and each entry is validated from the
+    DirEntry's cached type and a single stat() call, instead of resolving and
+    checking every path separately. Files are yielded while the listing is
+    read, in the order the filesystem returns them; only the paths of
+    subdirectories still to visit are kept, so memory stays flat however many
+    files a directory holds. Subdirectories are visited in name order.
+
+    Symbolic links to directories are not followed. Symbolic links to files
+    are yielded as the path of their target, as validate_file() resolves
+    them, so the target is compressed and the link is kept. mpress's own
+    temporary outputs and files with unsupported extensions are skipped
+    silently.
+
+    Args:
+        roots: Directories to walk
+        include: If non-empty, only files matching one of these globs are yielded
+        exclude: Files and directories matching one of these globs are skipped
+        on_error: Called with a FileValidationError for each directory that
+            cannot be read. If None, unreadable directories are skipped silently.
+
+    Yields:
+        Tuples of (file_path, file_type). file_type is 'image' or 'video' when
+        the entry passed validation, or None when it failed a check; those
+        paths should go through validate_file() so the error is reported.
+    """
+    for root in roots:
+        root = os.path.abspath(os.path.expanduser(root))
+        stack = [root]
+
+        while stack:
+            directory = stack.pop()
+            subdirectories = []
+            for entry in _scan(directory, on_error):
+                relative_path = os.path.relpath(entry.path, root).replace(os.sep, "/")
+                if exclude and _matches_any(entry.name, relative_path, exclude):
+                    continue
+
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirectories.append(entry.path)
+                        continue
+                except OSError:
+                    continue
+
+                file_type = get_file_type(os.path.splitext(entry.name)[1].lower())
+                if file_type is None or is_temp_output(entry.name):
+                    continue
+                if include and not _matches_any(entry.name, relative_path, include):
+                    continue
+
+                try:
+                    valid = entry.is_file() and _mode_allows_read_write(entry.stat())
+                except OSError:
+                    valid = False
+                file_path = entry.path
+                if valid and entry.is_symlink():
+                    file_path = os.path.realpath(file_path)
+                yield file_path, (file_type if valid else None)
+
+            # Depth-first in name order: push in reverse so the first pops first
+            stack.extend(sorted(subdirectories, reverse=True))
+
+
+def _scan(
+    directory: str, on_error: Optional[Callable[[FileValidationError], None]]
+) -> Iterator[os.DirEntry]:
+    """Yield the entries of a directory as they are read, reporting read errors."""
+    try:
+        it = os.scandir(directory)
+    except OSError as e:
+        if on_error is not None:
+            on_error(FileValidationError(f"Cannot read directory: {directory}: {e}"))
+        return
+    with it:
+        while True:
+            try:
+                entry = next(it)
+            except StopIteration:
+                return
+            except OSError as e:
+                if on_error is not None:
+                    on_error(FileValidationError(f"Cannot read directory: {directory}: {e}"))
+                return
+            yield entry
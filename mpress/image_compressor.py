@@ -1,11 +1,56 @@
 """Image compression using Pillow."""
 
+import importlib.util
+import io
 from pathlib import Path
-from typing import Optional
+from typing import IO, Any, Dict, Iterable, List, NamedTuple, Optional, Tuple, Union
 
-from PIL import Image
+from PIL import Image, features
 
-from mpress.utils import atomic_replace
+from mpress.jpeg_lossless import JpegLosslessError, optimize_jpeg
+from mpress.options import (
+    DEFAULT_JPEG_LOSSLESS_MIN_GAIN,
+    DEFAULT_PNG_COMPRESS_LEVEL,
+    DEFAULT_PNG_QUANTIZER,
+    DEFAULT_PNG_STRATEGY,
+    IMAGE_FORMATS,
+    PNG_QUANTIZERS,
+    PNG_STRATEGIES,
+)
+from mpress.timing import note, stage
+from mpress.utils import commit_output, scaled_size
+
+
+# Downscaling first shrinks by an integer factor (JPEG draft mode or
+# Image.reduce) to at least this multiple of the target size, then resamples
+# the rest; at 3 the result is practically identical to a full resample
+RESIZE_REDUCING_GAP = 3.0
+
+# JPEG quality used unless --target-ssim searches for one
+JPEG_QUALITY = 85
+
+# Qualities the --target-ssim search chooses from, and the most candidates it
+# encodes and scores per image (about log2 of the range, plus JPEG_QUALITY)
+JPEG_SEARCH_MIN_QUALITY = 40
+JPEG_SEARCH_MAX_QUALITY = 95
+JPEG_SEARCH_MAX_STEPS = 6
+
+# EXIF orientation tag, kept on re-encoded JPEGs with --jpeg-keep orientation
+_EXIF_ORIENTATION = 0x0112
+
+# Pillow stores RGB, RGBA and CMYK pixels in 4 bytes each
+_BYTES_PER_PIXEL = 4
+
+_QUANTIZE_METHODS = {
+    "libimagequant": Image.Quantize.LIBIMAGEQUANT,
+    "fastoctree": Image.Quantize.FASTOCTREE,
+    "mediancut": Image.Quantize.MEDIANCUT,
+    "maxcoverage": Image.Quantize.MAXCOVERAGE,
+}
+
+
+# Where images are read from and written to: a path or a binary file object
+ImageTarget = Union[Path, IO[bytes]]
 
 
 class ImageCompressionError(Exception):
@@ -14,13 +59,526 @@ class ImageCompressionError(Exception):
     pass
 
 
-def compress_png(input_path: Path, output_path: Optional[Path] = None) -> Path:
+class JpegSearch(NamedTuple):
+    """Outcome of a --target-ssim quality search."""
+
+    quality: int
+    # SSIM of the chosen quality, or None if the search ran out of steps
+    # before scoring it (only possible for JPEG_SEARCH_MAX_QUALITY)
+    ssim: Optional[float]
+    size: int
+    # Size at JPEG_QUALITY, the quality used without a target
+    baseline_size: int
+    steps: int
+
+
+def has_libimagequant() -> bool:
+    """
+    Check whether Pillow was built with libimagequant support.
+
+    Returns:
+        True if the LIBIMAGEQUANT quantizer is available
+    """
+    return bool(features.check_feature("libimagequant"))
+
+
+def has_ssim_support() -> bool:
+    """
+    Check whether NumPy, which --target-ssim scoring needs, is installed.
+
+    Returns:
+        True if SSIM-targeted JPEG encoding is available
+    """
+    return importlib.util.find_spec("numpy") is not None
+
+
+def available_image_formats() -> List[str]:
+    """
+    Get the target formats the installed Pillow can write.
+
+    Returns:
+        Keys of IMAGE_FORMATS whose encoder is available
+    """
+    # Older Pillow versions do not know the avif module at all
+    return [
+        name
+        for name in IMAGE_FORMATS
+        if name in features.modules and features.check_module(name)
+    ]
+
+
+def image_target_path(input_path: Path, image_format: Optional[str] = None) -> Path:
+    """
+    Get the path an image is written to.
+
+    Args:
+        input_path: Path to the original image
+        image_format: Target format (a key of IMAGE_FORMATS), or None to
+            keep the original format
+
+    Returns:
+        input_path itself, or a sibling with the target format's extension
+    """
+    if image_format is None:
+        return input_path
+    return input_path.with_suffix(IMAGE_FORMATS[image_format][0])
+
+
+def estimate_decode_memory(input_path: Path) -> int:
+    """
+    Estimate the peak memory needed to compress an image.
+
+    Only the image header is read. The estimate covers the decoded image plus
+    the one converted copy compression makes (the RGB canvas for JPEG, the
+    palette conversion for PNG).
+
+    Args:
+        input_path: Path to the image file
+
+    Returns:
+        Estimated bytes, or 0 if the header cannot be read (the error is
+        reported when the file is compressed)
+    """
+    try:
+        with Image.open(input_path) as img:
+            width, height = img.size
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return 0
+    return width * height * _BYTES_PER_PIXEL * 2
+
+
+def _downscale(
+    img: Image.Image, max_dimension: Optional[int], scale: Optional[float]
+) -> Image.Image:
+    """
+    Shrink an image for max_dimension/scale, in place where possible.
+
+    Call this before the image is loaded: for JPEGs, thumbnail() then puts
+    the decoder in draft mode so it decodes directly at 1/2, 1/4 or 1/8 scale.
+    """
+    target = scaled_size(img.size, max_dimension, scale)
+    if target == img.size:
+        return img
+    if img.mode == "P":
+        # Resizing palette images falls back to nearest neighbour
+        img = img.convert("RGBA" if "transparency" in img.info else "RGB")
+    elif img.mode == "1":
+        img = img.convert("L")
+    img.thumbnail(target, Image.Resampling.LANCZOS, reducing_gap=RESIZE_REDUCING_GAP)
+    return img
+
+
+def _exact_palette(img: Image.Image) -> Optional[Image.Image]:
+    """
+    Convert an image with at most 256 colors to palette mode without loss.
+
+    Args:
+        img: RGB or RGBA image
+
+    Returns:
+        Equivalent P-mode image, or None if the image has too many colors
+        (or, for RGBA, colors that differ only in alpha)
+    """
+    colors = img.getcolors(256)
+    if colors is None:
+        return None
+
+    rgb_colors = [color[:3] for _, color in colors]
+    if len(set(rgb_colors)) != len(rgb_colors):
+        # Palette lookup matches on RGB only, so two entries differing only
+        # in alpha would collapse into one
+        return None
+
+    palette = Image.new("P", (1, 1))
+    palette.putpalette([channel for color in rgb_colors for channel in color])
+    rgb = img.convert("RGB") if img.mode == "RGBA" else img
+    result = rgb.quantize(palette=palette, dither=Image.Dither.NONE)
+
+    if img.mode == "RGBA":
+        alphas = bytes(color[3] for _, color in colors)
+        if any(alpha != 255 for alpha in alphas):
+            result.info["transparency"] = alphas
+    return result
+
+
+def quantize_png(img: Image.Image, quantizer: str = DEFAULT_PNG_QUANTIZER) -> Image.Image:
+    """
+    Reduce an image to a palette of at most 256 colors.
+
+    Palette and grayscale images are returned unchanged, since quantizing
+    them cannot make them smaller.
+
+    Args:
+        img: Image to quantize
+        quantizer: One of PNG_QUANTIZERS
+
+    Returns:
+        Image ready to be saved as PNG
+
+    Raises:
+        ImageCompressionError: If the quantizer is unknown or unavailable
+    """
+    if quantizer not in PNG_QUANTIZERS:
+        raise ImageCompressionError(
+            f"Unknown PNG quantizer: {quantizer}. Available: {', '.join(PNG_QUANTIZERS)}"
+        )
+    if img.mode in ("P", "1", "L"):
+        return img
+    if img.mode not in ("RGB", "RGBA"):
+        img = img.convert("RGBA" if "A" in img.getbands() else "RGB")
+
+    if quantizer == "auto":
+        # Fast path: screenshots and icons often have few enough colors to
+        # be stored losslessly as a palette, so nothing needs quantizing
+        exact = _exact_palette(img)
+        if exact is not None:
+            return exact
+        if has_libimagequant():
+            quantizer = "libimagequant"
+        elif img.mode == "RGBA":
+            # Only FASTOCTREE and LIBIMAGEQUANT support RGBA
+            quantizer = "fastoctree"
+        else:
+            quantizer = "maxcoverage"
+
+    if quantizer == "libimagequant" and not has_libimagequant():
+        raise ImageCompressionError("Pillow was built without libimagequant support")
+    if img.mode == "RGBA" and quantizer in ("mediancut", "maxcoverage"):
+        raise ImageCompressionError(f"The {quantizer} quantizer does not support transparency")
+
+    return img.quantize(colors=256, method=_QUANTIZE_METHODS[quantizer])
+
+
+def encode_png(
+    img: Image.Image,
+    output: ImageTarget,
+    quantizer: str = DEFAULT_PNG_QUANTIZER,
+    compress_level: int = DEFAULT_PNG_COMPRESS_LEVEL,
+    strategy: str = DEFAULT_PNG_STRATEGY,
+) -> None:
+    """
+    Quantize and save an image as PNG.
+
+    Args:
+        img: Image to encode
+        output: Path or binary file object to write to
+        quantizer: One of PNG_QUANTIZERS
+        compress_level: zlib compression level (0-9)
+        strategy: zlib strategy, a key of PNG_STRATEGIES
+
+    Raises:
+        ImageCompressionError: If a setting is invalid
+    """
+    if strategy not in PNG_STRATEGIES:
+        raise ImageCompressionError(
+            f"Unknown PNG strategy: {strategy}. Available: {', '.join(PNG_STRATEGIES)}"
+        )
+    if not 0 <= compress_level <= 9:
+        raise ImageCompressionError(f"PNG compression level must be 0-9, got {compress_level}")
+
+    with stage("quantize"):
+        img = quantize_png(img, quantizer)
+    with stage("encode"):
+        img.save(
+            output,
+            "PNG",
+            # optimize forces level 9, so only use it when that was asked for
+            optimize=compress_level == 9,
+            compress_level=compress_level,
+            compress_type=PNG_STRATEGIES[strategy],
+        )
+
+
+def encode_jpeg_losslessly(
+    data: bytes,
+    min_gain: float = DEFAULT_JPEG_LOSSLESS_MIN_GAIN,
+    keep: Iterable[str] = (),
+    progressive: bool = False,
+) -> Optional[bytes]:
+    """
+    Try the lossless tier: optimize a JPEG without decoding its pixels.
+
+    Args:
+        data: The whole JPEG file
+        min_gain: Smallest saving, as a fraction of the input size, worth
+            keeping instead of re-encoding
+        keep: JPEG_METADATA entries to keep
+        progressive: Write a progressive JPEG (needs jpegtran)
+
+    Returns:
+        The optimized JPEG, or None if it saves less than min_gain or data
+        is not a JPEG that can be optimized
+    """
+    with stage("lossless"):
+        try:
+            optimized = optimize_jpeg(data, keep, progressive)
+        except JpegLosslessError:
+            return None
+    gain = 1 - len(optimized) / len(data)
+    note("jpeg_lossless_gain", round(gain, 4))
+    if gain < min_gain:
+        return None
+    note("jpeg_mode", "lossless")
+    return optimized
+
+
+def _jpeg_save_options(
+    img: Image.Image, keep: Iterable[str], progressive: bool
+) -> Dict[str, Any]:
+    """Get Pillow's JPEG settings, carrying over the metadata to keep."""
+    options: Dict[str, Any] = {"optimize": True, "progressive": progressive}
+    if "icc" in keep and img.info.get("icc_profile"):
+        options["icc_profile"] = img.info["icc_profile"]
+    if "orientation" in keep:
+        orientation = img.getexif().get(_EXIF_ORIENTATION)
+        if orientation not in (None, 1):
+            exif = Image.Exif()
+            exif[_EXIF_ORIENTATION] = orientation
+            options["exif"] = exif
+    return options
+
+
+def _write_bytes(output: ImageTarget, data: bytes) -> None:
+    """Write encoded bytes to a path or binary file object."""
+    with stage("encode"):
+        if isinstance(output, Path):
+            output.write_bytes(data)
+        else:
+            output.write(data)
+
+
+def _jpeg_bytes(img: Image.Image, quality: int, save_options: Dict[str, Any]) -> bytes:
+    """Encode an RGB image as JPEG in memory."""
+    buffer = io.BytesIO()
+    with stage("encode"):
+        img.save(buffer, "JPEG", quality=quality, **save_options)
+    return buffer.getvalue()
+
+
+def search_jpeg_quality(
+    img: Image.Image,
+    target_ssim: float,
+    max_steps: int = JPEG_SEARCH_MAX_STEPS,
+    save_options: Optional[Dict[str, Any]] = None,
+) -> Tuple[bytes, JpegSearch]:
+    """
+    Find the lowest JPEG quality whose SSIM reaches a target.
+
+    Binary-searches JPEG_SEARCH_MIN_QUALITY..JPEG_SEARCH_MAX_QUALITY,
+    starting at JPEG_QUALITY so the size without a target is known. Each
+    step encodes a candidate in memory and scores it against the image on
+    a downsampled luma plane. When the steps run out, the lowest quality
+    that reached the target is used (or JPEG_SEARCH_MAX_QUALITY if none did).
+
+    Args:
+        img: RGB image to encode
+        target_ssim: SSIM the result must reach, e.g. 0.95
+        max_steps: Most candidates to score (at least 1)
+        save_options: Extra Pillow JPEG settings for every candidate
+            (defaults to optimized Huffman tables)
+
+    Returns:
+        Tuple of (encoded JPEG, search outcome)
+
+    Raises:
+        ImageCompressionError: If NumPy is not installed
+    """
+    if not has_ssim_support():
+        raise ImageCompressionError("SSIM targeting requires NumPy (pip install numpy)")
+    from mpress.quality import luma_plane, ssim
+
+    if save_options is None:
+        save_options = {"optimize": True}
+    with stage("score"):
+        reference = luma_plane(img)
+    encoded: Dict[int, bytes] = {}
+    scores: Dict[int, float] = {}
+
+    # The answer lies in low..high; high is taken to pass until scored
+    low, high = JPEG_SEARCH_MIN_QUALITY, JPEG_SEARCH_MAX_QUALITY
+    quality = JPEG_QUALITY
+    steps = 0
+    while low < high and steps < max(1, max_steps):
+        steps += 1
+        encoded[quality] = _jpeg_bytes(img, quality, save_options)
+        with stage("score"), Image.open(io.BytesIO(encoded[quality])) as candidate:
+            scores[quality] = ssim(reference, luma_plane(candidate))
+        if scores[quality] >= target_ssim:
+            high = quality
+        else:
+            low = quality + 1
+        quality = (low + high) // 2
+
+    # The first step always encodes JPEG_QUALITY; high is unencoded only if
+    # no candidate reached the target
+    if high not in encoded:
+        encoded[high] = _jpeg_bytes(img, high, save_options)
+    data = encoded[high]
+    return data, JpegSearch(
+        high, scores.get(high), len(data), len(encoded[JPEG_QUALITY]), steps
+    )
+
+
+def _encode_jpeg(
+    img: Image.Image,
+    output: ImageTarget,
+    target_ssim: Optional[float] = None,
+    keep: Iterable[str] = (),
+    progressive: bool = False,
+) -> None:
+    """Flatten an image onto white if needed and save it as JPEG."""
+    save_options = _jpeg_save_options(img, keep, progressive)
+    source = img
+    # Convert to RGB if necessary (JPEG doesn't support transparency)
+    if img.mode in ("RGBA", "LA", "P"):
+        # Create a white background for transparent images
+        rgb_img = Image.new("RGB", img.size, (255, 255, 255))
+        if img.mode in ("RGBA", "LA"):
+            # Passing the image itself as the mask uses its alpha band
+            # in place, without split() copying every band
+            rgb_img.paste(img, mask=img)
+        else:
+            rgb_img.paste(img)
+        img = rgb_img
+    elif img.mode != "RGB":
+        img = img.convert("RGB")
+
+    if img is not source:
+        # Release the decoded source before encoding, so only one
+        # full-size buffer is alive while the encoder runs
+        source.close()
+
+    if target_ssim is not None:
+        data, search = search_jpeg_quality(img, target_ssim, save_options=save_options)
+        note("jpeg_quality", search.quality)
+        if search.ssim is not None:
+            note("jpeg_ssim", round(search.ssim, 4))
+        note("jpeg_search_steps", search.steps)
+        note("jpeg_bytes_saved_vs_q85", search.baseline_size - search.size)
+        _write_bytes(output, data)
+        return
+
+    # Save with compression
+    with stage("encode"):
+        img.save(output, "JPEG", quality=JPEG_QUALITY, **save_options)
+
+
+def encode_image(
+    source: ImageTarget,
+    output: ImageTarget,
+    output_format: Optional[str] = None,
+    png_quantizer: str = DEFAULT_PNG_QUANTIZER,
+    png_compress_level: int = DEFAULT_PNG_COMPRESS_LEVEL,
+    png_strategy: str = DEFAULT_PNG_STRATEGY,
+    max_dimension: Optional[int] = None,
+    scale: Optional[float] = None,
+    target_ssim: Optional[float] = None,
+    jpeg_keep: Iterable[str] = (),
+    jpeg_progressive: bool = False,
+    jpeg_lossless_min_gain: float = DEFAULT_JPEG_LOSSLESS_MIN_GAIN,
+) -> str:
+    """
+    Decode, optionally downscale, and re-encode an image.
+
+    This is the core of every image compressor. Source and output can be
+    paths or binary file objects, so images held in memory never touch the
+    filesystem. The source is read once, front to back.
+
+    With output_format 'jpeg' and no downscaling, the lossless tier is tried
+    first (see encode_jpeg_losslessly); the image is only decoded and
+    re-encoded if that saves less than jpeg_lossless_min_gain.
+
+    Args:
+        source: Path or binary file object to read the image from
+        output: Path or binary file object to write the result to
+        output_format: 'png', 'jpeg' or a key of IMAGE_FORMATS; None keeps
+            the source format (which must then be PNG or JPEG)
+        png_quantizer: Quantizer for PNG output (see PNG_QUANTIZERS)
+        png_compress_level: zlib level for PNG output (0-9)
+        png_strategy: zlib strategy for PNG output (see PNG_STRATEGIES)
+        max_dimension: If set, shrink so the longer side is at most this
+        scale: If set, shrink both sides by this factor
+        target_ssim: For JPEG output, search for the lowest quality reaching
+            this SSIM (see search_jpeg_quality) instead of using JPEG_QUALITY
+        jpeg_keep: JPEG_METADATA entries to keep in JPEG output
+        jpeg_progressive: Write progressive JPEGs
+        jpeg_lossless_min_gain: Smallest saving of the lossless tier worth
+            keeping, as a fraction; 1 or more skips the lossless tier
+
+    Returns:
+        The format written ('png', 'jpeg' or a key of IMAGE_FORMATS)
+
+    Raises:
+        ImageCompressionError: If the format is unsupported or a setting is
+            invalid; decoding and encoding errors propagate as raised by Pillow
+    """
+    if output_format in IMAGE_FORMATS and output_format not in available_image_formats():
+        raise ImageCompressionError(f"This Pillow build cannot write {output_format}")
+
+    if (
+        output_format == "jpeg"
+        and max_dimension is None
+        and scale is None
+        and jpeg_lossless_min_gain < 1
+    ):
+        data = source.read_bytes() if isinstance(source, Path) else source.read()
+        optimized = encode_jpeg_losslessly(
+            data, jpeg_lossless_min_gain, jpeg_keep, jpeg_progressive
+        )
+        if optimized is not None:
+            _write_bytes(output, optimized)
+            return output_format
+        source = io.BytesIO(data)
+
+    with Image.open(source) as img:
+        if output_format is None:
+            output_format = {"PNG": "png", "JPEG": "jpeg"}.get(img.format)
+            if output_format is None:
+                raise ImageCompressionError(f"Unsupported image format: {img.format}")
+
+        with stage("decode"):
+            # Pillow decodes lazily; load here so the time is not counted as
+            # quantizing or encoding (after _downscale, to keep draft mode)
+            img = _downscale(img, max_dimension, scale)
+            img.load()
+        if output_format == "png":
+            # Quantize to reduce file size (max 256 colors); this converts to
+            # P mode (palette-based) unless the image already is
+            encode_png(img, output, png_quantizer, png_compress_level, png_strategy)
+        elif output_format == "jpeg":
+            _encode_jpeg(img, output, target_ssim, jpeg_keep, jpeg_progressive)
+        elif output_format in IMAGE_FORMATS:
+            # Transparency is kept; both formats support an alpha channel
+            _, pillow_format, settings = IMAGE_FORMATS[output_format]
+            if img.mode == "P":
+                img = img.convert("RGBA" if "transparency" in img.info else "RGB")
+            with stage("encode"):
+                img.save(output, pillow_format, **settings)
+        else:
+            raise ImageCompressionError(f"Unknown output format: {output_format}")
+    return output_format
+
+
+def compress_png(
+    input_path: Path,
+    output_path: Optional[Path] = None,
+    quantizer: str = DEFAULT_PNG_QUANTIZER,
+    compress_level: int = DEFAULT_PNG_COMPRESS_LEVEL,
+    strategy: str = DEFAULT_PNG_STRATEGY,
+    max_dimension: Optional[int] = None,
+    scale: Optional[float] = None,
+) -> Path:
     """
     Compress a PNG image.
 
     Args:
         input_path: Path to the input PNG file
         output_path: Path for the output file (if None, uses temp file)
+        quantizer: One of PNG_QUANTIZERS
+        compress_level: zlib compression level (0-9)
+        strategy: zlib strategy, a key of PNG_STRATEGIES
+        max_dimension: If set, shrink so the longer side is at most this
+        scale: If set, shrink both sides by this factor
 
     Returns:
         Path to the compressed file
@@ -32,39 +590,50 @@ def compress_png(input_path: Path, output_path: Optional[Path] = None) -> Path:
         output_path = input_path.parent / f".{input_path.name}.tmp"
 
     try:
-        # Open and compress the image
-        with Image.open(input_path) as img:
-            # Quantize to reduce file size (max 256 colors)
-            # This effectively converts to P mode (palette-based)
-            # For RGBA images, only FASTOCTREE (method 2) or LIBIMAGEQUANT (method 3) are valid
-            if img.mode != "P":
-                if img.mode == "RGBA":
-                    # Use FASTOCTREE for RGBA images (method 2)
-                    img = img.quantize(colors=256, method=Image.Quantize.FASTOCTREE)
-                else:
-                    # Use MAXCOVERAGE for other modes (method 1) - better quality
-                    img = img.quantize(colors=256, method=Image.Quantize.MAXCOVERAGE)
-
-            img.save(
-                output_path,
-                "PNG",
-                optimize=True,
-                compress_level=9,
-            )
-
+        encode_image(
+            input_path,
+            output_path,
+            "png",
+            quantizer,
+            compress_level,
+            strategy,
+            max_dimension=max_dimension,
+            scale=scale,
+        )
         return output_path
 
     except Exception as e:
         raise ImageCompressionError(f"Failed to compress PNG {input_path}: {e}") from e
 
 
-def compress_jpeg(input_path: Path, output_path: Optional[Path] = None) -> Path:
+def compress_jpeg(
+    input_path: Path,
+    output_path: Optional[Path] = None,
+    max_dimension: Optional[int] = None,
+    scale: Optional[float] = None,
+    target_ssim: Optional[float] = None,
+    keep: Iterable[str] = (),
+    progressive: bool = False,
+    lossless_min_gain: float = DEFAULT_JPEG_LOSSLESS_MIN_GAIN,
+) -> Path:
     """
     Compress a JPEG/JPG image.
 
+    Without downscaling, the JPEG is first optimized losslessly and only
+    re-encoded if that saves less than lossless_min_gain. When downscaling,
+    the JPEG is decoded directly at a reduced scale, so the full-resolution
+    image is never held in memory.
+
     Args:
         input_path: Path to the input JPEG/JPG file
         output_path: Path for the output file (if None, uses temp file)
+        max_dimension: If set, shrink so the longer side is at most this
+        scale: If set, shrink both sides by this factor
+        target_ssim: If set, use the lowest quality reaching this SSIM
+        keep: JPEG_METADATA entries to keep
+        progressive: Write a progressive JPEG
+        lossless_min_gain: Smallest lossless saving (a fraction) to keep
+            instead of re-encoding; 1 or more always re-encodes
 
     Returns:
         Path to the compressed file
@@ -76,61 +645,147 @@ def compress_jpeg(input_path: Path, output_path: Optional[Path] = None) -> Path:
         output_path = input_path.parent / f".{input_path.name}.tmp"
 
     try:
-        # Open and compress the image
-        with Image.open(input_path) as img:
-            # Convert to RGB if necessary (JPEG doesn't support transparency)
-            if img.mode in ("RGBA", "LA", "P"):
-                # Create a white background for transparent images
-                rgb_img = Image.new("RGB", img.size, (255, 255, 255))
-                if img.mode == "RGBA":
-                    rgb_img.paste(img, mask=img.split()[3])  # Use alpha channel as mask
-                else:
-                    rgb_img.paste(img)
-                img = rgb_img
-            elif img.mode != "RGB":
-                img = img.convert("RGB")
-
-            # Save with compression
-            img.save(
-                output_path,
-                "JPEG",
-                quality=85,
-                optimize=True,
-            )
-
+        encode_image(
+            input_path,
+            output_path,
+            "jpeg",
+            max_dimension=max_dimension,
+            scale=scale,
+            target_ssim=target_ssim,
+            jpeg_keep=keep,
+            jpeg_progressive=progressive,
+            jpeg_lossless_min_gain=lossless_min_gain,
+        )
         return output_path
 
     except Exception as e:
         raise ImageCompressionError(f"Failed to compress JPEG {input_path}: {e}") from e
 
 
-def compress_image(input_path: Path) -> None:
+def convert_image(
+    input_path: Path,
+    output_path: Path,
+    image_format: str,
+    max_dimension: Optional[int] = None,
+    scale: Optional[float] = None,
+) -> Path:
+    """
+    Re-encode an image in a modern format (WebP or AVIF).
+
+    Transparency is kept; both formats support an alpha channel.
+
+    Args:
+        input_path: Path to the input image
+        output_path: Path for the output file
+        image_format: A key of IMAGE_FORMATS
+        max_dimension: If set, shrink so the longer side is at most this
+        scale: If set, shrink both sides by this factor
+
+    Returns:
+        Path to the converted file
+
+    Raises:
+        ImageCompressionError: If the format is unavailable or encoding fails
+    """
+    if image_format not in available_image_formats():
+        raise ImageCompressionError(f"This Pillow build cannot write {image_format}")
+
+    try:
+        encode_image(
+            input_path, output_path, image_format, max_dimension=max_dimension, scale=scale
+        )
+        return output_path
+
+    except Exception as e:
+        raise ImageCompressionError(
+            f"Failed to convert {input_path} to {image_format}: {e}"
+        ) from e
+
+
+def compress_image(
+    input_path: Path,
+    png_quantizer: str = DEFAULT_PNG_QUANTIZER,
+    png_compress_level: int = DEFAULT_PNG_COMPRESS_LEVEL,
+    png_strategy: str = DEFAULT_PNG_STRATEGY,
+    max_dimension: Optional[int] = None,
+    scale: Optional[float] = None,
+    image_format: Optional[str] = None,
+    keep_original: bool = False,
+    durable: bool = False,
+    target_ssim: Optional[float] = None,
+    jpeg_keep: Iterable[str] = (),
+    jpeg_progressive: bool = False,
+    jpeg_lossless_min_gain: float = DEFAULT_JPEG_LOSSLESS_MIN_GAIN,
+) -> Path:
     """
     Compress an image file and replace the original atomically.
 
-    Supports PNG, JPG, and JPEG formats.
+    Supports PNG, JPG, and JPEG formats. With image_format the image is
+    converted instead, and written next to the original with the new
+    extension (see image_target_path).
 
     Args:
         input_path: Path to the image file to compress
+        png_quantizer: Quantizer for PNG files (see PNG_QUANTIZERS)
+        png_compress_level: zlib level for PNG files (0-9)
+        png_strategy: zlib strategy for PNG files (see PNG_STRATEGIES)
+        max_dimension: If set, shrink so the longer side is at most this
+        scale: If set, shrink both sides by this factor
+        image_format: Target format (a key of IMAGE_FORMATS), or None to keep
+            the original format
+        keep_original: When converting, keep the original file as well
+        durable: Flush the new file to disk before it replaces the original
+        target_ssim: For JPEGs, use the lowest quality reaching this SSIM
+        jpeg_keep: JPEG_METADATA entries to keep in JPEGs
+        jpeg_progressive: Write progressive JPEGs
+        jpeg_lossless_min_gain: Smallest saving (a fraction) for which a JPEG
+            is only optimized losslessly instead of re-encoded
+
+    Returns:
+        Path of the compressed file
 
     Raises:
         ImageCompressionError: If compression fails or format is unsupported
     """
     extension = input_path.suffix.lower()
+    output_path = image_target_path(input_path, image_format)
 
     # Create temporary output file
-    temp_output = input_path.parent / f".{input_path.name}.tmp"
+    temp_output = output_path.parent / f".{output_path.name}.tmp"
 
     try:
-        if extension == ".png":
-            compress_png(input_path, temp_output)
-        elif extension in (".jpg", ".jpeg"):
-            compress_jpeg(input_path, temp_output)
-        else:
+        if extension not in (".png", ".jpg", ".jpeg"):
             raise ImageCompressionError(f"Unsupported image format: {extension}")
+        if output_path != input_path and output_path.exists():
+            raise ImageCompressionError(f"Output file already exists: {output_path}")
+
+        if image_format is not None:
+            convert_image(input_path, temp_output, image_format, max_dimension, scale)
+        elif extension == ".png":
+            compress_png(
+                input_path,
+                temp_output,
+                png_quantizer,
+                png_compress_level,
+                png_strategy,
+                max_dimension=max_dimension,
+                scale=scale,
+            )
+        else:
+            compress_jpeg(
+                input_path,
+                temp_output,
+                max_dimension=max_dimension,
+                scale=scale,
+                target_ssim=target_ssim,
+                keep=jpeg_keep,
+                progressive=jpeg_progressive,
+                lossless_min_gain=jpeg_lossless_min_gain,
+            )
 
-        # Atomically replace the original file
-        atomic_replace(temp_output, input_path)
+        # Atomically replace the original file (or move the converted one into place)
+        commit_output(temp_output, input_path, output_path, keep_original, durable)
+        return output_path
 
     except Exception as e:
         # Clean up temp file if it exists
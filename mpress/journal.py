@@ -0,0 +1,343 @@
+"""Crash-safe journal of batch progress, for resuming interrupted runs."""
+
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from mpress.batch import FileResult
+from mpress.cache import default_cache_dir
+from mpress.options import IMAGE_FORMATS
+from mpress.utils import is_temp_output
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+
+# Journals not touched for this long are deleted at startup
+JOURNAL_MAX_AGE = 30 * 24 * 3600
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS events (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    path TEXT NOT NULL,
+    event TEXT NOT NULL,
+    outcome TEXT,
+    bytes_before INTEGER,
+    bytes_after INTEGER,
+    size INTEGER,
+    mtime_ns INTEGER,
+    time REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS events_path ON events (path, seq);
+"""
+
+# Journal events: a file was handed to a worker, or finished (successfully
+# or not)
+SUBMITTED = "submitted"
+DONE = "done"
+FAILED = "failed"
+
+# Extensions a compressor may give its output instead of the input's own
+# (conversions), used to recognise temporary files left by a crash
+_TARGET_EXTENSIONS = tuple(extension for extension, _, _ in IMAGE_FORMATS.values()) + (".mp4",)
+
+
+class JournalError(Exception):
+    """Exception raised when a journal cannot be used."""
+
+    pass
+
+
+def run_key(arguments: Dict[str, Any]) -> str:
+    """
+    Identify a batch by the arguments that decide which files it processes.
+
+    Args:
+        arguments: JSON-serializable description of the batch (input paths,
+            filters and compression settings)
+
+    Returns:
+        Short hex key; the same arguments always give the same key
+    """
+    encoded = json.dumps(arguments, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.blake2b(encoded, digest_size=12).hexdigest()
+
+
+def default_journal_dir() -> Path:
+    """
+    Get the directory journals are kept in.
+
+    Returns:
+        Path inside the result cache directory (may not exist yet)
+    """
+    return default_cache_dir() / "journals"
+
+
+def temp_outputs_for(file_path: Path) -> List[Path]:
+    """
+    Find temporary files a compressor may have left next to an input.
+
+    Covers the image and video temp outputs ('.name.tmp', '.name.tmp.ext'),
+    temp outputs of conversions ('.stem.webp.tmp', ...) and the working
+    directories of segment-parallel encodes ('.name.XXXX.tmp').
+
+    Args:
+        file_path: The input file (it may no longer exist)
+
+    Returns:
+        Paths of matching temporary files and directories
+    """
+    prefixes = [f".{file_path.name}."]
+    prefixes += [f".{file_path.stem}{extension}." for extension in _TARGET_EXTENSIONS]
+    try:
+        names = os.listdir(file_path.parent)
+    except OSError:
+        return []
+    return [
+        file_path.parent / name
+        for name in sorted(names)
+        if is_temp_output(name) and name.startswith(tuple(prefixes))
+    ]
+
+
+def sweep_temp_files(paths: Iterable[str]) -> List[Path]:
+    """
+    Delete the temporary files left behind for inputs of a dead run.
+
+    Only call this for inputs no live process is working on, e.g. files a
+    journal recorded as submitted but never finished, once the journal's
+    lock shows its run has exited.
+
+    Args:
+        paths: Input files whose compression was interrupted
+
+    Returns:
+        Paths that were removed
+    """
+    removed = []
+    for file_path in paths:
+        for temp in temp_outputs_for(Path(file_path)):
+            try:
+                if temp.is_dir() and not temp.is_symlink():
+                    shutil.rmtree(temp)
+                else:
+                    temp.unlink()
+            except OSError:
+                continue
+            removed.append(temp)
+    return removed
+
+
+def prune_journals(directory: Path, max_age: float = JOURNAL_MAX_AGE) -> None:
+    """
+    Delete journals of runs that were abandoned long ago.
+
+    Args:
+        directory: Journal directory
+        max_age: Age in seconds after which an unused journal is deleted
+    """
+    cutoff = time.time() - max_age
+    try:
+        entries = list(os.scandir(directory))
+    except OSError:
+        return
+    for entry in entries:
+        try:
+            if entry.name.endswith(".sqlite3") and entry.stat().st_mtime < cutoff:
+                for suffix in ("", "-wal", "-shm"):
+                    Path(entry.path + suffix).unlink(missing_ok=True)
+                Path(entry.path).with_suffix(".lock").unlink(missing_ok=True)
+        except OSError:
+            continue
+
+
+class BatchJournal:
+    """
+    Append-only SQLite record of the files a batch has submitted and finished.
+
+    Every state change is a new row in WAL mode, so a run that is killed at
+    any point leaves a consistent journal behind: files whose last event is
+    'done' can be skipped by the next run, and files whose last event is
+    'submitted' may have left temporary outputs that need removing.
+
+    A lock file held for the lifetime of the journal tells a later run
+    whether the run that wrote it is still alive (where fcntl is available).
+    """
+
+    def __init__(self, path: Path):
+        """
+        Open (creating if necessary) and lock a journal.
+
+        Args:
+            path: Path to the SQLite journal file
+
+        Raises:
+            JournalError: If another live run holds the journal, or it cannot
+                be opened
+        """
+        self.path = path
+        self._lock_file = None
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self._lock()
+            self._conn = sqlite3.connect(str(path), timeout=30)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            # With WAL, NORMAL survives a killed process; only an OS crash or
+            # power loss can drop the last few events
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(_SCHEMA)
+        except (OSError, sqlite3.Error) as e:
+            self.close()
+            raise JournalError(f"Cannot open journal {path}: {e}") from e
+
+    def _lock(self) -> None:
+        if fcntl is None:
+            return
+        self._lock_file = open(self.path.with_suffix(".lock"), "a")
+        try:
+            # A POSIX record lock rather than flock: it belongs to this process
+            # only, so forked pool workers that outlive a killed run cannot
+            # keep holding it
+            fcntl.lockf(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            self._lock_file.close()
+            self._lock_file = None
+            raise JournalError(
+                "Another mpress run with the same files and settings is in progress"
+            ) from None
+
+    def reset(self, arguments: Dict[str, Any]) -> None:
+        """
+        Forget all events and start a new run.
+
+        Args:
+            arguments: Description of the batch, stored for reference
+        """
+        with self._conn:
+            self._conn.execute("DELETE FROM events")
+            self._conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('arguments', ?)",
+                (json.dumps(arguments, sort_keys=True, default=str),),
+            )
+
+    def _latest(self) -> List[Tuple]:
+        return self._conn.execute(
+            "SELECT path, event, size, mtime_ns FROM events "
+            "WHERE seq IN (SELECT MAX(seq) FROM events GROUP BY path) ORDER BY seq"
+        ).fetchall()
+
+    def completed(self) -> Dict[str, Optional[Tuple[int, int]]]:
+        """
+        Get the files whose last event is a successful finish.
+
+        Returns:
+            Mapping of path to the (size, mtime_ns) it had when it finished,
+            or None if it no longer existed (e.g. it was converted)
+        """
+        return {
+            path: None if size is None else (size, mtime_ns)
+            for path, event, size, mtime_ns in self._latest()
+            if event == DONE
+        }
+
+    def interrupted(self) -> List[str]:
+        """
+        Get the files that were submitted but never finished.
+
+        Returns:
+            Paths in submission order
+        """
+        return [path for path, event, _, _ in self._latest() if event == SUBMITTED]
+
+    def submitted(self, file_path: str) -> None:
+        """
+        Record that a file is about to be compressed.
+
+        Args:
+            file_path: Path of the input file
+        """
+        with self._conn:
+            self._conn.execute(
+                "INSERT INTO events (path, event, time) VALUES (?, ?, ?)",
+                (file_path, SUBMITTED, time.time()),
+            )
+
+    def finished(self, result: FileResult) -> None:
+        """
+        Record the outcome of a file.
+
+        Args:
+            result: Result from the worker
+        """
+        size = mtime_ns = None
+        if result.success:
+            try:
+                stat = os.stat(result.file_path)
+                size, mtime_ns = stat.st_size, stat.st_mtime_ns
+            except OSError:
+                pass
+        with self._conn:
+            self._conn.execute(
+                "INSERT INTO events (path, event, outcome, bytes_before, bytes_after, "
+                "size, mtime_ns, time) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    result.file_path,
+                    DONE if result.success else FAILED,
+                    result.outcome,
+                    result.bytes_before,
+                    result.bytes_after,
+                    size,
+                    mtime_ns,
+                    time.time(),
+                ),
+            )
+
+    def close(self, delete: bool = False) -> None:
+        """
+        Close the journal and release its lock.
+
+        Args:
+            delete: Also delete the journal files (the run completed, so
+                there is nothing to resume)
+        """
+        conn = getattr(self, "_conn", None)
+        if conn is not None:
+            conn.close()
+            self._conn = None
+        if delete:
+            for suffix in ("", "-wal", "-shm"):
+                Path(str(self.path) + suffix).unlink(missing_ok=True)
+        if self._lock_file is not None:
+            if delete:
+                self.path.with_suffix(".lock").unlink(missing_ok=True)
+            self._lock_file.close()
+            self._lock_file = None
+
+
+def is_unchanged(file_path: str, signature: Optional[Tuple[int, int]]) -> bool:
+    """
+    Check whether a finished file is still as the journal recorded it.
+
+    Args:
+        file_path: Path of the input file
+        signature: (size, mtime_ns) from BatchJournal.completed()
+
+    Returns:
+        True if the file is unchanged, or gone and was gone when it finished
+    """
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return signature is None
+    return signature == (stat.st_size, stat.st_mtime_ns)
@@ -0,0 +1,237 @@
+"""Lossless JPEG optimization: metadata stripping and jpegtran, without decoding pixels."""
+
+import shutil
+import struct
+import subprocess
+from typing import Iterable, Iterator, Optional, Tuple
+
+_SOI = b"\xff\xd8"
+_APP0 = 0xE0
+_APP1 = 0xE1
+_APP2 = 0xE2
+_APP14 = 0xEE
+_APP15 = 0xEF
+_SOS = 0xDA
+_EOI = 0xD9
+_COM = 0xFE
+
+# Markers without a length field (TEM and RST0-RST7)
+_STANDALONE_MARKERS = frozenset((0x01, *range(0xD0, 0xD8)))
+
+# EXIF tag holding the orientation, and the value meaning "as stored"
+_ORIENTATION_TAG = 0x0112
+_ORIENTATION_NORMAL = 1
+
+
+class JpegLosslessError(Exception):
+    """Exception raised when a JPEG cannot be optimized losslessly."""
+
+    pass
+
+
+def has_jpegtran() -> bool:
+    """
+    Check whether jpegtran (from libjpeg or libjpeg-turbo) is installed.
+
+    Returns:
+        True if jpegtran is found in PATH
+    """
+    return shutil.which("jpegtran") is not None
+
+
+def _scan_end(data: bytes, pos: int) -> int:
+    """Find the end of the entropy-coded data starting at pos."""
+    while True:
+        pos = data.find(b"\xff", pos)
+        if pos < 0 or pos + 1 >= len(data):
+            raise JpegLosslessError("Truncated JPEG: no end of image")
+        following = data[pos + 1]
+        # 0xFF 0x00 is an escaped data byte; restart markers stay in the scan
+        if following != 0x00 and following not in _STANDALONE_MARKERS:
+            return pos
+        pos += 2
+
+
+def _segments(data: bytes) -> Iterator[Tuple[int, int, int]]:
+    """
+    Walk the marker segments of a JPEG, from after SOI through EOI.
+
+    Anything after EOI (camera trailers, appended preview images) is not
+    visited.
+
+    Args:
+        data: The whole JPEG file
+
+    Yields:
+        Tuples of (marker, start, end) giving each segment's byte range; the
+        range of an SOS segment includes the entropy-coded data after it
+
+    Raises:
+        JpegLosslessError: If data is not a complete JPEG
+    """
+    if not data.startswith(_SOI):
+        raise JpegLosslessError("Not a JPEG file")
+    pos = 2
+    while True:
+        if pos >= len(data) or data[pos] != 0xFF:
+            raise JpegLosslessError(f"Corrupt JPEG: no marker at byte {pos}")
+        # Markers may be preceded by any number of 0xFF fill bytes
+        while pos < len(data) and data[pos] == 0xFF:
+            pos += 1
+        if pos >= len(data):
+            raise JpegLosslessError("Truncated JPEG: no end of image")
+        marker = data[pos]
+        start = pos - 1
+        pos += 1
+        if marker == _EOI:
+            yield marker, start, pos
+            return
+        if marker not in _STANDALONE_MARKERS:
+            if pos + 2 > len(data):
+                raise JpegLosslessError("Truncated JPEG segment")
+            (length,) = struct.unpack_from(">H", data, pos)
+            pos += length
+            if length < 2 or pos > len(data):
+                raise JpegLosslessError("Truncated JPEG segment")
+            if marker == _SOS:
+                pos = _scan_end(data, pos)
+        yield marker, start, pos
+
+
+def _exif_orientation(payload: bytes) -> Optional[int]:
+    """Read the orientation from an APP1 payload, if it is EXIF and has one."""
+    if not payload.startswith(b"Exif\x00\x00"):
+        return None
+    tiff = payload[6:]
+    byte_order = {b"II": "<", b"MM": ">"}.get(tiff[:2])
+    if byte_order is None:
+        return None
+    try:
+        (ifd,) = struct.unpack_from(byte_order + "I", tiff, 4)
+        (count,) = struct.unpack_from(byte_order + "H", tiff, ifd)
+        for index in range(count):
+            tag, value_type, _, value = struct.unpack_from(
+                byte_order + "HHI4s", tiff, ifd + 2 + 12 * index
+            )
+            if tag == _ORIENTATION_TAG and value_type == 3:  # SHORT
+                return struct.unpack_from(byte_order + "H", value)[0]
+    except struct.error:
+        return None
+    return None
+
+
+def _orientation_segment(orientation: int) -> bytes:
+    """Build an APP1 segment whose EXIF holds nothing but the orientation."""
+    tiff = (
+        b"MM\x00\x2a"
+        + struct.pack(">I", 8)
+        + struct.pack(">H", 1)
+        + struct.pack(">HHIHH", _ORIENTATION_TAG, 3, 1, orientation, 0)
+        + struct.pack(">I", 0)
+    )
+    payload = b"Exif\x00\x00" + tiff
+    return bytes((0xFF, _APP1)) + struct.pack(">H", len(payload) + 2) + payload
+
+
+def strip_metadata(data: bytes, keep: Iterable[str] = ()) -> bytes:
+    """
+    Remove metadata from a JPEG without touching the compressed image.
+
+    EXIF (including its thumbnail), XMP, Photoshop and other APPn segments,
+    comments and data after the end of the image are dropped. The JFIF and
+    Adobe segments stay, as decoders need them to interpret the colors.
+
+    Args:
+        data: The whole JPEG file
+        keep: 'orientation' to keep the EXIF orientation (in a minimal EXIF
+            segment), 'icc' to keep the ICC color profile
+
+    Returns:
+        The stripped JPEG
+
+    Raises:
+        JpegLosslessError: If data is not a complete JPEG
+    """
+    keep = set(keep)
+    view = memoryview(data)
+    parts = [_SOI]
+    orientation = None
+    for marker, start, end in _segments(data):
+        if marker == _APP1:
+            if "orientation" in keep and orientation is None:
+                orientation = _exif_orientation(data[start + 4 : end])
+            continue
+        # Application segments start with an identifier after the length
+        identifier = data[start + 4 : start + 16]
+        if marker == _APP0:
+            keep_segment = identifier.startswith(b"JFIF\x00")
+        elif marker == _APP2:
+            keep_segment = "icc" in keep and identifier.startswith(b"ICC_PROFILE\x00")
+        elif marker == _APP14:
+            keep_segment = identifier.startswith(b"Adobe")
+        else:
+            keep_segment = not (_APP0 <= marker <= _APP15 or marker == _COM)
+        if keep_segment:
+            parts.append(view[start:end])
+
+    if orientation is not None and orientation != _ORIENTATION_NORMAL:
+        # EXIF goes right after SOI, or after JFIF if there is one
+        index = 2 if len(parts) > 1 and parts[1][1] == _APP0 else 1
+        parts.insert(index, _orientation_segment(orientation))
+    return b"".join(parts)
+
+
+def optimize_huffman(data: bytes, progressive: bool = False) -> bytes:
+    """
+    Rewrite a JPEG's entropy coding with jpegtran.
+
+    Optimal Huffman tables (and, optionally, progressive scans) usually
+    save a few percent; the DCT coefficients, and so the pixels, stay
+    exactly the same. Markers are copied unchanged.
+
+    Args:
+        data: The whole JPEG file
+        progressive: Write a progressive JPEG
+
+    Returns:
+        The rewritten JPEG
+
+    Raises:
+        JpegLosslessError: If jpegtran is not installed or fails
+    """
+    jpegtran = shutil.which("jpegtran")
+    if jpegtran is None:
+        raise JpegLosslessError("jpegtran not found")
+    cmd = [jpegtran, "-copy", "all", "-optimize"]
+    if progressive:
+        cmd.append("-progressive")
+    result = subprocess.run(cmd, input=data, capture_output=True)
+    if result.returncode != 0 or not result.stdout:
+        error = result.stderr.decode(errors="replace").strip()
+        raise JpegLosslessError(f"jpegtran failed: {error}")
+    return result.stdout
+
+
+def optimize_jpeg(data: bytes, keep: Iterable[str] = (), progressive: bool = False) -> bytes:
+    """
+    Make a JPEG smaller without decoding or changing its pixels.
+
+    Metadata is always stripped (see strip_metadata). Huffman tables are
+    re-optimized, and progressive scans written, only if jpegtran is
+    installed.
+
+    Args:
+        data: The whole JPEG file
+        keep: Metadata to keep, as for strip_metadata()
+        progressive: Write a progressive JPEG (needs jpegtran)
+
+    Returns:
+        The optimized JPEG
+
+    Raises:
+        JpegLosslessError: If data is not a complete JPEG or jpegtran fails
+    """
+    stripped = strip_metadata(data, keep)
+    if has_jpegtran():
+        return optimize_huffman(stripped, progressive)
+    return stripped
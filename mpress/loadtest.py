@@ -0,0 +1,205 @@
+"""Load generator for the local compression service (mpress serve)."""
+
+import http.client
+import itertools
+import os
+import socket
+import threading
+import time
+from pathlib import Path
+from typing import List, NamedTuple, Optional, Sequence
+
+from mpress.server import DEFAULT_HOST, DEFAULT_PORT
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """HTTP connection over a Unix domain socket."""
+
+    def __init__(self, socket_path: str, timeout: float = 300):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self) -> None:
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+def connect(
+    host: str = DEFAULT_HOST,
+    port: int = DEFAULT_PORT,
+    socket_path: Optional[str] = None,
+    timeout: float = 300,
+) -> http.client.HTTPConnection:
+    """
+    Open a connection to the service.
+
+    Args:
+        host: Service address
+        port: Service TCP port
+        socket_path: Connect to this Unix socket instead of TCP
+        timeout: Socket timeout in seconds
+
+    Returns:
+        Connection (reusable for several requests)
+    """
+    if socket_path is not None:
+        return UnixHTTPConnection(socket_path, timeout)
+    return http.client.HTTPConnection(host, port, timeout=timeout)
+
+
+class LoadTestResult(NamedTuple):
+    """Outcome of a load test run."""
+
+    requests: int
+    # Responses other than 200, not counting 503 rejections
+    errors: int
+    # 503 responses (service at its concurrency limit)
+    rejected: int
+    bytes_sent: int
+    bytes_received: int
+    wall_time: float
+    # Seconds per successful request, sorted
+    latencies: List[float]
+
+    @property
+    def requests_per_s(self) -> float:
+        """Successful requests per second."""
+        return len(self.latencies) / self.wall_time if self.wall_time > 0 else 0.0
+
+    @property
+    def mb_per_s(self) -> float:
+        """Uploaded megabytes (10^6 bytes) per second."""
+        return self.bytes_sent / 1e6 / self.wall_time if self.wall_time > 0 else 0.0
+
+    def percentile(self, fraction: float) -> float:
+        """
+        Get a latency percentile.
+
+        Args:
+            fraction: Percentile as a fraction, e.g. 0.99
+
+        Returns:
+            Latency in seconds (0.0 if no request succeeded)
+        """
+        if not self.latencies:
+            return 0.0
+        index = min(len(self.latencies) - 1, int(fraction * len(self.latencies)))
+        return self.latencies[index]
+
+
+def run_load_test(
+    files: Sequence[Path],
+    requests: int = 100,
+    concurrency: int = 8,
+    host: str = DEFAULT_HOST,
+    port: int = DEFAULT_PORT,
+    socket_path: Optional[str] = None,
+) -> LoadTestResult:
+    """
+    Send compression requests to a running service from several clients.
+
+    Each client thread keeps one keep-alive connection and uploads the files
+    round-robin, streaming them from disk. The files themselves are never
+    modified.
+
+    Args:
+        files: Media files to upload
+        requests: Total number of requests
+        concurrency: Number of concurrent clients
+        host: Service address
+        port: Service TCP port
+        socket_path: Connect to this Unix socket instead of TCP
+
+    Returns:
+        Aggregated LoadTestResult
+    """
+    uploads = itertools.cycle(files)
+    remaining = itertools.count()
+    lock = threading.Lock()
+    latencies: List[float] = []
+    totals = {"errors": 0, "rejected": 0, "sent": 0, "received": 0}
+
+    def client() -> None:
+        conn = connect(host, port, socket_path)
+        try:
+            while True:
+                with lock:
+                    if next(remaining) >= requests:
+                        return
+                    path = next(uploads)
+                size = os.path.getsize(path)
+                extension = path.suffix.lstrip(".").lower()
+                start = time.perf_counter()
+                try:
+                    with open(path, "rb") as body:
+                        conn.request(
+                            "POST",
+                            f"/compress/{extension}",
+                            body=body,
+                            headers={"Content-Length": str(size)},
+                        )
+                    response = conn.getresponse()
+                    received = len(response.read())
+                except (OSError, http.client.HTTPException):
+                    conn.close()
+                    status, received = 0, 0
+                else:
+                    status = response.status
+                    if response.will_close:
+                        conn.close()
+                elapsed = time.perf_counter() - start
+
+                with lock:
+                    totals["sent"] += size
+                    totals["received"] += received
+                    if status == 200:
+                        latencies.append(elapsed)
+                    elif status == 503:
+                        totals["rejected"] += 1
+                    else:
+                        totals["errors"] += 1
+        finally:
+            conn.close()
+
+    threads = [threading.Thread(target=client) for _ in range(max(1, concurrency))]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall_time = time.perf_counter() - start
+
+    return LoadTestResult(
+        requests=requests,
+        errors=totals["errors"],
+        rejected=totals["rejected"],
+        bytes_sent=totals["sent"],
+        bytes_received=totals["received"],
+        wall_time=wall_time,
+        latencies=sorted(latencies),
+    )
+
+
+def fetch_metrics(
+    host: str = DEFAULT_HOST,
+    port: int = DEFAULT_PORT,
+    socket_path: Optional[str] = None,
+) -> str:
+    """
+    Get the service's /metrics text.
+
+    Args:
+        host: Service address
+        port: Service TCP port
+        socket_path: Connect to this Unix socket instead of TCP
+
+    Returns:
+        Prometheus metrics text
+    """
+    conn = connect(host, port, socket_path, timeout=10)
+    try:
+        conn.request("GET", "/metrics")
+        return conn.getresponse().read().decode("utf-8")
+    finally:
+        conn.close()
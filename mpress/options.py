@@ -0,0 +1,164 @@
+"""Compression settings shared by the CLI, batch workers and cache."""
+
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+
+# The tables below are used by the compressors, but live here so the CLI can
+# build its arguments without importing Pillow or the FFmpeg helpers.
+
+# PNG palette quantizers. "auto" keeps exact palettes for images that already
+# have at most 256 colors, then prefers libimagequant (best quality) when
+# Pillow was built with it, and otherwise falls back to the built-in methods.
+PNG_QUANTIZERS = ("auto", "libimagequant", "fastoctree", "mediancut", "maxcoverage")
+DEFAULT_PNG_QUANTIZER = "auto"
+
+# zlib settings for PNG output. Level 9 is the slowest; screenshots usually
+# lose very little at level 6 and encode several times faster.
+DEFAULT_PNG_COMPRESS_LEVEL = 9
+PNG_STRATEGIES = {
+    "default": 0,  # Z_DEFAULT_STRATEGY
+    "filtered": 1,  # Z_FILTERED
+    "huffman": 2,  # Z_HUFFMAN_ONLY
+    "rle": 3,  # Z_RLE, fast and good on flat screenshots
+    "fixed": 4,  # Z_FIXED
+}
+DEFAULT_PNG_STRATEGY = "default"
+
+# Metadata --jpeg-keep can carry over to compressed JPEGs; everything else
+# (EXIF with its thumbnail, XMP, comments, camera trailers) is dropped.
+JPEG_METADATA = ("orientation", "icc")
+
+# JPEGs are first optimized losslessly: metadata stripped and, with jpegtran,
+# Huffman tables re-optimized, without decoding the pixels. The result is used
+# when it saves at least this fraction; otherwise the JPEG is re-encoded.
+DEFAULT_JPEG_LOSSLESS_MIN_GAIN = 0.1
+
+# Modern formats for --target-format: file extension, Pillow format name and
+# encoder settings. Quality values give roughly the visual quality of the
+# JPEG path (quality 85) at 30-50% fewer bytes.
+IMAGE_FORMATS = {
+    "webp": (".webp", "WEBP", {"quality": 80, "method": 4}),
+    "avif": (".avif", "AVIF", {"quality": 60, "speed": 6}),
+}
+
+# Speed profiles map to encoder arguments per codec. All of them are software
+# encoders, so results are the same on any machine; only the speed differs.
+#
+# H.264 uses x264's presets. VP9 defaults to libvpx's "good" deadline at
+# cpu-used 0 with a single thread, which is very slow, so every profile sets
+# cpu-used explicitly and enables row-based multithreading (-row-mt) with
+# tile columns so that the encoder can actually use several cores.
+DEFAULT_PROFILE = "balanced"
+VIDEO_PROFILES = {
+    "fast": {
+        "h264": ["-preset", "veryfast"],
+        "hevc": ["-preset", "fast"],
+        "av1": ["-preset", "10"],
+        "av1-aom": ["-cpu-used", "8", "-row-mt", "1"],
+        "vp9": ["-deadline", "good", "-cpu-used", "5", "-row-mt", "1", "-tile-columns", "2"],
+    },
+    "balanced": {
+        "h264": ["-preset", "medium"],
+        "hevc": ["-preset", "medium"],
+        "av1": ["-preset", "8"],
+        "av1-aom": ["-cpu-used", "6", "-row-mt", "1"],
+        "vp9": ["-deadline", "good", "-cpu-used", "3", "-row-mt", "1", "-tile-columns", "2"],
+    },
+    "archival": {
+        "h264": ["-preset", "slower"],
+        "hevc": ["-preset", "slow"],
+        "av1": ["-preset", "5"],
+        "av1-aom": ["-cpu-used", "4", "-row-mt", "1"],
+        "vp9": [
+            "-deadline",
+            "good",
+            "-cpu-used",
+            "1",
+            "-row-mt",
+            "1",
+            "-tile-columns",
+            "1",
+            "-auto-alt-ref",
+            "1",
+            "-lag-in-frames",
+            "25",
+        ],
+    },
+}
+
+# Modern codecs for --target-format. Each lists its encoders in order of
+# preference as (FFmpeg encoder, VIDEO_PROFILES key, encoder arguments).
+# The CRFs give about the visual quality of the H.264 path at CRF 28.
+VIDEO_FORMATS = {
+    # hvc1 tagging is needed for QuickTime and Safari to play HEVC in MP4/MOV
+    "hevc": [("libx265", "hevc", ["-crf", "30", "-tag:v", "hvc1"])],
+    "av1": [
+        ("libsvtav1", "av1", ["-crf", "35"]),
+        ("libaom-av1", "av1-aom", ["-crf", "35", "-b:v", "0"]),
+    ],
+}
+
+
+# Options that change the output of each file type. Only these are part of the
+# result cache key, so e.g. changing the video profile does not invalidate
+# cached images.
+_IMAGE_OPTIONS = (
+    "png_quantizer",
+    "png_compress_level",
+    "png_strategy",
+    "max_dimension",
+    "scale",
+    "image_format",
+    "target_ssim",
+    "jpeg_keep",
+    "jpeg_progressive",
+    "jpeg_lossless_min_gain",
+)
+_VIDEO_OPTIONS = ("video_profile", "max_dimension", "scale", "video_format", "video_min_ssim")
+
+
+class CompressionOptions(NamedTuple):
+    """
+    Settings that control how files are compressed.
+
+    This is a NamedTuple so it can be sent to worker processes cheaply.
+    """
+
+    video_profile: str = DEFAULT_PROFILE
+    # Split long MOV/MP4 encodes into this many parallel segments (1 = off).
+    # Not part of the cache key: the output quality does not depend on it.
+    video_segments: int = 1
+    png_quantizer: str = DEFAULT_PNG_QUANTIZER
+    png_compress_level: int = DEFAULT_PNG_COMPRESS_LEVEL
+    png_strategy: str = DEFAULT_PNG_STRATEGY
+    # Downscaling for images and videos (None = keep the original size)
+    max_dimension: Optional[int] = None
+    scale: Optional[float] = None
+    # Convert to a modern format (None = keep the original format)
+    image_format: Optional[str] = None
+    video_format: Optional[str] = None
+    # Pick each re-encoded video's CRF by sampling for this SSIM (None = fixed CRF)
+    video_min_ssim: Optional[float] = None
+    # Search each JPEG's quality for this SSIM (None = fixed quality 85)
+    target_ssim: Optional[float] = None
+    # JPEG_METADATA entries to keep, in sorted order
+    jpeg_keep: Tuple[str, ...] = ()
+    jpeg_progressive: bool = False
+    jpeg_lossless_min_gain: float = DEFAULT_JPEG_LOSSLESS_MIN_GAIN
+    # Not part of the cache key: keeping the original does not change the output
+    keep_original: bool = False
+    # Not part of the cache key: flush each new file to disk before it replaces
+    # the original (see atomic_replace)
+    durable: bool = False
+
+    def cache_options(self, file_type: str) -> Dict[str, Any]:
+        """
+        Get the options that affect the output for a file type.
+
+        Args:
+            file_type: 'image' or 'video'
+
+        Returns:
+            Mapping of option name to value, for use in cache keys
+        """
+        names = _IMAGE_OPTIONS if file_type == "image" else _VIDEO_OPTIONS
+        return {name: getattr(self, name) for name in names}
@@ -0,0 +1,308 @@
+"""Video pre-analysis with ffprobe."""
+
+import json
+import shutil
+import subprocess
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import NamedTuple, Optional, Tuple
+
+from mpress.utils import scaled_size
+from mpress.video_compressor import FFmpegNotFoundError, VideoCompressionError
+
+
+# Actions chosen by plan_video()
+ACTION_SKIP = "skip"  # leave the file alone
+ACTION_REMUX = "remux"  # stream-copy into a fresh container with faststart
+ACTION_ENCODE = "encode"  # full re-encode
+
+# Codecs that compress better than what mpress would re-encode a MOV/MP4 to
+EFFICIENT_CODECS = {"hevc", "av1", "vp9"}
+
+# Bits per pixel per frame below which a stream is already low-bitrate.
+# H.264 at CRF 28 typically lands around 0.05-0.1 bpp on camera footage and
+# far lower on screen recordings, so re-encoding below this rarely pays off.
+LOW_BITRATE_BPP = 0.05
+
+# Rough bits per pixel per frame that mpress's encoders produce, used to
+# predict output sizes (camera footage; screen recordings come out smaller)
+EXPECTED_BPP = {".mov": 0.06, ".mp4": 0.06, ".webm": 0.045}
+
+# Probe results kept in memory, keyed by stat signature (device, inode, size,
+# mtime) so that different spellings of the same path share an entry
+_PROBE_CACHE_SIZE = 1024
+_probe_cache: "OrderedDict[Tuple[int, int, int, int], VideoProbe]" = OrderedDict()
+_probe_cache_lock = threading.Lock()
+
+
+class VideoProbe(NamedTuple):
+    """What ffprobe reports about a media file."""
+
+    size: int  # bytes
+    duration: Optional[float]  # seconds
+    bit_rate: Optional[int]  # overall bits per second
+    video_codec: Optional[str]  # None if there is no video stream
+    video_bit_rate: Optional[int]
+    width: int
+    height: int
+    frame_rate: float
+    audio_codec: Optional[str]
+    audio_bit_rate: Optional[int]
+
+    @property
+    def bits_per_pixel(self) -> Optional[float]:
+        """Video bits per pixel per frame, or None if unknown."""
+        bit_rate = self.video_bit_rate or self.bit_rate
+        pixel_rate = self.width * self.height * self.frame_rate
+        if not bit_rate or not pixel_rate:
+            return None
+        return bit_rate / pixel_rate
+
+
+def check_ffprobe_available() -> bool:
+    """
+    Check if ffprobe is available on the system.
+
+    Returns:
+        True if ffprobe is available, False otherwise
+    """
+    return shutil.which("ffprobe") is not None
+
+
+def get_ffprobe_path() -> str:
+    """
+    Get the path to the ffprobe executable.
+
+    Returns:
+        Path to ffprobe executable
+
+    Raises:
+        FFmpegNotFoundError: If ffprobe is not found
+    """
+    ffprobe_path = shutil.which("ffprobe")
+    if ffprobe_path is None:
+        raise FFmpegNotFoundError(
+            "ffprobe is not installed or not in PATH. "
+            "Please install FFmpeg: brew install ffmpeg"
+        )
+    return ffprobe_path
+
+
+def _to_int(value) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_float(value) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _parse_frame_rate(value: Optional[str]) -> float:
+    """Parse an ffprobe rational frame rate such as '30000/1001'."""
+    if not value:
+        return 0.0
+    numerator, _, denominator = value.partition("/")
+    try:
+        if denominator:
+            return float(numerator) / float(denominator) if float(denominator) else 0.0
+        return float(numerator)
+    except ValueError:
+        return 0.0
+
+
+def parse_probe(data: dict, size: int) -> VideoProbe:
+    """
+    Build a VideoProbe from ffprobe's JSON output.
+
+    Args:
+        data: Parsed output of ffprobe -show_format -show_streams
+        size: File size in bytes
+
+    Returns:
+        VideoProbe describing the first video and audio streams
+    """
+    streams = data.get("streams", [])
+    fmt = data.get("format", {})
+    video = next(
+        (
+            stream
+            for stream in streams
+            if stream.get("codec_type") == "video"
+            # Cover art is stored as a single-frame video stream
+            and not stream.get("disposition", {}).get("attached_pic")
+        ),
+        None,
+    )
+    audio = next((stream for stream in streams if stream.get("codec_type") == "audio"), None)
+
+    return VideoProbe(
+        size=size,
+        duration=_to_float(fmt.get("duration")),
+        bit_rate=_to_int(fmt.get("bit_rate")),
+        video_codec=video.get("codec_name") if video else None,
+        video_bit_rate=_to_int(video.get("bit_rate")) if video else None,
+        width=_to_int(video.get("width")) or 0 if video else 0,
+        height=_to_int(video.get("height")) or 0 if video else 0,
+        frame_rate=_parse_frame_rate(video.get("avg_frame_rate")) if video else 0.0,
+        audio_codec=audio.get("codec_name") if audio else None,
+        audio_bit_rate=_to_int(audio.get("bit_rate")) if audio else None,
+    )
+
+
+def probe_video(input_path: Path) -> VideoProbe:
+    """
+    Probe a video file with ffprobe.
+
+    Results are cached in memory by file identity, size and modification
+    time, so a file probed while scheduling a batch is not probed again by
+    its worker.
+
+    Args:
+        input_path: Path to the video file
+
+    Returns:
+        VideoProbe for the file
+
+    Raises:
+        FFmpegNotFoundError: If ffprobe is not available
+        VideoCompressionError: If ffprobe cannot read the file
+    """
+    stat = input_path.stat()
+    key = (stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+    with _probe_cache_lock:
+        if key in _probe_cache:
+            _probe_cache.move_to_end(key)
+            return _probe_cache[key]
+
+    cmd = [
+        get_ffprobe_path(),
+        "-v",
+        "error",
+        "-print_format",
+        "json",
+        "-show_format",
+        "-show_streams",
+        str(input_path),
+    ]
+    try:
+        result = subprocess.run(
+            cmd,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            check=False,
+        )
+    except FileNotFoundError:
+        raise FFmpegNotFoundError(
+            "ffprobe executable not found. Please install FFmpeg: brew install ffmpeg"
+        )
+
+    if result.returncode != 0:
+        error_msg = result.stderr.decode("utf-8", errors="ignore").strip()
+        raise VideoCompressionError(f"ffprobe failed for {input_path}: {error_msg}")
+    try:
+        probe = parse_probe(json.loads(result.stdout), stat.st_size)
+    except ValueError as e:
+        raise VideoCompressionError(f"Unreadable ffprobe output for {input_path}: {e}") from e
+
+    with _probe_cache_lock:
+        _probe_cache[key] = probe
+        while len(_probe_cache) > _PROBE_CACHE_SIZE:
+            _probe_cache.popitem(last=False)
+    return probe
+
+
+def plan_video(probe: VideoProbe, extension: str) -> Tuple[str, str]:
+    """
+    Decide how to handle a video.
+
+    Args:
+        probe: Probe result for the file
+        extension: Lower-case file extension ('.mov', '.mp4' or '.webm')
+
+    Returns:
+        Tuple of (action, reason) where action is ACTION_SKIP, ACTION_REMUX
+        or ACTION_ENCODE
+    """
+    if probe.video_codec is None:
+        return ACTION_SKIP, "no video stream"
+
+    bpp = probe.bits_per_pixel
+    low_bitrate = bpp is not None and bpp < LOW_BITRATE_BPP
+
+    if extension == ".webm":
+        if probe.video_codec in ("vp9", "av1") and low_bitrate:
+            return ACTION_SKIP, f"already low-bitrate {probe.video_codec}"
+        return ACTION_ENCODE, f"{probe.video_codec} at {_format_bpp(bpp)}"
+
+    if probe.video_codec in EFFICIENT_CODECS:
+        return ACTION_SKIP, f"already {probe.video_codec}"
+    if probe.video_codec == "h264" and low_bitrate:
+        return ACTION_REMUX, f"already low-bitrate h264 ({_format_bpp(bpp)})"
+    return ACTION_ENCODE, f"{probe.video_codec} at {_format_bpp(bpp)}"
+
+
+def plan_compression(
+    probe: VideoProbe,
+    extension: str,
+    video_format: Optional[str] = None,
+    max_dimension: Optional[int] = None,
+    scale: Optional[float] = None,
+) -> str:
+    """
+    Decide how compress_video() will handle a video with these settings.
+
+    Args:
+        probe: Probe result for the file
+        extension: Lower-case file extension
+        video_format: Target format (a key of VIDEO_FORMATS), or None
+        max_dimension: Downscaling, if any
+        scale: Downscaling, if any
+
+    Returns:
+        ACTION_SKIP, ACTION_REMUX or ACTION_ENCODE
+    """
+    action, _ = plan_video(probe, extension)
+    if probe.video_codec is None:
+        # Nothing to transcode or downscale
+        return action
+    if video_format is not None:
+        # Transcode anything that is not already in the target codec
+        action = ACTION_SKIP if probe.video_codec == video_format else ACTION_ENCODE
+    frame_size = (probe.width, probe.height)
+    if scaled_size(frame_size, max_dimension, scale) != frame_size:
+        # Downscaling needs a re-encode even if the codec is efficient
+        action = ACTION_ENCODE
+    return action
+
+
+def estimate_output_size(probe: VideoProbe, extension: str, action: str) -> int:
+    """
+    Predict the size of the file after handling it.
+
+    Args:
+        probe: Probe result for the file
+        extension: Lower-case file extension
+        action: Action from plan_video()
+
+    Returns:
+        Predicted size in bytes (never more than the current size, since
+        larger outputs are discarded)
+    """
+    if action != ACTION_ENCODE or not probe.duration:
+        return probe.size
+
+    pixel_rate = probe.width * probe.height * probe.frame_rate
+    video_bits = EXPECTED_BPP.get(extension, 0.06) * pixel_rate * probe.duration
+    audio_bits = (probe.audio_bit_rate or 0) * probe.duration
+    return min(probe.size, int((video_bits + audio_bits) / 8))
+
+
+def _format_bpp(bpp: Optional[float]) -> str:
+    return "unknown bitrate" if bpp is None else f"{bpp:.3f} bits/pixel"
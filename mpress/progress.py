@@ -0,0 +1,196 @@
+"""Live progress display for batch runs."""
+
+import os
+import sys
+import threading
+import time
+from typing import TYPE_CHECKING, Dict, Optional, TextIO, Tuple
+
+from mpress.utils import format_duration, format_size
+
+if TYPE_CHECKING:
+    # Only for annotations: the display itself never needs the FFmpeg helpers
+    from typing import Callable
+
+    from mpress.video_compressor import EncodeProgress
+
+
+# Minimum seconds between redraws triggered by FFmpeg progress updates
+REFRESH_INTERVAL = 0.2
+
+_CLEAR_LINE = "\x1b[2K"
+_CURSOR_UP = "\x1b[1A"
+
+
+class ProgressDashboard:
+    """
+    Multi-line status display shared by all workers in a batch.
+
+    Shows one line per running video encode (fps, speed, percentage and ETA)
+    and a summary line with the number of finished files and total bytes saved.
+    Videos announced with expect() also count towards a predicted saving and
+    an ETA for all queued video work.
+
+    The display is drawn on a terminal stream with ANSI escapes and erased
+    whenever a regular message is printed, so output stays readable.
+
+    When the stream is not a terminal the dashboard draws nothing, but still
+    keeps the totals used for the final summary.
+    """
+
+    def __init__(
+        self,
+        stream: TextIO = sys.stderr,
+        enabled: Optional[bool] = None,
+        video_jobs: int = 1,
+    ):
+        """
+        Args:
+            stream: Stream to draw on
+            enabled: Whether to draw; defaults to whether stream is a terminal
+            video_jobs: Number of concurrent video encodes, for the batch ETA
+        """
+        if enabled is None:
+            enabled = stream.isatty() and os.environ.get("TERM") != "dumb"
+        self.stream = stream
+        self.enabled = enabled
+        self.files_done = 0
+        self.bytes_before = 0
+        self.bytes_after = 0
+        self.video_jobs = max(1, video_jobs)
+        self._active: "Dict[str, Optional[EncodeProgress]]" = {}
+        # file_path -> (duration in seconds, predicted bytes saved)
+        self._expected: Dict[str, Tuple[float, int]] = {}
+        self._last_speed: Optional[float] = None
+        self._lock = threading.RLock()
+        self._drawn_lines = 0
+        self._last_draw = 0.0
+
+    @property
+    def bytes_saved(self) -> int:
+        """Total bytes saved by the files finished so far."""
+        return self.bytes_before - self.bytes_after
+
+    def expect(self, file_path: str, duration: float, expected_saving: int) -> None:
+        """
+        Announce a queued video so it counts towards batch-wide predictions.
+
+        Args:
+            file_path: Path of the video
+            duration: Seconds of media that will be encoded (0 if skipped)
+            expected_saving: Predicted bytes saved
+        """
+        with self._lock:
+            self._expected[file_path] = (duration, expected_saving)
+
+    def track(self, file_path: str) -> "Callable[[EncodeProgress], None]":
+        """
+        Register a running encode and get its progress callback.
+
+        Args:
+            file_path: Path of the file being encoded
+
+        Returns:
+            Callback to pass as on_progress to the video compressor
+        """
+        with self._lock:
+            self._active[file_path] = None
+
+        def update(progress: "EncodeProgress") -> None:
+            with self._lock:
+                if file_path not in self._active:
+                    return
+                self._active[file_path] = progress
+                if progress.speed > 0:
+                    self._last_speed = progress.speed
+                now = time.monotonic()
+                if now - self._last_draw >= REFRESH_INTERVAL:
+                    self._redraw()
+
+        return update
+
+    def finish(self, file_path: str, bytes_before: int, bytes_after: int) -> None:
+        """
+        Record a finished file and stop tracking it.
+
+        Args:
+            file_path: Path of the finished file
+            bytes_before: Size before compression
+            bytes_after: Size after compression
+        """
+        with self._lock:
+            self._active.pop(file_path, None)
+            self._expected.pop(file_path, None)
+            self.files_done += 1
+            self.bytes_before += bytes_before
+            self.bytes_after += bytes_after
+            self._redraw()
+
+    def print(self, message: str, file: TextIO = sys.stdout) -> None:
+        """
+        Print a message above the dashboard.
+
+        Args:
+            message: Message to print
+            file: Stream to print the message to
+        """
+        with self._lock:
+            self._erase()
+            print(message, file=file, flush=True)
+            self._redraw()
+
+    def close(self) -> None:
+        """Erase the dashboard from the terminal."""
+        with self._lock:
+            self._erase()
+            self._active.clear()
+
+    def _erase(self) -> None:
+        if self._drawn_lines:
+            self.stream.write((_CURSOR_UP + _CLEAR_LINE) * self._drawn_lines)
+            self.stream.flush()
+            self._drawn_lines = 0
+
+    def _redraw(self) -> None:
+        if not self.enabled:
+            return
+        lines = [self._format_active(path, progress) for path, progress in self._active.items()]
+        lines.append(self._format_summary())
+        self._erase()
+        for line in lines:
+            self.stream.write(_CLEAR_LINE + line + "\n")
+        self.stream.flush()
+        self._drawn_lines = len(lines)
+        self._last_draw = time.monotonic()
+
+    def _format_summary(self) -> str:
+        summary = f"{self.files_done} files done, {format_size(self.bytes_saved)} saved"
+        if not self._expected:
+            return summary
+
+        expected_saving = sum(saving for _, saving in self._expected.values())
+        summary += f", ~{format_size(expected_saving)} more expected"
+
+        # Media seconds still to encode, spread over the video workers at the
+        # most recently observed encoding speed
+        remaining = sum(duration for duration, _ in self._expected.values())
+        remaining -= sum(progress.out_time for progress in self._active.values() if progress)
+        if self._last_speed and remaining > 0:
+            eta = remaining / (self._last_speed * self.video_jobs)
+            summary += f", videos ETA {format_duration(eta)}"
+        return summary
+
+    @staticmethod
+    def _format_active(file_path: str, progress: "Optional[EncodeProgress]") -> str:
+        name = os.path.basename(file_path)
+        if progress is None:
+            return f"  {name}: starting"
+        parts = [f"  {name}:"]
+        if progress.fraction is not None:
+            parts.append(f"{progress.fraction:4.0%}")
+        parts.append(f"{progress.fps:.1f} fps")
+        if progress.speed:
+            parts.append(f"{progress.speed:.2f}x")
+        if progress.eta is not None:
+            parts.append(f"ETA {format_duration(progress.eta)}")
+        return " ".join(parts)
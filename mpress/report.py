@@ -0,0 +1,246 @@
+"""JSON and Prometheus reports of a batch run's timings and savings."""
+
+import json
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import mpress
+from mpress.batch import FileResult
+from mpress.dedup import DedupSummary
+from mpress.timing import STAGES, percentile
+from mpress.utils import atomic_replace, fsync_directory
+
+REPORT_VERSION = 1
+
+# Percentiles given for each stage, as (label, fraction)
+REPORT_PERCENTILES = (("p50", 0.5), ("p95", 0.95))
+
+
+class BatchReport:
+    """Collects FileResults of a batch and summarizes where the time went."""
+
+    def __init__(self, per_file: bool = True):
+        """
+        Args:
+            per_file: Keep an entry for every file in the JSON report, not
+                just the summary
+        """
+        self.per_file = per_file
+        self.started = time.time()
+        self._start = time.perf_counter()
+        self.wall_seconds: Optional[float] = None
+        self.outcomes: Counter = Counter()
+        self.succeeded = 0
+        self.failed = 0
+        self.bytes_before = 0
+        self.bytes_after = 0
+        self.stage_seconds: Dict[str, List[float]] = {}
+        # Qualities chosen by --target-ssim, and the bytes that saved over
+        # encoding at the fixed quality
+        self.jpeg_qualities: List[int] = []
+        self.jpeg_bytes_saved_vs_q85 = 0
+        # CRFs chosen by --video-min-ssim
+        self.video_crfs: List[int] = []
+        # Duplicates given another file's output by --dedup
+        self.dedup = DedupSummary()
+        self.files: List[Dict[str, Any]] = []
+
+    def add(self, result: FileResult) -> None:
+        """
+        Add a file's result.
+
+        Args:
+            result: Result from the worker, with stage timings if the worker
+                was asked to record them
+        """
+        self.outcomes[result.outcome] += 1
+        if result.success:
+            self.succeeded += 1
+        else:
+            self.failed += 1
+        self.bytes_before += result.bytes_before
+        self.bytes_after += result.bytes_after
+        for name, seconds in result.stages:
+            self.stage_seconds.setdefault(name, []).append(seconds)
+        details = dict(result.details)
+        if "jpeg_quality" in details:
+            self.jpeg_qualities.append(details["jpeg_quality"])
+            self.jpeg_bytes_saved_vs_q85 += details["jpeg_bytes_saved_vs_q85"]
+        if "video_crf" in details:
+            self.video_crfs.append(details["video_crf"])
+        self.dedup.add(result)
+        if self.per_file:
+            entry = {
+                "path": result.file_path,
+                "outcome": result.outcome,
+                "bytes_before": result.bytes_before,
+                "bytes_after": result.bytes_after,
+                "stages": dict(result.stages),
+            }
+            if details:
+                entry["details"] = details
+            self.files.append(entry)
+
+    def finish(self) -> None:
+        """Stop the wall clock (otherwise it stops when the report is built)."""
+        self.wall_seconds = time.perf_counter() - self._start
+
+    def stage_summary(self) -> Dict[str, Dict[str, float]]:
+        """
+        Summarize the recorded stages.
+
+        Returns:
+            For each stage (in pipeline order, unknown stages last): count of
+            files that ran it, total seconds, the REPORT_PERCENTILES and max
+        """
+        order = {name: index for index, name in enumerate(STAGES)}
+        summary = {}
+        names = sorted(self.stage_seconds, key=lambda name: (order.get(name, len(order)), name))
+        for name in names:
+            values = sorted(self.stage_seconds[name])
+            entry = {"count": len(values), "seconds": sum(values)}
+            for label, fraction in REPORT_PERCENTILES:
+                entry[label] = percentile(values, fraction)
+            entry["max"] = values[-1]
+            summary[name] = entry
+        return summary
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Build the JSON report.
+
+        Returns:
+            JSON-serializable report
+        """
+        wall_seconds = self.wall_seconds
+        if wall_seconds is None:
+            wall_seconds = time.perf_counter() - self._start
+        saved = self.bytes_before - self.bytes_after
+        report = {
+            "report_version": REPORT_VERSION,
+            "mpress_version": mpress.__version__,
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S%z", time.localtime(self.started)),
+            "wall_seconds": wall_seconds,
+            "files": {
+                "succeeded": self.succeeded,
+                "failed": self.failed,
+                "outcomes": dict(sorted(self.outcomes.items())),
+            },
+            "bytes": {
+                "before": self.bytes_before,
+                "after": self.bytes_after,
+                "saved": saved,
+                "saved_ratio": saved / self.bytes_before if self.bytes_before else 0.0,
+            },
+            "stages": self.stage_summary(),
+        }
+        if self.jpeg_qualities:
+            qualities = sorted(self.jpeg_qualities)
+            report["jpeg_search"] = {
+                "files": len(qualities),
+                "quality_p50": percentile(qualities, 0.5),
+                "quality_min": qualities[0],
+                "bytes_saved_vs_q85": self.jpeg_bytes_saved_vs_q85,
+            }
+        if self.video_crfs:
+            crfs = sorted(self.video_crfs)
+            report["video_crf_search"] = {
+                "files": len(crfs),
+                "crf_p50": percentile(crfs, 0.5),
+                "crf_min": crfs[0],
+                "crf_max": crfs[-1],
+            }
+        if self.dedup.files:
+            report["dedup"] = {
+                "files": self.dedup.files,
+                "cpu_seconds_saved": self.dedup.cpu_seconds,
+                "bytes_saved": self.dedup.bytes_saved,
+            }
+        if self.per_file:
+            report["per_file"] = self.files
+        return report
+
+    def render_prometheus(self) -> str:
+        """
+        Format the summary in the Prometheus text exposition format.
+
+        Stage timings are exported as summaries; the other values are gauges
+        describing the last run, as suits the node_exporter textfile collector.
+
+        Returns:
+            Metrics text, one sample per line
+        """
+        report = self.to_dict()
+        lines = [
+            "# TYPE mpress_batch_last_run_timestamp_seconds gauge",
+            f"mpress_batch_last_run_timestamp_seconds {self.started:.3f}",
+            "# TYPE mpress_batch_duration_seconds gauge",
+            f"mpress_batch_duration_seconds {report['wall_seconds']:g}",
+            "# TYPE mpress_batch_files gauge",
+        ]
+        for outcome, count in report["files"]["outcomes"].items():
+            lines.append(f'mpress_batch_files{{outcome="{outcome}"}} {count}')
+        lines += [
+            "# TYPE mpress_batch_bytes_before gauge",
+            f"mpress_batch_bytes_before {self.bytes_before}",
+            "# TYPE mpress_batch_bytes_after gauge",
+            f"mpress_batch_bytes_after {self.bytes_after}",
+        ]
+        if self.jpeg_qualities:
+            lines += [
+                "# TYPE mpress_batch_jpeg_bytes_saved_vs_q85 gauge",
+                f"mpress_batch_jpeg_bytes_saved_vs_q85 {self.jpeg_bytes_saved_vs_q85}",
+            ]
+        if self.dedup.files:
+            lines += [
+                "# TYPE mpress_batch_dedup_cpu_seconds_saved gauge",
+                f"mpress_batch_dedup_cpu_seconds_saved {self.dedup.cpu_seconds:g}",
+            ]
+        lines.append("# TYPE mpress_batch_stage_seconds summary")
+        for name, entry in report["stages"].items():
+            for label, fraction in REPORT_PERCENTILES:
+                lines.append(
+                    f'mpress_batch_stage_seconds{{stage="{name}",quantile="{fraction:g}"}} '
+                    f"{entry[label]:g}"
+                )
+            lines.append(f'mpress_batch_stage_seconds_sum{{stage="{name}"}} {entry["seconds"]:g}')
+            lines.append(f'mpress_batch_stage_seconds_count{{stage="{name}"}} {entry["count"]}')
+        return "\n".join(lines) + "\n"
+
+    def write_json(self, path: Path) -> None:
+        """
+        Write the JSON report.
+
+        Args:
+            path: Output file
+
+        Raises:
+            OSError: If the file cannot be written
+        """
+        _write_atomically(Path(path), json.dumps(self.to_dict(), indent=2) + "\n")
+
+    def write_prometheus(self, path: Path) -> None:
+        """
+        Write the metrics to a file for the node_exporter textfile collector.
+
+        The file is replaced atomically, so the collector never reads a
+        partial file.
+
+        Args:
+            path: Output file, conventionally ending in '.prom'
+
+        Raises:
+            OSError: If the file cannot be written
+        """
+        _write_atomically(Path(path), self.render_prometheus())
+
+
+def _write_atomically(path: Path, text: str) -> None:
+    """Write text to a temporary sibling and durably rename it over path."""
+    temp_path = path.parent / f".{path.name}.tmp"
+    temp_path.write_text(text, encoding="utf-8")
+    atomic_replace(temp_path, path, durable=True)
+    # The rename is only on disk once the directory is flushed
+    fsync_directory(path.parent)
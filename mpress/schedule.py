@@ -0,0 +1,361 @@
+"""Order a batch by the bytes each file is expected to save per CPU-second."""
+
+import functools
+import io
+import re
+import subprocess
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from PIL import Image, JpegImagePlugin
+
+from mpress.batch import classify_path, default_jobs
+from mpress.cache import ResultCache, settings_key
+from mpress.crf_search import CRF_SEARCH_BUDGET
+from mpress.image_compressor import encode_image, encode_jpeg_losslessly
+from mpress.options import CompressionOptions
+from mpress.probe import (
+    ACTION_ENCODE,
+    ACTION_SKIP,
+    check_ffprobe_available,
+    plan_compression,
+    probe_video,
+)
+from mpress.utils import scaled_size
+from mpress.video_compressor import (
+    VideoCompressionError,
+    get_codec_args,
+    get_encoder_args,
+    get_ffmpeg_path,
+    get_scale_args,
+    get_video_encoder,
+)
+
+# Images are estimated from a copy at most this large. Smaller copies make
+# the fixed cost of an encode look like per-pixel cost.
+SAMPLE_MAX_DIMENSION = 512
+
+# Videos are estimated by encoding this many seconds from the middle
+SLICE_SECONDS = 2.0
+
+# Cost of a file beyond what its sample shows: starting the task, reading
+# the file, committing the output
+_FILE_OVERHEAD_SECONDS = 0.01
+
+# Remuxing only copies streams, at roughly disk speed
+_REMUX_BYTES_PER_SECOND = 200 * 1024 * 1024
+
+_BENCH_RE = re.compile(r"bench: utime=([\d.]+)s stime=([\d.]+)s rtime=([\d.]+)s")
+
+
+class Estimate(NamedTuple):
+    """Predicted outcome of compressing one file."""
+
+    bytes_saved: int
+    cpu_seconds: float
+    # Time the file occupies its worker; below cpu_seconds for multithreaded
+    # video encoders
+    wall_seconds: float
+
+    @property
+    def rate(self) -> float:
+        """Bytes saved per CPU-second."""
+        return self.bytes_saved / max(self.cpu_seconds, _FILE_OVERHEAD_SECONDS)
+
+
+# Files that cannot be estimated, are skipped or are already compressed
+_NOTHING = Estimate(0, _FILE_OVERHEAD_SECONDS, _FILE_OVERHEAD_SECONDS)
+
+
+def estimate_image(input_path: Path, options: CompressionOptions) -> Estimate:
+    """
+    Predict an image's saving and cost by compressing a small copy.
+
+    The copy is saved once the way the original is stored (same format and,
+    for JPEGs, the same quantization tables) and once with mpress's
+    settings; the ratio of the two is applied to the file. CPU time is
+    scaled up by the ratio of pixels. JPEGs that the lossless tier would
+    handle are optimized for real, as that is cheap.
+
+    Args:
+        input_path: Image to estimate
+        options: Compression settings of the batch
+
+    Returns:
+        The estimate
+
+    Raises:
+        OSError: If the file cannot be read
+        ImageCompressionError: If the format is unsupported
+    """
+    start = time.process_time()
+    data = input_path.read_bytes()
+    size = len(data)
+    with Image.open(io.BytesIO(data)) as img:
+        full_size = img.size
+        output_size = scaled_size(full_size, options.max_dimension, options.scale)
+        source_format = img.format
+        if (
+            source_format == "JPEG"
+            and options.image_format is None
+            and options.max_dimension is None
+            and options.scale is None
+            and options.jpeg_lossless_min_gain < 1
+        ):
+            optimized = encode_jpeg_losslessly(
+                data, options.jpeg_lossless_min_gain, options.jpeg_keep, options.jpeg_progressive
+            )
+            if optimized is not None:
+                cpu_seconds = time.process_time() - start + _FILE_OVERHEAD_SECONDS
+                return Estimate(size - len(optimized), cpu_seconds, cpu_seconds)
+
+        reference_options = {}
+        if source_format == "JPEG":
+            reference_options = {
+                "qtables": img.quantization,
+                "subsampling": JpegImagePlugin.get_sampling(img),
+            }
+            # Decode at 1/2, 1/4 or 1/8 scale
+            img.draft(img.mode, (SAMPLE_MAX_DIMENSION, SAMPLE_MAX_DIMENSION))
+        decoded_pixels = img.width * img.height
+        img.load()
+        decode_seconds = time.process_time() - start
+
+        # Nearest-neighbour sampling adds no colors, so screenshots still
+        # take quantize_png's exact-palette path, and palettes are kept
+        sample_size = scaled_size(img.size, SAMPLE_MAX_DIMENSION)
+        sample = img.resize(sample_size, Image.Resampling.NEAREST)
+        reference = io.BytesIO()
+        sample.save(reference, source_format, **reference_options)
+        reference_bytes = reference.tell()
+
+    encode_start = time.process_time()
+    reference.seek(0)
+    compressed = io.BytesIO()
+    encode_image(
+        reference,
+        compressed,
+        options.image_format,
+        png_quantizer=options.png_quantizer,
+        png_compress_level=options.png_compress_level,
+        png_strategy=options.png_strategy,
+        target_ssim=options.target_ssim,
+        jpeg_keep=options.jpeg_keep,
+        jpeg_progressive=options.jpeg_progressive,
+        jpeg_lossless_min_gain=1.0,
+    )
+    encode_seconds = time.process_time() - encode_start
+
+    full_pixels = full_size[0] * full_size[1]
+    output_pixels = output_size[0] * output_size[1]
+    sample_pixels = sample_size[0] * sample_size[1]
+    ratio = compressed.tell() / reference_bytes
+    predicted = size * ratio * output_pixels / full_pixels
+    cpu_seconds = (
+        decode_seconds * full_pixels / decoded_pixels
+        + encode_seconds * output_pixels / sample_pixels
+        + _FILE_OVERHEAD_SECONDS
+    )
+    return Estimate(max(0, int(size - predicted)), cpu_seconds, cpu_seconds)
+
+
+def estimate_video(input_path: Path, options: CompressionOptions) -> Estimate:
+    """
+    Predict a video's saving and cost by encoding a short slice.
+
+    SLICE_SECONDS from the middle of the video are encoded in memory with the
+    batch's settings (video only; audio is assumed to keep its bitrate).
+    FFmpeg's -benchmark gives the slice's CPU and wall time, and both the
+    size and the times are scaled up to the whole duration.
+
+    Args:
+        input_path: Video to estimate
+        options: Compression settings of the batch
+
+    Returns:
+        The estimate (saving nothing for videos ffprobe is unavailable for,
+        or that would be skipped or only remuxed)
+
+    Raises:
+        VideoCompressionError: If probing or encoding the slice fails
+    """
+    if not check_ffprobe_available():
+        return _NOTHING
+    extension = input_path.suffix.lower()
+    probe = probe_video(input_path)
+    action = plan_compression(
+        probe, extension, options.video_format, options.max_dimension, options.scale
+    )
+    if action == ACTION_SKIP or not probe.duration or not probe.frame_rate:
+        return _NOTHING
+    if action != ACTION_ENCODE:
+        seconds = _FILE_OVERHEAD_SECONDS + probe.size / _REMUX_BYTES_PER_SECOND
+        return Estimate(0, seconds, seconds)
+
+    if options.video_format is not None:
+        encoder, profile_key, encoder_args = get_video_encoder(options.video_format)
+        codec_args = [
+            "-c:v",
+            encoder,
+            *encoder_args,
+            *get_encoder_args(options.video_profile, profile_key),
+            *get_scale_args(options.max_dimension, options.scale),
+        ]
+    else:
+        container = "webm" if extension == ".webm" else "mp4"
+        codec_args = get_codec_args(
+            container, options.video_profile, options.max_dimension, options.scale
+        )
+    length = min(SLICE_SECONDS, probe.duration)
+    start = max(0.0, probe.duration / 2 - length / 2)
+    frames = max(1, round(length * probe.frame_rate))
+    cmd = [
+        get_ffmpeg_path(),
+        "-hide_banner",
+        "-nostats",
+        "-benchmark",
+        # Start at the keyframe before, rather than decoding up to the exact
+        # time, which would add the cost of decoding part of a GOP
+        "-noaccurate_seek",
+        "-ss",
+        f"{start:.3f}",
+        "-i",
+        str(input_path),
+        "-map",
+        "0:v:0",
+        "-frames:v",
+        str(frames),
+        *codec_args,
+        "-an",
+        "-f",
+        "matroska",
+        "pipe:1",
+    ]
+    try:
+        result = subprocess.run(cmd, stdin=subprocess.DEVNULL, capture_output=True)
+    except OSError as e:
+        raise VideoCompressionError(f"Failed to run FFmpeg for {input_path}: {e}") from e
+    stderr = result.stderr.decode(errors="replace")
+    bench = _BENCH_RE.search(stderr)
+    if result.returncode != 0 or bench is None or not result.stdout:
+        tail = "\n".join(stderr.splitlines()[-5:])
+        raise VideoCompressionError(f"Failed to encode a slice of {input_path}: {tail}")
+
+    factor = probe.duration * probe.frame_rate / frames
+    predicted = len(result.stdout) * factor + (probe.audio_bit_rate or 0) * probe.duration / 8
+    user, system, real = (float(value) for value in bench.groups())
+    cpu_seconds = (user + system) * factor + _FILE_OVERHEAD_SECONDS
+    wall_seconds = real * factor + _FILE_OVERHEAD_SECONDS
+    if options.video_min_ssim is not None and options.video_format is None:
+        cpu_seconds *= 1 + CRF_SEARCH_BUDGET
+        wall_seconds *= 1 + CRF_SEARCH_BUDGET
+    # Larger outputs are discarded, so the saving is never negative
+    return Estimate(max(0, int(probe.size - predicted)), cpu_seconds, wall_seconds)
+
+
+def estimate_file(
+    file_path: str,
+    file_type: Optional[str] = None,
+    options: CompressionOptions = CompressionOptions(),
+    cache: Optional[ResultCache] = None,
+) -> Estimate:
+    """
+    Predict a file's saving and cost.
+
+    Estimates only steer the order of the batch, so they never fail: files
+    that are already compressed, or cannot be estimated, are predicted to
+    save nothing. Their errors are reported when they are compressed.
+
+    Args:
+        file_path: File to estimate
+        file_type: 'image' or 'video', or None to go by the extension
+        options: Compression settings of the batch
+        cache: Result cache; cached files would be skipped
+
+    Returns:
+        The estimate
+    """
+    file_type = file_type or classify_path(file_path)
+    path = Path(file_path)
+    try:
+        if file_type is None:
+            return _NOTHING
+        if cache is not None and cache.lookup(
+            path, settings_key(path, **options.cache_options(file_type))
+        ):
+            return _NOTHING
+        if file_type == "image":
+            return estimate_image(path, options)
+        return estimate_video(path, options)
+    except Exception:
+        return _NOTHING
+
+
+def estimate_batch(
+    inputs: Iterable[Tuple[str, Optional[str]]],
+    options: CompressionOptions = CompressionOptions(),
+    cache: Optional[ResultCache] = None,
+    jobs: Optional[int] = None,
+    video_jobs: int = 1,
+) -> List[Estimate]:
+    """
+    Estimate every file of a batch, with the batch's parallelism.
+
+    Images are estimated in a process pool and videos on threads, as in
+    run_batch.
+
+    Args:
+        inputs: (file_path, file_type) pairs
+        options: Compression settings of the batch
+        cache: Result cache; cached files would be skipped
+        jobs: Number of image worker processes (defaults to the CPU count)
+        video_jobs: Number of concurrent video estimates
+
+    Returns:
+        Estimates, in the order of inputs
+    """
+    inputs = list(inputs)
+    estimate = functools.partial(estimate_file, options=options, cache=cache)
+    jobs = default_jobs() if jobs is None else max(1, jobs)
+    if jobs == 1 and video_jobs <= 1:
+        return [estimate(file_path, file_type) for file_path, file_type in inputs]
+
+    from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+    image_pool = ProcessPoolExecutor(jobs) if jobs > 1 else ThreadPoolExecutor(1)
+    with image_pool, ThreadPoolExecutor(max(1, video_jobs)) as video_pool:
+        futures = [
+            (
+                video_pool if (file_type or classify_path(file_path)) == "video" else image_pool
+            ).submit(estimate, file_path, file_type)
+            for file_path, file_type in inputs
+        ]
+        return [future.result() for future in futures]
+
+
+def prioritize(
+    inputs: Iterable[Tuple[str, Optional[str]]],
+    estimates: List[Estimate],
+    weights: Optional[Dict[str, int]] = None,
+) -> List[Tuple[str, Optional[str]]]:
+    """
+    Order a batch by expected bytes saved per CPU-second, best first.
+
+    Files with equal rates keep their order.
+
+    Args:
+        inputs: (file_path, file_type) pairs
+        estimates: Their estimates, from estimate_batch()
+        weights: Number of files each compression is used for, where more
+            than one (see mpress.dedup); the saving counts that many times
+
+    Returns:
+        The inputs, reordered
+    """
+    weights = weights or {}
+    ranked = sorted(
+        zip(inputs, estimates),
+        key=lambda pair: -pair[1].rate * weights.get(pair[0][0], 1),
+    )
+    return [item for item, _ in ranked]
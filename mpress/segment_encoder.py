@@ -0,0 +1,250 @@
+"""Segment-parallel H.264 encoding for long videos."""
+
+import os
+import subprocess
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from mpress.probe import probe_video
+from mpress.video_compressor import (
+    DEFAULT_CRF,
+    DEFAULT_PROFILE,
+    EncodeAbortedError,
+    EncodeProgress,
+    FFmpegNotFoundError,
+    ProgressCallback,
+    VideoCompressionError,
+    get_encoder_args,
+    get_ffmpeg_path,
+    get_scale_args,
+    run_ffmpeg,
+    size_guard,
+)
+
+
+# Don't make segments shorter than this: each one restarts rate control and
+# lookahead, so very short segments cost compression efficiency
+MIN_SEGMENT_SECONDS = 30.0
+
+
+def plan_segment_count(duration: Optional[float], segments: int) -> int:
+    """
+    Decide how many segments to split a video into.
+
+    Args:
+        duration: Video duration in seconds (None if unknown)
+        segments: Requested number of segments
+
+    Returns:
+        Number of segments to use; 1 means encode in a single process
+    """
+    if not duration or segments < 2:
+        return 1
+    return max(1, min(segments, int(duration // MIN_SEGMENT_SECONDS)))
+
+
+def _split(ffmpeg_path: str, input_path: Path, workdir: Path, segment_time: float) -> List[Path]:
+    """
+    Split a video at keyframes into Matroska segments, without re-encoding.
+
+    The segment muxer cuts at the first keyframe after each multiple of
+    segment_time, so every segment starts with a keyframe and can be encoded
+    independently. Only the first video and first audio stream are carried;
+    subtitles and further tracks do not survive cutting and joining.
+    """
+    cmd = [
+        ffmpeg_path,
+        "-i",
+        str(input_path),
+        "-map",
+        "0:v:0",
+        "-map",
+        "0:a:0?",
+        "-c",
+        "copy",
+        "-f",
+        "segment",
+        "-segment_time",
+        f"{segment_time:.3f}",
+        "-segment_format",
+        "matroska",
+        "-reset_timestamps",
+        "1",
+        "-y",
+        str(workdir / "source%04d.mkv"),
+    ]
+    run_ffmpeg(cmd, input_path)
+    return sorted(workdir.glob("source*.mkv"))
+
+
+def _concat(ffmpeg_path: str, parts: List[Path], output_path: Path, input_path: Path) -> None:
+    """Join encoded segments losslessly with the concat demuxer."""
+    list_file = parts[0].parent / "segments.txt"
+    with open(list_file, "w", encoding="utf-8") as f:
+        for part in parts:
+            # The concat demuxer uses shell-style single quoting
+            quoted = str(part).replace("'", "'\\''")
+            f.write(f"file '{quoted}'\n")
+
+    cmd = [
+        ffmpeg_path,
+        "-f",
+        "concat",
+        "-safe",
+        "0",
+        "-i",
+        str(list_file),
+        "-c",
+        "copy",
+        "-movflags",
+        "+faststart",
+        "-y",
+        str(output_path),
+    ]
+    run_ffmpeg(cmd, input_path)
+
+
+def compress_segmented(
+    input_path: Path,
+    output_path: Path,
+    segments: int,
+    on_progress: Optional[ProgressCallback] = None,
+    profile: str = DEFAULT_PROFILE,
+    max_size: Optional[int] = None,
+    max_dimension: Optional[int] = None,
+    scale: Optional[float] = None,
+    crf: Optional[int] = None,
+) -> Path:
+    """
+    Compress a MOV or MP4 video with H.264 by encoding segments in parallel.
+
+    The input is split at keyframes into segments (stream copy), each segment
+    is encoded by its own FFmpeg process with the same settings as
+    compress_mov_mp4, and the results are joined with the concat demuxer.
+    Intermediate files live in a hidden temporary directory next to the
+    input and are always removed.
+
+    The output has the first video and first audio stream of the input, as
+    FFmpeg's default stream selection gives the single-process encode.
+    Further audio tracks, subtitles and data tracks are not kept.
+
+    Args:
+        input_path: Path to the input video file
+        output_path: Path for the joined output file
+        segments: Maximum number of segments (and parallel encoders)
+        on_progress: Called with combined EncodeProgress updates
+        profile: Speed profile (see VIDEO_PROFILES)
+        max_size: If set, stop all encoders once the combined output clearly
+            will not be smaller than this many bytes
+        max_dimension: If set, shrink so the longer side is at most this
+        scale: If set, shrink both sides by this factor
+        crf: Constant rate factor, or None for DEFAULT_CRF
+
+    Returns:
+        Path to the compressed file
+
+    Raises:
+        EncodeAbortedError: If the encode was stopped because of max_size
+        VideoCompressionError: If splitting, encoding or joining fails
+    """
+    ffmpeg_path = get_ffmpeg_path()
+    duration = probe_video(input_path).duration
+    count = plan_segment_count(duration, segments)
+    if count < 2:
+        raise VideoCompressionError(
+            f"Video too short to split into segments: {input_path}"
+        )
+
+    # Share the cores between encoders instead of each one using all of them
+    threads = max(1, (os.cpu_count() or 1) // count)
+
+    try:
+        with tempfile.TemporaryDirectory(
+            dir=input_path.parent, prefix=f".{input_path.name}.", suffix=".tmp"
+        ) as tmpdir:
+            workdir = Path(tmpdir)
+            sources = _split(ffmpeg_path, input_path, workdir, duration / count)
+            if not sources:
+                raise VideoCompressionError(f"FFmpeg did not create segments for {input_path}")
+
+            latest: Dict[int, EncodeProgress] = {}
+            lock = threading.Lock()
+            stop = threading.Event()
+            exceeded = size_guard(max_size) if max_size is not None else None
+
+            def combined() -> EncodeProgress:
+                return EncodeProgress(
+                    frame=sum(p.frame for p in latest.values()),
+                    fps=sum(p.fps for p in latest.values()),
+                    out_time=sum(p.out_time for p in latest.values()),
+                    total_size=sum(p.total_size for p in latest.values()),
+                    speed=sum(p.speed for p in latest.values()),
+                    duration=duration,
+                    done=False,
+                )
+
+            def encode(index: int, source: Path) -> Path:
+                target = workdir / f"encoded{index:04d}.mkv"
+
+                def update(progress: EncodeProgress) -> bool:
+                    # Used as abort_when: also returns whether to stop
+                    with lock:
+                        latest[index] = progress
+                        snapshot = combined()
+                    if on_progress is not None:
+                        on_progress(snapshot)
+                    if exceeded is not None and exceeded(snapshot):
+                        stop.set()
+                    return stop.is_set()
+
+                cmd = [
+                    ffmpeg_path,
+                    "-i",
+                    str(source),
+                    "-c:v",
+                    "libx264",
+                    "-crf",
+                    str(DEFAULT_CRF["h264"] if crf is None else crf),
+                    *get_encoder_args(profile, "h264"),
+                    "-threads",
+                    str(threads),
+                    *get_scale_args(max_dimension, scale),
+                    "-c:a",
+                    "copy",
+                    "-y",
+                    str(target),
+                ]
+                run_ffmpeg(cmd, input_path, abort_when=update)
+                return target
+
+            with ThreadPoolExecutor(max_workers=count) as pool:
+                futures = [pool.submit(encode, i, source) for i, source in enumerate(sources)]
+                try:
+                    parts = [future.result() for future in futures]
+                except BaseException:
+                    # Stop the remaining encoders before leaving the pool
+                    stop.set()
+                    raise
+
+            if stop.is_set():
+                raise EncodeAbortedError(
+                    f"Encode of {input_path} stopped: output would not be smaller"
+                )
+
+            _concat(ffmpeg_path, parts, output_path, input_path)
+
+        if not output_path.exists():
+            raise VideoCompressionError(f"FFmpeg did not create output file: {output_path}")
+        if on_progress is not None:
+            on_progress(combined()._replace(done=True))
+        return output_path
+
+    except FileNotFoundError:
+        raise FFmpegNotFoundError(
+            "FFmpeg executable not found. Please install FFmpeg: brew install ffmpeg"
+        )
+    except (OSError, subprocess.SubprocessError) as e:
+        raise VideoCompressionError(f"Failed to run FFmpeg for {input_path}: {e}") from e
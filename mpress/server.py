@@ -0,0 +1,570 @@
+"""Local HTTP service that compresses uploaded media with warm worker pools."""
+
+import errno
+import json
+import mimetypes
+import os
+import shutil
+import socket
+import socketserver
+import stat
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import BinaryIO, Dict, Optional, Tuple
+
+from mpress.batch import DEFAULT_VIDEO_JOBS, default_jobs
+from mpress.file_handler import SUPPORTED_FORMATS, get_file_type
+from mpress.image_compressor import ImageCompressionError, compress_image
+from mpress.options import CompressionOptions
+from mpress.video_compressor import (
+    REPLACED,
+    FFmpegNotFoundError,
+    VideoCompressionError,
+    compress_video,
+    video_target_path,
+)
+
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+# Requests admitted at once (uploading, waiting for a worker, compressing or
+# downloading). Further requests get 503 with Retry-After instead of piling
+# up spool files.
+DEFAULT_MAX_PENDING = 64
+
+# Largest accepted upload
+DEFAULT_MAX_BODY_SIZE = 4 * 1024**3
+
+# Bytes copied at a time between the socket and spool files
+_CHUNK_SIZE = 1024 * 1024
+
+# Seconds a connection may stay silent (while uploading or idle between
+# keep-alive requests) before it is closed
+_SOCKET_TIMEOUT = 60
+
+# Content types missing from older mimetypes tables
+_CONTENT_TYPES = {".webp": "image/webp", ".avif": "image/avif", ".webm": "video/webm"}
+
+
+class ServiceError(Exception):
+    """Exception raised for requests the compression service rejects."""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def compress_upload(
+    input_path: str, file_type: str, options: CompressionOptions
+) -> Tuple[str, str]:
+    """
+    Compress a spooled upload in place (runs in a pool worker).
+
+    Args:
+        input_path: Spool file, named with the upload's extension
+        file_type: 'image' or 'video'
+        options: Compression settings
+
+    Returns:
+        Tuple of (path of the file to send back, outcome); the outcome is
+        'compressed' or one of the video KEPT_* values
+
+    Raises:
+        ImageCompressionError: If image compression fails
+        VideoCompressionError: If video compression fails
+        FFmpegNotFoundError: If FFmpeg is not installed
+    """
+    path = Path(input_path)
+    if file_type == "image":
+        output_path = compress_image(
+            path,
+            png_quantizer=options.png_quantizer,
+            png_compress_level=options.png_compress_level,
+            png_strategy=options.png_strategy,
+            max_dimension=options.max_dimension,
+            scale=options.scale,
+            image_format=options.image_format,
+            target_ssim=options.target_ssim,
+            jpeg_keep=options.jpeg_keep,
+            jpeg_progressive=options.jpeg_progressive,
+            jpeg_lossless_min_gain=options.jpeg_lossless_min_gain,
+        )
+        return str(output_path), "compressed"
+
+    result = compress_video(
+        path,
+        profile=options.video_profile,
+        segments=options.video_segments,
+        max_dimension=options.max_dimension,
+        scale=options.scale,
+        video_format=options.video_format,
+        min_ssim=options.video_min_ssim,
+    )
+    if result == REPLACED:
+        return str(video_target_path(path, options.video_format)), "compressed"
+    # Kept originals are sent back unchanged
+    return input_path, result
+
+
+def _warm_worker() -> None:
+    """Pool initializer: load the image plugins before the first request."""
+    from PIL import Image
+
+    Image.init()
+
+
+def _ping() -> None:
+    """No-op task used to start pool workers ahead of time."""
+
+
+class ServiceMetrics:
+    """Counters and gauges for /metrics, shared by the request threads."""
+
+    def __init__(self, workers: Dict[str, int]):
+        """
+        Args:
+            workers: Number of workers per file type
+        """
+        self._lock = threading.Lock()
+        self.workers = workers
+        self.admitted = 0
+        self.pending = {file_type: 0 for file_type in workers}
+        self.max_queue_depth = {file_type: 0 for file_type in workers}
+        self.requests: Dict[Tuple[str, int], int] = {}
+        self.rejected = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.compress_seconds = {file_type: 0.0 for file_type in workers}
+
+    def queue_depth(self, file_type: str) -> int:
+        """Requests waiting for a free worker of a file type."""
+        return max(0, self.pending[file_type] - self.workers[file_type])
+
+    def admit(self, limit: int) -> bool:
+        """Reserve a request slot; False (and counted as rejected) if all are taken."""
+        with self._lock:
+            if self.admitted >= limit:
+                self.rejected += 1
+                return False
+            self.admitted += 1
+            return True
+
+    def release(self) -> None:
+        """Return a slot taken by admit()."""
+        with self._lock:
+            self.admitted -= 1
+
+    def start_compression(self, file_type: str, size: int) -> None:
+        """Count an upload handed to a worker pool."""
+        with self._lock:
+            self.bytes_in += size
+            self.pending[file_type] += 1
+            self.max_queue_depth[file_type] = max(
+                self.max_queue_depth[file_type], self.queue_depth(file_type)
+            )
+
+    def finish_compression(self, file_type: str, seconds: float) -> None:
+        """Count a finished (or failed) compression."""
+        with self._lock:
+            self.pending[file_type] -= 1
+            self.compress_seconds[file_type] += seconds
+
+    def finish_request(self, file_type: str, status: int, size: int = 0) -> None:
+        """Count a response."""
+        with self._lock:
+            key = (file_type, status)
+            self.requests[key] = self.requests.get(key, 0) + 1
+            self.bytes_out += size
+
+    def render(self) -> str:
+        """
+        Format the metrics in the Prometheus text exposition format.
+
+        Returns:
+            Metrics text, one sample per line
+        """
+        with self._lock:
+            lines = [
+                "# TYPE mpress_requests_in_progress gauge",
+                f"mpress_requests_in_progress {self.admitted}",
+                "# TYPE mpress_requests_rejected_total counter",
+                f"mpress_requests_rejected_total {self.rejected}",
+                "# TYPE mpress_requests_total counter",
+            ]
+            for (file_type, status), count in sorted(self.requests.items()):
+                lines.append(f'mpress_requests_total{{type="{file_type}",code="{status}"}} {count}')
+            lines += [
+                "# TYPE mpress_received_bytes_total counter",
+                f"mpress_received_bytes_total {self.bytes_in}",
+                "# TYPE mpress_sent_bytes_total counter",
+                f"mpress_sent_bytes_total {self.bytes_out}",
+            ]
+            per_type = [
+                ("mpress_workers", "gauge", self.workers),
+                ("mpress_compressions_in_progress", "gauge", self.pending),
+                (
+                    "mpress_queue_depth",
+                    "gauge",
+                    {file_type: self.queue_depth(file_type) for file_type in self.workers},
+                ),
+                ("mpress_queue_depth_max", "gauge", self.max_queue_depth),
+                ("mpress_compress_seconds_total", "counter", self.compress_seconds),
+            ]
+            for name, kind, values in per_type:
+                lines.append(f"# TYPE {name} {kind}")
+                for file_type, value in values.items():
+                    lines.append(f'{name}{{type="{file_type}"}} {value:g}')
+        return "\n".join(lines) + "\n"
+
+
+class CompressionService:
+    """Warm worker pools plus admission control, independent of the transport."""
+
+    def __init__(
+        self,
+        options: CompressionOptions = CompressionOptions(),
+        jobs: Optional[int] = None,
+        video_jobs: int = DEFAULT_VIDEO_JOBS,
+        max_pending: int = DEFAULT_MAX_PENDING,
+        max_body_size: int = DEFAULT_MAX_BODY_SIZE,
+        spool_dir: Optional[str] = None,
+    ):
+        """
+        Args:
+            options: Compression settings applied to every upload
+            jobs: Number of image worker processes (defaults to the CPU count)
+            video_jobs: Number of concurrent video compressions
+            max_pending: Maximum number of requests admitted at once
+            max_body_size: Largest accepted upload in bytes
+            spool_dir: Directory for spool files (defaults to the system
+                temporary directory)
+        """
+        self.options = options
+        self.max_pending = max_pending
+        self.max_body_size = max_body_size
+        self.spool_dir = spool_dir
+        jobs = max(1, jobs or default_jobs())
+        video_jobs = max(1, video_jobs)
+
+        # Image work is CPU-bound Python/Pillow, so it gets processes; video
+        # threads only wait for FFmpeg
+        if jobs > 1:
+            self._image_pool = ProcessPoolExecutor(max_workers=jobs, initializer=_warm_worker)
+        else:
+            self._image_pool = ThreadPoolExecutor(max_workers=1, initializer=_warm_worker)
+        self._video_pool = ThreadPoolExecutor(max_workers=video_jobs)
+        self.metrics = ServiceMetrics({"image": jobs, "video": video_jobs})
+
+    def warm(self) -> None:
+        """Start every image worker now rather than on the first requests."""
+        workers = self.metrics.workers["image"]
+        for future in [self._image_pool.submit(_ping) for _ in range(workers)]:
+            future.result()
+
+    def compress(self, input_path: Path, file_type: str) -> Tuple[Path, str]:
+        """
+        Compress a spooled upload on the pool for its file type.
+
+        Blocks the calling request thread until a worker has finished.
+
+        Args:
+            input_path: Spool file
+            file_type: 'image' or 'video'
+
+        Returns:
+            Tuple of (path of the file to send back, outcome)
+        """
+        pool = self._video_pool if file_type == "video" else self._image_pool
+        self.metrics.start_compression(file_type, input_path.stat().st_size)
+        start = time.monotonic()
+        try:
+            future = pool.submit(compress_upload, str(input_path), file_type, self.options)
+            output_path, outcome = future.result()
+        finally:
+            self.metrics.finish_compression(file_type, time.monotonic() - start)
+        return Path(output_path), outcome
+
+    def close(self) -> None:
+        """Wait for running compressions and stop the pools."""
+        self._image_pool.shutdown(wait=True, cancel_futures=True)
+        self._video_pool.shutdown(wait=True, cancel_futures=True)
+
+
+def _read_exactly(rfile: BinaryIO, size: int, dest: BinaryIO) -> None:
+    """Copy size bytes from the request to dest."""
+    while size > 0:
+        chunk = rfile.read(min(size, _CHUNK_SIZE))
+        if not chunk:
+            raise ServiceError(400, "Request body ended early")
+        dest.write(chunk)
+        size -= len(chunk)
+
+
+def spool_body(rfile: BinaryIO, headers, dest: BinaryIO, max_size: int) -> int:
+    """
+    Copy a request body to a file in fixed-size chunks.
+
+    Supports both Content-Length and chunked transfer encoding, so clients
+    can stream uploads of unknown length.
+
+    Args:
+        rfile: Request stream, positioned at the start of the body
+        headers: Request headers
+        dest: File to write the body to
+        max_size: Largest accepted body in bytes
+
+    Returns:
+        Number of body bytes written
+
+    Raises:
+        ServiceError: If the body is missing, malformed or too large
+    """
+    if headers.get("Transfer-Encoding", "").lower() == "chunked":
+        total = 0
+        while True:
+            line = rfile.readline(1024)
+            try:
+                size = int(line.split(b";", 1)[0].strip(), 16)
+            except ValueError:
+                raise ServiceError(400, "Malformed chunked body") from None
+            if size == 0:
+                break
+            total += size
+            if total > max_size:
+                raise ServiceError(413, f"Upload larger than {max_size} bytes")
+            _read_exactly(rfile, size, dest)
+            rfile.readline(1024)
+        # Skip trailers up to the terminating blank line
+        while rfile.readline(1024) not in (b"\r\n", b"\n", b""):
+            pass
+        return total
+
+    length = headers.get("Content-Length")
+    if length is None:
+        raise ServiceError(411, "Content-Length or chunked transfer encoding required")
+    try:
+        total = int(length)
+    except ValueError:
+        raise ServiceError(400, "Invalid Content-Length") from None
+    if total < 0:
+        raise ServiceError(400, "Invalid Content-Length")
+    if total > max_size:
+        raise ServiceError(413, f"Upload larger than {max_size} bytes")
+    _read_exactly(rfile, total, dest)
+    return total
+
+
+def _formats():
+    return sorted(extension.lstrip(".") for extension in SUPPORTED_FORMATS)
+
+
+def _content_type(path: Path) -> str:
+    suffix = path.suffix.lower()
+    if suffix in _CONTENT_TYPES:
+        return _CONTENT_TYPES[suffix]
+    return mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+
+
+class CompressionRequestHandler(BaseHTTPRequestHandler):
+    """
+    HTTP API of the compression service.
+
+    POST /compress/<ext> (ext is png, jpg, jpeg, mov, mp4 or webm) with the
+    file as the request body returns the compressed file. GET /metrics
+    returns Prometheus metrics and GET /healthz returns 'ok'.
+    """
+
+    protocol_version = "HTTP/1.1"
+    server_version = "mpress"
+    timeout = _SOCKET_TIMEOUT
+
+    @property
+    def service(self) -> CompressionService:
+        return self.server.service
+
+    def address_string(self) -> str:
+        # Unix socket peers have no address
+        return self.client_address[0] if self.client_address else "unix"
+
+    def log_message(self, format: str, *args) -> None:
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def do_GET(self) -> None:
+        if self.path == "/metrics":
+            self._send_text(200, self.service.metrics.render(), "text/plain; version=0.0.4")
+        elif self.path == "/healthz":
+            self._send_text(200, "ok\n")
+        else:
+            self._send_error(404, "Not found")
+
+    def do_POST(self) -> None:
+        extension = "." + self.path.rsplit("/", 1)[-1].lower()
+        file_type = get_file_type(extension) if extension in SUPPORTED_FORMATS else None
+        if not self.path.startswith("/compress/") or file_type is None:
+            self.close_connection = True
+            self._send_error(404, f"Use POST /compress/<{'|'.join(_formats())}>")
+            return
+        if not self.service.metrics.admit(self.service.max_pending):
+            # The body is not read, so the connection cannot be reused
+            self.close_connection = True
+            self._send_error(503, "Too many requests in progress", {"Retry-After": "1"})
+            return
+
+        spool = tempfile.mkdtemp(prefix="mpress-serve-", dir=self.service.spool_dir)
+        try:
+            input_path = Path(spool) / f"upload{extension}"
+            try:
+                with open(input_path, "wb") as f:
+                    size = spool_body(self.rfile, self.headers, f, self.service.max_body_size)
+            except ServiceError:
+                self.close_connection = True
+                raise
+            output_path, outcome = self.service.compress(input_path, file_type)
+            self._send_file(output_path, file_type, size, outcome)
+        except ServiceError as e:
+            self._send_error(e.status, str(e), file_type=file_type)
+        except (ImageCompressionError, VideoCompressionError) as e:
+            self._send_error(422, f"Compression error: {e}", file_type=file_type)
+        except FFmpegNotFoundError as e:
+            self._send_error(503, str(e), file_type=file_type)
+        except (ConnectionError, TimeoutError):
+            # The client went away; nothing can be sent back
+            self.close_connection = True
+        except Exception as e:
+            self._send_error(500, f"Unexpected error: {e}", file_type=file_type)
+        finally:
+            shutil.rmtree(spool, ignore_errors=True)
+            self.service.metrics.release()
+
+    def _send_file(self, path: Path, file_type: str, input_size: int, outcome: str) -> None:
+        size = path.stat().st_size
+        self.send_response(200)
+        self.send_header("Content-Type", _content_type(path))
+        self.send_header("Content-Length", str(size))
+        self.send_header("X-Mpress-Outcome", outcome)
+        self.send_header("X-Mpress-Format", path.suffix.lstrip(".").lower())
+        self.send_header("X-Mpress-Input-Size", str(input_size))
+        self.end_headers()
+        with open(path, "rb") as f:
+            # sendfile avoids copying the output through Python
+            self.connection.sendfile(f)
+        self.service.metrics.finish_request(file_type, 200, size)
+
+    def _send_text(self, status: int, text: str, content_type: str = "text/plain") -> None:
+        body = text.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", f"{content_type}; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error(
+        self,
+        status: int,
+        message: str,
+        headers: Optional[Dict[str, str]] = None,
+        file_type: str = "unknown",
+    ) -> None:
+        body = json.dumps({"error": message}).encode("utf-8") + b"\n"
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        if self.close_connection:
+            self.send_header("Connection", "close")
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+        self.service.metrics.finish_request(file_type, status)
+
+
+class CompressionHTTPServer(ThreadingHTTPServer):
+    """Threaded HTTP server on a TCP port."""
+
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], service: CompressionService, verbose=False):
+        super().__init__(address, CompressionRequestHandler)
+        self.service = service
+        self.verbose = verbose
+
+
+def remove_stale_socket(socket_path: str) -> None:
+    """
+    Remove a Unix socket that no server is listening on any more.
+
+    Args:
+        socket_path: Path the server is about to bind
+
+    Raises:
+        OSError: If the path is not a socket, or a server still accepts
+            connections on it
+    """
+    try:
+        mode = os.lstat(socket_path).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise FileExistsError(errno.EEXIST, "Not a socket, refusing to replace it", socket_path)
+
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(socket_path)
+    except (ConnectionRefusedError, FileNotFoundError):
+        # Nobody is listening: left behind by a server that did not shut down
+        Path(socket_path).unlink(missing_ok=True)
+        return
+    finally:
+        client.close()
+    raise OSError(errno.EADDRINUSE, "Another server is listening on this socket", socket_path)
+
+
+class CompressionUnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Threaded HTTP server on a Unix domain socket."""
+
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, service: CompressionService, verbose=False):
+        # A socket left behind by an earlier run would make bind fail
+        remove_stale_socket(socket_path)
+        super().__init__(socket_path, CompressionRequestHandler)
+        self.service = service
+        self.verbose = verbose
+
+    def server_close(self) -> None:
+        super().server_close()
+        try:
+            os.unlink(self.server_address)
+        except OSError:
+            pass
+
+
+def make_server(
+    service: CompressionService,
+    host: str = DEFAULT_HOST,
+    port: int = DEFAULT_PORT,
+    socket_path: Optional[str] = None,
+    verbose: bool = False,
+):
+    """
+    Create a server for the service (call serve_forever() to run it).
+
+    Args:
+        service: Service handling the requests
+        host: Address to listen on
+        port: TCP port (0 picks a free one)
+        socket_path: Listen on this Unix socket instead of TCP
+        verbose: Log every request to stderr
+
+    Returns:
+        CompressionHTTPServer or CompressionUnixServer
+    """
+    if socket_path is not None:
+        return CompressionUnixServer(socket_path, service, verbose)
+    return CompressionHTTPServer((host, port), service, verbose)
@@ -0,0 +1,161 @@
+"""Per-stage timing of file compression, and other facts for batch reports."""
+
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+from contextlib import contextmanager, nullcontext
+from typing import ContextManager, Dict, Iterator, Sequence, Tuple, Union
+
+# Stages the compressors record, in pipeline order. "total" is the whole of
+# process_file, so it also covers time outside any named stage.
+STAGES = (
+    "validate",
+    "cache",
+    "probe",
+    "sample",
+    "lossless",
+    "decode",
+    "quantize",
+    "score",
+    "encode",
+    "ffmpeg",
+    "commit",
+    "total",
+)
+
+# (stage, seconds) pairs, as carried back from worker processes in FileResult
+StageTimings = Tuple[Tuple[str, float], ...]
+
+# (name, value) facts about how a file was compressed, such as the JPEG
+# quality --target-ssim chose; carried back in FileResult like the timings
+FileDetails = Tuple[Tuple[str, Union[int, float, str]], ...]
+
+# The recorder of the file being processed on this thread, if any. Videos run
+# on threads and images in processes, so a thread-local is the right scope.
+_local = threading.local()
+
+# Returned by stage() when nothing is recording; nullcontext is reusable
+_NOT_RECORDING = nullcontext()
+
+
+class StageTimer:
+    """Accumulated seconds per stage, and noted details, for one file."""
+
+    def __init__(self):
+        self.seconds: Dict[str, float] = {}
+        self.details: Dict[str, Union[int, float, str]] = {}
+
+    def add(self, name: str, seconds: float) -> None:
+        """Add time to a stage (stages entered twice are summed)."""
+        self.seconds[name] = self.seconds.get(name, 0.0) + seconds
+
+    def items(self) -> StageTimings:
+        """Get the timings in a picklable form."""
+        return tuple(self.seconds.items())
+
+    def detail_items(self) -> FileDetails:
+        """Get the noted details in a picklable form."""
+        return tuple(self.details.items())
+
+
+@contextmanager
+def _timed(timer: StageTimer, name: str) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timer.add(name, time.perf_counter() - start)
+
+
+def stage(name: str) -> ContextManager[None]:
+    """
+    Time a block of work as one stage of the current file.
+
+    Outside record_stages() this returns a shared no-op context manager, so
+    instrumented code costs one thread-local lookup when reports are off.
+
+    Args:
+        name: One of STAGES
+
+    Returns:
+        Context manager wrapping the stage
+    """
+    timer = getattr(_local, "timer", None)
+    if timer is None:
+        return _NOT_RECORDING
+    return _timed(timer, name)
+
+
+def note(name: str, value: Union[int, float, str]) -> None:
+    """
+    Note a detail of the current file for the batch report.
+
+    Outside record_stages() this does nothing.
+
+    Args:
+        name: Name of the detail, e.g. 'jpeg_quality'
+        value: Its value
+    """
+    timer = getattr(_local, "timer", None)
+    if timer is not None:
+        timer.details[name] = value
+
+
+@contextmanager
+def record_stages() -> Iterator[StageTimer]:
+    """
+    Record the stages run on this thread until the block exits.
+
+    The time of the whole block is recorded as the "total" stage.
+
+    Yields:
+        StageTimer that collects the timings
+    """
+    timer = StageTimer()
+    previous = getattr(_local, "timer", None)
+    _local.timer = timer
+    start = time.perf_counter()
+    try:
+        yield timer
+    finally:
+        timer.add("total", time.perf_counter() - start)
+        _local.timer = previous
+
+
+def cpu_time() -> float:
+    """
+    Get the CPU time used so far by this process and its finished children.
+
+    Children (FFmpeg, jpegtran) only count once they have been waited for.
+    The counters are process-wide, so the difference across one file's work
+    overstates it when other threads are busy at the same time (several
+    concurrent videos). Windows has no counters for children.
+
+    Returns:
+        User plus system CPU seconds
+    """
+    seconds = time.process_time()
+    if resource is not None:
+        usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+        seconds += usage.ru_utime + usage.ru_stime
+    return seconds
+
+
+def percentile(values: Sequence[float], fraction: float) -> float:
+    """
+    Get a percentile of sorted values (nearest rank).
+
+    Args:
+        values: Values in ascending order
+        fraction: Percentile as a fraction, e.g. 0.95
+
+    Returns:
+        The percentile (0.0 if values is empty)
+    """
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(fraction * len(values)))]
@@ -1,22 +1,270 @@
 """Utility functions for mpress."""
 
+import errno
+import math
 import os
 import shutil
 from pathlib import Path
-from typing import Optional
+from typing import Optional, Tuple
 
+from mpress.timing import stage
 
-def atomic_replace(source: Path, destination: Path) -> None:
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+
+def fsync_file(path: Path) -> None:
+    """
+    Flush a file's data and metadata to disk.
+
+    Args:
+        path: File to flush (it does not need to be open)
+
+    Raises:
+        OSError: If the file cannot be opened or flushed
+    """
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def fsync_directory(path: Path) -> None:
+    """
+    Flush a directory, making renames and deletions of its entries durable.
+
+    Platforms that cannot open directories (Windows) are skipped silently.
+
+    Args:
+        path: Directory to flush
+    """
+    if os.name == "nt":
+        return
+    try:
+        fd = os.open(path, os.O_RDONLY | getattr(os, "O_DIRECTORY", 0))
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        # Some filesystems do not support fsync on directories
+        pass
+    finally:
+        os.close(fd)
+
+
+class DirectorySync:
+    """
+    Groups the directory fsyncs of a batch.
+
+    A rename is only durable once its directory has been flushed. Flushing
+    after every file costs one synchronous disk write per file; instead,
+    directories are collected as files are committed and each is flushed
+    once. File data is flushed before each rename (atomic_replace with
+    durable=True), so a crash before the flush leaves either the original
+    or the complete new file, never an empty one.
+    """
+
+    def __init__(self, max_pending: int = 256):
+        """
+        Args:
+            max_pending: Flush once this many directories are waiting
+        """
+        self.max_pending = max_pending
+        self.pending = set()
+
+    def add(self, file_path: str) -> None:
+        """
+        Note that a file's directory entry changed.
+
+        Args:
+            file_path: File that was replaced, created or deleted
+        """
+        self.pending.add(os.path.dirname(os.path.abspath(file_path)))
+        if len(self.pending) >= self.max_pending:
+            self.flush()
+
+    def flush(self) -> None:
+        """Flush every directory noted since the last flush."""
+        for directory in sorted(self.pending):
+            fsync_directory(Path(directory))
+        self.pending.clear()
+
+
+def copy_metadata(source: Path, destination: Path) -> None:
+    """
+    Give a new file the ownership, permissions, timestamps and extended
+    attributes of the file it replaces.
+
+    Each part is best effort: a non-root user cannot give files away, and
+    some filesystems support neither modes nor extended attributes.
+
+    Args:
+        source: Original file
+        destination: New file
+    """
+    try:
+        st = source.stat()
+    except OSError:
+        return
+    if hasattr(os, "chown"):
+        # Before copystat: chown can clear the setuid and setgid bits
+        try:
+            os.chown(destination, st.st_uid, st.st_gid)
+        except OSError:
+            pass
+    try:
+        shutil.copystat(source, destination)
+    except OSError:
+        pass
+
+
+# Chunk size for copying between filesystems
+_COPY_CHUNK_SIZE = 1 << 24
+
+
+def _copy_data(source_fd: int, destination_fd: int) -> None:
+    """
+    Copy the rest of one open file to another.
+
+    copy_file_range lets the kernel copy without passing the data through
+    user space (or share extents, on filesystems that support it). Kernels
+    and filesystems that cannot do it for this pair of files fall back to a
+    read/write loop, which continues from wherever copy_file_range stopped.
+    """
+    if hasattr(os, "copy_file_range"):
+        try:
+            while os.copy_file_range(source_fd, destination_fd, _COPY_CHUNK_SIZE):
+                pass
+            return
+        except OSError as e:
+            if e.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP):
+                raise
+    while True:
+        chunk = os.read(source_fd, _COPY_CHUNK_SIZE)
+        if not chunk:
+            return
+        view = memoryview(chunk)
+        while view:
+            view = view[os.write(destination_fd, view) :]
+
+
+# ioctl that makes one file share another's extents (Linux btrfs, XFS, bcachefs)
+_FICLONE = 0x40049409
+
+
+def clone_file(source: Path, destination: Path) -> None:
+    """
+    Copy a file, sharing its data blocks with the copy where possible.
+
+    A reflink (FICLONE) takes no time and no space until either file is
+    changed; filesystems without it get an ordinary copy. Only the data is
+    copied; destination is created (or truncated) with default permissions.
+
+    Args:
+        source: File to copy
+        destination: New file
+
+    Raises:
+        OSError: If the file cannot be copied
+    """
+    with open(source, "rb") as src, open(destination, "wb") as dst:
+        if fcntl is not None:
+            try:
+                fcntl.ioctl(dst.fileno(), _FICLONE, src.fileno())
+                return
+            except OSError:
+                pass
+        _copy_data(src.fileno(), dst.fileno())
+
+
+def _open_unnamed(directory: Path) -> Optional[int]:
+    """
+    Create an anonymous file in a directory with O_TMPFILE.
+
+    Returns:
+        File descriptor, or None where O_TMPFILE is unavailable (not Linux,
+        or a filesystem that does not support it)
+    """
+    if not hasattr(os, "O_TMPFILE"):
+        return None
+    try:
+        return os.open(directory, os.O_TMPFILE | os.O_WRONLY, 0o600)
+    except OSError:
+        return None
+
+
+def _link_unnamed(fd: int, path: Path) -> None:
+    """
+    Give a file opened with O_TMPFILE a name (linkat through /proc).
+
+    Raises:
+        OSError: If the file cannot be linked (e.g. /proc is not mounted)
+    """
+    # os.link only calls linkat() with AT_SYMLINK_FOLLOW, which the /proc
+    # link needs, when a directory descriptor is given
+    dir_fd = os.open(path.parent, os.O_RDONLY | getattr(os, "O_DIRECTORY", 0))
+    try:
+        os.link(f"/proc/self/fd/{fd}", path.name, dst_dir_fd=dir_fd)
+    finally:
+        os.close(dir_fd)
+
+
+def _copy_into_place(source: Path, destination: Path, durable: bool) -> None:
+    """
+    Replace destination with a copy of a file on another filesystem.
+
+    The copy is written to an anonymous O_TMPFILE and only linked into the
+    directory (as '.name.tmp') once complete, so a crash mid-copy leaves
+    nothing behind. Without O_TMPFILE it is written to '.name.tmp' directly.
+    Either way it is renamed over destination, and source is deleted.
+    """
+    temp_path = destination.parent / f".{destination.name}.tmp"
+    fd = _open_unnamed(destination.parent)
+    try:
+        with open(source, "rb") as src:
+            if fd is not None:
+                try:
+                    _copy_data(src.fileno(), fd)
+                    _link_unnamed(fd, temp_path)
+                except OSError:
+                    os.close(fd)
+                    fd = None
+                    src.seek(0)
+            if fd is None:
+                fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+                _copy_data(src.fileno(), fd)
+        copy_metadata(source, temp_path)
+        if durable:
+            os.fsync(fd)
+        os.replace(temp_path, destination)
+    except BaseException:
+        temp_path.unlink(missing_ok=True)
+        raise
+    finally:
+        if fd is not None:
+            os.close(fd)
+    source.unlink()
+
+
+def atomic_replace(source: Path, destination: Path, durable: bool = False) -> None:
     """
     Atomically replace destination file with source file.
 
     This ensures that if the operation fails, the original file is preserved.
-    The source file must be on the same filesystem as the destination (which is
-    guaranteed if created in the same directory).
+    The source file should be on the same filesystem as the destination (which
+    is guaranteed if created in the same directory); otherwise it is copied
+    next to the destination first.
 
     Args:
         source: Path to the new file (temporary compressed file)
         destination: Path to the original file to be replaced
+        durable: Flush source's data to disk before the rename, so a crash
+            can never leave an empty or partial destination. The rename itself
+            is durable once the directory is flushed (see DirectorySync).
 
     Raises:
         OSError: If the replacement fails
@@ -27,8 +275,16 @@ def atomic_replace(source: Path, destination: Path) -> None:
         raise OSError(f"Source file does not exist: {source}")
 
     try:
-        # Atomically replace destination with source file
-        source.replace(destination)
+        with stage("commit"):
+            if durable:
+                fsync_file(source)
+            try:
+                # Atomically replace destination with source file
+                source.replace(destination)
+            except OSError as e:
+                if e.errno != errno.EXDEV:
+                    raise
+                _copy_into_place(source, destination, durable)
 
     except Exception as e:
         # Clean up source file if it still exists
@@ -40,6 +296,59 @@ def atomic_replace(source: Path, destination: Path) -> None:
         raise OSError(f"Failed to replace file {destination}: {e}") from e
 
 
+def commit_output(
+    temp_path: Path,
+    input_path: Path,
+    output_path: Path,
+    keep_original: bool = False,
+    durable: bool = False,
+) -> None:
+    """
+    Move a finished temporary output into place.
+
+    The new file takes over the original's ownership (where permitted),
+    permissions, timestamps and extended attributes. When output_path is
+    input_path this is a plain atomic replace. When the output has a
+    different name (a format conversion), the new file is renamed into place
+    first and the original removed afterwards, so at every point at least one
+    complete copy exists.
+
+    Args:
+        temp_path: Finished temporary file, in the same directory as output_path
+        input_path: Original file
+        output_path: Final path of the new file
+        keep_original: Keep input_path when output_path differs from it
+        durable: Flush the new file to disk before renaming it (see
+            atomic_replace)
+
+    Raises:
+        OSError: If the file cannot be moved into place
+    """
+    copy_metadata(input_path, temp_path)
+    atomic_replace(temp_path, output_path, durable)
+    if output_path != input_path and not keep_original:
+        input_path.unlink()
+
+
+def is_temp_output(name: str) -> bool:
+    """
+    Check whether a file name is one of mpress's temporary outputs.
+
+    Compressors write to a hidden sibling of the input (".name.tmp" for images,
+    ".name.tmp.ext" for videos) before atomically replacing the original.
+
+    Args:
+        name: File name (not a full path)
+
+    Returns:
+        True if the name matches the temporary output pattern
+    """
+    if not name.startswith("."):
+        return False
+    stem, dot, extension = name.rpartition(".")
+    return bool(stem) and (extension == "tmp" or stem.endswith(".tmp"))
+
+
 def get_file_size(file_path: Path) -> int:
     """
     Get file size in bytes.
@@ -52,3 +361,126 @@ def get_file_size(file_path: Path) -> int:
     """
     return file_path.stat().st_size
 
+
+def format_size(num_bytes: int) -> str:
+    """
+    Format a byte count for display.
+
+    Args:
+        num_bytes: Number of bytes (may be negative)
+
+    Returns:
+        Human-readable size such as '1.5 MB'
+    """
+    size = float(num_bytes)
+    for unit in ("B", "KB", "MB", "GB"):
+        if abs(size) < 1024 or unit == "GB":
+            break
+        size /= 1024
+    if unit == "B":
+        return f"{int(size)} B"
+    return f"{size:.1f} {unit}"
+
+
+def format_duration(seconds: float) -> str:
+    """
+    Format a duration for display.
+
+    Args:
+        seconds: Duration in seconds
+
+    Returns:
+        Duration as 'M:SS' or 'H:MM:SS'
+    """
+    minutes, secs = divmod(int(round(seconds)), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{secs:02d}"
+    return f"{minutes}:{secs:02d}"
+
+
+_SIZE_UNITS = {"": 1, "K": 1024, "M": 1024**2, "G": 1024**3, "T": 1024**4}
+
+
+def parse_size(text: str) -> int:
+    """
+    Parse a human-written byte count.
+
+    Args:
+        text: Size such as '512M', '2G', '1.5GB' or '1048576'
+
+    Returns:
+        Number of bytes
+
+    Raises:
+        ValueError: If the text is not a valid size
+    """
+    value = text.strip().upper()
+    if value.endswith("B"):
+        value = value[:-1]
+    unit = value[-1:] if value[-1:] in _SIZE_UNITS else ""
+    number = value[: len(value) - len(unit)]
+    try:
+        size = float(number)
+    except ValueError:
+        raise ValueError(f"Invalid size: {text!r}") from None
+    if not math.isfinite(size) or size < 0:
+        raise ValueError(f"Invalid size: {text!r}")
+    return int(size * _SIZE_UNITS[unit])
+
+
+_DURATION_UNITS = {"": 1, "S": 1, "M": 60, "H": 3600}
+
+
+def parse_duration(text: str) -> float:
+    """
+    Parse a human-written duration.
+
+    Args:
+        text: Duration such as '90', '90s', '30m' or '1.5h'
+
+    Returns:
+        Number of seconds
+
+    Raises:
+        ValueError: If the text is not a valid duration
+    """
+    value = text.strip().upper()
+    unit = value[-1:] if value[-1:] in _DURATION_UNITS else ""
+    number = value[: len(value) - len(unit)]
+    try:
+        seconds = float(number)
+    except ValueError:
+        raise ValueError(f"Invalid duration: {text!r}") from None
+    if not math.isfinite(seconds) or seconds < 0:
+        raise ValueError(f"Invalid duration: {text!r}")
+    return seconds * _DURATION_UNITS[unit]
+
+
+def scaled_size(
+    size: Tuple[int, int],
+    max_dimension: Optional[int] = None,
+    scale: Optional[float] = None,
+) -> Tuple[int, int]:
+    """
+    Compute the size of an image or video frame after downscaling.
+
+    Nothing is ever enlarged.
+
+    Args:
+        size: Current (width, height)
+        max_dimension: Maximum length of the longer side in pixels
+        scale: Factor to scale both sides by (at most 1)
+
+    Returns:
+        New (width, height), or size unchanged if no downscaling applies
+    """
+    width, height = size
+    factor = 1.0
+    if scale is not None:
+        factor = min(factor, scale)
+    if max_dimension is not None and max(width, height) > 0:
+        factor = min(factor, max_dimension / max(width, height))
+    if factor >= 1.0:
+        return size
+    return max(1, round(width * factor)), max(1, round(height * factor))
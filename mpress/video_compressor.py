@@ -1,12 +1,51 @@
 """Video compression using FFmpeg."""
 
+import functools
+import itertools
+import os
+import re
 import shutil
+import struct
 import subprocess
 import sys
+import tempfile
+import threading
+from collections import deque
 from pathlib import Path
-from typing import Optional
+from typing import IO, Callable, Iterable, List, NamedTuple, Optional, Tuple
 
-from mpress.utils import atomic_replace
+from mpress.options import DEFAULT_PROFILE, VIDEO_FORMATS, VIDEO_PROFILES
+from mpress.timing import note, stage
+from mpress.utils import commit_output, get_file_size
+
+
+# Number of FFmpeg stderr lines kept for error messages
+STDERR_TAIL_LINES = 30
+
+# Bytes copied at a time between streams and FFmpeg pipes
+_PIPE_CHUNK_SIZE = 1024 * 1024
+
+# Bytes read from the start of an MP4/MOV stream to find its moov box
+_MP4_PEEK_SIZE = 256 * 1024
+
+# Outcomes of compress_video
+REPLACED = "replaced"  # the original was replaced with a smaller file
+KEPT_NO_GAIN = "no-gain"  # the encode finished but was not smaller
+KEPT_ABORTED = "aborted"  # the encode was stopped early, see size_guard()
+KEPT_EFFICIENT = "efficient"  # probing showed re-encoding would not help
+
+# Don't project the final output size until this fraction of the input has
+# been encoded. Encoders buffer frames (x264 lookahead, VP9 alt-ref), so early
+# output sizes lag behind and projections err on the small side.
+ABORT_MIN_FRACTION = 0.15
+
+# CRF per codec unless a search picks one (see mpress.crf_search)
+DEFAULT_CRF = {"h264": 28, "vp9": 30}
+
+# libvpx does not scale past this many threads at typical resolutions
+_MAX_VP9_THREADS = 16
+
+_DURATION_RE = re.compile(r"Duration: (\d+):(\d\d):(\d\d(?:\.\d+)?)")
 
 
 class VideoCompressionError(Exception):
@@ -21,6 +60,267 @@ class FFmpegNotFoundError(VideoCompressionError):
     pass
 
 
+class EncodeAbortedError(VideoCompressionError):
+    """Exception raised when an encode is stopped because it cannot save space."""
+
+    pass
+
+
+class EncodeProgress(NamedTuple):
+    """Snapshot of a running FFmpeg encode, parsed from -progress output."""
+
+    frame: int
+    fps: float
+    out_time: float  # seconds of output written so far
+    total_size: int  # bytes of output written so far
+    speed: float  # multiple of real time, 0.0 if unknown
+    duration: Optional[float]  # input duration in seconds, if known
+    done: bool
+
+    @property
+    def fraction(self) -> Optional[float]:
+        """Fraction of the input encoded so far, or None if unknown."""
+        if not self.duration:
+            return None
+        return min(1.0, self.out_time / self.duration)
+
+    @property
+    def eta(self) -> Optional[float]:
+        """Estimated seconds remaining, or None if unknown."""
+        if not self.duration or self.speed <= 0:
+            return None
+        return max(0.0, (self.duration - self.out_time) / self.speed)
+
+
+ProgressCallback = Callable[[EncodeProgress], None]
+
+
+def size_guard(max_size: int) -> Callable[[EncodeProgress], bool]:
+    """
+    Build a check that detects encodes which cannot end up smaller than max_size.
+
+    The final size is projected linearly from the bytes written so far and the
+    fraction of the input's duration encoded. Because encoder buffering makes
+    early sizes lag, the projection is an underestimate, so an encode is only
+    stopped once it clearly cannot win.
+
+    Args:
+        max_size: Size in bytes the output must stay below (the input's size)
+
+    Returns:
+        Function returning True when the encode should be aborted
+    """
+
+    def exceeded(progress: EncodeProgress) -> bool:
+        if progress.total_size >= max_size:
+            return True
+        fraction = progress.fraction
+        if fraction is None or fraction < ABORT_MIN_FRACTION:
+            return False
+        return progress.total_size / fraction >= max_size
+
+    return exceeded
+
+
+def get_encoder_args(profile: str, codec: str) -> List[str]:
+    """
+    Get the encoder arguments for a speed profile.
+
+    Args:
+        profile: Profile name (a key of VIDEO_PROFILES)
+        codec: 'h264' or 'vp9'
+
+    Returns:
+        FFmpeg arguments to add after the codec selection
+
+    Raises:
+        VideoCompressionError: If the profile is unknown
+    """
+    if profile not in VIDEO_PROFILES:
+        raise VideoCompressionError(
+            f"Unknown video profile: {profile}. "
+            f"Available profiles: {', '.join(VIDEO_PROFILES)}"
+        )
+    args = list(VIDEO_PROFILES[profile][codec])
+    if codec == "vp9":
+        threads = min(os.cpu_count() or 1, _MAX_VP9_THREADS)
+        args += ["-threads", str(threads)]
+    return args
+
+
+def get_scale_args(max_dimension: Optional[int] = None, scale: Optional[float] = None) -> List[str]:
+    """
+    Get FFmpeg arguments that downscale the video.
+
+    The aspect ratio is kept, frames are never enlarged, and both sides are
+    rounded down to even numbers as required by 4:2:0 chroma subsampling.
+
+    Args:
+        max_dimension: Maximum length of the longer side in pixels
+        scale: Factor to scale both sides by (at most 1)
+
+    Returns:
+        A -vf scale filter, or an empty list if neither option is set
+    """
+    if max_dimension is None and scale is None:
+        return []
+    width, height = "iw", "ih"
+    if scale is not None:
+        width, height = f"iw*{min(scale, 1.0)}", f"ih*{min(scale, 1.0)}"
+    if max_dimension is not None:
+        width, height = f"min({width},{max_dimension})", f"min({height},{max_dimension})"
+    # Quotes protect the commas inside min() from the filtergraph parser
+    return [
+        "-vf",
+        f"scale=w='{width}':h='{height}'"
+        ":force_original_aspect_ratio=decrease:force_divisible_by=2",
+    ]
+
+
+def get_codec_args(
+    container: str,
+    profile: str = DEFAULT_PROFILE,
+    max_dimension: Optional[int] = None,
+    scale: Optional[float] = None,
+    crf: Optional[int] = None,
+) -> List[str]:
+    """
+    Get the FFmpeg output arguments for re-encoding in a container's codec.
+
+    MOV and MP4 get H.264 with the audio copied; WebM gets VP9 with Opus audio.
+
+    Args:
+        container: 'mov', 'mp4' or 'webm'
+        profile: Speed profile (see VIDEO_PROFILES)
+        max_dimension: If set, shrink so the longer side is at most this
+        scale: If set, shrink both sides by this factor
+        crf: Constant rate factor, or None for the codec's DEFAULT_CRF
+
+    Returns:
+        Arguments to place between the input and the output
+
+    Raises:
+        VideoCompressionError: If the container is not supported
+    """
+    if container in ("mov", "mp4"):
+        # -c:v libx264: use H.264 video codec
+        # -crf: constant rate factor (quality setting, lower = better quality)
+        # profile args: x264 preset (encoding speed vs compression tradeoff)
+        # scale args: optional -vf scale filter for max_dimension/scale
+        # -c:a copy: copy audio stream without re-encoding (faster, preserves quality)
+        return [
+            "-c:v",
+            "libx264",
+            "-crf",
+            str(DEFAULT_CRF["h264"] if crf is None else crf),
+            *get_encoder_args(profile, "h264"),
+            *get_scale_args(max_dimension, scale),
+            "-c:a",
+            "copy",
+        ]
+    if container == "webm":
+        # -c:v libvpx-vp9: use VP9 video codec
+        # -crf: constant rate factor (quality setting)
+        # -b:v 0: use CRF mode (variable bitrate)
+        # profile args: deadline/cpu-used speed, row multithreading, tile columns
+        # scale args: optional -vf scale filter for max_dimension/scale
+        # -c:a libopus: use Opus audio codec (standard for WebM)
+        return [
+            "-c:v",
+            "libvpx-vp9",
+            "-crf",
+            str(DEFAULT_CRF["vp9"] if crf is None else crf),
+            "-b:v",
+            "0",
+            *get_encoder_args(profile, "vp9"),
+            *get_scale_args(max_dimension, scale),
+            "-c:a",
+            "libopus",
+        ]
+    raise VideoCompressionError(f"Unsupported video container: {container}")
+
+
+@functools.lru_cache(maxsize=None)
+def _ffmpeg_encoders() -> Tuple[str, ...]:
+    """List the encoders of the installed FFmpeg (empty if it cannot run)."""
+    try:
+        result = subprocess.run(
+            [get_ffmpeg_path(), "-hide_banner", "-encoders"],
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            check=False,
+        )
+    except (OSError, FFmpegNotFoundError):
+        return ()
+    # Lines look like " V....D libx265   libx265 H.265 / HEVC (codec hevc)"
+    return tuple(
+        fields[1]
+        for fields in (line.split() for line in result.stdout.splitlines())
+        if len(fields) >= 2 and len(fields[0]) == 6
+    )
+
+
+def get_video_encoder(video_format: str) -> Tuple[str, str, List[str]]:
+    """
+    Pick the encoder for a target format.
+
+    Args:
+        video_format: A key of VIDEO_FORMATS
+
+    Returns:
+        Tuple of (FFmpeg encoder, VIDEO_PROFILES key, encoder arguments)
+
+    Raises:
+        VideoCompressionError: If FFmpeg has none of the format's encoders
+    """
+    encoders = _ffmpeg_encoders()
+    for candidate in VIDEO_FORMATS[video_format]:
+        if candidate[0] in encoders:
+            return candidate
+    names = ", ".join(encoder for encoder, _, _ in VIDEO_FORMATS[video_format])
+    raise VideoCompressionError(f"This FFmpeg build has no {video_format} encoder ({names})")
+
+
+def available_video_formats() -> List[str]:
+    """
+    Get the target formats the installed FFmpeg can write.
+
+    Returns:
+        Keys of VIDEO_FORMATS with at least one available encoder
+    """
+    encoders = _ffmpeg_encoders()
+    return [
+        name
+        for name, candidates in VIDEO_FORMATS.items()
+        if any(encoder in encoders for encoder, _, _ in candidates)
+    ]
+
+
+def video_target_path(input_path: Path, video_format: Optional[str] = None) -> Path:
+    """
+    Get the path a video is written to.
+
+    The container is kept where it supports the target codec: HEVC cannot be
+    stored in WebM and is written as MP4, and AV1 in MOV is written as MP4.
+
+    Args:
+        input_path: Path to the original video
+        video_format: Target format (a key of VIDEO_FORMATS), or None to keep
+            the original codec family
+
+    Returns:
+        input_path itself, or a sibling with a different extension
+    """
+    extension = input_path.suffix.lower()
+    if video_format == "hevc" and extension == ".webm":
+        return input_path.with_suffix(".mp4")
+    if video_format == "av1" and extension == ".mov":
+        return input_path.with_suffix(".mp4")
+    return input_path
+
+
 def check_ffmpeg_available() -> bool:
     """
     Check if FFmpeg is available on the system.
@@ -50,18 +350,135 @@ def get_ffmpeg_path() -> str:
     return ffmpeg_path
 
 
-def compress_mov_mp4(input_path: Path, output_path: Optional[Path] = None) -> Path:
+def _parse_float(value: str) -> float:
+    """Parse a float from FFmpeg progress output, treating N/A as zero."""
+    try:
+        return float(value.rstrip("x"))
+    except ValueError:
+        return 0.0
+
+
+def run_ffmpeg(
+    cmd: List[str],
+    input_path: Path,
+    on_progress: Optional[ProgressCallback] = None,
+    abort_when: Optional[Callable[[EncodeProgress], bool]] = None,
+) -> None:
+    """
+    Run an FFmpeg command, streaming its progress.
+
+    FFmpeg writes machine-readable progress blocks to stdout (-progress pipe:1),
+    which are parsed as they arrive and passed to on_progress. Stderr is read
+    on a background thread so neither pipe can fill up and stall FFmpeg; only
+    its last STDERR_TAIL_LINES lines are kept for error messages.
+
+    Args:
+        cmd: FFmpeg command line (executable first)
+        input_path: Input file, used in error messages
+        on_progress: Called with an EncodeProgress after each progress block
+        abort_when: Called with each EncodeProgress; if it returns True,
+            FFmpeg is killed and EncodeAbortedError is raised
+
+    Raises:
+        EncodeAbortedError: If abort_when stopped the encode
+        VideoCompressionError: If FFmpeg exits with an error
+        FileNotFoundError: If the FFmpeg executable does not exist
+    """
+    cmd = [cmd[0], "-hide_banner", "-nostats", "-progress", "pipe:1"] + cmd[1:]
+    process = subprocess.Popen(
+        cmd,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        encoding="utf-8",
+        errors="replace",
+    )
+
+    stderr_tail: "deque[str]" = deque(maxlen=STDERR_TAIL_LINES)
+    duration: List[Optional[float]] = [None]
+
+    def drain_stderr() -> None:
+        for line in process.stderr:
+            if duration[0] is None:
+                match = _DURATION_RE.search(line)
+                if match:
+                    hours, minutes, seconds = match.groups()
+                    duration[0] = int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+            stderr_tail.append(line.rstrip())
+
+    stderr_thread = threading.Thread(target=drain_stderr, daemon=True)
+    stderr_thread.start()
+
+    try:
+        fields = {}
+        for line in process.stdout:
+            key, _, value = line.strip().partition("=")
+            if key != "progress":
+                fields[key] = value
+                continue
+            if on_progress is not None or abort_when is not None:
+                progress = EncodeProgress(
+                    frame=int(_parse_float(fields.get("frame", ""))),
+                    fps=_parse_float(fields.get("fps", "")),
+                    out_time=max(0.0, _parse_float(fields.get("out_time_us", "")) / 1_000_000),
+                    total_size=int(_parse_float(fields.get("total_size", ""))),
+                    speed=_parse_float(fields.get("speed", "")),
+                    duration=duration[0],
+                    done=value == "end",
+                )
+                if on_progress is not None:
+                    on_progress(progress)
+                if abort_when is not None and not progress.done and abort_when(progress):
+                    # The finally block kills FFmpeg
+                    raise EncodeAbortedError(
+                        f"Encode of {input_path} stopped: output would not be smaller"
+                    )
+            fields = {}
+
+        process.wait()
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        stderr_thread.join()
+        process.stdout.close()
+        process.stderr.close()
+
+    if process.returncode != 0:
+        error_msg = "\n".join(stderr_tail)
+        raise VideoCompressionError(f"FFmpeg compression failed for {input_path}: {error_msg}")
+
+
+def compress_mov_mp4(
+    input_path: Path,
+    output_path: Optional[Path] = None,
+    on_progress: Optional[ProgressCallback] = None,
+    profile: str = DEFAULT_PROFILE,
+    max_size: Optional[int] = None,
+    max_dimension: Optional[int] = None,
+    scale: Optional[float] = None,
+    crf: Optional[int] = None,
+) -> Path:
     """
-    Compress a MOV or MP4 video using H.264 codec with CRF 23.
+    Compress a MOV or MP4 video using H.264 codec (CRF 28 by default).
 
     Args:
         input_path: Path to the input video file
         output_path: Path for the output file (if None, uses temp file)
+        on_progress: Called with EncodeProgress updates while FFmpeg runs
+        profile: Speed profile (see VIDEO_PROFILES)
+        max_size: If set, stop early once the output clearly will not be
+            smaller than this many bytes (see size_guard)
+        max_dimension: If set, shrink so the longer side is at most this
+        scale: If set, shrink both sides by this factor
+        crf: Constant rate factor, or None for DEFAULT_CRF
 
     Returns:
         Path to the compressed file
 
     Raises:
+        EncodeAbortedError: If the encode was stopped because of max_size
         VideoCompressionError: If compression fails
     """
     if output_path is None:
@@ -71,41 +488,20 @@ def compress_mov_mp4(input_path: Path, output_path: Optional[Path] = None) -> Pa
 
     # Build FFmpeg command
     # -i: input file
-    # -c:v libx264: use H.264 video codec
-    # -crf 23: constant rate factor (quality setting, lower = better quality)
-    # -preset medium: encoding speed vs compression tradeoff
-    # -c:a copy: copy audio stream without re-encoding (faster, preserves quality)
+    # codec args: H.264 at the CRF, copied audio (see get_codec_args)
     # -y: overwrite output file without asking
     cmd = [
         ffmpeg_path,
         "-i",
         str(input_path),
-        "-c:v",
-        "libx264",
-        "-crf",
-        "28",
-        "-preset",
-        "medium",
-        "-c:a",
-        "copy",
+        *get_codec_args("mp4", profile, max_dimension, scale, crf),
         "-y",
         str(output_path),
     ]
 
     try:
-        # Run FFmpeg with suppressed output (errors go to stderr)
-        result = subprocess.run(
-            cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            check=False,
-        )
-
-        if result.returncode != 0:
-            error_msg = result.stderr.decode("utf-8", errors="ignore")
-            raise VideoCompressionError(
-                f"FFmpeg compression failed for {input_path}: {error_msg}"
-            )
+        abort_when = size_guard(max_size) if max_size is not None else None
+        run_ffmpeg(cmd, input_path, on_progress, abort_when)
 
         if not output_path.exists():
             raise VideoCompressionError(
@@ -118,22 +514,39 @@ def compress_mov_mp4(input_path: Path, output_path: Optional[Path] = None) -> Pa
         raise FFmpegNotFoundError(
             "FFmpeg executable not found. Please install FFmpeg: brew install ffmpeg"
         )
-    except subprocess.SubprocessError as e:
+    except (OSError, subprocess.SubprocessError) as e:
         raise VideoCompressionError(f"Failed to run FFmpeg for {input_path}: {e}") from e
 
 
-def compress_webm(input_path: Path, output_path: Optional[Path] = None) -> Path:
+def compress_webm(
+    input_path: Path,
+    output_path: Optional[Path] = None,
+    on_progress: Optional[ProgressCallback] = None,
+    profile: str = DEFAULT_PROFILE,
+    max_size: Optional[int] = None,
+    max_dimension: Optional[int] = None,
+    scale: Optional[float] = None,
+    crf: Optional[int] = None,
+) -> Path:
     """
-    Compress a WebM video using VP9 codec with CRF 30.
+    Compress a WebM video using VP9 codec (CRF 30 by default).
 
     Args:
         input_path: Path to the input video file
         output_path: Path for the output file (if None, uses temp file)
+        on_progress: Called with EncodeProgress updates while FFmpeg runs
+        profile: Speed profile (see VIDEO_PROFILES)
+        max_size: If set, stop early once the output clearly will not be
+            smaller than this many bytes (see size_guard)
+        max_dimension: If set, shrink so the longer side is at most this
+        scale: If set, shrink both sides by this factor
+        crf: Constant rate factor, or None for DEFAULT_CRF
 
     Returns:
         Path to the compressed file
 
     Raises:
+        EncodeAbortedError: If the encode was stopped because of max_size
         VideoCompressionError: If compression fails
     """
     if output_path is None:
@@ -143,42 +556,327 @@ def compress_webm(input_path: Path, output_path: Optional[Path] = None) -> Path:
 
     # Build FFmpeg command
     # -i: input file
-    # -c:v libvpx-vp9: use VP9 video codec
-    # -crf 30: constant rate factor (quality setting)
-    # -b:v 0: use CRF mode (variable bitrate)
-    # -c:a libopus: use Opus audio codec (standard for WebM)
+    # codec args: VP9 at the CRF, Opus audio (see get_codec_args)
     # -y: overwrite output file without asking
     cmd = [
         ffmpeg_path,
         "-i",
         str(input_path),
-        "-c:v",
-        "libvpx-vp9",
-        "-crf",
-        "30",
-        "-b:v",
-        "0",
-        "-c:a",
-        "libopus",
+        *get_codec_args("webm", profile, max_dimension, scale, crf),
         "-y",
         str(output_path),
     ]
 
     try:
-        # Run FFmpeg with suppressed output (errors go to stderr)
-        result = subprocess.run(
-            cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            check=False,
+        abort_when = size_guard(max_size) if max_size is not None else None
+        run_ffmpeg(cmd, input_path, on_progress, abort_when)
+
+        if not output_path.exists():
+            raise VideoCompressionError(
+                f"FFmpeg did not create output file: {output_path}"
+            )
+
+        return output_path
+
+    except FileNotFoundError:
+        raise FFmpegNotFoundError(
+            "FFmpeg executable not found. Please install FFmpeg: brew install ffmpeg"
+        )
+    except (OSError, subprocess.SubprocessError) as e:
+        raise VideoCompressionError(f"Failed to run FFmpeg for {input_path}: {e}") from e
+
+
+def _mp4_index_first(head: bytes) -> bool:
+    """Check whether an MP4/MOV file's moov box comes before its media data."""
+    offset = 0
+    while offset + 8 <= len(head):
+        size, kind = struct.unpack_from(">I4s", head, offset)
+        if kind == b"moov":
+            return True
+        if kind == b"mdat":
+            return False
+        if size == 1:
+            # 64-bit box size follows the type
+            if offset + 16 > len(head):
+                return False
+            size = struct.unpack_from(">Q", head, offset + 8)[0]
+        if size < 8:
+            # Size 0 runs to the end of the file; anything smaller is corrupt
+            return False
+        offset += size
+    return False
+
+
+def _run_ffmpeg_piped(
+    cmd: List[str], chunks: Optional[Iterable[bytes]], output: Optional[IO[bytes]]
+) -> None:
+    """
+    Run FFmpeg with chunks fed to its stdin and its stdout copied to output.
+
+    Stdin is written and stderr drained on background threads, so no pipe can
+    fill up and stall FFmpeg.
+    """
+    process = subprocess.Popen(
+        cmd,
+        stdin=subprocess.DEVNULL if chunks is None else subprocess.PIPE,
+        stdout=subprocess.DEVNULL if output is None else subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    stderr_tail: "deque[str]" = deque(maxlen=STDERR_TAIL_LINES)
+
+    def drain_stderr() -> None:
+        for line in process.stderr:
+            stderr_tail.append(line.decode("utf-8", "replace").rstrip())
+
+    def feed_stdin() -> None:
+        try:
+            for chunk in chunks:
+                process.stdin.write(chunk)
+        except (BrokenPipeError, ValueError):
+            # FFmpeg exited early; its exit status reports why
+            pass
+        finally:
+            try:
+                process.stdin.close()
+            except BrokenPipeError:
+                pass
+
+    threads = [threading.Thread(target=drain_stderr, daemon=True)]
+    if chunks is not None:
+        threads.append(threading.Thread(target=feed_stdin, daemon=True))
+    for thread in threads:
+        thread.start()
+
+    try:
+        if output is not None:
+            shutil.copyfileobj(process.stdout, output, _PIPE_CHUNK_SIZE)
+        process.wait()
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        for thread in threads:
+            thread.join()
+        process.stderr.close()
+        if output is not None:
+            process.stdout.close()
+
+    if process.returncode != 0:
+        error_msg = "\n".join(stderr_tail)
+        raise VideoCompressionError(f"FFmpeg compression failed for stream: {error_msg}")
+
+
+def compress_video_stream(
+    source: IO[bytes],
+    output: IO[bytes],
+    container: str,
+    profile: str = DEFAULT_PROFILE,
+    max_dimension: Optional[int] = None,
+    scale: Optional[float] = None,
+) -> None:
+    """
+    Compress a video read from a binary stream, writing it to another stream.
+
+    Uses the same codec settings as compress_mov_mp4 and compress_webm, and
+    avoids temporary files where the container allows it:
+
+    - WebM is piped through FFmpeg's stdin and stdout
+    - MOV/MP4 input is piped to stdin when its index (the moov box) comes
+      first; otherwise FFmpeg would have to seek to the end, so it is
+      spooled to a temporary file
+    - MOV/MP4 output is written to a temporary file, because FFmpeg seeks
+      back to write the index once the media data is complete
+
+    Unlike compress_video there is no probing and no size check: the encode
+    always runs and its result is always written.
+
+    Args:
+        source: Stream to read the video from (read once, front to back)
+        output: Stream to write the compressed video to
+        container: 'mov', 'mp4' or 'webm'; the output uses the same container
+        profile: Speed profile (see VIDEO_PROFILES)
+        max_dimension: If set, shrink so the longer side is at most this
+        scale: If set, shrink both sides by this factor
+
+    Raises:
+        FFmpegNotFoundError: If FFmpeg is not installed
+        VideoCompressionError: If the container is unsupported or FFmpeg fails
+    """
+    codec_args = get_codec_args(container, profile, max_dimension, scale)
+    ffmpeg_path = get_ffmpeg_path()
+    head = source.read(_MP4_PEEK_SIZE)
+    chunks = itertools.chain([head], iter(lambda: source.read(_PIPE_CHUNK_SIZE), b""))
+
+    try:
+        if container == "webm":
+            cmd = [ffmpeg_path, "-hide_banner", "-i", "pipe:0", *codec_args, "-f", "webm", "pipe:1"]
+            _run_ffmpeg_piped(cmd, chunks, output)
+            return
+
+        with tempfile.TemporaryDirectory(prefix="mpress-") as tmpdir:
+            if _mp4_index_first(head):
+                input_arg, feed = "pipe:0", chunks
+            else:
+                input_path = Path(tmpdir) / f"input.{container}"
+                with open(input_path, "wb") as f:
+                    for chunk in chunks:
+                        f.write(chunk)
+                input_arg, feed = str(input_path), None
+
+            output_path = Path(tmpdir) / f"output.{container}"
+            cmd = [ffmpeg_path, "-hide_banner", "-i", input_arg, *codec_args, str(output_path)]
+            _run_ffmpeg_piped(cmd, feed, None)
+            with open(output_path, "rb") as f:
+                shutil.copyfileobj(f, output, _PIPE_CHUNK_SIZE)
+
+    except FileNotFoundError:
+        raise FFmpegNotFoundError(
+            "FFmpeg executable not found. Please install FFmpeg: brew install ffmpeg"
         )
+    except (OSError, subprocess.SubprocessError) as e:
+        raise VideoCompressionError(f"Failed to run FFmpeg for stream: {e}") from e
+
+
+def transcode_video(
+    input_path: Path,
+    output_path: Path,
+    video_format: str,
+    on_progress: Optional[ProgressCallback] = None,
+    profile: str = DEFAULT_PROFILE,
+    max_size: Optional[int] = None,
+    max_dimension: Optional[int] = None,
+    scale: Optional[float] = None,
+) -> Path:
+    """
+    Encode a video with a modern codec (HEVC or AV1).
+
+    Audio is copied when the output container can hold it, and otherwise
+    re-encoded (Opus for WebM, AAC when moving from WebM to MP4).
+
+    Args:
+        input_path: Path to the input video file
+        output_path: Path for the output file; its extension picks the container
+        video_format: A key of VIDEO_FORMATS
+        on_progress: Called with EncodeProgress updates while FFmpeg runs
+        profile: Speed profile (see VIDEO_PROFILES)
+        max_size: If set, stop early once the output clearly will not be
+            smaller than this many bytes (see size_guard)
+        max_dimension: If set, shrink so the longer side is at most this
+        scale: If set, shrink both sides by this factor
+
+    Returns:
+        Path to the encoded file
+
+    Raises:
+        EncodeAbortedError: If the encode was stopped because of max_size
+        VideoCompressionError: If no encoder is available or encoding fails
+    """
+    ffmpeg_path = get_ffmpeg_path()
+    encoder, profile_key, encoder_args = get_video_encoder(video_format)
+
+    input_webm = input_path.suffix.lower() == ".webm"
+    if output_path.suffix.lower() == ".webm":
+        audio_args = ["-c:a", "libopus"]
+    elif input_webm:
+        audio_args = ["-c:a", "aac", "-b:a", "160k"]
+    else:
+        audio_args = ["-c:a", "copy"]
 
-        if result.returncode != 0:
-            error_msg = result.stderr.decode("utf-8", errors="ignore")
+    # Build FFmpeg command
+    # encoder args: CRF and codec-specific settings (see VIDEO_FORMATS)
+    # profile args: encoder preset or cpu-used speed setting
+    # scale args: optional -vf scale filter for max_dimension/scale
+    cmd = [
+        ffmpeg_path,
+        "-i",
+        str(input_path),
+        "-c:v",
+        encoder,
+        *encoder_args,
+        *get_encoder_args(profile, profile_key),
+        *get_scale_args(max_dimension, scale),
+        *audio_args,
+        "-y",
+        str(output_path),
+    ]
+
+    try:
+        abort_when = size_guard(max_size) if max_size is not None else None
+        run_ffmpeg(cmd, input_path, on_progress, abort_when)
+
+        if not output_path.exists():
             raise VideoCompressionError(
-                f"FFmpeg compression failed for {input_path}: {error_msg}"
+                f"FFmpeg did not create output file: {output_path}"
             )
 
+        return output_path
+
+    except FileNotFoundError:
+        raise FFmpegNotFoundError(
+            "FFmpeg executable not found. Please install FFmpeg: brew install ffmpeg"
+        )
+    except (OSError, subprocess.SubprocessError) as e:
+        raise VideoCompressionError(f"Failed to run FFmpeg for {input_path}: {e}") from e
+
+
+def remux_video(
+    input_path: Path,
+    output_path: Optional[Path] = None,
+    on_progress: Optional[ProgressCallback] = None,
+    max_size: Optional[int] = None,
+) -> Path:
+    """
+    Rewrite a MOV or MP4 video into a fresh container without re-encoding.
+
+    All streams are copied as-is and the index is moved to the front of the
+    file (faststart), which drops stale container data and helps streaming.
+
+    Args:
+        input_path: Path to the input video file
+        output_path: Path for the output file (if None, uses temp file)
+        on_progress: Called with EncodeProgress updates while FFmpeg runs
+        max_size: If set, stop early once the output clearly will not be
+            smaller than this many bytes (see size_guard)
+
+    Returns:
+        Path to the remuxed file
+
+    Raises:
+        EncodeAbortedError: If the remux was stopped because of max_size
+        VideoCompressionError: If remuxing fails
+    """
+    if output_path is None:
+        output_path = input_path.parent / f".{input_path.name}.tmp{input_path.suffix}"
+
+    ffmpeg_path = get_ffmpeg_path()
+
+    # Build FFmpeg command
+    # -map 0: keep every stream (extra audio, subtitles), not just one of each
+    # -dn: data streams cannot be copied into MP4; a timecode track is
+    #      written again from the video stream's timecode tag
+    # -ignore_unknown: leave out streams of unknown type instead of failing
+    # -c copy: copy all selected streams without re-encoding
+    # -movflags +faststart: move the index (moov atom) to the start of the file
+    cmd = [
+        ffmpeg_path,
+        "-i",
+        str(input_path),
+        "-map",
+        "0",
+        "-dn",
+        "-ignore_unknown",
+        "-c",
+        "copy",
+        "-movflags",
+        "+faststart",
+        "-y",
+        str(output_path),
+    ]
+
+    try:
+        abort_when = size_guard(max_size) if max_size is not None else None
+        run_ffmpeg(cmd, input_path, on_progress, abort_when)
+
         if not output_path.exists():
             raise VideoCompressionError(
                 f"FFmpeg did not create output file: {output_path}"
@@ -190,18 +888,55 @@ def compress_webm(input_path: Path, output_path: Optional[Path] = None) -> Path:
         raise FFmpegNotFoundError(
             "FFmpeg executable not found. Please install FFmpeg: brew install ffmpeg"
         )
-    except subprocess.SubprocessError as e:
+    except (OSError, subprocess.SubprocessError) as e:
         raise VideoCompressionError(f"Failed to run FFmpeg for {input_path}: {e}") from e
 
 
-def compress_video(input_path: Path) -> None:
+def compress_video(
+    input_path: Path,
+    on_progress: Optional[ProgressCallback] = None,
+    profile: str = DEFAULT_PROFILE,
+    segments: int = 1,
+    max_dimension: Optional[int] = None,
+    scale: Optional[float] = None,
+    video_format: Optional[str] = None,
+    keep_original: bool = False,
+    durable: bool = False,
+    min_ssim: Optional[float] = None,
+) -> str:
     """
     Compress a video file and replace the original atomically.
 
-    Supports MOV, MP4, and WebM formats.
+    Supports MOV, MP4, and WebM formats. When ffprobe is available the file is
+    probed first: files that are already efficiently encoded are left alone,
+    low-bitrate H.264 is only remuxed, and everything else is re-encoded.
+    The original is only replaced if the result is smaller; encodes that
+    clearly cannot get smaller are stopped early instead of running to
+    completion.
+
+    With video_format the video is transcoded to HEVC or AV1 instead; when
+    the container has to change (see video_target_path) the new file is
+    written next to the original.
 
     Args:
         input_path: Path to the video file to compress
+        on_progress: Called with EncodeProgress updates while FFmpeg runs
+        profile: Speed profile (see VIDEO_PROFILES)
+        segments: If greater than 1, long MOV/MP4 videos are split into up
+            to this many segments that are encoded in parallel (needs ffprobe)
+        max_dimension: If set, shrink so the longer side is at most this
+        scale: If set, shrink both sides by this factor
+        video_format: Target format (a key of VIDEO_FORMATS), or None to keep
+            the original codec family
+        keep_original: When the output has a different name, keep the
+            original file as well
+        durable: Flush the new file to disk before it replaces the original
+        min_ssim: If set, re-encodes use the highest CRF whose samples keep
+            this SSIM (see mpress.crf_search) instead of DEFAULT_CRF; needs
+            ffprobe and a video long enough to sample within the budget
+
+    Returns:
+        REPLACED, KEPT_NO_GAIN, KEPT_ABORTED or KEPT_EFFICIENT
 
     Raises:
         VideoCompressionError: If compression fails or format is unsupported
@@ -217,18 +952,125 @@ def compress_video(input_path: Path) -> None:
         )
 
     # Create temporary output file
-    temp_output = input_path.parent / f".{input_path.name}.tmp{input_path.suffix}"
+    output_path = video_target_path(input_path, video_format)
+    temp_output = output_path.parent / f".{output_path.name}.tmp{output_path.suffix}"
 
     try:
         if extension in (".mov", ".mp4"):
-            compress_mov_mp4(input_path, temp_output)
+            compress = compress_mov_mp4
         elif extension == ".webm":
-            compress_webm(input_path, temp_output)
+            compress = compress_webm
         else:
             raise VideoCompressionError(f"Unsupported video format: {extension}")
+        if output_path != input_path and output_path.exists():
+            raise VideoCompressionError(f"Output file already exists: {output_path}")
+
+        # Imported here: mpress.probe and mpress.segment_encoder build on this module
+        from mpress.probe import (
+            ACTION_ENCODE,
+            ACTION_REMUX,
+            ACTION_SKIP,
+            check_ffprobe_available,
+            plan_compression,
+            probe_video,
+        )
+
+        action = None
+        probe = None
+        if check_ffprobe_available():
+            with stage("probe"):
+                probe = probe_video(input_path)
+            action = plan_compression(probe, extension, video_format, max_dimension, scale)
+        if action == ACTION_SKIP:
+            return KEPT_EFFICIENT
+
+        segmented = False
+        if probe is not None and compress is compress_mov_mp4 and video_format is None:
+            from mpress.segment_encoder import compress_segmented, plan_segment_count
+
+            segmented = plan_segment_count(probe.duration, segments) > 1
+
+        crf = None
+        if (
+            min_ssim is not None
+            and probe is not None
+            and action == ACTION_ENCODE
+            and video_format is None
+        ):
+            from mpress.crf_search import choose_crf
+
+            codec = "h264" if compress is compress_mov_mp4 else "vp9"
+            with stage("sample"):
+                choice = choose_crf(
+                    input_path,
+                    codec,
+                    probe.duration,
+                    min_ssim,
+                    profile,
+                    max_dimension=max_dimension,
+                    scale=scale,
+                )
+            if choice is not None:
+                crf = choice.crf
+                note("video_crf", choice.crf)
+                if choice.ssim is not None:
+                    note("video_ssim", round(choice.ssim, 4))
+                if choice.psnr is not None and choice.psnr != float("inf"):
+                    note("video_psnr", round(choice.psnr, 2))
+                note("video_crf_search_steps", choice.steps)
+
+        original_size = get_file_size(input_path)
+        try:
+            # FFmpeg wall time, including segment splitting and joining
+            with stage("ffmpeg"):
+                if video_format is not None:
+                    transcode_video(
+                        input_path,
+                        temp_output,
+                        video_format,
+                        on_progress,
+                        profile,
+                        original_size,
+                        max_dimension=max_dimension,
+                        scale=scale,
+                    )
+                elif action == ACTION_REMUX:
+                    remux_video(input_path, temp_output, on_progress, original_size)
+                elif segmented:
+                    compress_segmented(
+                        input_path,
+                        temp_output,
+                        segments,
+                        on_progress,
+                        profile,
+                        original_size,
+                        max_dimension=max_dimension,
+                        scale=scale,
+                        crf=crf,
+                    )
+                else:
+                    compress(
+                        input_path,
+                        temp_output,
+                        on_progress,
+                        profile,
+                        original_size,
+                        max_dimension=max_dimension,
+                        scale=scale,
+                        crf=crf,
+                    )
+        except EncodeAbortedError:
+            temp_output.unlink(missing_ok=True)
+            return KEPT_ABORTED
+
+        # Keep the original if re-encoding did not make it smaller
+        if get_file_size(temp_output) >= original_size:
+            temp_output.unlink()
+            return KEPT_NO_GAIN
 
-        # Atomically replace the original file
-        atomic_replace(temp_output, input_path)
+        # Atomically replace the original file (or move the new one into place)
+        commit_output(temp_output, input_path, output_path, keep_original, durable)
+        return REPLACED
 
     except Exception as e:
         # Clean up temp file if it exists
@@ -0,0 +1,564 @@
+"""Watch directories and compress media files as they arrive."""
+
+import ctypes
+import ctypes.util
+import errno
+import os
+import queue
+import select
+import struct
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from mpress.batch import DEFAULT_VIDEO_JOBS, FileResult, classify_path, default_jobs
+from mpress.file_handler import filter_media_path, iter_media_files, path_excluded
+
+
+# Seconds a file's size and modification time must stay unchanged before it
+# is compressed, so uploads still in progress are not picked up half-written
+DEFAULT_SETTLE_SECONDS = 5.0
+
+# Seconds between directory scans when inotify is not available
+DEFAULT_POLL_INTERVAL = 2.0
+
+# Stable files waiting for a worker. When the queue is full the watcher stops
+# reading events until workers catch up; inotify buffers events in the kernel
+# meanwhile and reports an overflow (answered with a full rescan) if it fills.
+DEFAULT_QUEUE_SIZE = 256
+
+# Number of recently compressed files remembered, so the events caused by
+# replacing them do not queue them again
+_RECENT_OUTPUTS = 4096
+
+# inotify(7) constants
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_ONLYDIR = 0x01000000
+_IN_ISDIR = 0x40000000
+_IN_NONBLOCK = os.O_NONBLOCK
+_IN_CLOEXEC = getattr(os, "O_CLOEXEC", 0)
+_WATCH_MASK = _IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_CREATE | _IN_ONLYDIR
+# struct inotify_event: int wd; uint32_t mask, cookie, len; char name[len]
+_EVENT_HEADER = struct.Struct("iIII")
+_READ_SIZE = 64 * 1024
+
+
+class WatchError(Exception):
+    """Exception raised when directories cannot be watched."""
+
+    pass
+
+
+Signature = Tuple[int, int]
+
+
+def _signature(file_path: str) -> Optional[Signature]:
+    """Get (size, mtime_ns) of a file, or None if it is gone."""
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+class _Filter:
+    """The include/exclude filters of a set of watched roots."""
+
+    def __init__(self, roots: Sequence[str], include: Sequence[str], exclude: Sequence[str]):
+        self.roots = [os.path.abspath(os.path.expanduser(root)) for root in roots]
+        self.include = include
+        self.exclude = exclude
+
+    def root_of(self, path: str) -> Optional[str]:
+        for root in self.roots:
+            if path == root or path.startswith(root.rstrip(os.sep) + os.sep):
+                return root
+        return None
+
+    def accepts_file(self, path: str) -> bool:
+        root = self.root_of(path)
+        return root is not None and (
+            filter_media_path(root, path, self.include, self.exclude) is not None
+        )
+
+    def accepts_directory(self, path: str) -> bool:
+        root = self.root_of(path)
+        return root is not None and (path == root or not path_excluded(root, path, self.exclude))
+
+    def scan(self) -> List[str]:
+        return [path for path, _ in iter_media_files(self.roots, self.include, self.exclude)]
+
+
+class PollingWatcher:
+    """Find new and changed files by rescanning the directories periodically."""
+
+    def __init__(
+        self,
+        roots: Sequence[str],
+        include: Sequence[str] = (),
+        exclude: Sequence[str] = (),
+        interval: float = DEFAULT_POLL_INTERVAL,
+    ):
+        """
+        Args:
+            roots: Directories to watch (recursively)
+            include: Glob patterns a file must match
+            exclude: Glob patterns for files and directories to skip
+            interval: Seconds between scans
+        """
+        self._filter = _Filter(roots, include, exclude)
+        self.interval = interval
+        self._signatures: Dict[str, Signature] = {}
+        self._next_scan = 0.0
+
+    def initial_files(self) -> List[str]:
+        """
+        Get the media files present when watching starts.
+
+        Returns:
+            Paths of all matching files
+        """
+        self._scan()
+        return list(self._signatures)
+
+    def read(self, timeout: float) -> List[str]:
+        """
+        Wait up to timeout seconds for new or changed files.
+
+        Args:
+            timeout: Maximum seconds to wait
+
+        Returns:
+            Paths of files that appeared or changed since the last scan
+        """
+        delay = self._next_scan - time.monotonic()
+        if delay > 0:
+            time.sleep(min(delay, timeout))
+            if time.monotonic() < self._next_scan:
+                return []
+        return self._scan()
+
+    def close(self) -> None:
+        """Stop watching."""
+        self._signatures.clear()
+
+    def _scan(self) -> List[str]:
+        changed = []
+        signatures = {}
+        for path in self._filter.scan():
+            signature = _signature(path)
+            if signature is None:
+                continue
+            signatures[path] = signature
+            if self._signatures.get(path) != signature:
+                changed.append(path)
+        self._signatures = signatures
+        self._next_scan = time.monotonic() + self.interval
+        return changed
+
+
+def _load_inotify():
+    """Load the inotify functions from libc."""
+    if not sys.platform.startswith("linux"):
+        raise WatchError("inotify is only available on Linux")
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+    except (OSError, AttributeError) as e:
+        raise WatchError(f"inotify is not available: {e}") from e
+    return libc
+
+
+class InotifyWatcher:
+    """
+    Report files as they are closed after writing or moved into place (Linux).
+
+    Every directory under the roots gets its own watch; directories created
+    or moved in later are added as they appear, and files already inside them
+    are reported.
+    """
+
+    def __init__(
+        self,
+        roots: Sequence[str],
+        include: Sequence[str] = (),
+        exclude: Sequence[str] = (),
+    ):
+        """
+        Args:
+            roots: Directories to watch (recursively)
+            include: Glob patterns a file must match
+            exclude: Glob patterns for files and directories to skip
+
+        Raises:
+            WatchError: If inotify is unavailable or the watch limit is reached
+        """
+        self._libc = _load_inotify()
+        self._filter = _Filter(roots, include, exclude)
+        self._fd = self._libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self._fd < 0:
+            raise WatchError(f"inotify_init1 failed: {os.strerror(ctypes.get_errno())}")
+        self._directories: Dict[int, str] = {}
+        try:
+            self._initial = [path for root in self._filter.roots for path in self._add_tree(root)]
+        except WatchError:
+            self.close()
+            raise
+
+    def initial_files(self) -> List[str]:
+        """
+        Get the media files present when watching starts.
+
+        Returns:
+            Paths of all matching files
+        """
+        files, self._initial = self._initial, []
+        return files
+
+    def read(self, timeout: float) -> List[str]:
+        """
+        Wait up to timeout seconds for files to be written or moved in.
+
+        Args:
+            timeout: Maximum seconds to wait
+
+        Returns:
+            Paths of files that were written, in event order (may repeat)
+        """
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            data = os.read(self._fd, _READ_SIZE)
+        except BlockingIOError:
+            return []
+
+        files = []
+        overflow = False
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            start = offset + _EVENT_HEADER.size
+            name = data[start : start + length].rstrip(b"\0")
+            offset = start + length
+
+            if mask & _IN_Q_OVERFLOW:
+                overflow = True
+                continue
+            if mask & _IN_IGNORED:
+                # The directory was removed or moved away
+                self._directories.pop(wd, None)
+                continue
+            directory = self._directories.get(wd)
+            if directory is None or not name:
+                continue
+
+            path = os.path.join(directory, os.fsdecode(name))
+            if mask & _IN_ISDIR:
+                if mask & (_IN_CREATE | _IN_MOVED_TO):
+                    files.extend(self._add_tree(path))
+            elif mask & (_IN_CLOSE_WRITE | _IN_MOVED_TO) and self._filter.accepts_file(path):
+                files.append(path)
+
+        if overflow:
+            # Events were lost: fall back to reporting every file
+            files.extend(self._filter.scan())
+        return files
+
+    def close(self) -> None:
+        """Stop watching and release the inotify descriptor."""
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+    def _add_tree(self, top: str) -> List[str]:
+        """Watch top and every directory below it; return the media files inside."""
+        files = []
+        for directory, subdirectories, names in os.walk(top):
+            if not self._filter.accepts_directory(directory):
+                subdirectories[:] = []
+                continue
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(directory), _WATCH_MASK)
+            if wd < 0:
+                error = ctypes.get_errno()
+                if error == errno.ENOSPC:
+                    raise WatchError(
+                        "inotify watch limit reached; raise fs.inotify.max_user_watches "
+                        "or use --poll"
+                    )
+                # The directory disappeared or cannot be read; skip it
+                subdirectories[:] = []
+                continue
+            self._directories[wd] = directory
+            subdirectories.sort()
+            for name in sorted(names):
+                path = os.path.join(directory, name)
+                if self._filter.accepts_file(path):
+                    files.append(path)
+        return files
+
+
+def open_watcher(
+    roots: Sequence[str],
+    include: Sequence[str] = (),
+    exclude: Sequence[str] = (),
+    poll: bool = False,
+    poll_interval: float = DEFAULT_POLL_INTERVAL,
+):
+    """
+    Create the best available watcher.
+
+    Args:
+        roots: Directories to watch (recursively)
+        include: Glob patterns a file must match
+        exclude: Glob patterns for files and directories to skip
+        poll: Always use polling, e.g. for network filesystems where inotify
+            does not see changes made by other machines
+        poll_interval: Seconds between scans when polling
+
+    Returns:
+        InotifyWatcher where available, otherwise PollingWatcher
+    """
+    if not poll:
+        try:
+            return InotifyWatcher(roots, include, exclude)
+        except WatchError:
+            pass
+    return PollingWatcher(roots, include, exclude, poll_interval)
+
+
+class SettleTracker:
+    """Hold candidate files until their size and mtime stop changing."""
+
+    def __init__(self, settle_seconds: float = DEFAULT_SETTLE_SECONDS):
+        """
+        Args:
+            settle_seconds: How long a file must stay unchanged
+        """
+        self.settle_seconds = settle_seconds
+        # path -> (signature, time the signature was first seen)
+        self._candidates: Dict[str, Tuple[Signature, float]] = {}
+
+    def __len__(self) -> int:
+        return len(self._candidates)
+
+    def add(self, file_path: str) -> None:
+        """
+        Start (or restart) the settle timer of a file.
+
+        Args:
+            file_path: Path that was written
+        """
+        signature = _signature(file_path)
+        if signature is None:
+            self._candidates.pop(file_path, None)
+        else:
+            self._candidates[file_path] = (signature, time.monotonic())
+
+    def ready(self) -> List[str]:
+        """
+        Take the files that have been stable for settle_seconds.
+
+        Files that changed since they were added have their timer restarted;
+        files that disappeared are dropped.
+
+        Returns:
+            Paths of stable files, oldest first
+        """
+        now = time.monotonic()
+        stable = []
+        for file_path, (signature, since) in list(self._candidates.items()):
+            current = _signature(file_path)
+            if current is None:
+                del self._candidates[file_path]
+            elif current != signature:
+                self._candidates[file_path] = (current, now)
+            elif now - since >= self.settle_seconds:
+                del self._candidates[file_path]
+                stable.append(file_path)
+        return stable
+
+    def next_check(self) -> Optional[float]:
+        """
+        Get the seconds until the next file could become stable.
+
+        Returns:
+            Seconds to wait, or None if there are no candidates
+        """
+        if not self._candidates:
+            return None
+        oldest = min(since for _, since in self._candidates.values())
+        return max(0.0, oldest + self.settle_seconds - time.monotonic())
+
+
+class _RecentOutputs:
+    """Signatures of files mpress just wrote, to ignore the events they cause."""
+
+    def __init__(self, size: int = _RECENT_OUTPUTS):
+        self._size = size
+        self._signatures: "OrderedDict[str, Optional[Signature]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def record(self, file_path: str) -> None:
+        with self._lock:
+            self._signatures[file_path] = _signature(file_path)
+            self._signatures.move_to_end(file_path)
+            while len(self._signatures) > self._size:
+                self._signatures.popitem(last=False)
+
+    def unchanged(self, file_path: str) -> bool:
+        with self._lock:
+            if file_path not in self._signatures:
+                return False
+            return self._signatures[file_path] == _signature(file_path)
+
+
+def watch(
+    roots: Sequence[str],
+    process: Callable[..., FileResult],
+    on_result: Callable[[FileResult], None],
+    jobs: Optional[int] = None,
+    video_jobs: int = DEFAULT_VIDEO_JOBS,
+    include: Sequence[str] = (),
+    exclude: Sequence[str] = (),
+    settle_seconds: float = DEFAULT_SETTLE_SECONDS,
+    queue_size: int = DEFAULT_QUEUE_SIZE,
+    poll: bool = False,
+    poll_interval: float = DEFAULT_POLL_INTERVAL,
+    stop: Optional[threading.Event] = None,
+    on_start: Optional[Callable[[object], None]] = None,
+) -> None:
+    """
+    Compress media files under roots as they arrive, until stopped.
+
+    Files already present when watching starts are processed too (the result
+    cache makes this cheap for files compressed before). A watcher thread
+    passes each file through a SettleTracker and puts stable files on a
+    bounded queue; this thread hands them to resident worker pools (processes
+    for images, threads driving FFmpeg for videos), so Python and Pillow are
+    only loaded once. Results are reported as they finish, not in order.
+
+    Args:
+        roots: Directories to watch (recursively)
+        process: Function called as process(file_path, None) that returns a
+            FileResult; must be picklable when more than one job is used
+        on_result: Called with each FileResult (from worker callback threads)
+        jobs: Number of image worker processes (defaults to the CPU count)
+        video_jobs: Number of concurrent video compressions
+        include: Glob patterns a file must match
+        exclude: Glob patterns for files and directories to skip
+        settle_seconds: How long a file must be unchanged before it is queued
+        queue_size: Maximum number of stable files waiting for a worker
+        poll: Use polling instead of inotify
+        poll_interval: Seconds between scans when polling
+        stop: Set to stop watching; KeyboardInterrupt also stops
+        on_start: Called with the watcher once watching has started
+
+    Raises:
+        WatchError: If a root is not a directory
+    """
+    for root in roots:
+        if not os.path.isdir(root):
+            raise WatchError(f"Not a directory: {root}")
+    if stop is None:
+        stop = threading.Event()
+    jobs = max(1, jobs or default_jobs())
+    video_jobs = max(1, video_jobs)
+
+    watcher = open_watcher(roots, include, exclude, poll, poll_interval)
+    work: "queue.Queue[str]" = queue.Queue(maxsize=max(1, queue_size))
+    recent = _RecentOutputs()
+    producer = threading.Thread(
+        target=_produce,
+        args=(watcher, SettleTracker(settle_seconds), recent, work, stop),
+        name="mpress-watch",
+        daemon=True,
+    )
+
+    if jobs > 1:
+        image_pool = ProcessPoolExecutor(max_workers=jobs)
+    else:
+        image_pool = ThreadPoolExecutor(max_workers=1)
+    video_pool = ThreadPoolExecutor(max_workers=video_jobs)
+    # Only as many files in flight as there are workers; the rest wait in the
+    # bounded queue, which in turn holds back the watcher
+    slots = threading.Semaphore(jobs + video_jobs)
+    # Files being compressed; events for them come from mpress itself
+    in_flight = set()
+    lock = threading.Lock()
+
+    def finished(file_path: str, future: Future) -> None:
+        try:
+            result = future.result()
+        except Exception as e:
+            result = FileResult(file_path, False, f"Unexpected error processing {file_path}: {e}")
+        recent.record(file_path)
+        with lock:
+            in_flight.discard(file_path)
+        slots.release()
+        on_result(result)
+
+    producer.start()
+    if on_start is not None:
+        on_start(watcher)
+    try:
+        while not stop.is_set():
+            try:
+                file_path = work.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            with lock:
+                if file_path in in_flight:
+                    continue
+                in_flight.add(file_path)
+            while not slots.acquire(timeout=0.5):
+                if stop.is_set():
+                    return
+            pool = video_pool if classify_path(file_path) == "video" else image_pool
+            future = pool.submit(process, file_path, None)
+            future.add_done_callback(lambda f, path=file_path: finished(path, f))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        producer.join()
+        watcher.close()
+        image_pool.shutdown(wait=True, cancel_futures=True)
+        video_pool.shutdown(wait=True, cancel_futures=True)
+
+
+def _produce(
+    watcher,
+    tracker: SettleTracker,
+    recent: _RecentOutputs,
+    work: "queue.Queue[str]",
+    stop: threading.Event,
+) -> None:
+    """Watcher thread: feed stable files into the work queue."""
+    for file_path in watcher.initial_files():
+        tracker.add(file_path)
+
+    while not stop.is_set():
+        next_check = tracker.next_check()
+        timeout = 1.0 if next_check is None else min(1.0, next_check)
+        for file_path in watcher.read(timeout):
+            tracker.add(file_path)
+
+        for file_path in tracker.ready():
+            # Replacing a file with its compressed version fires events too
+            if recent.unchanged(file_path):
+                continue
+            while not stop.is_set():
+                try:
+                    work.put(file_path, timeout=0.5)
+                    break
+                except queue.Full:
+                    continue
@@ -0,0 +1,80 @@
+"""Tests for the in-memory api module."""
+
+import io
+
+import pytest
+from PIL import Image
+
+import mpress
+from mpress.api import compress_bytes, compress_stream, detect_format
+from mpress.image_compressor import available_image_formats
+from mpress.options import CompressionOptions
+
+
+class _Pipe(io.RawIOBase):
+    """Non-seekable stream, like a socket or pipe."""
+
+    def __init__(self, data: bytes):
+        self._data = io.BytesIO(data)
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        return self._data.readinto(buffer)
+
+
+def _encode(mode: str, image_format: str, **params) -> bytes:
+    buffer = io.BytesIO()
+    Image.linear_gradient("L").convert(mode).resize((300, 200)).save(
+        buffer, image_format, **params
+    )
+    return buffer.getvalue()
+
+
+def test_compress_bytes_png_and_jpeg():
+    """Test compressing images held in memory, with the format detected."""
+    png = _encode("RGB", "PNG", compress_level=0)
+    result = compress_bytes(png)
+    assert result.startswith(b"\x89PNG") and len(result) < len(png)
+
+    jpeg = _encode("RGB", "JPEG", quality=100)
+    result = compress_bytes(memoryview(jpeg), options=CompressionOptions(max_dimension=150))
+    with Image.open(io.BytesIO(result)) as img:
+        assert (img.format, img.size) == ("JPEG", (150, 100))
+
+    # Re-exported lazily from the package
+    assert mpress.compress_bytes is compress_bytes
+
+
+def test_compress_stream_non_seekable():
+    """Test that a peekable pipe is sniffed without losing its first bytes."""
+    png = _encode("RGBA", "PNG")
+    output = io.BytesIO()
+    assert compress_stream(io.BufferedReader(_Pipe(png)), output) is output
+    assert output.getvalue().startswith(b"\x89PNG")
+
+    with pytest.raises(ValueError, match="format is required"):
+        compress_stream(_Pipe(png))
+    result = compress_stream(_Pipe(png), format="PNG")
+    assert result.tell() == 0 and result.read(4) == b"\x89PNG"
+
+
+def test_compress_stream_target_format():
+    """Test converting through the stream API."""
+    if "webp" not in available_image_formats():
+        pytest.skip("Pillow built without WebP")
+    result = compress_bytes(_encode("RGB", "PNG"), options=CompressionOptions(image_format="webp"))
+    assert result[8:12] == b"WEBP"
+
+
+def test_detect_format():
+    """Test format sniffing and rejection of unknown data."""
+    assert detect_format(b"\x00\x00\x00\x18ftypmp42") == "mp4"
+    assert detect_format(b"\x00\x00\x00\x14ftypqt  ") == "mov"
+    assert detect_format(b"\x1a\x45\xdf\xa3\x01") == "webm"
+    assert detect_format(b"GIF89a") is None
+    with pytest.raises(ValueError, match="Could not detect"):
+        compress_bytes(b"GIF89a")
+    with pytest.raises(ValueError, match="Unsupported format"):
+        compress_bytes(b"", format="gif")
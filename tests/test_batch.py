@@ -0,0 +1,137 @@
+"""Tests for batch module."""
+
+import tempfile
+import time
+from pathlib import Path
+
+from PIL import Image
+
+from mpress.batch import FileResult, classify_path, run_batch
+from mpress.cli import process_file
+
+
+def create_test_images(directory: Path, count: int) -> list[str]:
+    """Create a mix of PNG and JPEG test files."""
+    paths = []
+    for i in range(count):
+        if i % 2:
+            path = directory / f"image{i}.png"
+            Image.new("RGB", (64, 64), color=(i * 10 % 256, 0, 0)).save(path, "PNG")
+        else:
+            path = directory / f"image{i}.jpg"
+            Image.new("RGB", (64, 64), color=(0, 0, i * 10 % 256)).save(path, "JPEG")
+        paths.append(str(path))
+    return paths
+
+
+def test_classify_path():
+    """Test routing of paths by extension."""
+    assert classify_path("a/b/photo.JPG") == "image"
+    assert classify_path("clip.webm") == "video"
+    assert classify_path("notes.txt") is None
+
+
+def test_run_batch_preserves_order():
+    """Test that parallel results come back in input order."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        paths = create_test_images(Path(tmpdir), 12)
+        missing = str(Path(tmpdir) / "missing.png")
+        inputs = paths[:6] + [missing] + paths[6:]
+
+        files = [(file_path, None) for file_path in inputs]
+        results = list(run_batch(files, process_file, jobs=3, video_jobs=2))
+
+        assert [result.file_path for result in results] == inputs
+        for result in results:
+            if result.file_path == missing:
+                assert not result.success
+                assert "File not found" in result.message
+            else:
+                assert result.success, result.message
+                assert result.bytes_before > 0
+
+
+def test_run_batch_sequential():
+    """Test that a single job processes files in order without pools."""
+    calls = []
+
+    def process(file_path, file_type, on_progress=None):
+        calls.append((file_path, on_progress))
+        return FileResult(file_path, file_path.endswith(".png"), f"done {file_path}")
+
+    files = [("a.png", None), ("b.mp4", "video"), ("c.txt", None)]
+    results = list(
+        run_batch(files, process, jobs=1, video_jobs=1, track_progress=lambda path: path)
+    )
+
+    # Only the video gets a progress callback
+    assert calls == [("a.png", None), ("b.mp4", "b.mp4"), ("c.txt", None)]
+    assert results == [
+        FileResult("a.png", True, "done a.png"),
+        FileResult("b.mp4", False, "done b.mp4"),
+        FileResult("c.txt", False, "done c.txt"),
+    ]
+
+
+def record_run(file_path, file_type, on_progress=None):
+    """Record when a task runs, in a file next to its path."""
+    start = time.monotonic()
+    time.sleep(0.2)
+    Path(file_path).write_text(f"{start} {time.monotonic()}")
+    return FileResult(file_path, True, "ok")
+
+
+def test_run_batch_memory_budget_limits_concurrency():
+    """Test that images whose estimates exceed the budget do not overlap."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        paths = [str(Path(tmpdir) / f"image{i}.png") for i in range(3)]
+        files = [(file_path, "image") for file_path in paths]
+
+        results = list(
+            run_batch(
+                files,
+                record_run,
+                jobs=3,
+                memory_budget=100,
+                estimate_memory=lambda file_path: 60,
+            )
+        )
+
+        assert [result.file_path for result in results] == paths
+        spans = sorted(tuple(map(float, Path(p).read_text().split())) for p in paths)
+        for (_, end), (next_start, _) in zip(spans, spans[1:]):
+            assert next_start >= end
+
+
+def test_run_batch_defers_files_past_deadline():
+    """Test that files predicted to overrun the deadline are not started."""
+    seconds = {"a.png": 0.2, "b.png": 100.0, "c.png": 0.2, "d.mp4": 100.0}
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for jobs, video_jobs in ((1, 1), (2, 1)):
+            paths = [str(Path(tmpdir) / f"{jobs}{name}") for name in seconds]
+            files = [(file_path, None) for file_path in paths]
+
+            results = list(
+                run_batch(
+                    files,
+                    record_run,
+                    jobs=jobs,
+                    video_jobs=video_jobs,
+                    deadline=time.monotonic() + 5,
+                    estimate_seconds=lambda file_path: seconds[Path(file_path).name[1:]],
+                )
+            )
+
+            assert [result.file_path for result in results] == paths
+            assert [result.outcome for result in results] == [
+                "failed",
+                "deferred",
+                "failed",
+                "deferred",
+            ]
+            assert [Path(file_path).exists() for file_path in paths] == [
+                True,
+                False,
+                True,
+                False,
+            ]
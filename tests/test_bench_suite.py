@@ -0,0 +1,54 @@
+"""Tests for bench_suite module."""
+
+import json
+import tempfile
+from pathlib import Path
+
+from mpress.bench_suite import (
+    build_report,
+    compare_reports,
+    generate_corpus,
+    load_corpus,
+    load_report,
+    run_suite,
+)
+
+
+def test_generate_corpus_is_deterministic():
+    """Test that the same seed produces byte-identical images."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        first = generate_corpus(Path(tmpdir) / "a", count=1, video=False)
+        second = generate_corpus(Path(tmpdir) / "b", count=1, video=False)
+
+        assert first["clips"] == []
+        for kind in ("screenshots", "alpha", "photos"):
+            assert len(first[kind]) == 1
+            assert first[kind][0].read_bytes() == second[kind][0].read_bytes()
+
+        assert load_corpus(Path(tmpdir) / "a") == first
+
+
+def test_run_suite_report_round_trip():
+    """Test measurements, JSON output and comparison against a baseline."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        corpus = generate_corpus(Path(tmpdir) / "corpus", count=1, video=False)
+        output_dir = Path(tmpdir) / "output"
+        output_dir.mkdir()
+
+        # Video paths are skipped because the corpus has no clips
+        results = run_suite(corpus, output_dir)
+        assert [result.codec for result in results] == ["png-screenshot", "png-alpha", "jpeg-photo"]
+        for result in results:
+            assert result.files == 1
+            assert 0 < result.output_bytes < result.input_bytes
+            assert result.mb_per_s > 0
+            assert result.peak_rss is None or result.peak_rss > 0
+        assert list(output_dir.iterdir()) == []
+
+        report_path = Path(tmpdir) / "report.json"
+        report_path.write_text(json.dumps(build_report(results)))
+        baseline = load_report(report_path)
+        assert baseline["results"]["jpeg-photo"]["ratio"] == results[2].ratio
+
+        changes = compare_reports(baseline, build_report(results))
+        assert changes["png-alpha"]["ratio"] == 0.0
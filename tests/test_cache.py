@@ -0,0 +1,141 @@
+"""Tests for cache module."""
+
+import os
+import pickle
+import tempfile
+from pathlib import Path
+from unittest.mock import patch
+
+from PIL import Image
+
+from mpress.cache import ResultCache, hash_file, settings_key
+from mpress.cli import process_file
+from mpress.options import CompressionOptions
+
+
+def test_settings_key_includes_extension_and_options():
+    """Test that settings keys distinguish formats and options."""
+    png_key = settings_key(Path("a.PNG"))
+    assert png_key.startswith(".png;")
+    assert png_key != settings_key(Path("a.jpg"))
+    assert settings_key(Path("a.mp4"), profile="fast") != settings_key(
+        Path("a.mp4"), profile="archival"
+    )
+
+
+def test_cache_options_only_include_relevant_settings():
+    """Test that video settings do not change image cache keys."""
+    fast = CompressionOptions(video_profile="fast")
+    assert fast.cache_options("image") == CompressionOptions().cache_options("image")
+    assert fast.cache_options("video") == {
+        "video_profile": "fast",
+        "max_dimension": None,
+        "scale": None,
+        "video_format": None,
+        "video_min_ssim": None,
+    }
+
+    rle = CompressionOptions(png_strategy="rle")
+    assert rle.cache_options("image") != CompressionOptions().cache_options("image")
+    assert rle.cache_options("video") == CompressionOptions().cache_options("video")
+
+
+def test_lookup_after_record():
+    """Test that a recorded output is recognised, also at another path."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        cache = ResultCache(Path(tmpdir) / "cache.sqlite3")
+        output = Path(tmpdir) / "out.png"
+        output.write_bytes(b"compressed bytes")
+
+        assert not cache.lookup(output, "png")
+        cache.record(output, "png")
+        assert cache.lookup(output, "png")
+        assert not cache.lookup(output, "jpg")
+
+        copy = Path(tmpdir) / "copy.png"
+        copy.write_bytes(b"compressed bytes")
+        assert cache.lookup(copy, "png")
+
+
+def test_lookup_unchanged_file_does_not_read():
+    """Test that an unchanged path is matched by stat alone."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        cache = ResultCache(Path(tmpdir) / "cache.sqlite3")
+        output = Path(tmpdir) / "out.png"
+        output.write_bytes(b"compressed bytes")
+        cache.record(output, "png")
+
+        with patch("mpress.cache.hash_file") as mock_hash:
+            assert cache.lookup(output, "png")
+            mock_hash.assert_not_called()
+
+        # Modified content must be rehashed and miss
+        output.write_bytes(b"different bytes!")
+        assert not cache.lookup(output, "png")
+
+
+def test_evict_keeps_most_recent():
+    """Test LRU eviction bounds the number of entries."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        cache = ResultCache(Path(tmpdir) / "cache.sqlite3", max_entries=2)
+        paths = []
+        for i in range(3):
+            path = Path(tmpdir) / f"out{i}.png"
+            path.write_bytes(f"content {i}".encode())
+            cache.record(path, "png")
+            paths.append(path)
+
+        cache.evict()
+
+        assert not cache.lookup(paths[0], "png")
+        assert cache.lookup(paths[2], "png")
+
+
+def test_evict_bounds_database_size():
+    """Test LRU eviction bounds the bytes the database uses."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        cache = ResultCache(Path(tmpdir) / "cache.sqlite3", max_bytes=64 * 1024)
+        path = Path(tmpdir) / "out.png"
+        for i in range(1000):
+            path.write_bytes(f"content {i}".encode())
+            cache.record(path, f"png;{'x' * 200}")
+        assert cache.used_bytes() > cache.max_bytes
+
+        cache.evict()
+
+        assert cache.used_bytes() <= cache.max_bytes
+        assert cache.lookup(path, f"png;{'x' * 200}")
+        path.write_bytes(b"content 0")
+        assert not cache.lookup(path, f"png;{'x' * 200}")
+
+
+def test_cache_pickles_without_connection():
+    """Test that a cache can be sent to worker processes."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        cache = ResultCache(Path(tmpdir) / "cache.sqlite3")
+        output = Path(tmpdir) / "out.png"
+        output.write_bytes(b"data")
+        cache.record(output, "png")
+
+        clone = pickle.loads(pickle.dumps(cache))
+        assert clone.lookup(output, "png")
+
+
+def test_process_file_skips_cached_output():
+    """Test that a second run skips the file mpress just compressed."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        cache = ResultCache(Path(tmpdir) / "cache.sqlite3")
+        input_path = Path(tmpdir) / "test.jpg"
+        Image.new("RGB", (64, 64), color="blue").save(input_path, "JPEG", quality=95)
+
+        result = process_file(str(input_path), cache=cache)
+        assert result.success
+        assert result.message.startswith("Compressed")
+        digest = hash_file(input_path)
+
+        result = process_file(str(input_path), cache=cache)
+        assert result.success
+        assert result.message.startswith("Skipped")
+        assert result.bytes_before == result.bytes_after
+        assert hash_file(input_path) == digest
+        assert not os.path.exists(Path(tmpdir) / ".test.jpg.tmp")
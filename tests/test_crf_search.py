@@ -0,0 +1,72 @@
+"""Tests for crf_search module."""
+
+import os
+import subprocess
+import tempfile
+from pathlib import Path
+
+import pytest
+
+from mpress.crf_search import CRF_SEARCH_RANGES, choose_crf, plan_search_steps, sample_starts
+from mpress.video_compressor import check_ffmpeg_available
+
+
+def make_clip(path: Path, source: str, seconds: int = 12) -> None:
+    """Encode a lavfi source at high quality."""
+    subprocess.run(
+        [
+            "ffmpeg",
+            "-v",
+            "error",
+            "-f",
+            "lavfi",
+            "-i",
+            f"{source}=duration={seconds}:size=320x180:rate=25",
+            "-vf",
+            "noise=alls=30:allf=t" if source.startswith("testsrc") else "null",
+            "-c:v",
+            "mpeg4",
+            "-q:v",
+            "2",
+            "-y",
+            str(path),
+        ],
+        check=True,
+    )
+
+
+def test_plan_search_steps():
+    """Test that the budget bounds the number of candidates."""
+    assert plan_search_steps(None) == 0
+    assert plan_search_steps(30.0) == 0
+    assert plan_search_steps(300.0) == 2
+    assert plan_search_steps(3600.0) == 4
+    # A larger budget searches shorter videos
+    assert plan_search_steps(30.0, budget=2.0) == 4
+    starts = sample_starts(60.0)
+    assert len(starts) == 3 and 0 < starts[0] < starts[1] < starts[2] < 60
+
+
+def test_choose_crf_static_vs_noisy():
+    """Test that static footage gets a higher CRF than noisy footage."""
+    if not check_ffmpeg_available():
+        pytest.skip("FFmpeg not available")
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        static = Path(tmpdir) / "static.mp4"
+        noisy = Path(tmpdir) / "noisy.mp4"
+        make_clip(static, "smptebars")
+        make_clip(noisy, "testsrc2")
+
+        static_choice = choose_crf(static, "h264", 12.0, 0.97, "fast", budget=3.0)
+        noisy_choice = choose_crf(noisy, "h264", 12.0, 0.97, "fast", budget=3.0)
+        # Sampling leaves nothing behind
+        assert sorted(os.listdir(tmpdir)) == ["noisy.mp4", "static.mp4"]
+
+    low, high = CRF_SEARCH_RANGES["h264"]
+    for choice in (static_choice, noisy_choice):
+        assert low <= choice.crf <= high
+        assert choice.steps <= 4
+        assert choice.ssim is None or choice.ssim >= 0.97
+    assert static_choice.crf > noisy_choice.crf
+    assert choose_crf(static, "h264", 12.0, 0.97) is None
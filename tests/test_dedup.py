@@ -0,0 +1,133 @@
+"""Tests for dedup module."""
+
+import os
+import random
+import tempfile
+from pathlib import Path
+
+import pytest
+from PIL import Image
+
+from mpress.batch import FileResult
+from mpress.cli import main, process_file
+from mpress.dedup import DedupSummary, group_duplicates, share_results
+from mpress.options import CompressionOptions
+
+
+def _noisy_png(path: Path, seed: int) -> None:
+    """Write a PNG that compression makes smaller."""
+    rng = random.Random(seed)
+    pixels = bytes(rng.randrange(0, 256, 32) for _ in range(64 * 64 * 3))
+    Image.frombytes("RGB", (64, 64), pixels).save(path, "PNG", compress_level=0)
+
+
+def test_group_duplicates():
+    """Test that only files with identical content are grouped."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        paths = {name: os.path.join(tmpdir, name) for name in "abcde"}
+        contents = {"a": b"x" * 100, "b": b"y" * 100, "c": b"x" * 100, "d": b"x" * 99}
+        for name, data in contents.items():
+            Path(paths[name] + ".png").write_bytes(data)
+        # Same content, different extension
+        Path(paths["e"] + ".jpg").write_bytes(b"x" * 100)
+        inputs = [(paths[name] + ".png", None) for name in "abcd"]
+        inputs += [(paths["e"] + ".jpg", "image"), (paths["a"] + ".png", None)]
+
+        unique, duplicates = group_duplicates(inputs)
+
+    assert unique == inputs[:2] + inputs[3:5]
+    assert duplicates == {inputs[0][0]: [inputs[2][0], inputs[0][0]]}
+
+
+def test_share_results_copies_output():
+    """Test that a duplicate gets the output of the file it duplicates."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        first = Path(tmpdir) / "logo.png"
+        copy = Path(tmpdir) / "nested" / "logo.png"
+        copy.parent.mkdir()
+        _noisy_png(first, seed=1)
+        copy.write_bytes(first.read_bytes())
+        os.chmod(copy, 0o640)
+
+        unique, duplicates = group_duplicates([(str(first), None), (str(copy), None)])
+        assert unique == [(str(first), None)]
+        results = list(
+            share_results((process_file(path) for path, _ in unique), duplicates)
+        )
+
+        assert [result.file_path for result in results] == [str(first), str(copy)]
+        assert all(result.success for result in results)
+        assert results[1].outcome == "compressed"
+        assert results[1].bytes_after == results[0].bytes_after < results[0].bytes_before
+        assert copy.read_bytes() == first.read_bytes()
+        assert not os.path.samefile(first, copy)
+        assert os.stat(copy).st_mode & 0o777 == 0o640
+        assert os.listdir(copy.parent) == ["logo.png"]
+
+        summary = DedupSummary()
+        for result in results:
+            summary.add(result)
+        assert summary.files == 1
+        assert summary.bytes_saved == results[0].bytes_before - results[0].bytes_after
+        assert summary.cpu_seconds == results[0].cpu_seconds > 0
+
+
+def test_share_results_hardlinks_and_conversions():
+    """Test hard links and converted outputs for duplicates."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        first = Path(tmpdir) / "a.png"
+        copy = Path(tmpdir) / "b.png"
+        _noisy_png(first, seed=2)
+        copy.write_bytes(first.read_bytes())
+
+        results = list(
+            share_results(
+                [process_file(str(first))], {str(first): [str(copy)]}, hardlink=True
+            )
+        )
+        assert results[1].success
+        assert os.path.samefile(first, copy)
+
+        # A converted output is copied to the duplicate's own name
+        options = CompressionOptions(image_format="webp")
+        _noisy_png(first, seed=3)
+        copy.unlink()
+        copy.write_bytes(first.read_bytes())
+        results = list(
+            share_results(
+                [process_file(str(first), options=options)], {str(first): [str(copy)]}, options
+            )
+        )
+        assert results[1].success, results[1].message
+        assert results[1].output_path == str(Path(tmpdir) / "b.webp")
+        assert not copy.exists()
+        assert sorted(os.listdir(tmpdir)) == ["a.webp", "b.webp"]
+
+
+def test_share_results_propagates_outcomes():
+    """Test that duplicates of kept or failed files are not written."""
+    kept = FileResult("a.mp4", True, "Kept original (compressed file was not smaller): a.mp4")
+    kept = kept._replace(outcome="no-gain", cpu_seconds=2.0)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        copy = Path(tmpdir) / "b.mp4"
+        copy.write_bytes(b"video")
+        failed = FileResult("c.mp4", False, "Compression error: bad file")
+        results = list(
+            share_results([kept, failed], {"a.mp4": [str(copy)], "c.mp4": [str(copy)]})
+        )
+
+    assert results[1].success
+    assert results[1].outcome == "no-gain"
+    assert results[1].bytes_before == results[1].bytes_after == 5
+    assert dict(results[1].details)["cpu_seconds_saved"] == 2.0
+    assert not results[3].success
+    assert "duplicate of c.mp4" in results[3].message
+
+
+def test_hardlink_duplicates_requires_dedup(capsys):
+    """Test that --hardlink-duplicates without --dedup is rejected."""
+    with pytest.raises(SystemExit) as exc_info:
+        main(["--hardlink-duplicates", "logo.png"])
+
+    assert exc_info.value.code == 2
+    assert "--hardlink-duplicates requires --dedup" in capsys.readouterr().err
@@ -1,14 +1,20 @@
 """Tests for file_handler module."""
 
 import os
+import random
+import sys
 import tempfile
 from pathlib import Path
 
 import pytest
+from PIL import Image
 
+from mpress.cli import main
 from mpress.file_handler import (
     FileValidationError,
     SUPPORTED_FORMATS,
+    filter_media_path,
+    iter_media_files,
     validate_file,
 )
 
@@ -65,3 +71,98 @@ def test_validate_file_video_format():
     finally:
         os.unlink(tmp_path)
 
+
+def test_iter_media_files_recursive():
+    """Test walking a tree with include/exclude patterns."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        root = Path(tmpdir)
+        (root / "a" / "b").mkdir(parents=True)
+        (root / "skip").mkdir()
+        for name in [
+            "top.png",
+            "a/clip.mp4",
+            "a/b/photo.JPG",
+            "a/notes.txt",
+            "a/.clip.mp4.tmp.mp4",
+            "skip/ignored.png",
+        ]:
+            (root / name).write_bytes(b"data")
+
+        found = list(iter_media_files([tmpdir], exclude=["skip"]))
+
+        assert found == [
+            (str(root / "top.png"), "image"),
+            (str(root / "a" / "clip.mp4"), "video"),
+            (str(root / "a" / "b" / "photo.JPG"), "image"),
+        ]
+
+        found = list(iter_media_files([tmpdir], include=["*.png"]))
+        assert [Path(path).name for path, _ in found] == ["top.png", "ignored.png"]
+
+
+@pytest.mark.skipif(
+    not hasattr(os, "geteuid") or os.geteuid() == 0,
+    reason="permission checks do not apply to root",
+)
+def test_iter_media_files_unwritable_needs_validation():
+    """Test that files failing the fast checks are left for validate_file."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = Path(tmpdir) / "readonly.png"
+        path.write_bytes(b"data")
+        path.chmod(0o444)
+
+        assert list(iter_media_files([tmpdir])) == [(str(path), None)]
+        with pytest.raises(FileValidationError, match="Cannot write"):
+            validate_file(str(path))
+
+
+def test_iter_media_files_unreadable_directory():
+    """Test that a missing directory is reported through on_error."""
+    errors = []
+    found = list(iter_media_files(["/nonexistent/dir"], on_error=errors.append))
+    assert found == []
+    assert len(errors) == 1
+    assert "Cannot read directory" in str(errors[0])
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="symlinks need privileges on Windows")
+def test_recursive_run_compresses_symlink_target(monkeypatch):
+    """Test that -r compresses a symlinked file's target and keeps the link."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        monkeypatch.setenv("MPRESS_CACHE_DIR", os.path.join(tmpdir, "cache"))
+        tree = Path(tmpdir) / "tree"
+        (tree / "real").mkdir(parents=True)
+        target = tree / "real" / "a.png"
+        rng = random.Random(0)
+        pixels = bytes(rng.randrange(0, 256, 32) for _ in range(64 * 64 * 3))
+        Image.frombytes("RGB", (64, 64), pixels).save(target, "PNG", compress_level=0)
+        original = target.read_bytes()
+        link = tree / "link.png"
+        link.symlink_to(target)
+
+        found = list(iter_media_files([str(tree)], exclude=["real"]))
+        assert found == [(str(target), "image")]
+
+        with pytest.raises(SystemExit) as exc_info:
+            main(["-r", str(tree), "--exclude", "real", "--no-cache", "--no-progress"])
+        assert exc_info.value.code == 0
+        assert link.is_symlink()
+        assert os.readlink(link) == str(target)
+        assert target.read_bytes() != original
+
+
+def test_filter_media_path_matches_walker():
+    """Test that single-file filtering applies the walker's rules."""
+    root = os.path.join(os.sep, "media")
+    exclude = ["cache"]
+
+    def check(relative_path, include=()):
+        return filter_media_path(root, os.path.join(root, relative_path), include, exclude)
+
+    assert check("a.png") == "image"
+    assert check(os.path.join("sub", "b.MP4")) == "video"
+    assert check("notes.txt") is None
+    assert check(".a.png.tmp") is None
+    assert check(os.path.join("cache", "c.png")) is None
+    assert check("a.png", include=["*.jpg"]) is None
+    assert filter_media_path(root, os.path.join(os.sep, "other", "a.png")) is None
@@ -1,5 +1,6 @@
 """Tests for image_compressor module."""
 
+import io
 import os
 import tempfile
 from pathlib import Path
@@ -7,7 +8,17 @@ from pathlib import Path
 import pytest
 from PIL import Image
 
-from mpress.image_compressor import ImageCompressionError, compress_image
+from mpress.image_compressor import (
+    JPEG_QUALITY,
+    ImageCompressionError,
+    compress_image,
+    compress_jpeg,
+    compress_png,
+    available_image_formats,
+    estimate_decode_memory,
+    quantize_png,
+    search_jpeg_quality,
+)
 
 
 def create_test_png(path: Path, size: tuple[int, int] = (100, 100)) -> None:
@@ -40,6 +51,64 @@ def test_compress_png():
         assert compressed_size <= original_size
 
 
+def test_compress_png_exact_palette_is_lossless():
+    """Test that images with at most 256 colors keep every pixel."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for mode, colors in (
+            ("RGB", [(255, 0, 0), (0, 255, 0), (0, 0, 255), (12, 34, 56)]),
+            ("RGBA", [(255, 0, 0, 255), (0, 255, 0, 128), (0, 0, 255, 0), (12, 34, 56, 255)]),
+        ):
+            input_path = Path(tmpdir) / f"{mode}.png"
+            img = Image.new(mode, (40, 10))
+            for i, color in enumerate(colors):
+                img.paste(color, (i * 10, 0, i * 10 + 10, 10))
+            img.save(input_path, "PNG")
+
+            output_path = compress_png(input_path, Path(tmpdir) / f"{mode}-out.png")
+
+            with Image.open(output_path) as result:
+                assert result.mode == "P"
+                assert result.convert(mode).tobytes() == img.tobytes()
+
+
+def test_compress_png_zlib_settings():
+    """Test that the zlib level and strategy are selectable."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        input_path = Path(tmpdir) / "test.png"
+        create_test_png(input_path)
+
+        for level, strategy in ((1, "huffman"), (6, "rle"), (9, "default")):
+            output_path = compress_png(
+                input_path, Path(tmpdir) / "out.png", compress_level=level, strategy=strategy
+            )
+            with Image.open(output_path) as result:
+                assert result.convert("RGB").getpixel((0, 0)) == (255, 0, 0)
+
+        with pytest.raises(ImageCompressionError, match="Unknown PNG strategy"):
+            compress_png(input_path, strategy="bogus")
+
+
+def test_quantize_png_methods():
+    """Test quantizer selection for images with many colors."""
+    gradient = Image.merge(
+        "RGB", (Image.linear_gradient("L"), Image.radial_gradient("L"), Image.new("L", (256, 256)))
+    )
+    rgba = gradient.convert("RGBA")
+
+    assert quantize_png(gradient, "auto").mode == "P"
+    assert quantize_png(rgba, "auto").mode == "P"
+    assert quantize_png(gradient, "mediancut").mode == "P"
+
+    # Palette images are left alone
+    palette_img = quantize_png(gradient)
+    assert quantize_png(palette_img) is palette_img
+
+    with pytest.raises(ImageCompressionError, match="does not support transparency"):
+        quantize_png(rgba, "maxcoverage")
+    with pytest.raises(ImageCompressionError, match="Unknown PNG quantizer"):
+        quantize_png(gradient, "bogus")
+
+
 def test_compress_jpeg():
     """Test JPEG compression."""
     with tempfile.TemporaryDirectory() as tmpdir:
@@ -58,6 +127,131 @@ def test_compress_jpeg():
         assert compressed_size <= original_size
 
 
+def test_compress_jpeg_lossless_tier():
+    """Test that bloated JPEGs are optimized without re-encoding."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        input_path = Path(tmpdir) / "photo.jpg"
+        img = Image.effect_noise((100, 100), 30).convert("RGB")
+        exif = Image.Exif()
+        exif[0x010E] = "x" * 20000
+        img.save(input_path, "JPEG", quality=95, exif=exif)
+        with Image.open(input_path) as original:
+            pixels = original.tobytes()
+
+        # Too little gain: re-encoded at quality 85
+        output_path = compress_jpeg(input_path, Path(tmpdir) / "q85.jpg", lossless_min_gain=1)
+        with Image.open(output_path) as result:
+            assert result.tobytes() != pixels
+
+        output_path = compress_jpeg(input_path, Path(tmpdir) / "lossless.jpg")
+        assert output_path.stat().st_size < input_path.stat().st_size - 20000
+        with Image.open(output_path) as result:
+            assert result.tobytes() == pixels
+            assert not result.getexif()
+
+
+def test_compress_jpeg_max_size():
+    """Test reduced-size decoding of a large JPEG."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        input_path = Path(tmpdir) / "large.jpg"
+        create_test_jpeg(input_path, (4000, 3000))
+        assert estimate_decode_memory(input_path) == 4000 * 3000 * 4 * 2
+
+        output_path = compress_jpeg(input_path, Path(tmpdir) / "out.jpg", max_dimension=500)
+
+        with Image.open(output_path) as result:
+            assert result.size == (500, 375)
+
+
+def test_compress_jpeg_transparency_on_white():
+    """Test that transparent pixels are composited onto white."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        input_path = Path(tmpdir) / "alpha.jpg"
+        img = Image.new("RGBA", (20, 10), (0, 0, 0, 0))
+        img.paste((0, 0, 255, 255), (10, 0, 20, 10))
+        # A mislabeled PNG: JPEG cannot store alpha
+        img.save(input_path, "PNG")
+
+        output_path = compress_jpeg(input_path, Path(tmpdir) / "out.jpg")
+
+        with Image.open(output_path) as result:
+            white = result.getpixel((2, 5))
+            blue = result.getpixel((17, 5))
+        assert min(white) > 245
+        assert blue[2] > 200 and blue[0] < 50
+
+
+def test_search_jpeg_quality():
+    """Test the SSIM-targeted quality search and its bounded cost."""
+    pytest.importorskip("numpy")
+    from mpress.quality import luma_plane, ssim
+
+    noise = Image.merge("RGB", [Image.effect_noise((300, 200), 30) for _ in range(3)])
+    img = Image.blend(noise, Image.linear_gradient("L").resize((300, 200)).convert("RGB"), 0.5)
+    assert ssim(luma_plane(img), luma_plane(img)) == 1.0
+
+    baseline = io.BytesIO()
+    img.save(baseline, "JPEG", quality=JPEG_QUALITY, optimize=True)
+
+    low_data, low = search_jpeg_quality(img, 0.8)
+    high_data, high = search_jpeg_quality(img, 0.995)
+    for data, search, target in ((low_data, low, 0.8), (high_data, high, 0.995)):
+        assert search.steps <= 6
+        assert search.size == len(data)
+        assert search.baseline_size == len(baseline.getvalue())
+        assert search.ssim is None or search.ssim >= target
+    assert low.quality < JPEG_QUALITY < high.quality
+    assert low.size < low.baseline_size < high.size
+
+    # One step only scores JPEG_QUALITY
+    _, capped = search_jpeg_quality(img, 0.8, max_steps=1)
+    assert (capped.quality, capped.steps) == (JPEG_QUALITY, 1)
+
+
+def test_compress_image_downscale():
+    """Test --max-dimension/--scale on both image paths."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        png_path = Path(tmpdir) / "shot.png"
+        Image.linear_gradient("L").resize((600, 300)).convert("RGB").save(png_path)
+        jpeg_path = Path(tmpdir) / "photo.jpg"
+        create_test_jpeg(jpeg_path, (3000, 2000))
+
+        compress_image(png_path, max_dimension=200)
+        compress_image(jpeg_path, scale=0.25)
+        # Smaller images are never enlarged
+        compress_image(png_path, max_dimension=1000)
+
+        with Image.open(png_path) as result:
+            assert result.size == (200, 100)
+        with Image.open(jpeg_path) as result:
+            assert result.size == (750, 500)
+
+
+def test_compress_image_target_format():
+    """Test conversion to WebP, keeping or removing the original."""
+    if "webp" not in available_image_formats():
+        pytest.skip("Pillow built without WebP support")
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        jpeg_path = Path(tmpdir) / "photo.jpg"
+        create_test_jpeg(jpeg_path)
+        png_path = Path(tmpdir) / "icon.png"
+        Image.new("RGBA", (32, 32), (255, 0, 0, 128)).save(png_path)
+
+        assert compress_image(jpeg_path, image_format="webp") == Path(tmpdir) / "photo.webp"
+        assert compress_image(png_path, image_format="webp", keep_original=True) == (
+            Path(tmpdir) / "icon.webp"
+        )
+        assert sorted(os.listdir(tmpdir)) == ["icon.png", "icon.webp", "photo.webp"]
+        with Image.open(Path(tmpdir) / "icon.webp") as result:
+            assert result.mode == "RGBA"
+
+        # Existing files are never overwritten by a conversion
+        with pytest.raises(ImageCompressionError, match="already exists"):
+            compress_image(png_path, image_format="webp")
+        assert sorted(os.listdir(tmpdir)) == ["icon.png", "icon.webp", "photo.webp"]
+
+
 def test_compress_image_nonexistent():
     """Test compression of non-existent file."""
     with tempfile.TemporaryDirectory() as tmpdir:
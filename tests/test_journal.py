@@ -0,0 +1,141 @@
+"""Tests for journal module."""
+
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import pytest
+from PIL import Image
+
+from mpress.batch import FileResult
+from mpress.cli import main
+from mpress.journal import (
+    BatchJournal,
+    JournalError,
+    is_unchanged,
+    prune_journals,
+    run_key,
+    sweep_temp_files,
+    temp_outputs_for,
+)
+
+
+def test_journal_survives_reopen():
+    """Test that events are replayed into finished and interrupted files."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        done = Path(tmpdir) / "done.png"
+        done.write_bytes(b"small")
+        converted = str(Path(tmpdir) / "converted.jpg")
+
+        journal = BatchJournal(Path(tmpdir) / "run.sqlite3")
+        journal.reset({"files": [tmpdir]})
+        for path in (str(done), converted, "failed.png", "running.png"):
+            journal.submitted(path)
+        journal.finished(FileResult(str(done), True, "", 10, 5, "compressed"))
+        journal.finished(FileResult(converted, True, "", 10, 5, "compressed"))
+        journal.finished(FileResult("failed.png", False, "Error"))
+        # Closed without delete, as when the run is killed
+        journal.close()
+
+        journal = BatchJournal(Path(tmpdir) / "run.sqlite3")
+        completed = journal.completed()
+        assert sorted(completed) == sorted([str(done), converted])
+        assert completed[converted] is None
+        assert is_unchanged(str(done), completed[str(done)])
+        assert is_unchanged(converted, completed[converted])
+        assert journal.interrupted() == ["running.png"]
+
+        done.write_bytes(b"changed!")
+        assert not is_unchanged(str(done), completed[str(done)])
+
+        journal.reset({"files": [tmpdir]})
+        assert journal.completed() == {}
+        journal.close(delete=True)
+        assert os.listdir(tmpdir) == ["done.png"]
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="journal locking needs fcntl")
+def test_journal_lock_excludes_second_run():
+    """Test that a live run's journal cannot be opened by another."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        first = BatchJournal(Path(tmpdir) / "run.sqlite3")
+        try:
+            # POSIX record locks never exclude their own process, so try
+            # from a child
+            pid = os.fork()
+            if pid == 0:
+                try:
+                    BatchJournal(Path(tmpdir) / "run.sqlite3")
+                except JournalError:
+                    os._exit(0)
+                os._exit(1)
+            _, status = os.waitpid(pid, 0)
+            assert os.WEXITSTATUS(status) == 0
+        finally:
+            first.close()
+
+
+def test_sweep_temp_files():
+    """Test that only temporary files belonging to the given inputs are removed."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        root = Path(tmpdir)
+        names = (
+            "a.png",
+            ".a.png.tmp",
+            ".a.webp.tmp",
+            "b.mov",
+            ".b.mov.tmp.mov",
+            ".b.mp4.tmp.mp4",
+            ".c.png.tmp",
+            ".a.png.backup",
+        )
+        for name in names:
+            (root / name).write_bytes(b"x")
+        (root / ".b.mov.x1y2.tmp").mkdir()
+        (root / ".b.mov.x1y2.tmp" / "segment-0.mov").write_bytes(b"x")
+
+        assert [path.name for path in temp_outputs_for(root / "a.png")] == [
+            ".a.png.tmp",
+            ".a.webp.tmp",
+        ]
+        removed = sweep_temp_files([str(root / "a.png"), str(root / "b.mov")])
+        assert len(removed) == 5
+        assert sorted(os.listdir(tmpdir)) == [".a.png.backup", ".c.png.tmp", "a.png", "b.mov"]
+
+
+def test_run_key_and_prune():
+    """Test run keys and deletion of abandoned journals."""
+    assert run_key({"files": ["a"], "recursive": True}) == run_key(
+        {"recursive": True, "files": ["a"]}
+    )
+    assert run_key({"files": ["a"]}) != run_key({"files": ["b"]})
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        old = Path(tmpdir) / "old.sqlite3"
+        old.write_bytes(b"")
+        (Path(tmpdir) / "old.lock").write_bytes(b"")
+        (Path(tmpdir) / "new.sqlite3").write_bytes(b"")
+        stale = time.time() - 3600
+        os.utime(old, (stale, stale))
+        prune_journals(Path(tmpdir), max_age=60)
+        assert os.listdir(tmpdir) == ["new.sqlite3"]
+
+
+def test_only_batches_are_journaled(monkeypatch):
+    """Test that a single-file run opens no journal, and a batch does."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        monkeypatch.setenv("MPRESS_CACHE_DIR", os.path.join(tmpdir, "cache"))
+        journals = Path(tmpdir) / "cache" / "journals"
+        images = [os.path.join(tmpdir, name) for name in ("a.png", "b.png")]
+        for image in images:
+            Image.new("RGB", (64, 64)).save(image)
+
+        with pytest.raises(SystemExit):
+            main([images[0], "--no-cache", "--no-progress"])
+        assert not journals.exists()
+
+        with pytest.raises(SystemExit):
+            main(images + ["--no-cache", "--no-progress"])
+        assert journals.is_dir()
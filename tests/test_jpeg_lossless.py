@@ -0,0 +1,79 @@
+"""Tests for jpeg_lossless module."""
+
+import io
+
+import pytest
+from PIL import Image, ImageCms
+
+from mpress.jpeg_lossless import (
+    JpegLosslessError,
+    has_jpegtran,
+    optimize_huffman,
+    strip_metadata,
+)
+
+
+def create_jpeg_with_metadata(progressive: bool = False) -> bytes:
+    """Create a JPEG with EXIF (rotated), an ICC profile, a comment and a trailer."""
+    img = Image.merge("RGB", [Image.effect_noise((120, 80), 30) for _ in range(3)])
+    exif = Image.Exif()
+    exif[0x0112] = 6
+    exif[0x010E] = "x" * 5000
+    icc = ImageCms.ImageCmsProfile(ImageCms.createProfile("sRGB")).tobytes()
+    buffer = io.BytesIO()
+    img.save(
+        buffer,
+        "JPEG",
+        quality=90,
+        exif=exif,
+        icc_profile=icc,
+        comment=b"comment",
+        progressive=progressive,
+    )
+    return buffer.getvalue() + b"camera trailer" * 100
+
+
+@pytest.mark.parametrize("progressive", [False, True])
+def test_strip_metadata_keeps_pixels(progressive):
+    """Test that stripping removes metadata but not a single pixel."""
+    data = create_jpeg_with_metadata(progressive)
+
+    stripped = strip_metadata(data)
+    kept = strip_metadata(data, keep=("orientation", "icc"))
+    assert len(stripped) < len(kept) < len(data) - 5000
+
+    with Image.open(io.BytesIO(data)) as original:
+        pixels = original.tobytes()
+    with Image.open(io.BytesIO(stripped)) as img:
+        assert img.tobytes() == pixels
+        assert not img.getexif()
+        assert "icc_profile" not in img.info
+        assert "comment" not in img.info
+    with Image.open(io.BytesIO(kept)) as img:
+        assert img.tobytes() == pixels
+        assert dict(img.getexif()) == {0x0112: 6}
+        assert img.info["icc_profile"]
+    assert stripped.endswith(b"\xff\xd9")
+
+
+def test_strip_metadata_rejects_broken_files():
+    """Test that non-JPEG and truncated data raise JpegLosslessError."""
+    data = create_jpeg_with_metadata()
+    with pytest.raises(JpegLosslessError):
+        strip_metadata(b"\x89PNG\r\n\x1a\n")
+    with pytest.raises(JpegLosslessError):
+        strip_metadata(data[: len(data) // 2])
+
+
+@pytest.mark.skipif(not has_jpegtran(), reason="jpegtran not installed")
+def test_optimize_huffman():
+    """Test that jpegtran's rewrite decodes to the same pixels."""
+    buffer = io.BytesIO()
+    Image.effect_noise((120, 80), 30).save(buffer, "JPEG", quality=90)
+    data = buffer.getvalue()
+
+    optimized = optimize_huffman(data, progressive=True)
+    assert len(optimized) <= len(data)
+    with Image.open(io.BytesIO(data)) as original, Image.open(io.BytesIO(optimized)) as img:
+        assert img.tobytes() == original.tobytes()
+        assert img.info.get("progressive")
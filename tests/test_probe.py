@@ -0,0 +1,121 @@
+"""Tests for probe module."""
+
+import json
+import subprocess
+import tempfile
+from pathlib import Path
+from unittest.mock import patch
+
+from mpress.probe import (
+    ACTION_ENCODE,
+    ACTION_REMUX,
+    ACTION_SKIP,
+    estimate_output_size,
+    parse_probe,
+    plan_compression,
+    plan_video,
+    probe_video,
+)
+
+
+def make_probe_data(codec="h264", bit_rate=5_000_000, audio=True):
+    """Create ffprobe-style JSON output for a 10 second 1280x720 clip."""
+    streams = []
+    if codec is not None:
+        streams.append(
+            {
+                "codec_type": "video",
+                "codec_name": codec,
+                "width": 1280,
+                "height": 720,
+                "avg_frame_rate": "30/1",
+                "bit_rate": str(bit_rate),
+            }
+        )
+    if audio:
+        streams.append({"codec_type": "audio", "codec_name": "aac", "bit_rate": "128000"})
+    return {
+        "streams": streams,
+        "format": {"duration": "10.000000", "bit_rate": str(bit_rate + 128000)},
+    }
+
+
+def test_parse_probe():
+    """Test extraction of stream information."""
+    probe = parse_probe(make_probe_data(), size=6_000_000)
+    assert probe.video_codec == "h264"
+    assert (probe.width, probe.height) == (1280, 720)
+    assert probe.frame_rate == 30.0
+    assert probe.duration == 10.0
+    assert probe.audio_codec == "aac"
+    assert round(probe.bits_per_pixel, 3) == 0.181
+
+
+def test_parse_probe_ignores_cover_art():
+    """Test that attached pictures are not treated as video."""
+    data = make_probe_data(codec=None)
+    data["streams"].append(
+        {"codec_type": "video", "codec_name": "mjpeg", "disposition": {"attached_pic": 1}}
+    )
+    probe = parse_probe(data, size=1000)
+    assert probe.video_codec is None
+    assert plan_video(probe, ".mp4")[0] == ACTION_SKIP
+
+
+def test_plan_video():
+    """Test the skip/remux/encode decision."""
+    size = 6_000_000
+    assert plan_video(parse_probe(make_probe_data("hevc"), size), ".mov")[0] == ACTION_SKIP
+    assert plan_video(parse_probe(make_probe_data("h264"), size), ".mp4")[0] == ACTION_ENCODE
+    assert (
+        plan_video(parse_probe(make_probe_data("h264", bit_rate=500_000), size), ".mp4")[0]
+        == ACTION_REMUX
+    )
+    assert (
+        plan_video(parse_probe(make_probe_data("vp9", bit_rate=500_000), size), ".webm")[0]
+        == ACTION_SKIP
+    )
+    assert plan_video(parse_probe(make_probe_data("vp8"), size), ".webm")[0] == ACTION_ENCODE
+
+
+def test_plan_compression():
+    """Test that format and downscaling settings force an encode, but only of video."""
+    size = 6_000_000
+    hevc = parse_probe(make_probe_data("hevc"), size)
+    assert plan_compression(hevc, ".mp4") == ACTION_SKIP
+    assert plan_compression(hevc, ".mp4", video_format="hevc") == ACTION_SKIP
+    assert plan_compression(hevc, ".mp4", video_format="av1") == ACTION_ENCODE
+    assert plan_compression(hevc, ".mp4", max_dimension=640) == ACTION_ENCODE
+    assert plan_compression(hevc, ".mp4", max_dimension=1920) == ACTION_SKIP
+
+    audio_only = parse_probe(make_probe_data(codec=None), size)
+    assert plan_compression(audio_only, ".mp4", video_format="hevc") == ACTION_SKIP
+    assert plan_compression(audio_only, ".mp4", max_dimension=640) == ACTION_SKIP
+
+
+def test_estimate_output_size():
+    """Test byte-savings predictions."""
+    probe = parse_probe(make_probe_data("h264"), size=6_500_000)
+    assert estimate_output_size(probe, ".mp4", ACTION_SKIP) == probe.size
+    assert estimate_output_size(probe, ".mp4", ACTION_REMUX) == probe.size
+    estimate = estimate_output_size(probe, ".mp4", ACTION_ENCODE)
+    assert 0 < estimate < probe.size
+
+
+@patch("mpress.probe.shutil.which", return_value="/usr/bin/ffprobe")
+@patch("mpress.probe.subprocess.run")
+def test_probe_video_runs_once_per_file(mock_run, mock_which):
+    """Test that probe results are cached for unchanged files."""
+    mock_run.return_value = subprocess.CompletedProcess(
+        args=[], returncode=0, stdout=json.dumps(make_probe_data()).encode(), stderr=b""
+    )
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = Path(tmpdir) / "clip.mp4"
+        path.write_bytes(b"video")
+
+        first = probe_video(path)
+        second = probe_video(path)
+
+        assert first == second
+        assert first.size == 5
+        assert mock_run.call_count == 1
@@ -0,0 +1,83 @@
+"""Tests for progress module."""
+
+import io
+
+from mpress.progress import ProgressDashboard
+from mpress.video_compressor import EncodeProgress
+
+
+def make_progress(out_time: float, done: bool = False) -> EncodeProgress:
+    """Create a progress snapshot for a 10 second input."""
+    return EncodeProgress(
+        frame=int(out_time * 25),
+        fps=50.0,
+        out_time=out_time,
+        total_size=1000,
+        speed=2.0,
+        duration=10.0,
+        done=done,
+    )
+
+
+def test_encode_progress_eta():
+    """Test fraction and ETA calculations."""
+    progress = make_progress(4.0)
+    assert progress.fraction == 0.4
+    assert progress.eta == 3.0
+
+    unknown = progress._replace(duration=None)
+    assert unknown.fraction is None
+    assert unknown.eta is None
+
+
+def test_dashboard_draws_active_encodes():
+    """Test that running encodes and totals are drawn on the stream."""
+    stream = io.StringIO()
+    dashboard = ProgressDashboard(stream=stream, enabled=True)
+
+    update = dashboard.track("/videos/clip.mp4")
+    update(make_progress(4.0))
+    output = stream.getvalue()
+    assert "clip.mp4:  40% 50.0 fps 2.00x ETA 0:03" in output
+
+    dashboard.finish("/videos/clip.mp4", 3000, 1000)
+    assert dashboard.files_done == 1
+    assert dashboard.bytes_saved == 2000
+    assert "1 files done, 2.0 KB saved" in stream.getvalue()
+
+    # Late updates for a finished file are ignored
+    update(make_progress(5.0))
+    dashboard.close()
+
+
+def test_dashboard_disabled_draws_nothing():
+    """Test that a disabled dashboard only prints messages and keeps totals."""
+    stream = io.StringIO()
+    out = io.StringIO()
+    dashboard = ProgressDashboard(stream=stream, enabled=False)
+
+    dashboard.track("a.mp4")(make_progress(1.0))
+    dashboard.print("Compressed: a.mp4", file=out)
+    dashboard.finish("a.mp4", 100, 40)
+    dashboard.close()
+
+    assert stream.getvalue() == ""
+    assert out.getvalue() == "Compressed: a.mp4\n"
+    assert dashboard.bytes_saved == 60
+
+
+def test_dashboard_batch_predictions():
+    """Test predicted savings and batch ETA from probed videos."""
+    stream = io.StringIO()
+    dashboard = ProgressDashboard(stream=stream, enabled=True, video_jobs=2)
+
+    dashboard.expect("a.mp4", 10.0, 5000)
+    dashboard.expect("b.mp4", 30.0, 3000)
+    dashboard.track("a.mp4")(make_progress(4.0))
+
+    # 36 media seconds left at 2x speed over 2 workers
+    assert "~7.8 KB more expected, videos ETA 0:09" in stream.getvalue()
+
+    dashboard.finish("a.mp4", 100, 50)
+    dashboard.finish("b.mp4", 100, 50)
+    assert "more expected" not in stream.getvalue().splitlines()[-1]
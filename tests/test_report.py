@@ -0,0 +1,122 @@
+"""Tests for timing and report modules."""
+
+import json
+import tempfile
+from pathlib import Path
+
+from PIL import Image
+
+from mpress import report as report_module
+from mpress.batch import FileResult
+from mpress.cli import process_file
+from mpress.report import BatchReport
+from mpress.timing import percentile, record_stages, stage
+
+
+def test_stage_is_noop_when_not_recording():
+    """Test that stages outside record_stages() record nothing."""
+    with stage("encode"):
+        pass
+    with record_stages() as timer:
+        with stage("encode"):
+            pass
+        with stage("encode"):
+            pass
+    # Nothing leaks to the thread after the block
+    assert stage("encode") is stage("decode")
+
+    seconds = dict(timer.items())
+    assert set(seconds) == {"encode", "total"}
+    assert 0 <= seconds["encode"] <= seconds["total"]
+    assert percentile([1.0, 2.0, 3.0, 4.0], 0.5) == 3.0
+    assert percentile([], 0.95) == 0.0
+
+
+def test_process_file_records_stages():
+    """Test that a timed image compression reports its stages."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        input_path = Path(tmpdir) / "test.png"
+        Image.new("RGB", (64, 64), color=(255, 0, 0)).save(input_path, "PNG")
+
+        untimed = process_file(str(input_path))
+        assert untimed.stages == ()
+
+        result = process_file(str(input_path), timed=True)
+        assert result.success
+        stages = dict(result.stages)
+        assert {"validate", "decode", "quantize", "encode", "commit", "total"} <= set(stages)
+        assert sum(seconds for name, seconds in stages.items() if name != "total") <= (
+            stages["total"]
+        )
+
+
+def test_batch_report_json_and_prometheus():
+    """Test the report summary and both output formats."""
+    report = BatchReport()
+    for index in range(10):
+        report.add(
+            FileResult(
+                f"file{index}.png",
+                True,
+                "Compressed",
+                1000,
+                400,
+                "compressed",
+                (("decode", 0.01 * (index + 1)), ("total", 0.1)),
+            )
+        )
+    report.add(FileResult("broken.png", False, "Error"))
+    report.add(
+        FileResult(
+            "photo.jpg",
+            True,
+            "Compressed",
+            500,
+            300,
+            "compressed",
+            details=(("jpeg_quality", 62), ("jpeg_bytes_saved_vs_q85", 120)),
+        )
+    )
+    report.finish()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        json_path = Path(tmpdir) / "report.json"
+        prom_path = Path(tmpdir) / "mpress.prom"
+        report.write_json(json_path)
+        report.write_prometheus(prom_path)
+        data = json.loads(json_path.read_text())
+        metrics = prom_path.read_text()
+        assert sorted(p.name for p in Path(tmpdir).iterdir()) == ["mpress.prom", "report.json"]
+
+    assert data["files"] == {
+        "succeeded": 11,
+        "failed": 1,
+        "outcomes": {"compressed": 11, "failed": 1},
+    }
+    assert data["bytes"]["saved"] == 6200
+    assert list(data["stages"]) == ["decode", "total"]
+    assert data["stages"]["decode"]["count"] == 10
+    assert data["stages"]["decode"]["p50"] == 0.06
+    assert data["stages"]["decode"]["p95"] == 0.1
+    assert len(data["per_file"]) == 12
+    assert data["per_file"][-1]["details"]["jpeg_quality"] == 62
+    assert data["jpeg_search"]["bytes_saved_vs_q85"] == 120
+
+    assert 'mpress_batch_files{outcome="compressed"} 11' in metrics
+    assert "mpress_batch_jpeg_bytes_saved_vs_q85 120" in metrics
+    assert 'mpress_batch_stage_seconds{stage="decode",quantile="0.95"} 0.1' in metrics
+    assert 'mpress_batch_stage_seconds_count{stage="total"} 10' in metrics
+
+
+def test_report_writes_flush_directory(monkeypatch):
+    """Test that the renamed report files are made durable."""
+    flushed = []
+    monkeypatch.setattr(report_module, "fsync_directory", flushed.append)
+    report = BatchReport()
+    report.finish()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        report.write_json(Path(tmpdir) / "report.json")
+        report.write_prometheus(Path(tmpdir) / "mpress.prom")
+
+        assert flushed == [Path(tmpdir), Path(tmpdir)]
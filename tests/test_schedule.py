@@ -0,0 +1,129 @@
+"""Tests for schedule module."""
+
+import random
+import tempfile
+from pathlib import Path
+
+import pytest
+from PIL import Image
+
+from mpress import schedule
+from mpress.cli import main
+from mpress.schedule import Estimate, estimate_batch, estimate_file, prioritize
+from mpress.video_compressor import check_ffmpeg_available
+from tests.test_crf_search import make_clip
+
+
+def _photo(path: Path, quality: int) -> None:
+    """Write a noisy JPEG at the given quality."""
+    rng = random.Random(quality)
+    pixels = bytes(rng.randrange(0, 256) for _ in range(128 * 128 * 3))
+    image = Image.frombytes("RGB", (128, 128), pixels).resize((512, 512), Image.BILINEAR)
+    image.save(path, "JPEG", quality=quality)
+
+
+def _noisy_png(path: Path, seed: int) -> None:
+    """Write a PNG that compression makes smaller."""
+    rng = random.Random(seed)
+    pixels = bytes(rng.randrange(0, 256, 32) for _ in range(64 * 64 * 3))
+    Image.frombytes("RGB", (64, 64), pixels).save(path, "PNG", compress_level=0)
+
+
+def test_prioritize():
+    """Test that files are ordered by saving per second, with weights and stable ties."""
+    inputs = [(name, None) for name in "abcd"]
+    estimates = [
+        Estimate(100, 1.0, 1.0),
+        Estimate(1000, 1.0, 1.0),
+        Estimate(100, 1.0, 1.0),
+        Estimate(1000, 20.0, 20.0),
+    ]
+    assert Estimate(1000, 2.0, 1.0).rate == 500
+    assert [name for name, _ in prioritize(inputs, estimates)] == ["b", "a", "c", "d"]
+    # Compressing "c" also serves two duplicates
+    weights = {"c": 3}
+    assert [name for name, _ in prioritize(inputs, estimates, weights)] == ["b", "c", "a", "d"]
+
+
+def test_estimate_image():
+    """Test that a high-quality JPEG is predicted to save more than a low-quality one."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        high = Path(tmpdir) / "high.jpg"
+        low = Path(tmpdir) / "low.jpg"
+        _photo(high, 95)
+        _photo(low, 60)
+
+        high_estimate, low_estimate = estimate_batch(
+            [(str(high), None), (str(low), "image")], jobs=1
+        )
+
+        assert high_estimate.bytes_saved > high.stat().st_size // 4
+        assert high_estimate.bytes_saved > low_estimate.bytes_saved
+        assert high_estimate.cpu_seconds > 0
+        # Estimating leaves the file alone
+        assert Image.open(high).size == (512, 512)
+
+
+def test_estimate_file_never_fails():
+    """Test that files that cannot be estimated are predicted to save nothing."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        broken = Path(tmpdir) / "broken.png"
+        broken.write_bytes(b"not an image")
+        assert estimate_file(str(broken)).bytes_saved == 0
+        assert estimate_file(str(Path(tmpdir) / "missing.mp4")).bytes_saved == 0
+        assert estimate_file(str(Path(tmpdir) / "notes.txt")).bytes_saved == 0
+
+
+def test_estimate_video():
+    """Test that a high-bitrate video is predicted to shrink."""
+    if not check_ffmpeg_available():
+        pytest.skip("FFmpeg not available")
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        video = Path(tmpdir) / "clip.mp4"
+        make_clip(video, "smptebars", seconds=4)
+
+        estimate = estimate_file(str(video))
+
+        assert 0 < estimate.bytes_saved < video.stat().st_size
+        assert estimate.wall_seconds > 0
+
+
+def test_resume_compresses_deferred_files(monkeypatch, capsys):
+    """Test that files deferred by --time-budget are compressed by --resume."""
+
+    def fake_estimates(inputs, *args):
+        # Files named slow_* would take far longer than the budget
+        return [
+            Estimate(1000, 1e6, 1e6) if "slow_" in path else Estimate(1000, 0.1, 0.1)
+            for path, _ in inputs
+        ]
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        monkeypatch.setenv("MPRESS_CACHE_DIR", str(Path(tmpdir) / "cache"))
+        media = Path(tmpdir) / "media"
+        media.mkdir()
+        for seed, name in enumerate(["fast_a.png", "slow_b.png", "fast_c.png", "slow_d.png"]):
+            _noisy_png(media / name, seed)
+        originals = {path.name: path.read_bytes() for path in media.iterdir()}
+        arguments = ["-r", str(media), "--no-cache", "--no-progress"]
+
+        monkeypatch.setattr(schedule, "estimate_batch", fake_estimates)
+        with pytest.raises(SystemExit) as exc_info:
+            main(arguments + ["--time-budget", "1h"])
+        assert exc_info.value.code == 0
+        changed = sorted(
+            path.name for path in media.iterdir() if path.read_bytes() != originals[path.name]
+        )
+        assert changed == ["fast_a.png", "fast_c.png"]
+        assert "Run again with --resume" in capsys.readouterr().out
+
+        with pytest.raises(SystemExit) as exc_info:
+            main(arguments + ["--resume"])
+        assert exc_info.value.code == 0
+        output = capsys.readouterr().out
+        assert "Resumed: skipped 2 files" in output
+        assert "fast_" not in output
+        assert all(path.read_bytes() != originals[path.name] for path in media.iterdir())
+        # The completed run deleted its journal
+        assert list((Path(tmpdir) / "cache" / "journals").glob("*.sqlite3")) == []
@@ -0,0 +1,104 @@
+"""Tests for segment_encoder module."""
+
+import json
+import os
+import subprocess
+import tempfile
+from pathlib import Path
+
+import pytest
+
+from mpress import segment_encoder
+from mpress.probe import check_ffprobe_available
+from mpress.segment_encoder import compress_segmented, plan_segment_count
+from mpress.video_compressor import check_ffmpeg_available, compress_mov_mp4
+
+
+def ffprobe_streams(path: Path) -> dict:
+    """Get duration and per-stream details for a file."""
+    result = subprocess.run(
+        [
+            "ffprobe",
+            "-v",
+            "error",
+            "-print_format",
+            "json",
+            "-show_format",
+            "-show_streams",
+            str(path),
+        ],
+        stdout=subprocess.PIPE,
+        check=True,
+    )
+    data = json.loads(result.stdout)
+    return {
+        "duration": float(data["format"]["duration"]),
+        "streams": [
+            (
+                stream["codec_type"],
+                stream["codec_name"],
+                stream.get("width"),
+                stream.get("height"),
+                stream.get("nb_frames") if stream["codec_type"] == "video" else None,
+            )
+            for stream in data["streams"]
+        ],
+    }
+
+
+def test_plan_segment_count():
+    """Test that short videos are not split."""
+    assert plan_segment_count(None, 8) == 1
+    assert plan_segment_count(600.0, 1) == 1
+    assert plan_segment_count(45.0, 8) == 1
+    assert plan_segment_count(95.0, 8) == 3
+    assert plan_segment_count(7200.0, 8) == 8
+
+
+def test_segmented_matches_single_process(monkeypatch):
+    """Test duration and stream parity against a single-process encode."""
+    if not (check_ffmpeg_available() and check_ffprobe_available()):
+        pytest.skip("FFmpeg/ffprobe not available")
+    monkeypatch.setattr(segment_encoder, "MIN_SEGMENT_SECONDS", 2.0)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        input_path = Path(tmpdir) / "long.mp4"
+        subprocess.run(
+            [
+                "ffmpeg",
+                "-f",
+                "lavfi",
+                "-i",
+                "testsrc=duration=8:size=320x240:rate=25",
+                "-f",
+                "lavfi",
+                "-i",
+                "sine=frequency=440:duration=8",
+                "-c:v",
+                "mpeg4",
+                "-g",
+                "25",
+                "-c:a",
+                "aac",
+                "-y",
+                str(input_path),
+            ],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            check=True,
+        )
+        single = compress_mov_mp4(input_path, Path(tmpdir) / "single.mp4")
+        segmented = compress_segmented(input_path, Path(tmpdir) / "segmented.mp4", 3)
+
+        expected = ffprobe_streams(single)
+        actual = ffprobe_streams(segmented)
+
+        # One video and one audio stream in, the same out
+        source = ffprobe_streams(input_path)
+        assert [stream[0] for stream in actual["streams"]] == [
+            stream[0] for stream in source["streams"]
+        ]
+        assert actual["streams"] == expected["streams"]
+        assert actual["duration"] == pytest.approx(expected["duration"], abs=0.1)
+        # Only the inputs and the two outputs remain: segments are cleaned up
+        assert sorted(os.listdir(tmpdir)) == ["long.mp4", "segmented.mp4", "single.mp4"]
@@ -0,0 +1,175 @@
+"""Tests for server and loadtest modules."""
+
+import errno
+import io
+import socket
+import tempfile
+import threading
+from pathlib import Path
+
+import pytest
+from PIL import Image
+
+from mpress.loadtest import connect, fetch_metrics, run_load_test
+from mpress.server import (
+    CompressionService,
+    ServiceError,
+    make_server,
+    remove_stale_socket,
+    spool_body,
+)
+
+
+@pytest.fixture
+def service():
+    """A running service on a free localhost port, with one image worker."""
+    with tempfile.TemporaryDirectory() as spool_dir:
+        service = CompressionService(jobs=1, max_body_size=10_000_000, spool_dir=spool_dir)
+        server = make_server(service, port=0)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            yield service, server.server_address[1], Path(spool_dir)
+        finally:
+            server.shutdown()
+            server.server_close()
+            service.close()
+
+
+def _png(path: Path) -> Path:
+    Image.new("RGB", (400, 300), (30, 120, 200)).save(path, compress_level=0)
+    return path
+
+
+def test_spool_body_chunked():
+    """Test reading a chunked upload, including trailers."""
+    body = io.BytesIO(b"5\r\nhello\r\n6;ext=1\r\n world\r\n0\r\nX-Trailer: 1\r\n\r\nNEXT")
+    dest = io.BytesIO()
+    assert spool_body(body, {"Transfer-Encoding": "chunked"}, dest, 100) == 11
+    assert dest.getvalue() == b"hello world"
+    assert body.read() == b"NEXT"
+
+    with pytest.raises(ServiceError) as error:
+        chunked = io.BytesIO(b"5\r\nhello\r\n0\r\n\r\n")
+        spool_body(chunked, {"Transfer-Encoding": "chunked"}, io.BytesIO(), 4)
+    assert error.value.status == 413
+    with pytest.raises(ServiceError) as error:
+        spool_body(io.BytesIO(b""), {}, io.BytesIO(), 4)
+    assert error.value.status == 411
+
+
+def test_compress_png_request(service):
+    """Test a round trip over a keep-alive connection and the metrics it leaves."""
+    _, port, spool_dir = service
+    with tempfile.TemporaryDirectory() as tmpdir:
+        original = _png(Path(tmpdir) / "a.png").read_bytes()
+
+    conn = connect(port=port)
+    try:
+        for _ in range(2):
+            conn.request("POST", "/compress/png", body=original)
+            response = conn.getresponse()
+            body = response.read()
+            assert response.status == 200
+            assert response.getheader("Content-Type") == "image/png"
+            assert response.getheader("X-Mpress-Input-Size") == str(len(original))
+            assert 0 < len(body) < len(original)
+            assert Image.open(io.BytesIO(body)).size == (400, 300)
+
+        conn.request("POST", "/compress/txt", body=b"x")
+        assert conn.getresponse().status == 404
+    finally:
+        conn.close()
+
+    # Spool files are removed once the response is sent
+    assert list(spool_dir.iterdir()) == []
+    metrics = fetch_metrics(port=port)
+    assert 'mpress_requests_total{type="image",code="200"} 2' in metrics
+    assert f"mpress_received_bytes_total {2 * len(original)}" in metrics
+    assert 'mpress_queue_depth{type="image"} 0' in metrics
+
+
+def test_invalid_and_oversized_uploads(service):
+    """Test error statuses for bodies that are not images or are too large."""
+    _, port, _ = service
+    conn = connect(port=port)
+    try:
+        conn.request("POST", "/compress/jpg", body=b"not a jpeg")
+        response = conn.getresponse()
+        assert response.status == 422
+        assert b"Compression error" in response.read()
+
+        conn.putrequest("POST", "/compress/png")
+        conn.putheader("Content-Length", "20000000")
+        conn.endheaders()
+        assert conn.getresponse().status == 413
+    finally:
+        conn.close()
+
+
+def test_admission_limit():
+    """Test that requests beyond max_pending are refused."""
+    service = CompressionService(jobs=1, max_pending=1)
+    try:
+        metrics = service.metrics
+        assert metrics.admit(service.max_pending)
+        assert not metrics.admit(service.max_pending)
+        metrics.release()
+        assert metrics.admit(service.max_pending)
+        assert "mpress_requests_rejected_total 1" in metrics.render()
+    finally:
+        service.close()
+
+
+def test_unix_socket_load_test():
+    """Test the load generator against a service on a Unix socket."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        socket_path = str(Path(tmpdir) / "mpress.sock")
+        sample = _png(Path(tmpdir) / "a.png")
+        service = CompressionService(jobs=1)
+        server = make_server(service, socket_path=socket_path)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            result = run_load_test([sample], requests=6, concurrency=2, socket_path=socket_path)
+        finally:
+            server.shutdown()
+            server.server_close()
+            service.close()
+
+        assert len(result.latencies) == 6
+        assert result.errors == result.rejected == 0
+        assert result.bytes_sent == 6 * sample.stat().st_size
+        assert 0 < result.bytes_received < result.bytes_sent
+        assert result.percentile(0.5) <= result.percentile(0.99)
+        assert not Path(socket_path).exists()
+        # Uploads are copies; the sample is left alone
+        assert sample.stat().st_size > result.bytes_received / 6
+
+
+def test_remove_stale_socket():
+    """Test that only sockets nobody listens on are replaced."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = str(Path(tmpdir) / "mpress.sock")
+        remove_stale_socket(path)
+
+        Path(path).write_text("not a socket")
+        service = CompressionService(jobs=1)
+        try:
+            with pytest.raises(FileExistsError):
+                make_server(service, socket_path=path)
+        finally:
+            service.close()
+        assert Path(path).read_text() == "not a socket"
+        Path(path).unlink()
+
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as live:
+            live.bind(path)
+            live.listen()
+            with pytest.raises(OSError) as excinfo:
+                remove_stale_socket(path)
+            assert excinfo.value.errno == errno.EADDRINUSE
+            assert Path(path).is_socket()
+
+        # Closed without unlinking, as after a crash
+        remove_stale_socket(path)
+        assert not Path(path).exists()
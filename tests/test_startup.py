@@ -0,0 +1,83 @@
+"""Tests for CLI startup cost."""
+
+import os
+import subprocess
+import sys
+import tempfile
+
+from PIL import Image
+
+# Cumulative import time allowed for mpress.cli, in microseconds
+IMPORT_BUDGET_US = 100_000
+
+# Modules only some subcommands or file types need
+HEAVY_MODULES = (
+    "PIL",
+    "subprocess",
+    "multiprocessing",
+    "concurrent.futures",
+    "http.server",
+    "mpress.image_compressor",
+    "mpress.video_compressor",
+)
+
+
+def _import_times(code: str, cache_dir: str) -> dict:
+    """Run code in a fresh interpreter and return -X importtime's cumulative times."""
+    env = dict(os.environ, MPRESS_CACHE_DIR=cache_dir)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        env=env,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        if cumulative.strip().isdigit():
+            times[name.strip()] = int(cumulative)
+    return times
+
+
+def test_cli_import_is_lazy():
+    """Test that importing the CLI skips heavy modules and stays in budget."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        # Best of three, to ride out a busy machine
+        runs = [_import_times("import mpress.cli", tmpdir) for _ in range(3)]
+
+    for times in runs:
+        assert "mpress.cli" in times
+        loaded = [name for name in HEAVY_MODULES if name in times]
+        assert loaded == []
+    assert min(times["mpress.cli"] for times in runs) < IMPORT_BUDGET_US
+
+
+def test_video_only_run_skips_pillow():
+    """Test that a run without images never imports Pillow."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        code = (
+            "from mpress.cli import main\n"
+            f"main([{os.path.join(tmpdir, 'missing.mp4')!r}])\n"
+        )
+        times = _import_times(code, tmpdir)
+
+    assert "mpress.cli" in times
+    assert "PIL" not in times
+    assert "mpress.image_compressor" not in times
+
+
+def test_single_file_run_skips_pools():
+    """Test that one file is compressed without worker pools, whatever --jobs says."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        image = os.path.join(tmpdir, "image.png")
+        Image.new("RGB", (64, 64)).save(image)
+        code = f"from mpress.cli import main\nmain([{image!r}, '--jobs', '4'])\n"
+        times = _import_times(code, tmpdir)
+
+    assert "mpress.cli" in times
+    assert "PIL" in times
+    assert "multiprocessing" not in times
+    assert "concurrent.futures.process" not in times
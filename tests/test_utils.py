@@ -0,0 +1,121 @@
+"""Tests for utils module."""
+
+import errno
+import os
+import stat
+import tempfile
+from pathlib import Path
+
+import pytest
+
+from mpress import utils
+from mpress.utils import DirectorySync, atomic_replace, commit_output, parse_duration
+
+
+def test_commit_output_preserves_metadata():
+    """Test that the new file keeps the original's mode, mtime and xattrs."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        original = Path(tmpdir) / "photo.jpg"
+        original.write_bytes(b"original")
+        os.chmod(original, 0o640)
+        os.utime(original, ns=(1_500_000_000_000_000_000, 1_600_000_000_000_000_000))
+        has_xattr = hasattr(os, "setxattr")
+        if has_xattr:
+            try:
+                os.setxattr(original, "user.mpress.test", b"kept")
+            except OSError:
+                has_xattr = False
+
+        temp = Path(tmpdir) / ".photo.jpg.tmp"
+        temp.write_bytes(b"new")
+        commit_output(temp, original, original, durable=True)
+
+        assert original.read_bytes() == b"new"
+        assert not temp.exists()
+        st = original.stat()
+        assert stat.S_IMODE(st.st_mode) == 0o640
+        assert st.st_mtime_ns == 1_600_000_000_000_000_000
+        if has_xattr:
+            assert os.getxattr(original, "user.mpress.test") == b"kept"
+
+
+def test_atomic_replace_across_filesystems(monkeypatch):
+    """Test the copy fallback used when rename fails with EXDEV."""
+    real_replace = Path.replace
+
+    def cross_device(self, target):
+        if self.name == "source.bin":
+            raise OSError(errno.EXDEV, "Invalid cross-device link")
+        return real_replace(self, target)
+
+    monkeypatch.setattr(Path, "replace", cross_device)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        source = Path(tmpdir) / "source.bin"
+        destination = Path(tmpdir) / "out" / "data.bin"
+        destination.parent.mkdir()
+        destination.write_bytes(b"old")
+        data = os.urandom(300_000)
+        source.write_bytes(data)
+
+        probe_fd = utils._open_unnamed(destination.parent)
+        if probe_fd is not None:
+            os.close(probe_fd)
+            # The copy must go through an anonymous file where it can
+            real_link = utils._link_unnamed
+            linked = []
+            monkeypatch.setattr(
+                utils, "_link_unnamed", lambda fd, path: linked.append(real_link(fd, path))
+            )
+        else:
+            linked = [None]
+        atomic_replace(source, destination, durable=True)
+        assert linked == [None]
+
+        assert destination.read_bytes() == data
+        assert not source.exists()
+        assert os.listdir(destination.parent) == ["data.bin"]
+
+        # Without O_TMPFILE the copy goes through a named temporary file
+        monkeypatch.setattr(utils, "_open_unnamed", lambda directory: None)
+        source.write_bytes(b"second")
+        atomic_replace(source, destination)
+        assert destination.read_bytes() == b"second"
+        assert os.listdir(destination.parent) == ["data.bin"]
+
+
+def test_directory_sync_groups_directories(monkeypatch):
+    """Test that each directory is flushed once per batch."""
+    flushed = []
+    monkeypatch.setattr(utils, "fsync_directory", lambda path: flushed.append(path.name))
+
+    sync = DirectorySync(max_pending=3)
+    for name in ("a/1.png", "a/2.png", "b/1.png", "a/3.png"):
+        sync.add(name)
+    assert flushed == []
+    sync.add("c/1.png")
+    assert flushed == ["a", "b", "c"]
+    sync.add("a/4.png")
+    sync.flush()
+    sync.flush()
+    assert flushed == ["a", "b", "c", "a"]
+
+
+def test_atomic_replace_missing_source():
+    """Test that a missing source leaves the destination alone."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        destination = Path(tmpdir) / "data.bin"
+        destination.write_bytes(b"old")
+        with pytest.raises(OSError):
+            atomic_replace(Path(tmpdir) / "missing", destination)
+        assert destination.read_bytes() == b"old"
+
+
+def test_parse_duration():
+    """Test parsing durations with units."""
+    assert parse_duration("90") == 90
+    assert parse_duration("1.5m") == 90
+    assert parse_duration("2h") == 7200
+    assert parse_duration(" 30S ") == 30
+    for text in ("", "abc", "-5s", "1d"):
+        with pytest.raises(ValueError):
+            parse_duration(text)
@@ -1,6 +1,7 @@
 """Tests for video_compressor module."""
 
 import os
+import subprocess
 import tempfile
 from pathlib import Path
 from unittest.mock import MagicMock, patch
@@ -8,10 +9,24 @@ from unittest.mock import MagicMock, patch
 import pytest
 
 from mpress.video_compressor import (
+    KEPT_ABORTED,
+    KEPT_NO_GAIN,
+    REPLACED,
+    STDERR_TAIL_LINES,
+    EncodeProgress,
     FFmpegNotFoundError,
     VideoCompressionError,
+    available_video_formats,
     check_ffmpeg_available,
     compress_video,
+    compress_video_stream,
+    get_encoder_args,
+    get_scale_args,
+    remux_video,
+    run_ffmpeg,
+    size_guard,
+    video_target_path,
+    _mp4_index_first,
 )
 
 
@@ -45,3 +60,275 @@ def test_compress_video_unsupported_format():
         with pytest.raises(VideoCompressionError, match="Unsupported video format"):
             compress_video(input_path)
 
+
+def create_test_video(path: Path, seconds: int = 2, codec_args: tuple = ()) -> None:
+    """Create a short test clip with FFmpeg's testsrc source."""
+    subprocess.run(
+        [
+            "ffmpeg",
+            "-f",
+            "lavfi",
+            "-i",
+            f"testsrc=duration={seconds}:size=320x240:rate=25",
+            *(codec_args or ("-c:v", "mpeg4", "-q:v", "2")),
+            "-y",
+            str(path),
+        ],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        check=True,
+    )
+
+
+def test_compress_video_reports_progress():
+    """Test that FFmpeg progress is streamed to the callback."""
+    if not check_ffmpeg_available():
+        pytest.skip("FFmpeg not available")
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        input_path = Path(tmpdir) / "test.mp4"
+        create_test_video(input_path)
+
+        updates = []
+        assert compress_video(input_path, on_progress=updates.append) == REPLACED
+
+        assert updates
+        assert updates[-1].done
+        assert updates[-1].frame == 50
+        assert updates[-1].duration == pytest.approx(2.0)
+        assert updates[-1].fraction == pytest.approx(1.0, abs=0.05)
+
+
+def _stream_types(path: Path) -> list:
+    """List the codec types of a file's streams with ffprobe."""
+    result = subprocess.run(
+        ["ffprobe", "-v", "error", "-show_entries", "stream=codec_type", "-of", "csv=p=0", path],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return result.stdout.split()
+
+
+def test_remux_video_keeps_all_streams():
+    """Test that a remux keeps extra audio, subtitle and timecode tracks."""
+    if not check_ffmpeg_available():
+        pytest.skip("FFmpeg not available")
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        subtitles = Path(tmpdir) / "subtitles.srt"
+        subtitles.write_text("1\n00:00:00,000 --> 00:00:01,000\nHello\n")
+        input_path = Path(tmpdir) / "multi.mp4"
+        subprocess.run(
+            [
+                "ffmpeg",
+                "-v",
+                "error",
+                "-f",
+                "lavfi",
+                "-i",
+                "testsrc=duration=2:size=320x240:rate=25",
+                "-f",
+                "lavfi",
+                "-i",
+                "sine=duration=2",
+                "-f",
+                "lavfi",
+                "-i",
+                "sine=frequency=880:duration=2",
+                "-i",
+                str(subtitles),
+                *("-map", "0", "-map", "1", "-map", "2", "-map", "3"),
+                *("-c:v", "mpeg4", "-c:a", "aac", "-c:s", "mov_text"),
+                *("-timecode", "01:00:00:00", "-y", str(input_path)),
+            ],
+            check=True,
+        )
+        streams = _stream_types(input_path)
+        assert streams == ["video", "audio", "audio", "subtitle", "data"]
+
+        output_path = remux_video(input_path, Path(tmpdir) / "remuxed.mp4")
+
+        assert _stream_types(output_path) == streams
+
+
+def test_run_ffmpeg_error_keeps_stderr_tail():
+    """Test that failures report only the tail of FFmpeg's stderr."""
+    if not check_ffmpeg_available():
+        pytest.skip("FFmpeg not available")
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        input_path = Path(tmpdir) / "broken.mp4"
+        input_path.write_bytes(b"not a video")
+        with pytest.raises(VideoCompressionError) as excinfo:
+            run_ffmpeg(
+                ["ffmpeg", "-i", str(input_path), "-y", str(Path(tmpdir) / "out.mp4")],
+                input_path,
+            )
+        message = str(excinfo.value)
+        assert "FFmpeg compression failed" in message
+        assert message.count("\n") < STDERR_TAIL_LINES
+
+
+def test_get_encoder_args_profiles():
+    """Test that profiles map to tuned encoder arguments."""
+    assert get_encoder_args("balanced", "h264") == ["-preset", "medium"]
+    assert get_encoder_args("fast", "h264") == ["-preset", "veryfast"]
+
+    vp9_args = get_encoder_args("fast", "vp9")
+    assert vp9_args[vp9_args.index("-row-mt") + 1] == "1"
+    assert "-tile-columns" in vp9_args
+    assert int(vp9_args[vp9_args.index("-threads") + 1]) >= 1
+
+
+def test_get_encoder_args_unknown_profile():
+    """Test that an unknown profile is rejected."""
+    with pytest.raises(VideoCompressionError, match="Unknown video profile"):
+        get_encoder_args("ludicrous", "h264")
+
+
+def test_size_guard():
+    """Test projection of the final output size."""
+    exceeded = size_guard(1000)
+
+    def progress(out_time, total_size, duration=10.0):
+        return EncodeProgress(0, 0.0, out_time, total_size, 1.0, duration, False)
+
+    # Too early to judge, even though the projection is large
+    assert not exceeded(progress(1.0, 200))
+    # 50% done with 400 bytes projects to 800: keep going
+    assert not exceeded(progress(5.0, 400))
+    # 50% done with 600 bytes projects to 1200: give up
+    assert exceeded(progress(5.0, 600))
+    # Already larger than the input, whatever the duration
+    assert exceeded(progress(1.0, 1000, duration=None))
+
+
+def test_compress_video_keeps_smaller_original():
+    """Test that an already-efficient video is not replaced."""
+    if not check_ffmpeg_available():
+        pytest.skip("FFmpeg not available")
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        input_path = Path(tmpdir) / "small.mp4"
+        create_test_video(input_path, codec_args=("-c:v", "libx264", "-crf", "45"))
+        original = input_path.read_bytes()
+
+        outcome = compress_video(input_path)
+
+        assert outcome in (KEPT_NO_GAIN, KEPT_ABORTED)
+        assert input_path.read_bytes() == original
+        assert os.listdir(tmpdir) == ["small.mp4"]
+
+
+def test_get_scale_args():
+    """Test the scale filter for max_dimension and scale."""
+    assert get_scale_args() == []
+    assert "min(iw*0.5,1280)" in get_scale_args(1280, 0.5)[1]
+    assert get_scale_args(scale=0.5)[1].startswith("scale=w='iw*0.5':h='ih*0.5'")
+
+
+def test_compress_video_max_dimension():
+    """Test that videos are downscaled, keeping the aspect ratio."""
+    if not check_ffmpeg_available():
+        pytest.skip("FFmpeg not available")
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        input_path = Path(tmpdir) / "test.mp4"
+        create_test_video(input_path)
+
+        assert compress_video(input_path, max_dimension=160) == REPLACED
+
+        result = subprocess.run(
+            [
+                "ffprobe",
+                "-v",
+                "error",
+                "-select_streams",
+                "v:0",
+                "-show_entries",
+                "stream=width,height",
+                "-of",
+                "csv=p=0",
+                str(input_path),
+            ],
+            stdout=subprocess.PIPE,
+            text=True,
+            check=True,
+        )
+        assert result.stdout.strip() == "160,120"
+
+
+def test_video_target_path():
+    """Test that the container only changes when it cannot hold the codec."""
+    assert video_target_path(Path("a.mov")) == Path("a.mov")
+    assert video_target_path(Path("a.mov"), "hevc") == Path("a.mov")
+    assert video_target_path(Path("a.webm"), "hevc") == Path("a.mp4")
+    assert video_target_path(Path("a.webm"), "av1") == Path("a.webm")
+    assert video_target_path(Path("a.mov"), "av1") == Path("a.mp4")
+
+
+def test_compress_video_target_format():
+    """Test transcoding a WebM to HEVC in MP4 and removing the original."""
+    if not check_ffmpeg_available() or "hevc" not in available_video_formats():
+        pytest.skip("FFmpeg with libx265 not available")
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        input_path = Path(tmpdir) / "clip.webm"
+        create_test_video(input_path, codec_args=("-c:v", "libvpx-vp9", "-b:v", "4M"))
+
+        assert compress_video(input_path, video_format="hevc") == REPLACED
+        assert os.listdir(tmpdir) == ["clip.mp4"]
+
+
+def test_mp4_index_first():
+    """Test locating the moov box among the top-level boxes."""
+    ftyp = b"\x00\x00\x00\x10ftypisom\x00\x00\x00\x00"
+    assert _mp4_index_first(ftyp + b"\x00\x00\x00\x08moov")
+    assert not _mp4_index_first(ftyp + b"\x00\x00\x00\x08mdat" + b"\x00\x00\x00\x08moov")
+    # The header ends before either box shows up
+    assert not _mp4_index_first(ftyp + b"\x00\x01\x00\x00free")
+
+
+@pytest.mark.parametrize(
+    "name, codec_args",
+    [
+        ("clip.webm", ("-c:v", "libvpx-vp9", "-b:v", "4M")),
+        ("clip.mp4", ("-c:v", "mpeg4", "-q:v", "2")),
+        ("faststart.mp4", ("-c:v", "mpeg4", "-q:v", "2", "-movflags", "+faststart")),
+    ],
+)
+def test_compress_video_stream(name, codec_args):
+    """Test compressing between streams, with and without a leading index."""
+    if not check_ffmpeg_available():
+        pytest.skip("FFmpeg not available")
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        input_path = Path(tmpdir) / name
+        create_test_video(input_path, codec_args=codec_args)
+        output_path = Path(tmpdir) / f"out-{name}"
+
+        with open(input_path, "rb") as source, open(output_path, "wb") as output:
+            compress_video_stream(source, output, input_path.suffix[1:], "fast")
+
+        assert 0 < output_path.stat().st_size < input_path.stat().st_size
+        result = subprocess.run(
+            [
+                "ffprobe",
+                "-v",
+                "error",
+                "-count_frames",
+                "-select_streams",
+                "v:0",
+                "-show_entries",
+                "stream=nb_read_frames",
+                "-of",
+                "csv=p=0",
+                str(output_path),
+            ],
+            stdout=subprocess.PIPE,
+            text=True,
+            check=True,
+        )
+        assert result.stdout.strip() == "50"
+        assert sorted(os.listdir(tmpdir)) == sorted([name, output_path.name])
@@ -0,0 +1,162 @@
+"""Tests for watcher module."""
+
+import signal
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+from mpress import watcher as watcher_module
+from mpress.batch import FileResult
+from mpress.cli import main
+from mpress.watcher import InotifyWatcher, PollingWatcher, SettleTracker, WatchError, watch
+
+
+def _read_until(watcher, expected, timeout=5.0):
+    """Collect paths reported by a watcher until expected shows up."""
+    seen = []
+    deadline = time.monotonic() + timeout
+    while expected not in seen and time.monotonic() < deadline:
+        seen.extend(watcher.read(0.1))
+    return seen
+
+
+def record_path(file_path, file_type=None):
+    """Stand-in for process_file (module level so it pickles)."""
+    return FileResult(file_path, True, f"Compressed: {file_path}", 1, 1, "compressed")
+
+
+def test_settle_tracker_waits_for_stable_files():
+    """Test that files are only released after they stop changing."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = str(Path(tmpdir) / "a.png")
+        Path(path).write_bytes(b"x")
+        tracker = SettleTracker(settle_seconds=0.2)
+        tracker.add(path)
+        assert tracker.ready() == []
+        assert 0 < tracker.next_check() <= 0.2
+
+        # A write restarts the timer
+        time.sleep(0.15)
+        Path(path).write_bytes(b"xy")
+        assert tracker.ready() == []
+        time.sleep(0.1)
+        assert tracker.ready() == []
+        time.sleep(0.15)
+        assert tracker.ready() == [path]
+        assert tracker.next_check() is None
+
+        # Files deleted before settling are dropped
+        tracker.add(path)
+        Path(path).unlink()
+        assert tracker.ready() == []
+        assert len(tracker) == 0
+
+
+def test_polling_watcher_reports_new_and_changed_files():
+    """Test that rescans report added and modified files only."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        root = Path(tmpdir)
+        (root / "old.png").write_bytes(b"x")
+        (root / "skip").mkdir()
+        watcher = PollingWatcher([tmpdir], exclude=["skip"], interval=0.05)
+        assert watcher.initial_files() == [str(root / "old.png")]
+
+        (root / "sub").mkdir()
+        (root / "sub" / "new.mov").write_bytes(b"x")
+        (root / "skip" / "ignored.png").write_bytes(b"x")
+        (root / ".new.mov.tmp").write_bytes(b"x")
+        new = str(root / "sub" / "new.mov")
+        assert _read_until(watcher, new) == [new]
+
+        (root / "old.png").write_bytes(b"changed")
+        assert _read_until(watcher, str(root / "old.png")) == [str(root / "old.png")]
+        watcher.close()
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="inotify is Linux-only")
+def test_inotify_watcher_follows_new_directories():
+    """Test that files written and directories created later are reported."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        root = Path(tmpdir)
+        (root / "old.jpg").write_bytes(b"x")
+        try:
+            watcher = InotifyWatcher([tmpdir])
+        except WatchError as e:
+            pytest.skip(str(e))
+        try:
+            assert watcher.initial_files() == [str(root / "old.jpg")]
+
+            (root / "a.png").write_bytes(b"x")
+            (root / "notes.txt").write_bytes(b"x")
+            seen = _read_until(watcher, str(root / "a.png"))
+            assert seen == [str(root / "a.png")]
+
+            # A directory moved in brings its files; later writes in it are seen
+            staging = Path(tempfile.mkdtemp(dir=tmpdir, prefix=".staging"))
+            (staging / "b.png").write_bytes(b"x")
+            staging.rename(root / "album")
+            assert str(root / "album" / "b.png") in _read_until(
+                watcher, str(root / "album" / "b.png")
+            )
+            (root / "album" / "c.webm").write_bytes(b"x")
+            assert str(root / "album" / "c.webm") in _read_until(
+                watcher, str(root / "album" / "c.webm")
+            )
+        finally:
+            watcher.close()
+
+
+def test_watch_processes_stable_files_once():
+    """Test the watch loop end to end with polling and a single worker."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        root = Path(tmpdir)
+        (root / "a.png").write_bytes(b"x")
+        results = []
+        stop = threading.Event()
+
+        def on_result(result):
+            results.append(result.file_path)
+            if len(results) == 2:
+                stop.set()
+
+        def add_file(watcher):
+            (root / "b.mp4").write_bytes(b"x")
+
+        runner = threading.Thread(
+            target=watch,
+            args=([tmpdir], record_path, on_result),
+            kwargs=dict(
+                jobs=1,
+                settle_seconds=0.1,
+                poll=True,
+                poll_interval=0.05,
+                stop=stop,
+                on_start=add_file,
+            ),
+        )
+        runner.start()
+        runner.join(timeout=10)
+        assert not runner.is_alive()
+        assert sorted(results) == [str(root / "a.png"), str(root / "b.mp4")]
+
+
+def test_watch_command_parses_arguments(monkeypatch):
+    """Test that 'mpress watch' parses its arguments and starts the watch loop."""
+    calls = []
+    monkeypatch.setattr(watcher_module, "watch", lambda *args, **kwargs: calls.append(kwargs))
+    monkeypatch.setattr(signal, "signal", lambda signum, handler: None)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        main(["watch", tmpdir, "--poll", "--no-cache", "--jobs", "2", "--settle", "0.5"])
+
+        assert len(calls) == 1
+        assert calls[0]["jobs"] == 2
+        assert calls[0]["settle_seconds"] == 0.5
+        assert calls[0]["poll"]
+
+        with pytest.raises(SystemExit):
+            main(["watch", tmpdir, "--jobs", "0"])
+        assert len(calls) == 1